@@ -0,0 +1 @@
+"""Local benchmarks for gebwai hot paths."""
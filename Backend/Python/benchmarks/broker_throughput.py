@@ -0,0 +1,161 @@
+"""
+Taskiq broker throughput: InMemory vs ZeroMQ vs Postgres.
+
+Runs a client broker sending ``--messages`` no-op tasks and a worker
+broker running them with a taskiq receiver in the same process, and
+prints tasks run per second and how many never ran within ``--timeout``
+seconds. ZeroMQ drops tasks nobody is subscribed for, the Postgres
+broker keeps them until they're run.
+
+The Postgres broker needs Postgres from ``BACKEND_DB_*`` settings,
+it creates and drops its own database, ``gebwai_benchmark`` unless
+``BACKEND_DB_BASE`` is set. It's skipped when Postgres can't be reached.
+Run it from ``Backend/Python``::
+
+    python -m benchmarks.broker_throughput --messages 5000
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, List, Tuple
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+os.environ.setdefault("BACKEND_DB_BASE", "gebwai_benchmark")
+
+from taskiq import AsyncBroker, InMemoryBroker, ZeroMQBroker  # noqa: E402
+from taskiq.receiver import Receiver  # noqa: E402
+
+from gebwai.brokers.postgres import PostgresBroker  # noqa: E402
+from gebwai.db.engine import create_engine  # noqa: E402
+from gebwai.db.meta import meta  # noqa: E402
+from gebwai.db.models import load_all_models  # noqa: E402
+from gebwai.db.utils import create_database, drop_database  # noqa: E402
+from gebwai.settings import settings  # noqa: E402
+
+ZMQ_HOST = "tcp://127.0.0.1:5599"
+
+
+class Counter:
+    """Counts tasks run by a worker."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    async def run(self) -> None:
+        self.count += 1
+
+
+def postgres_broker() -> PostgresBroker:
+    return PostgresBroker(
+        create_engine(),
+        visibility_timeout=settings.broker_visibility_timeout,
+        max_attempts=settings.broker_max_attempts,
+        retry_delay=settings.broker_retry_delay,
+        retry_max_delay=settings.broker_retry_max_delay,
+        claim_batch_size=settings.broker_claim_batch_size,
+        poll_interval=settings.broker_poll_interval,
+    )
+
+
+def in_memory_pair() -> Tuple[AsyncBroker, AsyncBroker]:
+    broker = InMemoryBroker()
+    return broker, broker
+
+
+def zeromq_pair() -> Tuple[AsyncBroker, AsyncBroker]:
+    return (
+        ZeroMQBroker(zmq_pub_host=ZMQ_HOST, zmq_sub_host=ZMQ_HOST),
+        ZeroMQBroker(zmq_pub_host=ZMQ_HOST, zmq_sub_host=ZMQ_HOST),
+    )
+
+
+def postgres_pair() -> Tuple[AsyncBroker, AsyncBroker]:
+    return postgres_broker(), postgres_broker()
+
+
+async def measure(
+    pair: Callable[[], Tuple[AsyncBroker, AsyncBroker]],
+    args: argparse.Namespace,
+) -> Tuple[float, int]:
+    client, worker = pair()
+    counter = Counter()
+    for broker in {client, worker}:
+        broker.register_task(counter.run, task_name="benchmark:count")
+    worker.is_worker_process = client is not worker
+    await worker.startup()
+    if client is not worker:
+        await client.startup()
+    receiver = None
+    if client is not worker:
+        receiver = asyncio.create_task(
+            Receiver(
+                worker,
+                max_async_tasks=args.concurrency,
+                run_startup=False,
+            ).listen(),
+        )
+        # ZeroMQ subscribers miss messages sent before they're connected.
+        await asyncio.sleep(0.5)
+    task = client.find_task("benchmark:count")
+    assert task is not None
+    started = time.perf_counter()
+    for _ in range(args.messages):
+        await task.kiq()
+    deadline = started + args.timeout
+    while counter.count < args.messages and time.perf_counter() < deadline:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    if receiver is not None:
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+    for broker in {client, worker}:  # noqa: WPS440
+        await broker.shutdown()
+    return counter.count / elapsed, args.messages - counter.count
+
+
+async def postgres_ready() -> bool:
+    load_all_models()
+    try:
+        await create_database()
+    except OSError as error:
+        print(f"Postgres skipped: {error}")  # noqa: WPS421
+        return False
+    engine = create_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(meta.create_all)
+    await engine.dispose()
+    return True
+
+
+async def run(args: argparse.Namespace) -> None:
+    brokers: List[Tuple[str, Callable[[], Tuple[AsyncBroker, AsyncBroker]]]] = [
+        ("inmemory", in_memory_pair),
+        ("zeromq", zeromq_pair),
+    ]
+    cleanups: List[Callable[[], Awaitable[None]]] = []
+    if await postgres_ready():
+        brokers.append(("postgres", postgres_pair))
+        cleanups.append(drop_database)
+    print(f"{'broker':<10} {'tasks/s':>10} {'lost':>8}")  # noqa: WPS421
+    try:
+        for name, pair in brokers:
+            rate, lost = await measure(pair, args)
+            print(f"{name:<10} {rate:>10.0f} {lost:>8}")  # noqa: WPS421
+    finally:
+        for cleanup in cleanups:
+            await cleanup()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--messages", type=int, default=5000)
+    arg_parser.add_argument("--concurrency", type=int, default=100)
+    arg_parser.add_argument("--timeout", type=float, default=60)
+    args = arg_parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
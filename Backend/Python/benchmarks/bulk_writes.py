@@ -0,0 +1,122 @@
+"""
+Collected item writes: one insert per item vs batched writes.
+
+Writes ``--rows`` items from ``--concurrency`` handlers, first each
+in its own session and transaction, as a request would, then through
+``BulkWriter`` with multi-row ``INSERT`` and with ``COPY``,
+and prints rows per second.
+
+Needs Postgres from ``BACKEND_DB_*`` settings. It creates and drops
+its own database, ``gebwai_benchmark`` unless ``BACKEND_DB_BASE`` is set.
+Run it from ``Backend/Python``::
+
+    python -m benchmarks.bulk_writes --rows 20000
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+os.environ.setdefault("BACKEND_DB_BASE", "gebwai_benchmark")
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker  # noqa: E402
+
+from gebwai.db.bulk import BulkWriter, Record  # noqa: E402
+from gebwai.db.engine import create_engine  # noqa: E402
+from gebwai.db.models.item_model import GebItem  # noqa: E402
+from gebwai.db.utils import create_database, drop_database  # noqa: E402
+from gebwai.services.items import ITEM_COLUMNS  # noqa: E402
+from gebwai.settings import BulkWriteMethod, settings  # noqa: E402
+
+
+def make_record(index: int) -> Record:
+    return (
+        str(index),
+        f"C{index % 100}",
+        f"U{index % 1000}",
+        "image",
+        1024,
+        datetime.now(),
+    )
+
+
+async def run_handlers(
+    args: argparse.Namespace,
+    handle: Callable[[Record], Awaitable[None]],
+) -> None:
+    async def handler(offset: int) -> None:
+        for index in range(offset, args.rows, args.concurrency):
+            await handle(make_record(index))
+
+    await asyncio.gather(*(handler(offset) for offset in range(args.concurrency)))
+
+
+async def single_inserts(engine: AsyncEngine, args: argparse.Namespace) -> None:
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def handle(record: Record) -> None:
+        async with session_factory() as session:
+            session.add(GebItem(**dict(zip(ITEM_COLUMNS, record))))
+            await session.commit()
+
+    await run_handlers(args, handle)
+
+
+async def bulk_writes(
+    engine: AsyncEngine,
+    args: argparse.Namespace,
+    method: BulkWriteMethod,
+) -> None:
+    writer = BulkWriter(
+        GebItem.__table__,  # type: ignore
+        ITEM_COLUMNS,
+        batch_size=settings.item_write_batch_size,
+        flush_interval=settings.item_write_flush_interval,
+        max_pending=settings.item_write_max_pending,
+        method=method,
+        engine=engine,
+    )
+    await run_handlers(args, writer.submit)
+    await writer.close()
+    assert writer.written == args.rows, writer.failed
+
+
+async def run(args: argparse.Namespace) -> None:
+    await create_database()
+    engine = create_engine()
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(GebItem.__table__.create)  # type: ignore
+        cases = {
+            "single inserts": lambda: single_inserts(engine, args),
+            "bulk insert": lambda: bulk_writes(engine, args, BulkWriteMethod.INSERT),
+            "bulk copy": lambda: bulk_writes(engine, args, BulkWriteMethod.COPY),
+        }
+        print(f"{'writes':<16} {'rows/s':>10}")  # noqa: WPS421
+        for name, case in cases.items():
+            async with engine.begin() as conn:  # noqa: WPS440
+                await conn.execute(text("TRUNCATE geb_item"))
+            started = time.perf_counter()
+            await case()
+            elapsed = time.perf_counter() - started
+            print(f"{name:<16} {args.rows / elapsed:>10.0f}")  # noqa: WPS421
+    finally:
+        await engine.dispose()
+        await drop_database()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rows", type=int, default=20000)
+    arg_parser.add_argument("--concurrency", type=int, default=20)
+    args = arg_parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Database round trips per request for each session dependency.
+
+Runs requests that don't touch the database, read one row
+or insert one row through the old always-commit dependency,
+``get_db_session`` and ``get_db_readonly_session``.
+Connections go through a local TCP proxy that counts
+how many times the client sends to the server,
+which is one per round trip.
+
+Needs Postgres from ``BACKEND_DB_*`` settings, it creates
+and drops a ``benchmark_round_trips`` table there.
+Pool pre-ping adds a round trip per request, see ``BACKEND_DB_POOL_PRE_PING``.
+Run it from ``Backend/Python``::
+
+    python -m benchmarks.db_round_trips --requests 500
+"""
+import argparse
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Tuple
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+
+from sqlalchemy import Column, Integer, MetaData, Table, insert, select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker  # noqa: E402
+
+from gebwai.db.dependencies import get_db_readonly_session, get_db_session  # noqa: E402
+from gebwai.db.engine import create_engine  # noqa: E402
+from gebwai.db.session import ReadOnlySession, WriteTrackingSession  # noqa: E402
+from gebwai.settings import settings  # noqa: E402
+
+metadata = MetaData()
+table = Table(
+    "benchmark_round_trips",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("value", Integer),
+)
+
+
+class CountingProxy:
+    """TCP proxy counting writes from clients."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.sends = 0
+
+    async def handle(
+        self,
+        client_reader: asyncio.StreamReader,
+        client_writer: asyncio.StreamWriter,
+    ) -> None:
+        server_reader, server_writer = await asyncio.open_connection(
+            self.host,
+            self.port,
+        )
+        await asyncio.gather(
+            self.pipe(client_reader, server_writer, count=True),
+            self.pipe(server_reader, client_writer, count=False),
+        )
+
+    async def pipe(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        count: bool,
+    ) -> None:
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                if count:
+                    self.sends += 1
+                writer.write(chunk)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def always_commit_session(
+    request: Any,
+) -> AsyncGenerator[AsyncSession, None]:
+    """Session dependency before sessions tracked writes."""
+    session: AsyncSession = request.app.state.db_session_factory()
+
+    try:  # noqa: WPS501
+        yield session
+    finally:
+        await session.commit()
+        await session.close()
+
+
+async def run_request(
+    dependency: Callable[[Any], AsyncGenerator[AsyncSession, None]],
+    request: Any,
+    work: Callable[[AsyncSession], Awaitable[Any]],
+) -> None:
+    generator = dependency(request)
+    session = await generator.__anext__()
+    await work(session)
+    try:
+        await generator.__anext__()
+    except StopAsyncIteration:
+        pass  # noqa: WPS420
+
+
+async def nothing(session: AsyncSession) -> None:
+    """Request that doesn't use the database."""
+
+
+async def read(session: AsyncSession) -> None:
+    await session.execute(select(table.c.value).where(table.c.id == 1))
+
+
+async def write(session: AsyncSession) -> None:
+    await session.execute(insert(table).values(value=1))
+
+
+async def run(args: argparse.Namespace) -> None:
+    proxy = CountingProxy(settings.db_host, settings.db_port)
+    server = await asyncio.start_server(proxy.handle, "127.0.0.1", 0)
+    settings.db_host = "127.0.0.1"
+    settings.db_port = server.sockets[0].getsockname()[1]
+
+    engine = create_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+        await conn.execute(insert(table).values(id=1, value=1))
+    tracking = async_sessionmaker(
+        engine,
+        expire_on_commit=False,
+        sync_session_class=WriteTrackingSession,
+    )
+    request = SimpleNamespace(
+        app=SimpleNamespace(
+            state=SimpleNamespace(
+                db_session_factory=tracking,
+                db_readonly_session_factory=async_sessionmaker(
+                    engine.execution_options(isolation_level="AUTOCOMMIT"),
+                    expire_on_commit=False,
+                    sync_session_class=ReadOnlySession,
+                ),
+            ),
+        ),
+    )
+    cases: Dict[str, Tuple[Any, Callable[[AsyncSession], Awaitable[Any]]]] = {
+        "no db, always commit": (always_commit_session, nothing),
+        "no db, lazy": (get_db_session, nothing),
+        "read, always commit": (always_commit_session, read),
+        "read, lazy": (get_db_session, read),
+        "read, read-only": (get_db_readonly_session, read),
+        "write, always commit": (always_commit_session, write),
+        "write, lazy": (get_db_session, write),
+    }
+
+    try:
+        print(f"{'request':<22} {'trips':>6} {'mean':>9}")  # noqa: WPS421
+        for name, (dependency, work) in cases.items():
+            for _ in range(10):
+                await run_request(dependency, request, work)
+            proxy.sends = 0
+            started = time.perf_counter()
+            for _ in range(args.requests):  # noqa: WPS440
+                await run_request(dependency, request, work)
+            elapsed = time.perf_counter() - started
+            print(  # noqa: WPS421
+                f"{name:<22} {proxy.sends / args.requests:>6.2f} "
+                f"{elapsed / args.requests * 1000:>7.3f}ms",
+            )
+    finally:
+        async with engine.begin() as conn:  # noqa: WPS440
+            await conn.run_sync(metadata.drop_all)
+        await engine.dispose()
+        server.close()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--requests", type=int, default=500)
+    args = arg_parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
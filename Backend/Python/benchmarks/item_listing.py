@@ -0,0 +1,174 @@
+"""
+Item listing latency by page depth: offset vs keyset pagination.
+
+Seeds a user collecting ``--sources`` groups with ``--items`` items
+in total, then times pages of ``--limit`` items at increasing depths,
+once with ``LIMIT/OFFSET`` as ``DummyDAO`` pages, once with the cursor
+of the previous page as the item listing API does. The plan of a deep
+keyset page is printed to show index-only scans of the covering index.
+
+Needs Postgres from ``BACKEND_DB_*`` settings. It creates and drops
+its own database, ``gebwai_benchmark`` unless ``BACKEND_DB_BASE`` is set.
+Run it from ``Backend/Python``::
+
+    python -m benchmarks.item_listing --items 200000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Any, List
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+os.environ.setdefault("BACKEND_DB_BASE", "gebwai_benchmark")
+
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.dialects import postgresql  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from gebwai.db.dao.item_dao import ItemDAO, listing_statement  # noqa: E402
+from gebwai.db.meta import meta  # noqa: E402
+from gebwai.db.models import load_all_models  # noqa: E402
+from gebwai.db.models.item_model import GebItem  # noqa: E402
+from gebwai.db.models.user_model import SourceSettings, User  # noqa: E402
+from gebwai.db.utils import create_database, drop_database  # noqa: E402
+from gebwai.settings import settings  # noqa: E402
+
+USER = "U0"
+START = datetime(2024, 1, 1)
+CHUNK = 5000
+FILE_TYPES = ("image", "image", "chat", "link", "video", "file")
+
+
+async def seed(session: AsyncSession, args: argparse.Namespace) -> None:
+    await session.execute(User.__table__.insert(), [{"line_user_id": USER}])
+    await session.execute(
+        SourceSettings.__table__.insert(),
+        [
+            SourceSettings(
+                line_user_id=USER,
+                source_id=f"C{source}",
+                starting_source_name="group",
+            ).model_dump()
+            for source in range(args.sources)
+        ],
+    )
+    for start in range(0, args.items, CHUNK):
+        await session.execute(
+            GebItem.__table__.insert(),
+            [
+                {
+                    "message_id": str(index),
+                    "source_id": f"C{index % args.sources}",
+                    "line_user_id": f"U{index % 50}",
+                    "file_type": FILE_TYPES[index % len(FILE_TYPES)],
+                    "size": 1024,
+                    "collected_at": START + timedelta(seconds=index),
+                }
+                for index in range(start, min(start + CHUNK, args.items))
+            ],
+        )
+    await session.commit()
+
+
+def offset_statement(limit: int, offset: int) -> Any:
+    sources = select(SourceSettings.source_id).where(
+        SourceSettings.line_user_id == USER,
+        SourceSettings.enabled,
+    )
+    return (
+        select(GebItem)
+        .where(GebItem.source_id.in_(sources))
+        .order_by(GebItem.collected_at.desc(), GebItem.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+async def time_pages(
+    session: AsyncSession,
+    args: argparse.Namespace,
+    depth: int,
+) -> List[float]:
+    dao = ItemDAO(session)
+    offset_timings = []
+    keyset_timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        rows = (await session.execute(offset_statement(args.limit, depth))).all()
+        offset_timings.append(time.perf_counter() - started)
+        last = rows[0][0]
+        after = (last.collected_at, last.id + 1)
+        started = time.perf_counter()
+        page = [row async for row in dao.stream_items(USER, args.limit, after=after)]
+        keyset_timings.append(time.perf_counter() - started)
+        assert len(page) == args.limit
+        session.expunge_all()
+    return [statistics.median(offset_timings), statistics.median(keyset_timings)]
+
+
+async def run(args: argparse.Namespace) -> None:
+    load_all_models()
+    await create_database()
+    engine = create_async_engine(str(settings.db_url))
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(meta.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        started = time.perf_counter()
+        async with session_factory() as session:
+            await seed(session, args)
+        async with engine.connect() as conn:
+            autocommit = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await autocommit.execute(text("VACUUM ANALYZE"))
+        print(  # noqa: WPS421
+            f"seeded {args.items} items in {args.sources} sources "
+            f"in {time.perf_counter() - started:.1f}s",
+        )
+
+        print(f"{'depth':>8} {'offset p50':>11} {'keyset p50':>11}")  # noqa: WPS421
+        depth = 0
+        async with session_factory() as session:
+            while depth < args.items - args.limit:
+                offset_p50, keyset_p50 = await time_pages(session, args, depth)
+                print(  # noqa: WPS421
+                    f"{depth:>8} {offset_p50 * 1000:>9.2f}ms "
+                    f"{keyset_p50 * 1000:>9.2f}ms",
+                )
+                depth = depth * 4 if depth else args.limit
+
+            statement = listing_statement(
+                USER,
+                args.limit,
+                after=(START + timedelta(seconds=args.items // 10), 1),
+            )
+            compiled = statement.compile(
+                dialect=postgresql.dialect(),
+                compile_kwargs={"literal_binds": True},
+            )
+            plan = await session.execute(text(f"EXPLAIN ANALYZE {compiled}"))
+            print("\n".join(plan.scalars()))  # noqa: WPS421
+    finally:
+        await engine.dispose()
+        await drop_database()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--items", type=int, default=200000)
+    arg_parser.add_argument("--sources", type=int, default=20)
+    arg_parser.add_argument("--limit", type=int, default=50)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
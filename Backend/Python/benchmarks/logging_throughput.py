@@ -0,0 +1,133 @@
+"""
+Log records per second: synchronous sink vs queued sinks.
+
+Logs records through loguru with the app's formatter to a stream
+that writes instantly and to one that takes ``--slow-ms`` per write,
+like a busy container log driver, with:
+
+- the stream as a synchronous sink, as before,
+- loguru's ``enqueue=True``,
+- ``QueuedStream`` writing text or JSON lines in a background thread.
+
+Then logs uvicorn access records through the stdlib ``InterceptHandler``
+with and without the default rate limit. Reports records per second
+seen by the code that logs, and the time until everything is written.
+
+Run it from ``Backend/Python``::
+
+    python -m benchmarks.logging_throughput --records 20000
+"""
+import argparse
+import io
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Tuple
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+
+from loguru import logger  # noqa: E402
+
+from gebwai.logging import (  # noqa: E402
+    InterceptHandler,
+    QueuedStream,
+    SamplingFilter,
+    record_formatter,
+)
+from gebwai.settings import settings  # noqa: E402
+
+
+class SlowStream(io.StringIO):
+    """Stream taking a fixed time per write."""
+
+    def __init__(self, delay: float) -> None:
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return len(text)
+
+
+def run(
+    records: int,
+    sink: Any,
+    options: Dict[str, Any],
+    log: Callable[[int], None],
+) -> Tuple[float, float]:
+    handler_id = logger.add(
+        sink,
+        format=record_formatter,  # type: ignore
+        colorize=False,
+        **options,
+    )
+    started = time.perf_counter()
+    for index in range(records):
+        log(index)
+    logged = time.perf_counter() - started
+    # Removing the sink waits until queued records are written.
+    logger.remove(handler_id)
+    return records / logged, time.perf_counter() - started
+
+
+def log_event(index: int) -> None:
+    logger.info("Handled event {} of source {}", index, "C1")
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--records", type=int, default=20000)
+    arg_parser.add_argument("--slow-ms", type=float, default=0.1)
+    args = arg_parser.parse_args()
+
+    logger.remove()
+    logger.configure(extra={"trace_id": 0, "span_id": 0})
+    streams = {
+        "instant": lambda: open(os.devnull, "w"),  # noqa: WPS515
+        "slow": lambda: SlowStream(args.slow_ms / 1000),
+    }
+    sinks: Dict[str, Callable[[Any], Tuple[Any, Dict[str, Any]]]] = {
+        "sync": lambda stream: (stream, {}),
+        "enqueue=True": lambda stream: (stream, {"enqueue": True}),
+        "queued": lambda stream: (QueuedStream(stream), {}),
+        "queued json": lambda stream: (QueuedStream(stream, json=True), {}),
+    }
+    for stream_name, make_stream in streams.items():
+        for sink_name, make_sink in sinks.items():
+            settings.log_json = sink_name == "queued json"
+            sink, options = make_sink(make_stream())
+            per_second, elapsed = run(args.records, sink, options, log_event)
+            print(  # noqa: WPS421
+                f"{stream_name:>7} stream, {sink_name:>12}: "
+                f"{per_second:>10,.0f} records/s, all written in {elapsed:6.2f}s",
+            )
+    settings.log_json = False
+
+    access_logger = logging.getLogger("uvicorn.access")
+    access_logger.handlers = [InterceptHandler()]
+    access_logger.propagate = False
+    access_logger.setLevel(logging.INFO)
+
+    def log_access(index: int) -> None:  # noqa: WPS430
+        access_logger.info('%s - "GET /api/line/callback HTTP/1.1" %d', "10.0.0.1", 200)
+
+    for filter_name, max_per_second in (("unlimited", None), ("100/s", 100.0)):
+        for log_filter in access_logger.filters:
+            access_logger.removeFilter(log_filter)
+        if max_per_second is not None:
+            access_logger.addFilter(SamplingFilter(max_per_second=max_per_second))
+        per_second, elapsed = run(
+            args.records,
+            QueuedStream(open(os.devnull, "w")),  # noqa: WPS515
+            {},
+            log_access,
+        )
+        print(  # noqa: WPS421
+            f"uvicorn.access {filter_name:>10}: "
+            f"{per_second:>10,.0f} records/s, all written in {elapsed:6.2f}s",
+        )
+
+
+if __name__ == "__main__":
+    main()
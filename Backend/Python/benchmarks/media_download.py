@@ -0,0 +1,142 @@
+"""
+Peak memory of media downloads: buffered vs streamed.
+
+Serves content of 1 to 200 MiB from a local fixture server shaped like
+LINE's content endpoint and downloads it ``--jobs`` times at once
+into a temporary ``LocalStorage``, first reading each body whole
+as the line-bot-sdk blob API does, then with ``MediaDownloader``.
+Every case runs in a fresh process, which prints how much its peak
+RSS grew per job and the throughput.
+
+Run it from ``Backend/Python`` on Linux::
+
+    python -m benchmarks.media_download --jobs 4
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+
+from aiohttp import web  # noqa: E402
+
+from gebwai.services.media.downloader import MediaDownloader  # noqa: E402
+from gebwai.services.media.storage import LocalStorage  # noqa: E402
+
+MIB = 1024 * 1024
+SIZES_MIB = (1, 10, 50, 200)
+BLOCK = os.urandom(MIB)
+
+
+async def serve_content(request: web.Request) -> web.StreamResponse:
+    size = int(request.match_info["message_id"])
+    response = web.StreamResponse(headers={"Content-Type": "video/mp4"})
+    response.content_length = size
+    await response.prepare(request)
+    for offset in range(0, size, MIB):
+        await response.write(BLOCK[: size - offset])
+    await response.write_eof()
+    return response
+
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def buffered(downloader: MediaDownloader, message_id: str, key: str) -> None:
+    async with downloader._get_session().get(  # noqa: WPS437
+        f"{downloader.data_host}/v2/bot/message/{message_id}/content",
+    ) as response:
+        body = await response.read()
+    hashlib.sha256(body).hexdigest()
+
+    async def chunks():  # type: ignore
+        yield body
+
+    await downloader.storage.put(key, chunks())
+
+
+async def run_job(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as root:
+        downloader = MediaDownloader(
+            f"http://127.0.0.1:{args.port}",
+            "benchmark",
+            chunk_size=64 * 1024,
+            max_concurrency=args.jobs,
+            timeout=600,
+            storage=LocalStorage(Path(root)),
+        )
+        if args.mode == "streamed":
+            job = downloader.download
+        else:
+            job = functools.partial(buffered, downloader)
+        baseline = peak_rss_mib()
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(job(str(args.size), f"C1/{index}") for index in range(args.jobs)),
+        )
+        elapsed = time.perf_counter() - started
+        await downloader.close()
+    growth = (peak_rss_mib() - baseline) / args.jobs
+    throughput = args.size * args.jobs / MIB / elapsed
+    print(f"{growth:.1f} {throughput:.0f}")  # noqa: WPS421
+
+
+async def run(args: argparse.Namespace) -> None:
+    app = web.Application()
+    app.router.add_get("/v2/bot/message/{message_id}/content", serve_content)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore # noqa: WPS437
+    print(  # noqa: WPS421
+        f"{'size MiB':>8} {'mode':>9} {'peak RSS MiB/job':>17} {'MiB/s':>7}",
+    )
+    try:
+        for size in SIZES_MIB:
+            for mode in ("buffered", "streamed"):
+                process = await asyncio.create_subprocess_exec(
+                    sys.executable,
+                    "-m",
+                    "benchmarks.media_download",
+                    "--job",
+                    mode,
+                    "--size",
+                    str(size * MIB),
+                    "--jobs",
+                    str(args.jobs),
+                    "--port",
+                    str(port),
+                    stdout=asyncio.subprocess.PIPE,
+                )
+                stdout, _ = await process.communicate()
+                growth, throughput = stdout.decode().split()
+                print(  # noqa: WPS421
+                    f"{size:>8} {mode:>9} {float(growth):>17.1f} {throughput:>7}",
+                )
+    finally:
+        await runner.cleanup()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--jobs", type=int, default=4)
+    arg_parser.add_argument("--job", dest="mode", help=argparse.SUPPRESS)
+    arg_parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    arg_parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    asyncio.run(run_job(args) if args.mode else run(args))
+
+
+if __name__ == "__main__":
+    main()
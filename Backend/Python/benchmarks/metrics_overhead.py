@@ -0,0 +1,139 @@
+"""
+Metrics overhead: webhook latency with and without recording metrics.
+
+Sends signed webhook bodies to ``/api/line/callback`` through ASGI,
+with the LINE reply call replaced by a fixed delay, alternating rounds
+with histograms recording and with ``Histogram.observe`` replaced by
+a no-op. Reports mean latency of both and the overhead, which should
+stay under 2%, and the cost of a single observation. Collected messages
+aren't written, so it doesn't need Postgres.
+
+Run it from ``Backend/Python``::
+
+    python -m benchmarks.metrics_overhead --rounds 10 --requests 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, List
+
+from benchmarks.webhook_latency import SlowMessagingApi, make_body, sign
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from gebwai.services.line import handlers
+from gebwai.services.line.messaging import LineMessenger
+from gebwai.services.metrics import Histogram, event_seconds, metrics, render
+from gebwai.settings import settings
+from gebwai.web.api.LINE import router
+
+
+async def run_round(
+    client: AsyncClient,
+    args: argparse.Namespace,
+    prefix: str,
+) -> List[float]:
+    # Event ids must be unique, or deduplication drops the events.
+    bodies = [
+        make_body(args.events, args.sources, f"{prefix}-{request}")
+        for request in range(args.requests)
+    ]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+
+    async def send(body: str) -> None:
+        headers = {"X-Line-Signature": sign(body)}
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/line/callback",
+                content=body,
+                headers=headers,
+            )
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    await asyncio.gather(*(send(body) for body in bodies))
+    return latencies
+
+
+async def skip_recording(event: Any) -> None:
+    """Stand-in for record_message."""
+
+
+def time_observe(calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        event_seconds.observe(0.003, "message")
+    return (time.perf_counter() - started) / calls
+
+
+async def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rounds", type=int, default=10)
+    arg_parser.add_argument("--requests", type=int, default=100)
+    arg_parser.add_argument("--events", type=int, default=10)
+    arg_parser.add_argument("--sources", type=int, default=3)
+    arg_parser.add_argument("--concurrency", type=int, default=20)
+    arg_parser.add_argument("--reply-ms", type=float, default=5)
+    args = arg_parser.parse_args()
+
+    messaging_api = SlowMessagingApi(args.reply_ms / 1000)
+
+    async def api_factory() -> Any:
+        return messaging_api
+
+    handlers.messenger = LineMessenger(
+        api_factory,
+        rate_limits=settings.line_api_rate_limits,
+        reply_token_ttl=float("inf"),
+        flush_delay=settings.line_messages_flush_delay,
+        request_timeout=settings.line_api_timeout,
+    )
+    handlers.record_message = skip_recording
+    settings.line_webhook_ack_first = False
+    app = FastAPI()
+    app.include_router(router, prefix="/api/line")
+    observe = Histogram.observe
+    latencies = {"on": [], "off": []}  # type: ignore[var-annotated]
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        # Warm up connections, caches and the histograms' series.
+        await run_round(client, args, "warmup")
+        for index in range(args.rounds):
+            # Alternate which goes first, so drift hits both alike.
+            modes = ("on", "off") if index % 2 else ("off", "on")
+            for mode in modes:
+                if mode == "off":
+                    Histogram.observe = lambda *args: None  # type: ignore
+                latencies[mode].extend(
+                    await run_round(client, args, f"{index}-{mode}"),
+                )
+                Histogram.observe = observe  # type: ignore
+
+    on = statistics.mean(latencies["on"])
+    off = statistics.mean(latencies["off"])
+    for mode, mean in (("off", off), ("on", on)):
+        print(  # noqa: WPS421
+            f"metrics {mode:>3}: mean={mean * 1000:8.3f}ms "
+            f"p50={statistics.median(latencies[mode]) * 1000:8.3f}ms",
+        )
+    print(f"overhead: {(on - off) / off * 100:+.2f}%")  # noqa: WPS421
+    # Observations made with metrics on, their cost in CPU time per request.
+    observed = sum(
+        sum(counts[:-1])
+        for histogram in metrics.histograms
+        for counts in histogram.series.values()
+    )
+    per_request = observed / (len(latencies["on"]) + args.requests)
+    observe_seconds = time_observe(1_000_000)
+    print(  # noqa: WPS421
+        f"observe: {observe_seconds * 1e9:.0f}ns per call, "
+        f"{per_request:.1f} calls per request, "
+        f"{per_request * observe_seconds / off * 100:.3f}% of mean latency, "
+        f"render: {len(render(metrics.snapshot()))} bytes",
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+Slip verification throughput: inline vs a process pool, per batch size.
+
+Builds a corpus of synthetic slip images, phone screenshot sized JPEGs
+with text-like noise and a slip QR code, plus photos without one,
+then verifies all of them inline in the event loop and with
+``SlipVerifier`` for each batch size, with the cache off.
+Prints slips per second and per core of the pool.
+
+Needs the ``slip`` extra and ``qrcode``. Run it from ``Backend/Python``::
+
+    python -m benchmarks.slip_verify --images 200
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import time
+from typing import List
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+
+import qrcode  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from gebwai.services.slips.decoder import decode_slip  # noqa: E402
+from gebwai.services.slips.payload import build_slip_payload  # noqa: E402
+from gebwai.services.slips.verifier import SlipVerifier  # noqa: E402
+
+SIZE = (1080, 1920)
+
+
+def make_image(index: int, is_slip: bool) -> bytes:
+    rng = random.Random(index)
+    image = Image.new("RGB", SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(40):
+        top = 80 + line * 30
+        draw.rectangle(
+            (60, top, 60 + rng.randint(200, 900), top + 14),
+            fill=(rng.randint(0, 120),) * 3,
+        )
+    if is_slip:
+        code = qrcode.make(
+            build_slip_payload("014", f"{index:012d}APP{rng.randint(0, 99999):05d}"),
+            box_size=6,
+        )
+        image.paste(code.get_image().convert("RGB"), (700, 1450))
+    else:
+        noise = Image.effect_noise((400, 400), 60).convert("RGB")
+        image.paste(noise, (600, 1400))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+async def verify_all(verifier: SlipVerifier, images: List[bytes]) -> float:
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verifier.verify(image) for image in images))
+    elapsed = time.perf_counter() - started
+    assert sum(result.is_slip for result in results) == (len(images) + 1) // 2
+    return elapsed
+
+
+async def run(args: argparse.Namespace) -> None:
+    images = [make_image(index, index % 2 == 0) for index in range(args.images)]
+    workers = args.workers or os.cpu_count() or 1
+    print(  # noqa: WPS421
+        f"{len(images)} images of {sum(map(len, images)) // len(images) // 1024}"
+        f" KiB, {workers} worker processes",
+    )
+    print(f"{'verification':<22} {'slips/s':>8} {'per core':>9}")  # noqa: WPS421
+
+    started = time.perf_counter()
+    for image in images:
+        decode_slip(image)
+    rate = len(images) / (time.perf_counter() - started)
+    print(f"{'inline':<22} {rate:>8.1f} {rate:>9.1f}")  # noqa: WPS421
+
+    for batch_size in (1, 4, 16):
+        verifier = SlipVerifier(
+            batch_size=batch_size,
+            batch_delay=0.005,
+            cache_size=1,
+            cache_ttl=0,
+            max_workers=workers,
+        )
+        # Starts the pool outside of the measurement.
+        await verifier.verify(images[0])
+        elapsed = await verify_all(verifier, images)
+        verifier.shutdown()
+        rate = len(images) / elapsed
+        name = f"pool, batches of {batch_size}"
+        print(f"{name:<22} {rate:>8.1f} {rate / workers:>9.1f}")  # noqa: WPS421
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--images", type=int, default=200)
+    arg_parser.add_argument("--workers", type=int, default=None)
+    args = arg_parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
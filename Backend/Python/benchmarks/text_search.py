@@ -0,0 +1,198 @@
+"""
+Text search latency by corpus size: ILIKE scans vs the search index.
+
+Grows a corpus of generated Thai and English chat messages of a user
+collecting ``--sources`` groups through each of ``--sizes``, writing
+them as the text writer does, with the index in place. At each size
+it times ``--repeat`` runs of common and rare queries, once with
+``ILIKE '%word%'`` and once with the ranked full-text query of the
+search API, and prints the median of each. Tokenizing speed is printed
+first, since lexemes are made at ingest.
+
+Needs Postgres from ``BACKEND_DB_*`` settings. It creates and drops
+its own database, ``gebwai_benchmark`` unless ``BACKEND_DB_BASE`` is set.
+Run it from ``Backend/Python``, sizes up to 10M take a while to load::
+
+    python -m benchmarks.text_search --sizes 10000,100000,1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+os.environ.setdefault("BACKEND_DB_BASE", "gebwai_benchmark")
+
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from gebwai.db.bulk import BulkWriter, Record  # noqa: E402
+from gebwai.db.dao.text_dao import TextDAO  # noqa: E402
+from gebwai.db.meta import meta  # noqa: E402
+from gebwai.db.models import load_all_models  # noqa: E402
+from gebwai.db.models.text_model import GebText  # noqa: E402
+from gebwai.db.models.user_model import GebSettings, SourceSettings, User  # noqa: E402
+from gebwai.db.utils import create_database, drop_database  # noqa: E402
+from gebwai.services.search.indexer import TEXT_COLUMNS  # noqa: E402
+from gebwai.services.search.tokenizer import to_tsquery, to_tsvector  # noqa: E402
+from gebwai.settings import BulkWriteMethod, settings  # noqa: E402
+
+USER = "U0"
+START = datetime(2024, 1, 1)
+CHUNK = 10000
+# Frequent words first, message words are picked with a skewed distribution.
+WORDS = (
+    "ครับ ค่ะ นะ โอนเงิน แล้ว ยัง ไม่ได้ พรุ่งนี้ ประชุม ส่งไฟล์ ใบเสร็จ "
+    "ok thanks meeting invoice ลูกค้า สินค้า ราคา ส่วนลด จัดส่ง พัสดุ "
+    "เลขบัญชี กรุงเทพ เชียงใหม่ report deadline ตรวจสอบ อนุมัติ ยกเลิก "
+    "สัญญา เอกสาร payroll ภาษี ใบกำกับ refund ผ่อนชำระ ดอกเบี้ย"
+).split()
+QUERIES = ("โอนเงิน", "ประชุม พรุ่งนี้", "invoice", "ใบกำกับ", "ผ่อนชำระ ดอกเบี้ย")
+
+
+def messages(rng: random.Random, start: int, stop: int) -> Iterator[str]:
+    for _ in range(start, stop):
+        length = rng.randint(2, 12)
+        words = rng.choices(
+            WORDS,
+            weights=[1 / (rank + 1) for rank in range(len(WORDS))],
+            k=length,
+        )
+        yield " ".join(words) if rng.random() < 0.5 else "".join(words)
+
+
+def records(
+    args: argparse.Namespace,
+    bodies: List[str],
+    start: int,
+) -> List[Record]:
+    return [
+        (
+            str(index),
+            f"C{index % args.sources}",
+            f"U{index % 50}",
+            "chat",
+            START + timedelta(seconds=index),
+            body,
+            to_tsvector(body),
+        )
+        for index, body in enumerate(bodies, start)
+    ]
+
+
+async def time_queries(session: AsyncSession, args: argparse.Namespace) -> None:
+    sources = select(SourceSettings.source_id).where(
+        SourceSettings.line_user_id == USER,
+        SourceSettings.enabled,
+    )
+    dao = TextDAO(session)
+    for query in QUERIES:
+        scan_timings = []
+        search_timings = []
+        tsquery = to_tsquery(query)
+        assert tsquery is not None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            scan = select(GebText.message_id).where(GebText.source_id.in_(sources))
+            for word in query.split():
+                scan = scan.where(GebText.body.ilike(f"%{word}%"))
+            await session.execute(
+                scan.order_by(GebText.collected_at.desc()).limit(args.limit),
+            )
+            scan_timings.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            await dao.search(USER, tsquery, args.limit)
+            search_timings.append(time.perf_counter() - started)
+        print(  # noqa: WPS421
+            f"{query:<20} {statistics.median(scan_timings) * 1000:>9.2f}ms "
+            f"{statistics.median(search_timings) * 1000:>9.2f}ms",
+        )
+
+
+async def run(args: argparse.Namespace) -> None:  # noqa: WPS210
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    rng = random.Random(0)
+    sample = list(messages(rng, 0, CHUNK))
+    started = time.perf_counter()
+    for body in sample:
+        to_tsvector(body)
+    print(  # noqa: WPS421
+        f"tokenized {CHUNK / (time.perf_counter() - started):.0f} messages/s",
+    )
+
+    load_all_models()
+    await create_database()
+    engine = create_async_engine(str(settings.db_url))
+    writer = BulkWriter(
+        GebText.__table__,  # type: ignore
+        TEXT_COLUMNS,
+        batch_size=CHUNK,
+        flush_interval=0,
+        max_pending=CHUNK,
+        method=BulkWriteMethod.COPY,
+        engine=engine,
+    )
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(meta.create_all)
+            await conn.execute(User.__table__.insert(), [{"line_user_id": USER}])
+            await conn.execute(
+                SourceSettings.__table__.insert(),
+                [
+                    SourceSettings(
+                        line_user_id=USER,
+                        source_id=f"C{source}",
+                        starting_source_name="group",
+                        geb_settings=GebSettings(chat=True).model_dump(),
+                    ).model_dump()
+                    for source in range(args.sources)
+                ],
+            )
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        loaded = 0
+        for size in sizes:
+            started = time.perf_counter()
+            for start in range(loaded, size, CHUNK):
+                stop = min(start + CHUNK, size)
+                await writer.write(
+                    records(args, list(messages(rng, start, stop)), start),
+                )
+            print(  # noqa: WPS421
+                f"\n{size} messages, wrote {size - loaded} at "
+                f"{(size - loaded) / (time.perf_counter() - started):.0f} rows/s",
+            )
+            loaded = size
+            async with engine.connect() as conn:  # noqa: WPS440
+                autocommit = await conn.execution_options(
+                    isolation_level="AUTOCOMMIT",
+                )
+                await autocommit.execute(text("VACUUM ANALYZE geb_text"))
+            print(f"{'query':<20} {'ILIKE p50':>11} {'index p50':>11}")  # noqa: WPS421
+            async with session_factory() as session:
+                await time_queries(session, args)
+    finally:
+        await engine.dispose()
+        await drop_database()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--sizes", default="10000,100000,1000000")
+    arg_parser.add_argument("--sources", type=int, default=20)
+    arg_parser.add_argument("--limit", type=int, default=20)
+    arg_parser.add_argument("--repeat", type=int, default=10)
+    args = arg_parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
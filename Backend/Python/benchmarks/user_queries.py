@@ -0,0 +1,249 @@
+"""
+Event path queries on the user schema, against a local Postgres.
+
+Seeds ``--users`` users with ``--sources`` source settings each,
+spread over ``--groups`` groups, and a year of monthly stats,
+then times the queries a webhook event runs one by one:
+the user, the settings of its source, users collecting a group,
+this month's stats, and the upserts run when a user or source is new.
+The plan of each read is printed to show which index it uses.
+
+Needs Postgres from ``BACKEND_DB_*`` settings. It creates and drops
+its own database, ``gebwai_benchmark`` unless ``BACKEND_DB_BASE`` is set.
+Run it from ``Backend/Python``::
+
+    python -m benchmarks.user_queries --users 10000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+os.environ.setdefault("BACKEND_DB_BASE", "gebwai_benchmark")
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.dialects import postgresql  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from gebwai.db.dao.user_dao import UserDAO  # noqa: E402
+from gebwai.db.meta import meta  # noqa: E402
+from gebwai.db.models import load_all_models  # noqa: E402
+from gebwai.db.models.user_model import (  # noqa: E402
+    MonthlyStats,
+    SourceSettings,
+    User,
+    UserSettings,
+)
+from gebwai.db.utils import create_database, drop_database  # noqa: E402
+from gebwai.settings import settings  # noqa: E402
+
+THIS_MONTH = date.today().replace(day=1)
+CHUNK = 5000
+
+
+def user_id(index: int) -> str:
+    return f"U{index:032x}"
+
+
+def group_id(index: int) -> str:
+    return f"C{index:032x}"
+
+
+async def insert_chunked(
+    session: AsyncSession,
+    table: Any,
+    rows: List[Dict[str, Any]],
+) -> None:
+    for start in range(0, len(rows), CHUNK):
+        await session.execute(table.insert(), rows[start : start + CHUNK])
+
+
+async def seed(
+    session_factory: "async_sessionmaker[AsyncSession]",
+    args: argparse.Namespace,
+) -> None:
+    users = [
+        {"line_user_id": user_id(index), "is_blocked": False}
+        for index in range(args.users)
+    ]
+    user_settings = [
+        UserSettings(line_user_id=user_id(index)).model_dump()
+        for index in range(args.users)
+    ]
+    sources = []
+    stats = []
+    for index in range(args.users):
+        for group in random.sample(range(args.groups), args.sources):
+            sources.append(
+                SourceSettings(
+                    line_user_id=user_id(index),
+                    source_id=group_id(group),
+                    starting_source_name="group",
+                    enabled=group % 10 != 0,
+                ).model_dump(),
+            )
+        for month in range(1, 13):
+            stats.append(
+                MonthlyStats(
+                    line_user_id=user_id(index),
+                    month=THIS_MONTH.replace(month=month),
+                    n_geb_all=month,
+                ).model_dump(),
+            )
+
+    async with session_factory() as session:
+        await insert_chunked(session, User.__table__, users)
+        await insert_chunked(session, UserSettings.__table__, user_settings)
+        await insert_chunked(session, SourceSettings.__table__, sources)
+        await insert_chunked(session, MonthlyStats.__table__, stats)
+        await session.commit()
+
+
+async def explain(session: AsyncSession, statement: Any) -> str:
+    compiled = statement.compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={"literal_binds": True},
+    )
+    plan = await session.execute(text(f"EXPLAIN {compiled}"))
+    return plan.scalars().first()
+
+
+async def time_query(
+    session_factory: "async_sessionmaker[AsyncSession]",
+    query: Callable[[UserDAO, int], Awaitable[Any]],
+    repeat: int,
+    key_range: int,
+) -> List[float]:
+    timings = []
+    async with session_factory() as session:
+        dao = UserDAO(session)
+        for _ in range(repeat):
+            key = random.randrange(key_range)
+            started = time.perf_counter()
+            await query(dao, key)
+            timings.append(time.perf_counter() - started)
+            # Measure database round trips, not the identity map.
+            session.expunge_all()
+        await session.rollback()
+    return timings
+
+
+async def run(args: argparse.Namespace) -> None:
+    load_all_models()
+    await create_database()
+    engine = create_async_engine(str(settings.db_url))
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(meta.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        started = time.perf_counter()
+        await seed(session_factory, args)
+        async with engine.connect() as conn:
+            autocommit = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await autocommit.execute(text("VACUUM ANALYZE"))
+        print(  # noqa: WPS421
+            f"seeded {args.users} users, {args.users * args.sources} sources "
+            f"in {time.perf_counter() - started:.1f}s",
+        )
+
+        queries: Dict[str, Callable[[UserDAO, int], Awaitable[Any]]] = {
+            "user": lambda dao, key: dao.get_user(user_id(key)),
+            "source settings": lambda dao, key: dao.get_source_settings(
+                user_id(key),
+                group_id(key % args.groups),
+            ),
+            "collecting users": lambda dao, key: dao.get_collecting_users(
+                group_id(key % args.groups),
+            ),
+            "monthly stats": lambda dao, key: dao.get_monthly_stats(
+                user_id(key),
+                THIS_MONTH,
+            ),
+            "upsert user": lambda dao, key: dao.upsert_user(user_id(key)),
+            "insert source": lambda dao, key: dao.insert_source_settings(
+                SourceSettings(
+                    line_user_id=user_id(key),
+                    source_id=group_id(key % args.groups),
+                    starting_source_name="group",
+                ),
+            ),
+        }
+        async with session_factory() as session:
+            plans = {
+                "user": await explain(
+                    session,
+                    User.__table__.select().where(
+                        User.line_user_id == user_id(0),
+                    ),
+                ),
+                "source settings": await explain(
+                    session,
+                    SourceSettings.__table__.select().where(
+                        SourceSettings.line_user_id == user_id(0),
+                        SourceSettings.source_id == group_id(0),
+                    ),
+                ),
+                "collecting users": await explain(
+                    session,
+                    SourceSettings.__table__.select()
+                    .with_only_columns(SourceSettings.line_user_id)
+                    .where(
+                        SourceSettings.source_id == group_id(1),
+                        SourceSettings.enabled,
+                    ),
+                ),
+                "monthly stats": await explain(
+                    session,
+                    MonthlyStats.__table__.select().where(
+                        MonthlyStats.line_user_id == user_id(0),
+                        MonthlyStats.month == THIS_MONTH,
+                    ),
+                ),
+            }
+
+        print(  # noqa: WPS421
+            f"{'query':<17} {'mean':>9} {'p50':>9} {'p99':>9}  plan",
+        )
+        for name, query in queries.items():
+            timings = await time_query(
+                session_factory,
+                query,
+                args.repeat,
+                args.users,
+            )
+            timings.sort()
+            print(  # noqa: WPS421
+                f"{name:<17} "
+                f"{statistics.mean(timings) * 1000:>7.3f}ms "
+                f"{timings[len(timings) // 2] * 1000:>7.3f}ms "
+                f"{timings[int(len(timings) * 0.99)] * 1000:>7.3f}ms  "
+                f"{plans.get(name, '')}",
+            )
+    finally:
+        await engine.dispose()
+        await drop_database()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--users", type=int, default=10000)
+    arg_parser.add_argument("--sources", type=int, default=5)
+    arg_parser.add_argument("--groups", type=int, default=2000)
+    arg_parser.add_argument("--repeat", type=int, default=2000)
+    args = arg_parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
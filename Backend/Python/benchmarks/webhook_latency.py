@@ -0,0 +1,163 @@
+"""
+Webhook latency: inline handling vs ack-first.
+
+Sends signed webhook bodies to ``/api/line/callback`` through ASGI
+with the LINE reply call replaced by a fixed delay and reports
+latency percentiles for both modes.
+
+Run it from ``Backend/Python``::
+
+    python -m benchmarks.webhook_latency --requests 200 --events 10
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import statistics
+import time
+from typing import Any, Dict, List
+
+os.environ.setdefault("BACKEND_ENVIRONMENT", "pytest")
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+
+import ujson  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from httpx import AsyncClient  # noqa: E402
+
+from gebwai.services.line import handlers  # noqa: E402
+from gebwai.services.line.messaging import LineMessenger  # noqa: E402
+from gebwai.settings import settings  # noqa: E402
+from gebwai.tkq import broker  # noqa: E402
+from gebwai.web.api.LINE import router  # noqa: E402
+
+
+class SlowMessagingApi:
+    """Stand-in for AsyncMessagingApi with a fixed round trip."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.replies = 0
+
+    async def reply_message(self, request: Any, **kwargs: Any) -> None:
+        await asyncio.sleep(self.delay)
+        self.replies += 1
+
+    async def wait_for(self, replies: int) -> None:
+        while self.replies < replies:
+            await asyncio.sleep(self.delay)
+
+
+def make_body(n_events: int, n_sources: int, prefix: str) -> str:
+    events: List[Dict[str, Any]] = []
+    for index in range(n_events):
+        events.append(
+            {
+                "type": "message",
+                "mode": "active",
+                "timestamp": 1700000000000 + index,
+                "webhookEventId": f"{prefix}-{index}",
+                "deliveryContext": {"isRedelivery": False},
+                "replyToken": f"token-{index}",
+                "source": {
+                    "type": "group",
+                    "groupId": f"G{index % n_sources}",
+                    "userId": "U1",
+                },
+                "message": {
+                    "type": "text",
+                    "id": str(index),
+                    "quoteToken": "q",
+                    "text": f"message {index}",
+                },
+            },
+        )
+    return ujson.dumps({"destination": "U0", "events": events})
+
+
+def sign(body: str) -> str:
+    digest = hmac.new(
+        settings.LINE_CHANNEL_SECRET.encode(),
+        body.encode(),
+        hashlib.sha256,
+    ).digest()
+    return base64.b64encode(digest).decode()
+
+
+async def run_mode(args: argparse.Namespace, ack_first: bool) -> List[float]:
+    settings.line_webhook_ack_first = ack_first
+    app = FastAPI()
+    app.include_router(router, prefix="/api/line")
+    # Event ids must be unique, or deduplication drops the events.
+    bodies = [
+        make_body(args.events, args.sources, f"{ack_first}-{request}")
+        for request in range(args.requests)
+    ]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+
+    async def send(client: AsyncClient, body: str) -> None:
+        headers = {"X-Line-Signature": sign(body)}
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/line/callback",
+                content=body,
+                headers=headers,
+            )
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        await asyncio.gather(*(send(client, body) for body in bodies))
+    return latencies
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--requests", type=int, default=200)
+    arg_parser.add_argument("--events", type=int, default=10)
+    arg_parser.add_argument("--sources", type=int, default=3)
+    arg_parser.add_argument("--concurrency", type=int, default=20)
+    arg_parser.add_argument("--reply-ms", type=float, default=50)
+    args = arg_parser.parse_args()
+
+    messaging_api = SlowMessagingApi(args.reply_ms / 1000)
+
+    async def api_factory() -> Any:
+        return messaging_api
+
+    handlers.messenger = LineMessenger(
+        api_factory,
+        rate_limits=settings.line_api_rate_limits,
+        reply_token_ttl=float("inf"),
+        flush_delay=settings.line_messages_flush_delay,
+        request_timeout=settings.line_api_timeout,
+    )
+    await broker.startup()
+    for mode, ack_first in (("inline", False), ("ack-first", True)):
+        messaging_api.replies = 0
+        started = time.perf_counter()
+        latencies = await run_mode(args, ack_first)
+        # ack-first keeps replying after the last response.
+        await messaging_api.wait_for(args.requests * args.events)
+        elapsed = time.perf_counter() - started
+        print(  # noqa: WPS421
+            f"{mode:>10}: "
+            f"p50={statistics.median(latencies) * 1000:8.2f}ms "
+            f"p99={percentile(latencies, 0.99) * 1000:8.2f}ms "
+            f"max={max(latencies) * 1000:8.2f}ms "
+            f"all replies sent in {elapsed:6.2f}s",
+        )
+    await broker.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
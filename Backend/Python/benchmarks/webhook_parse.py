@@ -0,0 +1,151 @@
+"""
+Webhook body parsing: line-bot-sdk parser vs the fast path.
+
+Compares ``WebhookParser.parse`` on the decoded body with
+``verify_and_decode`` on raw bytes plus building models
+for handled events, for bodies of 1 to 500 events where
+a quarter of events are of types the bot doesn't handle.
+The last column is the longest event loop stall while
+``WebhookBodyParser`` verifies and decodes the body in a pool,
+models are built later, one by one, as the dispatcher takes them.
+
+Run it from ``Backend/Python``::
+
+    python -m benchmarks.webhook_parse
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+import timeit
+from typing import Any, Dict, List
+
+os.environ.setdefault("BACKEND_LINE_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("BACKEND_LINE_CHANNEL_SECRET", "benchmark")
+
+import ujson  # noqa: E402
+from linebot.v3 import WebhookParser  # noqa: E402
+
+from gebwai.services.line.handlers import HANDLED_EVENT_TYPES  # noqa: E402
+from gebwai.services.line.parser import (  # noqa: E402
+    WebhookBodyParser,
+    build_events,
+    verify_and_decode,
+)
+
+SECRET = "benchmark"
+
+
+def make_body(n_events: int) -> bytes:
+    events: List[Dict[str, Any]] = []
+    for index in range(n_events):
+        source = {"type": "group", "groupId": f"G{index % 7}", "userId": "U1"}
+        if index % 4 == 3:
+            events.append(
+                {
+                    "type": "memberJoined",
+                    "mode": "active",
+                    "timestamp": 1700000000000 + index,
+                    "webhookEventId": f"bench-{index}",
+                    "deliveryContext": {"isRedelivery": True},
+                    "replyToken": f"token-{index}",
+                    "source": source,
+                    "joined": {"members": [{"type": "user", "userId": "U2"}]},
+                },
+            )
+            continue
+        events.append(
+            {
+                "type": "message",
+                "mode": "active",
+                "timestamp": 1700000000000 + index,
+                "webhookEventId": f"bench-{index}",
+                "deliveryContext": {"isRedelivery": True},
+                "replyToken": f"token-{index}",
+                "source": source,
+                "message": {
+                    "type": "text",
+                    "id": str(index),
+                    "quoteToken": "q",
+                    "text": "สวัสดี ข้อความทดสอบ " * 10,
+                },
+            },
+        )
+    return ujson.dumps({"destination": "U0", "events": events}).encode()
+
+
+def sign(body: bytes) -> str:
+    digest = hmac.new(SECRET.encode(), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+async def max_loop_stall(body: bytes, signature: str, repeat: int) -> float:
+    body_parser = WebhookBodyParser(SECRET, HANDLED_EVENT_TYPES, offload_bytes=0)
+    stall = 0.0
+    running = True
+
+    async def tick() -> None:
+        nonlocal stall
+        last = time.perf_counter()
+        while running:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, now - last)
+            last = now
+
+    ticker = asyncio.create_task(tick())
+    for _ in range(repeat):
+        await body_parser.parse(body, signature)
+    running = False
+    await ticker
+    body_parser.shutdown()
+    return stall
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1, 10, 50, 100, 500]
+    )
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    sdk_parser = WebhookParser(SECRET)
+    print(
+        f"{'events':>6} {'bytes':>9} {'sdk':>10} {'fast':>10} {'speedup':>8}"
+    )  # noqa: WPS421
+    for n_events in args.sizes:
+        body = make_body(n_events)
+        signature = sign(body)
+
+        sdk_time = timeit.timeit(
+            lambda: sdk_parser.parse(body.decode(), signature),  # noqa: B023
+            number=args.repeat,
+        )
+        fast_time = timeit.timeit(
+            lambda: list(  # noqa: B023
+                build_events(
+                    verify_and_decode(
+                        SECRET.encode(),
+                        body,  # noqa: B023
+                        signature,  # noqa: B023
+                        HANDLED_EVENT_TYPES,
+                    ),
+                ),
+            ),
+            number=args.repeat,
+        )
+        print(  # noqa: WPS421
+            f"{n_events:>6} {len(body):>9} "
+            f"{sdk_time / args.repeat * 1000:>8.3f}ms "
+            f"{fast_time / args.repeat * 1000:>8.3f}ms "
+            f"{sdk_time / fast_time:>7.2f}x "
+            f"{asyncio.run(max_loop_stall(body, signature, 5)) * 1000:>8.3f}ms",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Taskiq brokers."""
@@ -0,0 +1,229 @@
+import functools
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from pydantic import BaseModel, computed_field
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col
+from taskiq import AsyncTaskiqDecoratedTask, TaskiqMessage, TaskiqMiddleware
+
+from gebwai.brokers.queues import DEDUP_KEY_LABEL
+from gebwai.db.models.queue_model import CachedTaskResult
+from gebwai.services.cache import LRUTTLCache
+
+TaskType = TypeVar("TaskType", bound=AsyncTaskiqDecoratedTask[Any, Any])
+
+
+class PostgresTaskResultStore:
+    """Cached task results shared by all workers through Postgres."""
+
+    def __init__(self, engine: AsyncEngine, purge_interval: float = 60) -> None:
+        self.engine = engine
+        self.purge_interval = purge_interval
+        self._last_purge: float = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Get a result that hasn't expired.
+
+        :param key: cache key of the task call.
+        :return: stored value or None.
+        """
+        async with self.engine.connect() as conn:
+            return await conn.scalar(
+                select(col(CachedTaskResult.value)).where(
+                    col(CachedTaskResult.key) == key,
+                    col(CachedTaskResult.expires_at) > func.localtimestamp(),
+                ),
+            )
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """
+        Store a result, purging expired ones now and then.
+
+        :param key: cache key of the task call.
+        :param value: JSON serializable value.
+        :param ttl: seconds the value is valid for.
+        """
+        expires_at = func.localtimestamp() + timedelta(seconds=ttl)
+        query = insert(CachedTaskResult).values(
+            key=key,
+            value=value,
+            expires_at=expires_at,
+        )
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                query.on_conflict_do_update(
+                    index_elements=[CachedTaskResult.key],
+                    set_={"value": value, "expires_at": expires_at},
+                ),
+            )
+            now = time.monotonic()
+            if now - self._last_purge > self.purge_interval:
+                self._last_purge = now
+                await conn.execute(
+                    delete(CachedTaskResult).where(
+                        col(CachedTaskResult.expires_at) <= func.localtimestamp(),
+                    ),
+                )
+
+
+class TaskCacheStats(BaseModel):
+    """Calls of a cached task."""
+
+    # Calls answered from the cache and calls that ran.
+    hits: int = 0
+    misses: int = 0
+    # Sends dropped because the same call was queued or running.
+    deduplicated: int = 0
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def hit_rate(self) -> float:
+        """
+        Share of calls answered from the cache.
+
+        :return: 0 to 1.
+        """
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0
+
+
+class TaskCache(TaskiqMiddleware):
+    """
+    Caches results of tasks that only depend on their arguments.
+
+    Tasks are declared cached with ``cached`` and a key function
+    taking the task's arguments. A call whose key has a result cached
+    returns it without running. Results are kept in an in-process LRU
+    cache and, if a shared store is set, in Postgres for all workers.
+
+    Sends of a cached task are labelled with their key, so the
+    Postgres broker drops them while the same call is queued or running.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        store: Optional[PostgresTaskResultStore] = None,
+    ) -> None:
+        super().__init__()
+        self.store = store
+        self.stats: Dict[str, TaskCacheStats] = {}
+        self._keys: Dict[str, Callable[..., str]] = {}
+        # Entries are set with the ttl of their task.
+        self._local: LRUTTLCache[str, Any] = LRUTTLCache(max_size, ttl=0)
+
+    def cached(
+        self,
+        key: Callable[..., str],
+        ttl: float,
+    ) -> Callable[[TaskType], TaskType]:
+        """
+        Cache results of a task.
+
+        Put it above ``@broker.task``::
+
+            @task_cache.cached(key=lambda url: url, ttl=60 * 60)
+            @broker.task(task_name="links:fetch")
+            async def fetch(url: str) -> str:
+
+        Results have to be JSON serializable to be shared.
+
+        :param key: function of the task's arguments naming the call.
+        :param ttl: seconds a result is served for.
+        :return: decorator of the task.
+        """
+
+        def decorator(task: TaskType) -> TaskType:
+            self._keys[task.task_name] = key
+            self.stats[task.task_name] = TaskCacheStats()
+            task.original_func = self._wrap(
+                task.task_name,
+                task.original_func,
+                key,
+                ttl,
+            )
+            return task
+
+        return decorator
+
+    def pre_send(self, message: TaskiqMessage) -> TaskiqMessage:
+        """
+        Label sends of cached tasks with their key.
+
+        :param message: task being sent.
+        :return: labelled task.
+        """
+        key = self._keys.get(message.task_name)
+        if key is not None and DEDUP_KEY_LABEL not in message.labels:
+            message.labels[DEDUP_KEY_LABEL] = self._cache_key(
+                message.task_name,
+                key(*message.args, **message.kwargs),
+            )
+        return message
+
+    def get_stats(self) -> Dict[str, TaskCacheStats]:
+        """
+        Get calls of cached tasks in this process.
+
+        :return: stats by task name.
+        """
+        deduplicated = getattr(self.broker, "deduplicated", {})
+        for task_name, stats in self.stats.items():
+            stats.deduplicated = deduplicated.get(task_name, 0)
+        return self.stats
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached value.
+
+        :param key: cache key of the task call.
+        :return: value or None.
+        """
+        cached = self._local.get(key)
+        if cached is None and self.store is not None:
+            cached = await self.store.get(key)
+        return cached
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """
+        Cache a value.
+
+        :param key: cache key of the task call.
+        :param value: value to cache.
+        :param ttl: seconds the value is valid for.
+        """
+        self._local.set(key, value, ttl)
+        if self.store is not None:
+            await self.store.set(key, value, ttl)
+
+    def _wrap(
+        self,
+        task_name: str,
+        task_func: Callable[..., Awaitable[Any]],
+        key: Callable[..., str],
+        ttl: float,
+    ) -> Callable[..., Awaitable[Any]]:
+        stats = self.stats[task_name]
+
+        @functools.wraps(task_func)
+        async def run_cached(*args: Any, **kwargs: Any) -> Any:  # noqa: WPS430
+            cache_key = self._cache_key(task_name, key(*args, **kwargs))
+            # Results are wrapped, so None results are cached too.
+            cached = await self.get(cache_key)
+            if cached is not None:
+                stats.hits += 1
+                return cached["result"]
+            stats.misses += 1
+            result = await task_func(*args, **kwargs)
+            await self.set(cache_key, {"result": result}, ttl)
+            return result
+
+        return run_cached
+
+    def _cache_key(self, task_name: str, key: str) -> str:
+        return f"{task_name}:{key}"
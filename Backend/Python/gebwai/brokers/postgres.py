@@ -0,0 +1,494 @@
+import asyncio
+import functools
+import inspect
+import uuid
+from collections import Counter
+from datetime import timedelta
+from operator import attrgetter
+from typing import Any, AsyncGenerator, Dict, List, NamedTuple, Optional
+
+from loguru import logger
+from sqlalchemy import delete, func, insert, literal, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlmodel import col
+from taskiq import AckableMessage, AsyncBroker, BrokerMessage, TaskiqMiddleware
+from taskiq.exceptions import NoResultError
+from taskiq.message import TaskiqMessage
+from taskiq.result import TaskiqResult
+
+from gebwai.brokers.queues import (
+    DEDUP_KEY_LABEL,
+    FAIR_BY_LABEL,
+    FAIR_KEY_LABEL,
+    QUEUE_LABEL,
+    WEIGHT_LABEL,
+    TaskQueue,
+    get_queue,
+)
+from gebwai.db.models.queue_model import DeadTask, QueuedTask
+
+# Channel workers listen on for new tasks.
+CHANNEL = "taskiq_queue"
+# Ready tasks locked per claimed task, the turns of fair keys are taken
+# among them.
+CLAIM_OVERSAMPLE = 4
+# Columns copied to the dead letter table.
+_DEAD_COLUMNS = (
+    "id",
+    "task_id",
+    "task_name",
+    "queue",
+    "message",
+    "attempts",
+    "created",
+)
+
+
+def backoff_delay(attempts: int, delay: float, max_delay: float) -> float:
+    """
+    Get seconds to wait before retrying a failed task.
+
+    :param attempts: attempts made so far, at least 1.
+    :param delay: wait after the first attempt.
+    :param max_delay: longest wait.
+    :return: exponential backoff.
+    """
+    return min(delay * 2 ** (attempts - 1), max_delay)
+
+
+class ClaimedTask(NamedTuple):
+    """Task a worker claimed."""
+
+    row_id: int
+    task_id: str
+    message: bytes
+    lock_token: str
+    queue: TaskQueue
+
+
+class PostgresBroker(AsyncBroker):  # noqa: WPS230
+    """
+    Taskiq broker keeping tasks in a Postgres table.
+
+    Tasks are inserted by ``kick`` and claimed by workers with
+    ``SELECT ... FOR UPDATE SKIP LOCKED``, so any number of workers
+    on any host share the queue, and tasks survive restarts.
+    Delivery is at least once: a claimed task is hidden for
+    ``visibility_timeout`` seconds, extended while its worker runs it,
+    and deleted when the task is done. Tasks of a worker that died
+    are claimed again once the timeout passes.
+
+    Failed tasks are retried with exponential backoff from
+    ``retry_delay`` up to ``retry_max_delay`` seconds, and moved to the
+    dead letter table after ``max_attempts`` attempts, or the task's
+    ``max_attempts`` label. Workers wait for ``NOTIFY`` when the queue
+    is empty and look for tasks every ``poll_interval`` seconds anyway.
+
+    Workers take tasks from queues in the order of ``TaskQueue``,
+    and hold at most ``queue_concurrency[queue]`` tasks of a queue at once.
+    Within a queue, tasks of each ``fair_key`` label take turns, so one
+    busy source doesn't hold up everyone else's tasks. Turns are taken
+    among the oldest ready tasks no other worker is claiming,
+    ``CLAIM_OVERSAMPLE`` times as many as the worker claims, so workers
+    claiming at once get different tasks. Tasks declared with
+    a ``fair_by`` label get the argument it names as their key.
+
+    A task with a ``dedup_key`` label isn't queued while another task
+    with the same key is queued or running, ``deduplicated`` counts
+    the dropped ones by task name.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        engine: AsyncEngine,
+        visibility_timeout: float,
+        max_attempts: int,
+        retry_delay: float,
+        retry_max_delay: float,
+        claim_batch_size: int,
+        poll_interval: float,
+        use_notify: bool = True,
+        queue_concurrency: Optional[Dict[str, int]] = None,
+    ) -> None:
+        super().__init__()
+        self.engine = engine
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self.claim_batch_size = claim_batch_size
+        self.poll_interval = poll_interval
+        self.use_notify = use_notify
+        self.queue_concurrency = {
+            get_queue(queue): limit
+            for queue, limit in (queue_concurrency or {}).items()
+        }
+        # Claimed tasks of this worker by task id.
+        self.in_flight: Dict[str, ClaimedTask] = {}
+        self.deduplicated: "Counter[str]" = Counter()
+        self._notified: Optional[asyncio.Event] = None
+        self._listener: Optional[AsyncConnection] = None
+        self._extender: "Optional[asyncio.Task[None]]" = None
+        self.add_middlewares(_FairKeyMiddleware(), _RetryMiddleware())
+
+    async def startup(self) -> None:
+        """Start listening for new tasks in worker processes."""
+        await super().startup()
+        if self.is_worker_process:
+            self._notified = asyncio.Event()
+            if self.use_notify:
+                await self._listen_for_notifications()
+            self._extender = asyncio.create_task(self._extend_forever())
+
+    async def shutdown(self) -> None:
+        """Stop listening and close connections."""
+        if self._extender is not None:
+            self._extender.cancel()
+            await asyncio.gather(self._extender, return_exceptions=True)
+            self._extender = None
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+        await super().shutdown()
+        await self.engine.dispose()
+
+    async def kick(self, message: BrokerMessage) -> None:
+        """
+        Queue a task.
+
+        :param message: serialized task.
+        """
+        dedup_key = message.labels.get(DEDUP_KEY_LABEL)
+        queued = (
+            pg_insert(QueuedTask)
+            .values(
+                task_id=message.task_id,
+                task_name=message.task_name,
+                queue=get_queue(message.labels.get(QUEUE_LABEL)).value,
+                fair_key=str(message.labels.get(FAIR_KEY_LABEL, "")),
+                weight=float(message.labels.get(WEIGHT_LABEL, 1)),
+                dedup_key=None if dedup_key is None else str(dedup_key),
+                message=message.message,
+            )
+            .on_conflict_do_nothing(
+                index_elements=[col(QueuedTask.dedup_key)],
+                index_where=text("dedup_key IS NOT NULL"),
+            )
+            .returning(col(QueuedTask.id))
+        )
+        async with self.engine.begin() as conn:
+            if await conn.scalar(queued) is None:
+                self.deduplicated[message.task_name] += 1
+                return
+            if self.use_notify:
+                await conn.execute(select(func.pg_notify(CHANNEL, "")))
+
+    async def listen(self) -> AsyncGenerator[AckableMessage, None]:
+        """
+        Claim tasks as the worker is ready for them.
+
+        :yield: tasks to run, acknowledged once they're done.
+        """
+        while True:  # noqa: WPS457
+            claimed = await self.claim(self.claim_batch_size)
+            if not claimed:
+                await self._wait_for_tasks()
+                continue
+            for task in claimed:
+                yield AckableMessage(
+                    data=task.message,
+                    ack=functools.partial(self.ack, task.task_id),
+                )
+
+    async def claim(self, limit: int) -> List[ClaimedTask]:
+        """
+        Claim ready tasks, dead lettering those out of attempts.
+
+        Claimed tasks count as in flight until they're acked.
+
+        :param limit: maximum number of tasks.
+        :return: claimed tasks, most urgent queue first.
+        """
+        running = Counter(task.queue for task in self.in_flight.values())
+        claimed: List[ClaimedTask] = []
+        for queue in TaskQueue:
+            room = self._room(queue, running[queue], limit - len(claimed))
+            if room > 0:
+                claimed.extend(await self._claim_queue(queue, room))
+        for task in claimed:
+            self.in_flight[task.task_id] = task
+        return claimed
+
+    async def ack(self, task_id: str) -> None:
+        """
+        Delete a finished task unless it was rescheduled.
+
+        :param task_id: taskiq task id.
+        """
+        task = self.in_flight.pop(task_id)
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                delete(QueuedTask).where(
+                    col(QueuedTask.id) == task.row_id,
+                    col(QueuedTask.lock_token) == task.lock_token,
+                ),
+            )
+        # A full queue has room again.
+        if self._notified is not None and task.queue in self.queue_concurrency:
+            self._notified.set()
+
+    async def fail(self, task_id: str, error: str, max_attempts: int) -> None:
+        """
+        Reschedule a failed task or move it to the dead letter table.
+
+        :param task_id: taskiq task id.
+        :param error: what went wrong.
+        :param max_attempts: attempts allowed for the task.
+        """
+        task = self.in_flight.get(task_id)
+        if task is None:
+            return
+        async with self.engine.begin() as conn:
+            attempts = await conn.scalar(
+                select(col(QueuedTask.attempts)).where(
+                    col(QueuedTask.id) == task.row_id,
+                    col(QueuedTask.lock_token) == task.lock_token,
+                ),
+            )
+            if attempts is None:
+                return
+            if attempts < max_attempts:
+                delay = backoff_delay(attempts, self.retry_delay, self.retry_max_delay)
+                await conn.execute(
+                    update(QueuedTask)
+                    .where(col(QueuedTask.id) == task.row_id)
+                    .values(
+                        available_at=func.localtimestamp() + timedelta(seconds=delay),
+                        lock_token=None,
+                        last_error=error,
+                    ),
+                )
+                return
+        await self.bury(task.row_id, task.lock_token, error)
+
+    async def bury(self, row_id: int, lock_token: str, error: str) -> None:
+        """
+        Move a claimed task to the dead letter table.
+
+        :param row_id: id of the queued task.
+        :param lock_token: token the task was claimed with.
+        :param error: why the task is given up on.
+        """
+        moved = (
+            delete(QueuedTask)
+            .where(
+                col(QueuedTask.id) == row_id,
+                col(QueuedTask.lock_token) == lock_token,
+            )
+            .returning(
+                *(col(getattr(QueuedTask, column)) for column in _DEAD_COLUMNS),
+            )
+            .cte("moved")
+        )
+        async with self.engine.begin() as conn:
+            buried = await conn.execute(
+                insert(DeadTask)
+                .from_select(
+                    [*_DEAD_COLUMNS, "last_error"],
+                    select(
+                        *(moved.c[column] for column in _DEAD_COLUMNS),
+                        literal(error),
+                    ),
+                )
+                .returning(col(DeadTask.task_name)),
+            )
+            for task_name in buried.scalars():
+                logger.error(
+                    "Task {0} moved to the dead letter table: {1}",
+                    task_name,
+                    error,
+                )
+
+    async def extend_visibility(self) -> None:
+        """Hide tasks this worker is running for another visibility timeout."""
+        if not self.in_flight:
+            return
+        row_ids = [task.row_id for task in self.in_flight.values()]
+        lock_tokens = {task.lock_token for task in self.in_flight.values()}
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                update(QueuedTask)
+                .where(
+                    col(QueuedTask.id).in_(row_ids),
+                    col(QueuedTask.lock_token).in_(lock_tokens),
+                )
+                .values(
+                    available_at=func.localtimestamp()
+                    + timedelta(seconds=self.visibility_timeout),
+                ),
+            )
+
+    def _room(self, queue: TaskQueue, running: int, room: int) -> int:
+        concurrency = self.queue_concurrency.get(queue)
+        if concurrency is None:
+            return room
+        return min(room, concurrency - running)
+
+    async def _claim_queue(  # noqa: WPS210
+        self,
+        queue: TaskQueue,
+        limit: int,
+    ) -> List[ClaimedTask]:
+        lock_token = uuid.uuid4().hex
+        queued_id = col(QueuedTask.id)
+        # Locked first, so concurrent claims skip each other's candidates.
+        candidates = (
+            select(
+                queued_id,
+                col(QueuedTask.fair_key),
+                col(QueuedTask.weight),
+            )
+            .where(
+                col(QueuedTask.queue) == queue.value,
+                col(QueuedTask.available_at) <= func.localtimestamp(),
+            )
+            .order_by(col(QueuedTask.available_at), queued_id)
+            .limit(limit * CLAIM_OVERSAMPLE)
+            .with_for_update(skip_locked=True)
+            .cte("candidates")
+        )
+        # Tasks of each key numbered in order, so keys take turns.
+        turns = select(
+            candidates.c.id,
+            (
+                func.row_number().over(
+                    partition_by=candidates.c.fair_key,
+                    order_by=candidates.c.id,
+                )
+                / candidates.c.weight
+            ).label("turn"),
+        ).subquery()
+        locked = (
+            select(turns.c.id, turns.c.turn)
+            .order_by(turns.c.turn, turns.c.id)
+            .limit(limit)
+            .cte("locked")
+        )
+        async with self.engine.begin() as conn:
+            rows = (
+                await conn.execute(
+                    update(QueuedTask)
+                    .where(queued_id == locked.c.id)
+                    .values(
+                        attempts=col(QueuedTask.attempts) + 1,
+                        available_at=func.localtimestamp()
+                        + timedelta(seconds=self.visibility_timeout),
+                        lock_token=lock_token,
+                    )
+                    .returning(
+                        queued_id,
+                        col(QueuedTask.task_id),
+                        col(QueuedTask.message),
+                        col(QueuedTask.attempts),
+                        locked.c.turn,
+                    ),
+                )
+            ).all()
+        # UPDATE ... RETURNING doesn't keep the order rows were picked in.
+        rows = sorted(rows, key=attrgetter("turn", "id"))
+        claimed: List[ClaimedTask] = []
+        for row_id, task_id, message, attempts, _ in rows:
+            # Tasks whose workers kept dying or timing out.
+            if attempts > self.max_attempts:
+                await self.bury(
+                    row_id,
+                    lock_token,
+                    "Not finished within the visibility timeout.",
+                )
+            else:
+                claimed.append(
+                    ClaimedTask(row_id, task_id, message, lock_token, queue),
+                )
+        return claimed
+
+    async def _listen_for_notifications(self) -> None:
+        self._listener = await self.engine.connect()
+        raw_connection = await self._listener.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        if driver_connection is None:
+            raise RuntimeError("Broker listener connection is closed.")
+        await driver_connection.add_listener(
+            CHANNEL,
+            self._on_notification,
+        )
+
+    def _on_notification(self, *args: Any) -> None:
+        if self._notified is not None:
+            self._notified.set()
+
+    async def _wait_for_tasks(self) -> None:
+        if self._notified is None:
+            await asyncio.sleep(self.poll_interval)
+            return
+        try:
+            await asyncio.wait_for(self._notified.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            return
+        self._notified.clear()
+
+    async def _extend_forever(self) -> None:
+        while True:  # noqa: WPS457
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await self.extend_visibility()
+            except Exception as error:
+                logger.warning("Can't extend visibility of running tasks: {0}", error)
+
+
+class _RetryMiddleware(TaskiqMiddleware):
+    """Reports failed tasks to the Postgres broker before they're acked."""
+
+    async def on_error(
+        self,
+        message: TaskiqMessage,
+        result: TaskiqResult[Any],
+        exception: BaseException,
+    ) -> None:
+        if isinstance(exception, NoResultError):
+            return
+        broker: PostgresBroker = self.broker  # type: ignore
+        await broker.fail(
+            message.task_id,
+            repr(exception),
+            int(message.labels.get("max_attempts", broker.max_attempts)),
+        )
+
+
+class _FairKeyMiddleware(TaskiqMiddleware):
+    """Sets the fair key of tasks from the argument named by their label."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.signatures: Dict[str, inspect.Signature] = {}
+
+    def pre_send(self, message: TaskiqMessage) -> TaskiqMessage:
+        fair_by = message.labels.get(FAIR_BY_LABEL)
+        if not fair_by or FAIR_KEY_LABEL in message.labels:
+            return message
+        if message.task_name not in self.signatures:
+            task = self.broker.find_task(message.task_name)
+            if task is None:
+                return message
+            self.signatures[message.task_name] = inspect.signature(
+                task.original_func,
+            )
+        arguments = (
+            self.signatures[message.task_name]
+            .bind_partial(*message.args, **message.kwargs)
+            .arguments
+        )
+        fair_key = arguments.get(fair_by)
+        if fair_key is not None:
+            message.labels[FAIR_KEY_LABEL] = str(fair_key)
+        return message
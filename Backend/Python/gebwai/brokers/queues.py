@@ -0,0 +1,35 @@
+import enum
+
+# Label naming the queue of a task.
+QUEUE_LABEL = "queue"
+# Label naming whose task it is, tasks of one key share their queue fairly
+# with tasks of other keys.
+FAIR_KEY_LABEL = "fair_key"
+# Label naming the task argument used as the fair key when it isn't given.
+FAIR_BY_LABEL = "fair_by"
+# Label with the share of a key, 2 gets twice the tasks of 1.
+WEIGHT_LABEL = "weight"
+# Label of tasks sent only if no task with the same one is queued or running.
+DEDUP_KEY_LABEL = "dedup_key"
+
+
+class TaskQueue(str, enum.Enum):  # noqa: WPS600
+    """Queues of the Postgres broker, in the order workers take tasks from them."""
+
+    REPLIES = "replies"
+    SLIPS = "slips"
+    MEDIA = "media"
+    BACKGROUND = "background"
+
+
+def get_queue(name: object) -> TaskQueue:
+    """
+    Get the queue of a task.
+
+    :param name: value of the queue label.
+    :return: queue, background for tasks without a known one.
+    """
+    try:
+        return TaskQueue(name)
+    except ValueError:
+        return TaskQueue.BACKGROUND
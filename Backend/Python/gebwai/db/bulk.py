@@ -0,0 +1,178 @@
+import asyncio
+from typing import Any, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from sqlalchemy import Table
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from gebwai.settings import BulkWriteMethod
+
+Record = Tuple[Any, ...]
+
+
+class BulkWriter:  # noqa: WPS230
+    """
+    Write-behind batching of rows into one table.
+
+    Records are put on a bounded in-process queue and written
+    by a background flusher every ``batch_size`` records or
+    ``flush_interval`` seconds, whichever comes first,
+    with asyncpg ``COPY`` or a multi-row ``INSERT``.
+    When ``max_pending`` records are waiting, ``submit`` waits too.
+    Records are dropped while the writer has no engine.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        table: Table,
+        columns: Sequence[str],
+        batch_size: int,
+        flush_interval: float,
+        max_pending: int,
+        method: BulkWriteMethod = BulkWriteMethod.COPY,
+        max_retries: int = 3,
+        engine: Optional[AsyncEngine] = None,
+    ) -> None:
+        self.table = table
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.method = method
+        self.max_retries = max_retries
+        self.engine = engine
+        # Records written and dropped after failed retries.
+        self.written = 0
+        self.failed = 0
+        self._queue: "Optional[asyncio.Queue[Record]]" = None
+        self._closing: Optional[asyncio.Event] = None
+        self._flusher: "Optional[asyncio.Task[None]]" = None
+
+    async def submit(self, record: Record) -> None:
+        """
+        Queue a record for writing.
+
+        :param record: values in the order of ``columns``.
+        """
+        if self.engine is None:
+            return
+        if self._queue is None or self._closing is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._closing = asyncio.Event()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(
+                self._flush_forever(self._queue, self._closing),
+            )
+        await self._queue.put(record)
+
+    async def close(self) -> None:
+        """Write queued records and stop the flusher."""
+        if self._closing is not None:
+            self._closing.set()
+        if self._queue is not None and self._flusher is not None:
+            if not self._flusher.done():
+                await self._queue.join()
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        self._queue = None
+        self._closing = None
+        self._flusher = None
+
+    async def write(self, records: List[Record]) -> None:
+        """
+        Write records right away.
+
+        :param records: values in the order of ``columns``.
+        :raises RuntimeError: if there is no engine or connection.
+        """
+        if self.engine is None:
+            raise RuntimeError("Bulk writer has no database engine.")
+        if self.method == BulkWriteMethod.COPY:
+            async with self.engine.connect() as conn:
+                raw_connection = await conn.get_raw_connection()
+                driver_connection = raw_connection.driver_connection
+                if driver_connection is None:
+                    raise RuntimeError("Bulk writer connection is closed.")
+                await driver_connection.copy_records_to_table(
+                    self.table.name,
+                    records=records,
+                    columns=self.columns,
+                    schema_name=self.table.schema,
+                )
+            return
+        async with self.engine.begin() as conn:  # noqa: WPS440
+            await conn.execute(
+                self.table.insert(),
+                [dict(zip(self.columns, record)) for record in records],
+            )
+
+    async def _flush_forever(
+        self,
+        queue: "asyncio.Queue[Record]",
+        closing: asyncio.Event,
+    ) -> None:
+        while True:  # noqa: WPS457
+            batch = await self._next_batch(queue, closing)
+            await self._write_with_retries(batch)
+            for _ in batch:
+                queue.task_done()
+
+    async def _next_batch(
+        self,
+        queue: "asyncio.Queue[Record]",
+        closing: asyncio.Event,
+    ) -> List[Record]:
+        # Waits for a first record, then fills the batch until the deadline.
+        loop = asyncio.get_running_loop()
+        batch = [await queue.get()]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            record = await self._next_record(queue, closing, deadline)
+            if record is None:
+                break
+            batch.append(record)
+        return batch
+
+    async def _next_record(
+        self,
+        queue: "asyncio.Queue[Record]",
+        closing: asyncio.Event,
+        deadline: float,
+    ) -> Optional[Record]:
+        # Waits for a record unless the deadline passes or the writer closes.
+        if not queue.empty():
+            return queue.get_nowait()
+        timeout = deadline - asyncio.get_running_loop().time()
+        if timeout <= 0 or closing.is_set():
+            return None
+        getter = asyncio.ensure_future(queue.get())
+        closed = asyncio.ensure_future(closing.wait())
+        await asyncio.wait(
+            {getter, closed},
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        closed.cancel()
+        if getter.done():
+            return getter.result()
+        getter.cancel()
+        return None
+
+    async def _write_with_retries(self, batch: List[Record]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.write(batch)
+            except Exception as error:
+                if attempt == self.max_retries:
+                    logger.exception(
+                        "Dropped {0} {1} records: {2}",
+                        len(batch),
+                        self.table.name,
+                        error,
+                    )
+                    self.failed += len(batch)
+                    return
+                await asyncio.sleep(0.1 * 2**attempt)
+                continue
+            self.written += len(batch)
+            return
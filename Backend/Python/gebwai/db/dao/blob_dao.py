@@ -0,0 +1,190 @@
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from fastapi import Depends
+from pydantic import BaseModel
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.dml import Update
+from sqlmodel import col
+
+from gebwai.db.dependencies import get_db_session
+from gebwai.db.models.blob_model import Blob
+from gebwai.db.models.item_model import GebItem
+
+
+class StorageSavings(BaseModel):
+    """Space saved by storing identical content once."""
+
+    blobs: int
+    references: int
+    stored_bytes: int
+    referenced_bytes: int
+    saved_bytes: int
+
+
+class BlobDAO:
+    """Class for accessing stored content and references to it."""
+
+    def __init__(self, session: AsyncSession = Depends(get_db_session)):
+        self.session = session
+
+    async def find_message_blob(
+        self,
+        message_id: str,
+        size: Optional[int] = None,
+    ) -> Optional[Blob]:
+        """
+        Get content already downloaded for a message.
+
+        :param message_id: LINE message id.
+        :param size: size of the content if LINE sent it.
+        :return: blob if the message was downloaded before.
+        """
+        statement = (
+            select(Blob)
+            .join(GebItem, col(GebItem.sha256) == col(Blob.sha256))
+            .where(col(GebItem.message_id) == message_id)
+            .limit(1)
+        )
+        if size is not None:
+            statement = statement.where(col(Blob.size) == size)
+        return (await self.session.scalars(statement)).one_or_none()
+
+    async def claim_blob(self, blob: Blob) -> None:
+        """
+        Insert a blob, or restart the grace period of an unreferenced one.
+
+        Either way garbage collection leaves it for its grace period,
+        while its content is moved in and references are written.
+        A blob being collected is inserted again once it's deleted.
+
+        :param blob: new blob without references.
+        """
+        statement = insert(Blob).values(blob.model_dump())
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[col(Blob.sha256)],
+                set_={"unreferenced_since": statement.excluded.unreferenced_since},
+                where=col(Blob.ref_count) == 0,
+            ),
+        )
+
+    async def reference(self, sha256: str, message_id: str, size: int) -> int:
+        """
+        Point items of a message to a blob.
+
+        :param sha256: hash of the content.
+        :param message_id: LINE message id.
+        :param size: size of the content.
+        :return: number of items pointed to the blob.
+        """
+        linked = await self.session.scalars(
+            update(GebItem)
+            .where(
+                col(GebItem.message_id) == message_id,
+                col(GebItem.sha256).is_(None),
+            )
+            .values(sha256=sha256, size=size)
+            .returning(col(GebItem.id)),
+        )
+        count = len(linked.all())
+        if count:
+            await self.session.execute(
+                update(Blob)
+                .where(col(Blob.sha256) == sha256)
+                .values(ref_count=col(Blob.ref_count) + count, unreferenced_since=None),
+            )
+        return count
+
+    async def release(self, item_ids: Sequence[int]) -> None:
+        """
+        Drop references of items to their blobs.
+
+        Blobs left without references wait for garbage collection.
+
+        :param item_ids: ids of ``geb_item`` rows.
+        """
+        released = await self._clear_references(item_ids)
+        for sha256, count in sorted(released.items()):
+            await self.session.execute(_drop_references(sha256, count))
+
+    async def lock_garbage(self, before: datetime, limit: int) -> List[Blob]:
+        """
+        Get and lock blobs without references.
+
+        Blobs locked by other transactions are skipped.
+
+        :param before: only blobs unreferenced since before this time.
+        :param limit: maximum number of blobs.
+        :return: blobs to delete.
+        """
+        rows = await self.session.scalars(
+            select(Blob)
+            .where(col(Blob.ref_count) == 0, col(Blob.unreferenced_since) < before)
+            .limit(limit)
+            .with_for_update(skip_locked=True),
+        )
+        return list(rows.all())
+
+    async def delete_blobs(self, hashes: Sequence[str]) -> None:
+        """
+        Delete blob rows.
+
+        :param hashes: hashes of the content.
+        """
+        await self.session.execute(
+            delete(Blob).where(col(Blob.sha256).in_(hashes)),
+        )
+
+    async def get_savings(self) -> StorageSavings:
+        """
+        Measure space saved by deduplication.
+
+        :return: stored and referenced content.
+        """
+        ref_count = col(Blob.ref_count)
+        size = col(Blob.size)
+        totals = await self.session.execute(
+            select(
+                func.count().label("blobs"),
+                func.coalesce(func.sum(ref_count), 0).label("references"),
+                func.coalesce(func.sum(size), 0).label("stored_bytes"),
+                func.coalesce(func.sum(size * ref_count), 0).label("referenced_bytes"),
+            ),
+        )
+        row = totals.mappings().one()
+        saved_bytes = row["referenced_bytes"] - row["stored_bytes"]
+        return StorageSavings(**row, saved_bytes=max(saved_bytes, 0))
+
+    async def _clear_references(self, item_ids: Sequence[int]) -> "Counter[str]":
+        # RETURNING gives new values, so hashes are read from locked old rows.
+        item_id = col(GebItem.id)
+        sha256 = col(GebItem.sha256)
+        old = (
+            select(item_id, sha256)
+            .where(item_id.in_(item_ids), sha256.is_not(None))
+            .with_for_update()
+            .subquery("old")
+        )
+        hashes = await self.session.scalars(
+            update(GebItem)
+            .where(item_id == old.c.id)
+            .values(sha256=None)
+            .returning(old.c.sha256),
+        )
+        return Counter(hashes.all())
+
+
+def _drop_references(sha256: str, count: int) -> Update:
+    ref_count = col(Blob.ref_count)
+    # Blobs losing their last references start their grace period.
+    last = (ref_count == count, func.localtimestamp())
+    unreferenced_since = case(last, else_=col(Blob.unreferenced_since))
+    return (
+        update(Blob)
+        .where(col(Blob.sha256) == sha256)
+        .values(ref_count=ref_count - count, unreferenced_since=unreferenced_since)
+    )
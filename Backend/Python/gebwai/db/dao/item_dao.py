@@ -0,0 +1,157 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Mapping, Optional, Tuple, cast
+
+from fastapi import Depends
+from sqlalchemy import Select, delete, literal, select, true, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import elements
+from sqlalchemy.sql.selectable import Subquery
+from sqlmodel import col
+
+from gebwai.db.dao.blob_dao import BlobDAO
+from gebwai.db.dependencies import get_db_session
+from gebwai.db.models.item_model import LISTED_COLUMNS, GebItem
+from gebwai.db.models.text_model import GebText
+from gebwai.db.models.user_model import SourceSettings
+
+# Position in a listing, ``collected_at`` and ``id`` of the last item seen.
+ItemKey = Tuple[datetime, int]
+
+
+def listing_statement(  # noqa: WPS211
+    line_user_id: str,
+    limit: int,
+    after: Optional[ItemKey] = None,
+    source_id: Optional[str] = None,
+    file_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Select[Any]:
+    """
+    Build query of one page of items collected by a user, newest first.
+
+    Every enabled source of the user is read with its own index range
+    of at most ``limit`` items after the key, and those are merged,
+    so a page costs the same however deep it is.
+
+    :param line_user_id: LINE user id.
+    :param limit: maximum number of items.
+    :param after: key of the last item of the previous page.
+    :param source_id: only items of this source.
+    :param file_type: only items of this kind.
+    :param since: only items collected at or after this time.
+    :param until: only items collected before this time.
+    :return: select statement.
+    """
+    user_sources = _user_sources(line_user_id, source_id)
+
+    collected_at = col(GebItem.collected_at)
+    item_id = col(GebItem.id)
+    per_source = select(
+        item_id,
+        col(GebItem.source_id),
+        collected_at,
+        *(col(getattr(GebItem, column)) for column in LISTED_COLUMNS),
+    ).where(col(GebItem.source_id) == user_sources.c.source_id)
+    if file_type is not None:
+        per_source = per_source.where(col(GebItem.file_type) == file_type)
+    if since is not None:
+        per_source = per_source.where(collected_at >= since)
+    if until is not None:
+        per_source = per_source.where(collected_at < until)
+    if after is not None:
+        per_source = per_source.where(tuple_(collected_at, item_id) < _literal(after))
+    items = (
+        per_source.order_by(collected_at.desc(), item_id.desc())
+        .limit(limit)
+        .lateral("items")
+    )
+    return (
+        select(items)
+        .select_from(user_sources.join(items, true()))
+        .order_by(items.c.collected_at.desc(), items.c.id.desc())
+        .limit(limit)
+    )
+
+
+def _user_sources(line_user_id: str, source_id: Optional[str]) -> Subquery:
+    sources = select(col(SourceSettings.source_id)).where(
+        col(SourceSettings.line_user_id) == line_user_id,
+        col(SourceSettings.enabled),
+    )
+    if source_id is not None:
+        sources = sources.where(col(SourceSettings.source_id) == source_id)
+    return sources.subquery("user_sources")
+
+
+def _literal(key: ItemKey) -> elements.Tuple:
+    return tuple_(literal(key[0]), literal(key[1]))
+
+
+class ItemDAO:
+    """Class for accessing collected items."""
+
+    def __init__(self, session: AsyncSession = Depends(get_db_session)):
+        self.session = session
+
+    async def stream_items(  # noqa: WPS211
+        self,
+        line_user_id: str,
+        limit: int,
+        after: Optional[ItemKey] = None,
+        source_id: Optional[str] = None,
+        file_type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        """
+        Stream one page of items collected by a user, newest first.
+
+        Rows are fetched from a server-side cursor as they're consumed.
+
+        :param line_user_id: LINE user id.
+        :param limit: maximum number of items.
+        :param after: key of the last item of the previous page.
+        :param source_id: only items of this source.
+        :param file_type: only items of this kind.
+        :param since: only items collected at or after this time.
+        :param until: only items collected before this time.
+        :yield: items as column mappings.
+        """
+        result = await self.session.stream(
+            listing_statement(
+                line_user_id,
+                limit,
+                after=after,
+                source_id=source_id,
+                file_type=file_type,
+                since=since,
+                until=until,
+            ),
+        )
+        async for row in result.mappings():
+            yield cast(Mapping[str, Any], row)
+
+    async def delete_message(self, message_id: str) -> int:
+        """
+        Delete items and searchable text of a message.
+
+        Blobs the items pointed to are released for garbage collection.
+
+        :param message_id: LINE message id.
+        :return: number of deleted items.
+        """
+        rows = await self.session.scalars(
+            select(col(GebItem.id))
+            .where(col(GebItem.message_id) == message_id)
+            .with_for_update(),
+        )
+        item_ids = [item_id for item_id in rows if item_id is not None]
+        await BlobDAO(self.session).release(item_ids)
+        await self.session.execute(
+            delete(GebItem).where(col(GebItem.id).in_(item_ids)),
+        )
+        await self.session.execute(
+            delete(GebText).where(col(GebText.message_id) == message_id),
+        )
+        return len(item_ids)
@@ -0,0 +1,102 @@
+from typing import Any, Optional, Tuple
+
+from fastapi import Depends
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from gebwai.db.dependencies import get_db_session
+from gebwai.db.models.LINE.GroupSummary import GroupSummary, LINEGroup
+from gebwai.db.models.LINE.UserProfile import BaseLINEUser, LINEUser
+
+
+class LINEProfileDAO:
+    """Class for accessing stored LINE user profiles and group summaries."""
+
+    def __init__(self, session: AsyncSession = Depends(get_db_session)):
+        self.session = session
+
+    async def get_user(self, user_id: str) -> Optional[Tuple[BaseLINEUser, float]]:
+        """
+        Get stored profile of a user.
+
+        :param user_id: LINE user id.
+        :return: profile and seconds since it was fetched, if it's stored.
+        """
+        row = (
+            await self.session.execute(
+                select(LINEUser, _age(LINEUser.fetched_at)).where(
+                    col(LINEUser.user_id) == user_id,
+                ),
+            )
+        ).first()
+        if row is None:
+            return None
+        return (
+            BaseLINEUser.model_validate(row[0], from_attributes=True),
+            float(row[1]),
+        )
+
+    async def get_group(self, group_id: str) -> Optional[Tuple[GroupSummary, float]]:
+        """
+        Get stored summary of a group.
+
+        :param group_id: LINE group id.
+        :return: summary and seconds since it was fetched, if it's stored.
+        """
+        row = (
+            await self.session.execute(
+                select(LINEGroup, _age(LINEGroup.fetched_at)).where(
+                    col(LINEGroup.group_id) == group_id,
+                ),
+            )
+        ).first()
+        if row is None:
+            return None
+        return (
+            GroupSummary.model_validate(row[0], from_attributes=True),
+            float(row[1]),
+        )
+
+    async def upsert_user(self, profile: BaseLINEUser) -> None:
+        """
+        Insert or refresh profile of a user.
+
+        :param profile: profile fetched from LINE.
+        """
+        values = profile.model_dump(mode="json")
+        await self.session.execute(
+            insert(LINEUser)
+            .values(values)
+            .on_conflict_do_update(
+                index_elements=[LINEUser.user_id],
+                set_={**values, "fetched_at": func.localtimestamp()},
+            ),
+        )
+
+    async def upsert_group(self, summary: GroupSummary) -> None:
+        """
+        Insert or refresh summary of a group.
+
+        :param summary: summary fetched from LINE.
+        """
+        values = summary.model_dump(mode="json")
+        await self.session.execute(
+            insert(LINEGroup)
+            .values(values)
+            .on_conflict_do_update(
+                index_elements=[LINEGroup.group_id],
+                set_={**values, "fetched_at": func.localtimestamp()},
+            ),
+        )
+
+
+def _age(fetched_at: Any) -> Any:
+    """
+    Seconds since a row was fetched, computed by the database clock.
+
+    :param fetched_at: fetched_at column.
+    :return: SQL expression.
+    """
+    return func.extract("epoch", func.localtimestamp() - fetched_at)
@@ -0,0 +1,59 @@
+from typing import Optional, Tuple
+
+from fastapi import Depends
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from gebwai.db.dependencies import get_db_session
+from gebwai.db.models.link_model import LinkMetadata, LinkPreview
+
+
+class LinkPreviewDAO:
+    """Class for accessing stored link previews."""
+
+    def __init__(self, session: AsyncSession = Depends(get_db_session)):
+        self.session = session
+
+    async def get_preview(self, url: str) -> Optional[Tuple[LinkMetadata, float]]:
+        """
+        Get stored preview of a link.
+
+        :param url: normalized URL.
+        :return: metadata and seconds since it was fetched, if it's stored.
+        """
+        row = (
+            await self.session.execute(
+                select(
+                    LinkPreview,
+                    func.extract(
+                        "epoch",
+                        func.localtimestamp() - LinkPreview.fetched_at,
+                    ),
+                ).where(col(LinkPreview.url) == url),
+            )
+        ).first()
+        if row is None:
+            return None
+        return (
+            LinkMetadata.model_validate(row[0], from_attributes=True),
+            float(row[1]),
+        )
+
+    async def upsert_preview(self, url: str, metadata: LinkMetadata) -> None:
+        """
+        Insert or refresh preview of a link.
+
+        :param url: normalized URL.
+        :param metadata: metadata just fetched.
+        """
+        values = metadata.model_dump()
+        await self.session.execute(
+            insert(LinkPreview)
+            .values(url=url, **values)
+            .on_conflict_do_update(
+                index_elements=[LinkPreview.url],
+                set_={**values, "fetched_at": func.localtimestamp()},
+            ),
+        )
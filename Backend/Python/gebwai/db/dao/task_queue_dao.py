@@ -0,0 +1,65 @@
+from typing import Any, List
+
+from fastapi import Depends
+from pydantic import BaseModel
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from gebwai.brokers.queues import TaskQueue
+from gebwai.db.dependencies import get_db_readonly_session
+from gebwai.db.models.queue_model import QueuedTask
+
+
+class TaskQueueStats(BaseModel):
+    """Tasks of a queue of the Postgres broker."""
+
+    queue: TaskQueue
+    # Tasks waiting for a worker.
+    ready: int = 0
+    # Tasks claimed by workers.
+    running: int = 0
+    # Failed tasks waiting to be retried.
+    delayed: int = 0
+    # How long the oldest and an average ready task have waited.
+    oldest_wait_seconds: float = 0
+    mean_wait_seconds: float = 0
+
+
+def stats_statement() -> Select[Any]:
+    """
+    Build query of task counts of every queue with tasks.
+
+    :return: select statement with columns named like ``TaskQueueStats``.
+    """
+    now = func.localtimestamp()
+    ready = col(QueuedTask.available_at) <= now
+    waited = func.extract("epoch", now - col(QueuedTask.available_at))
+    locked = col(QueuedTask.lock_token).is_not(None)
+    return select(
+        col(QueuedTask.queue).label("queue"),
+        func.count().filter(ready).label("ready"),
+        func.count().filter(~ready, locked).label("running"),
+        func.count().filter(~ready, ~locked).label("delayed"),
+        func.coalesce(func.max(waited).filter(ready), 0).label("oldest_wait_seconds"),
+        func.coalesce(func.avg(waited).filter(ready), 0).label("mean_wait_seconds"),
+    ).group_by(col(QueuedTask.queue))
+
+
+class TaskQueueDAO:
+    """Class for inspecting the task queue."""
+
+    def __init__(self, session: AsyncSession = Depends(get_db_readonly_session)):
+        self.session = session
+
+    async def get_stats(self) -> List[TaskQueueStats]:
+        """
+        Count tasks of every queue.
+
+        :return: stats in the order workers take tasks from the queues.
+        """
+        rows = await self.session.execute(stats_statement())
+        stats = {row["queue"]: TaskQueueStats(**row) for row in rows.mappings()}
+        return [
+            stats.get(queue.value, TaskQueueStats(queue=queue)) for queue in TaskQueue
+        ]
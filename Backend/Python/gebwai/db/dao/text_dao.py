@@ -0,0 +1,118 @@
+from typing import Any, List, Optional
+
+from fastapi import Depends
+from sqlalchemy import (
+    Boolean,
+    ColumnElement,
+    RowMapping,
+    Select,
+    and_,
+    cast,
+    func,
+    select,
+)
+from sqlalchemy.dialects.postgresql import TSQUERY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from gebwai.db.dependencies import get_db_readonly_session
+from gebwai.db.models.text_model import GebText
+from gebwai.db.models.user_model import SourceSettings
+
+# ts_rank_cd normalization, rank is divided by 1 + log of the text length
+# so long messages don't win by repeating words.
+RANK_NORMALIZATION = 1
+
+
+def search_statement(
+    line_user_id: str,
+    tsquery: str,
+    limit: int,
+    source_id: Optional[str] = None,
+    file_type: Optional[str] = None,
+) -> Select[Any]:
+    """
+    Build query of the best matching texts a user collected.
+
+    Only texts of the user's enabled sources are searched,
+    and only kinds the user collects from each source.
+
+    :param line_user_id: LINE user id.
+    :param tsquery: ``tsquery`` literal.
+    :param limit: maximum number of texts.
+    :param source_id: only texts of this source.
+    :param file_type: only texts of this kind, ``chat`` or ``link``.
+    :return: select statement.
+    """
+    query = cast(tsquery, TSQUERY)
+    search_vector = col(GebText.search_vector)
+    rank = func.ts_rank_cd(search_vector, query, RANK_NORMALIZATION)
+    statement = (
+        select(
+            col(GebText.message_id),
+            col(GebText.source_id),
+            col(GebText.line_user_id),
+            col(GebText.file_type),
+            col(GebText.collected_at),
+            col(GebText.body),
+            rank.label("rank"),
+        )
+        .join(SourceSettings, _collected_by(line_user_id))
+        .where(search_vector.op("@@")(query))
+    )
+    if source_id is not None:
+        statement = statement.where(col(GebText.source_id) == source_id)
+    if file_type is not None:
+        statement = statement.where(col(GebText.file_type) == file_type)
+    return statement.order_by(
+        rank.desc(),
+        col(GebText.collected_at).desc(),
+    ).limit(limit)
+
+
+def _collected_by(line_user_id: str) -> ColumnElement[bool]:
+    return and_(
+        col(SourceSettings.source_id) == col(GebText.source_id),
+        col(SourceSettings.line_user_id) == line_user_id,
+        col(SourceSettings.enabled),
+        cast(
+            col(SourceSettings.geb_settings)[col(GebText.file_type)].astext,
+            Boolean,
+        ),
+    )
+
+
+class TextDAO:
+    """Class for searching collected texts."""
+
+    def __init__(self, session: AsyncSession = Depends(get_db_readonly_session)):
+        self.session = session
+
+    async def search(  # noqa: WPS211
+        self,
+        line_user_id: str,
+        tsquery: str,
+        limit: int,
+        source_id: Optional[str] = None,
+        file_type: Optional[str] = None,
+    ) -> List[RowMapping]:
+        """
+        Get the best matching texts a user collected, best first.
+
+        :param line_user_id: LINE user id.
+        :param tsquery: ``tsquery`` literal.
+        :param limit: maximum number of texts.
+        :param source_id: only texts of this source.
+        :param file_type: only texts of this kind, ``chat`` or ``link``.
+        :return: texts as column mappings with their ``rank``.
+        """
+        result = await self.session.execute(
+            search_statement(
+                line_user_id,
+                tsquery,
+                limit,
+                source_id=source_id,
+                file_type=file_type,
+            ),
+        )
+        return list(result.mappings().all())
@@ -0,0 +1,156 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import Depends
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from gebwai.db.dependencies import get_db_session
+from gebwai.db.models.user_model import MonthlyStats, SourceSettings, User, UserSettings
+
+
+class UserDAO:
+    """Class for accessing users and their source settings."""
+
+    def __init__(self, session: AsyncSession = Depends(get_db_session)):
+        self.session = session
+
+    async def get_user(self, line_user_id: str) -> Optional[User]:
+        """
+        Get user by LINE user id.
+
+        :param line_user_id: LINE user id.
+        :return: user if exists.
+        """
+        return await self.session.get(User, line_user_id)
+
+    async def upsert_user(self, line_user_id: str) -> User:
+        """
+        Create a user or unblock the existing one in a single statement.
+
+        :param line_user_id: LINE user id.
+        :return: created or updated user.
+        """
+        statement = (
+            insert(User)
+            .values(line_user_id=line_user_id, is_blocked=False)
+            .on_conflict_do_update(
+                index_elements=[User.line_user_id],
+                set_={"is_blocked": False, "updated_at": func.localtimestamp()},
+            )
+            .returning(User)
+        )
+        return (
+            await self.session.scalars(
+                statement,
+                execution_options={"populate_existing": True},
+            )
+        ).one()
+
+    async def get_user_settings(self, line_user_id: str) -> Optional[UserSettings]:
+        """
+        Get settings of a user.
+
+        :param line_user_id: LINE user id.
+        :return: user settings if exist.
+        """
+        return await self.session.get(UserSettings, line_user_id)
+
+    async def insert_user_settings(self, line_user_id: str) -> None:
+        """
+        Insert default settings of a user unless they already exist.
+
+        :param line_user_id: LINE user id.
+        """
+        await self.session.execute(
+            insert(UserSettings)
+            .values(UserSettings(line_user_id=line_user_id).model_dump())
+            .on_conflict_do_nothing(index_elements=[UserSettings.line_user_id]),
+        )
+
+    async def get_source_settings(
+        self,
+        line_user_id: str,
+        source_id: str,
+    ) -> Optional[SourceSettings]:
+        """
+        Get settings of one source of a user.
+
+        :param line_user_id: LINE user id.
+        :param source_id: id of a group, room or user.
+        :return: source settings if exist.
+        """
+        return await self.session.get(SourceSettings, (line_user_id, source_id))
+
+    async def insert_source_settings(
+        self,
+        source_settings: SourceSettings,
+    ) -> Optional[SourceSettings]:
+        """
+        Insert settings of a source unless they already exist.
+
+        :param source_settings: new source settings.
+        :return: inserted settings or None if another writer was first.
+        """
+        statement = (
+            insert(SourceSettings)
+            .values(source_settings.model_dump())
+            .on_conflict_do_nothing(
+                index_elements=[SourceSettings.line_user_id, SourceSettings.source_id],
+            )
+            .returning(SourceSettings)
+        )
+        return (await self.session.scalars(statement)).one_or_none()
+
+    async def ensure_source_settings(
+        self,
+        source_settings: SourceSettings,
+    ) -> SourceSettings:
+        """
+        Insert settings of a source or get the existing ones.
+
+        :param source_settings: new source settings.
+        :return: settings stored in the database.
+        """
+        inserted = await self.insert_source_settings(source_settings)
+        if inserted is not None:
+            return inserted
+        return (
+            await self.session.execute(
+                select(SourceSettings).where(
+                    col(SourceSettings.line_user_id) == source_settings.line_user_id,
+                    col(SourceSettings.source_id) == source_settings.source_id,
+                ),
+            )
+        ).scalar_one()
+
+    async def get_collecting_users(self, source_id: str) -> List[str]:
+        """
+        Get users who collect files from a source.
+
+        :param source_id: id of a group, room or user.
+        :return: LINE user ids.
+        """
+        rows = await self.session.scalars(
+            select(col(SourceSettings.line_user_id)).where(
+                col(SourceSettings.source_id) == source_id,
+                col(SourceSettings.enabled),
+            ),
+        )
+        return list(rows.all())
+
+    async def get_monthly_stats(
+        self,
+        line_user_id: str,
+        month: date,
+    ) -> Optional[MonthlyStats]:
+        """
+        Get stats of a user in a month.
+
+        :param line_user_id: LINE user id.
+        :param month: first day of the month.
+        :return: stats if anything was collected that month.
+        """
+        return await self.session.get(MonthlyStats, (line_user_id, month))
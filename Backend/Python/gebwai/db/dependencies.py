@@ -4,6 +4,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 from taskiq import TaskiqDepends
 
+from gebwai.db.session import has_writes
+
 
 async def get_db_session(
     request: Request = TaskiqDepends(),
@@ -11,13 +13,45 @@ async def get_db_session(
     """
     Create and get database session.
 
+    The session takes a connection from the pool on its first query.
+    It's committed only if something was written
+    and rolled back if the request failed.
+
     :param request: current request.
     :yield: database session.
+    :raises Exception: whatever failed the request, after the rollback.
     """
     session: AsyncSession = request.app.state.db_session_factory()
 
+    try:  # noqa: WPS501
+        yield session
+    except Exception:
+        await session.rollback()
+        raise
+    else:
+        if has_writes(session):
+            await session.commit()
+    finally:
+        await session.close()
+
+
+async def get_db_readonly_session(
+    request: Request = TaskiqDepends(),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Create and get read-only database session.
+
+    Queries run in autocommit mode, one round trip each,
+    without BEGIN and COMMIT. Writes raise an error.
+    The session reads from the replica when one is configured
+    and not lagging, so it may not see writes made just before.
+
+    :param request: current request.
+    :yield: read-only database session.
+    """
+    session: AsyncSession = request.app.state.db_readonly_session_factory()
+
     try:  # noqa: WPS501
         yield session
     finally:
-        await session.commit()
         await session.close()
@@ -0,0 +1,133 @@
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+from yarl import URL
+
+from gebwai.settings import settings
+
+
+class PoolStats:
+    """Counters of connection checkouts from a pool."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total: float = 0
+        self.wait_seconds_max: float = 0
+
+    def record_checkout(self, waited: float) -> None:
+        """
+        Record a checkout.
+
+        :param waited: seconds spent getting the connection.
+        """
+        self.checkouts += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that measures how long checkouts wait.
+
+    The time includes opening a new connection
+    when the pool isn't full yet.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.record_checkout(time.perf_counter() - started)
+
+
+class PoolStatus(BaseModel):
+    """Current state of a connection pool."""
+
+    size: int
+    in_use: int
+    idle: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+
+
+def pool_status(engine: AsyncEngine) -> PoolStatus:
+    """
+    Get state of the engine's connection pool.
+
+    :param engine: engine created by ``create_engine``.
+    :return: pool state.
+    """
+    pool = engine.pool
+    stats = getattr(pool, "stats", PoolStats())
+    return PoolStatus(
+        size=pool.size(),  # type: ignore
+        in_use=pool.checkedout(),  # type: ignore
+        idle=pool.checkedin(),  # type: ignore
+        overflow=max(pool.overflow(), 0),  # type: ignore
+        checkouts=stats.checkouts,
+        timeouts=stats.timeouts,
+        wait_seconds_total=stats.wait_seconds_total,
+        wait_seconds_max=stats.wait_seconds_max,
+    )
+
+
+def _connect_args() -> Dict[str, Any]:
+    connect_args: Dict[str, Any] = {
+        "prepared_statement_cache_size": settings.db_statement_cache_size,
+    }
+    if settings.db_pgbouncer:
+        # PgBouncer in transaction mode may run each statement
+        # on another server connection, so nothing is prepared twice.
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+        )
+    if settings.db_statement_timeout is not None:
+        if settings.db_pgbouncer:
+            # PgBouncer doesn't pass server settings of the startup packet.
+            connect_args["command_timeout"] = settings.db_statement_timeout
+        else:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(int(settings.db_statement_timeout * 1000)),
+            }
+    return connect_args
+
+
+def create_engine(url: Optional[URL] = None) -> AsyncEngine:
+    """
+    Create database engine from settings.
+
+    :param url: database URL, the primary database by default.
+    :return: engine with a ``TimedQueuePool``.
+    """
+    return create_async_engine(
+        str(url or settings.db_url),
+        echo=settings.db_echo,
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        # Reuse recent connections, so idle ones time out and are recycled.
+        pool_use_lifo=True,
+        connect_args=_connect_args(),
+    )
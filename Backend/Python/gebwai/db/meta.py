@@ -1,3 +1,5 @@
-import sqlalchemy as sa
+from sqlmodel import SQLModel
 
-meta = sa.MetaData()
+# SQLModel tables register themselves here,
+# so DeclarativeBase models share the same metadata.
+meta = SQLModel.metadata
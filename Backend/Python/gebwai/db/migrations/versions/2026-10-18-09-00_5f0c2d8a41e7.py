@@ -0,0 +1,43 @@
+"""Created LINE webhook event table.
+
+Revision ID: 5f0c2d8a41e7
+Revises: 2b7380507a71
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5f0c2d8a41e7"
+down_revision = "2b7380507a71"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "line_webhook_event",
+        sa.Column("webhook_event_id", sa.String(), nullable=False),
+        sa.Column(
+            "received_at",
+            sa.DateTime(),
+            server_default=sa.text("current_timestamp"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("webhook_event_id"),
+    )
+    op.create_index(
+        op.f("ix_line_webhook_event_received_at"),
+        "line_webhook_event",
+        ["received_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_line_webhook_event_received_at"),
+        table_name="line_webhook_event",
+    )
+    op.drop_table("line_webhook_event")
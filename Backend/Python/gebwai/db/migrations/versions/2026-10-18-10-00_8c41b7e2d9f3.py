@@ -0,0 +1,51 @@
+"""Created LINE user and group tables.
+
+Revision ID: 8c41b7e2d9f3
+Revises: 5f0c2d8a41e7
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8c41b7e2d9f3"
+down_revision = "5f0c2d8a41e7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "line_user",
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("display_name", sa.String(), nullable=False),
+        sa.Column("picture_url", sa.String(), nullable=True),
+        sa.Column("status_message", sa.String(), nullable=True),
+        sa.Column("language", sa.String(), nullable=True),
+        sa.Column(
+            "fetched_at",
+            sa.DateTime(),
+            server_default=sa.text("current_timestamp"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_table(
+        "line_group",
+        sa.Column("group_id", sa.String(), nullable=False),
+        sa.Column("group_name", sa.String(), nullable=False),
+        sa.Column("picture_url", sa.String(), nullable=True),
+        sa.Column(
+            "fetched_at",
+            sa.DateTime(),
+            server_default=sa.text("current_timestamp"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("group_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("line_group")
+    op.drop_table("line_user")
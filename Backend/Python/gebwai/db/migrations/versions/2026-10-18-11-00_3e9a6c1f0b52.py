@@ -0,0 +1,57 @@
+"""Created user and source settings tables.
+
+Revision ID: 3e9a6c1f0b52
+Revises: 8c41b7e2d9f3
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "3e9a6c1f0b52"
+down_revision = "8c41b7e2d9f3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "gebwai_user",
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("current_timestamp"),
+            nullable=False,
+        ),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("is_blocked", sa.Boolean(), nullable=False),
+        sa.Column("line_user_id", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("line_user_id"),
+    )
+    op.create_table(
+        "source_settings",
+        sa.Column("line_user_id", sa.String(), nullable=False),
+        sa.Column("source_id", sa.String(), nullable=False),
+        sa.Column("starting_source_name", sa.String(), nullable=False),
+        sa.Column(
+            "geb_settings",
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=False,
+        ),
+        sa.Column("verify_slip", sa.Boolean(), nullable=True),
+        sa.Column("enabled", sa.Boolean(), nullable=False),
+        sa.Column("before_follow_gebwai", sa.Boolean(), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["line_user_id"],
+            ["gebwai_user.line_user_id"],
+        ),
+        sa.PrimaryKeyConstraint("line_user_id", "source_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("source_settings")
+    op.drop_table("gebwai_user")
@@ -0,0 +1,77 @@
+"""Created user settings and monthly stats tables.
+
+Revision ID: a6d2f4e8b1c7
+Revises: 3e9a6c1f0b52
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "a6d2f4e8b1c7"
+down_revision = "3e9a6c1f0b52"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_settings",
+        sa.Column("line_user_id", sa.String(), nullable=False),
+        sa.Column(
+            "automatic_geb_for_newly_added_group",
+            sa.Boolean(),
+            nullable=False,
+        ),
+        sa.Column("geb_my_own_files", sa.Boolean(), nullable=False),
+        sa.Column("report_geb_stats", sa.Boolean(), nullable=False),
+        sa.Column(
+            "default_geb_settings",
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=False,
+        ),
+        sa.Column("default_verify_slip", sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["line_user_id"],
+            ["gebwai_user.line_user_id"],
+        ),
+        sa.PrimaryKeyConstraint("line_user_id"),
+    )
+    op.create_table(
+        "monthly_stats",
+        sa.Column("line_user_id", sa.String(), nullable=False),
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("n_geb_all", sa.Integer(), nullable=False),
+        sa.Column("n_process_slip", sa.Integer(), nullable=False),
+        sa.Column("n_image", sa.Integer(), nullable=False),
+        sa.Column("n_audio", sa.Integer(), nullable=False),
+        sa.Column("n_file", sa.Integer(), nullable=False),
+        sa.Column("n_video", sa.Integer(), nullable=False),
+        sa.Column("n_slip", sa.Integer(), nullable=False),
+        sa.Column("n_link", sa.Integer(), nullable=False),
+        sa.Column("n_chat", sa.Integer(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["line_user_id"],
+            ["gebwai_user.line_user_id"],
+        ),
+        sa.PrimaryKeyConstraint("line_user_id", "month"),
+    )
+    op.create_index(
+        "ix_source_settings_enabled_source_id",
+        "source_settings",
+        ["source_id", "line_user_id"],
+        unique=False,
+        postgresql_where=sa.text("enabled"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_source_settings_enabled_source_id",
+        table_name="source_settings",
+    )
+    op.drop_table("monthly_stats")
+    op.drop_table("user_settings")
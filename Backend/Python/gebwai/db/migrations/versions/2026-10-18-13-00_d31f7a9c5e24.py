@@ -0,0 +1,40 @@
+"""Created collected item table.
+
+Revision ID: d31f7a9c5e24
+Revises: a6d2f4e8b1c7
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d31f7a9c5e24"
+down_revision = "a6d2f4e8b1c7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "geb_item",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("message_id", sa.String(), nullable=False),
+        sa.Column("source_id", sa.String(), nullable=False),
+        sa.Column("line_user_id", sa.String(), nullable=True),
+        sa.Column("file_type", sa.String(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=True),
+        sa.Column("collected_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_geb_item_message_id"),
+        "geb_item",
+        ["message_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_geb_item_message_id"), table_name="geb_item")
+    op.drop_table("geb_item")
@@ -0,0 +1,46 @@
+"""Created blob table for deduplicated media.
+
+Revision ID: e5b8c2a74f19
+Revises: d31f7a9c5e24
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5b8c2a74f19"
+down_revision = "d31f7a9c5e24"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blob",
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("content_type", sa.String(), nullable=True),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("unreferenced_since", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("sha256"),
+    )
+    op.create_index(
+        "ix_blob_unreferenced_since",
+        "blob",
+        ["unreferenced_since"],
+        unique=False,
+        postgresql_where=sa.text("ref_count = 0"),
+    )
+    op.add_column("geb_item", sa.Column("sha256", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("geb_item", "sha256")
+    op.drop_index(
+        "ix_blob_unreferenced_since",
+        table_name="blob",
+        postgresql_where=sa.text("ref_count = 0"),
+    )
+    op.drop_table("blob")
@@ -0,0 +1,51 @@
+"""Created covering indexes for item listing.
+
+Revision ID: 7a4c9e1d2b86
+Revises: e5b8c2a74f19
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7a4c9e1d2b86"
+down_revision = "e5b8c2a74f19"
+branch_labels = None
+depends_on = None
+
+LISTED = ["message_id", "line_user_id", "file_type", "size", "sha256"]
+
+
+def upgrade() -> None:
+    # Built without locking out the item writer.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_geb_item_source_listing",
+            "geb_item",
+            ["source_id", "collected_at", "id"],
+            unique=False,
+            postgresql_include=LISTED,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_geb_item_source_type_listing",
+            "geb_item",
+            ["source_id", "file_type", "collected_at", "id"],
+            unique=False,
+            postgresql_include=[column for column in LISTED if column != "file_type"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_geb_item_source_type_listing",
+            table_name="geb_item",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_geb_item_source_listing",
+            table_name="geb_item",
+            postgresql_concurrently=True,
+        )
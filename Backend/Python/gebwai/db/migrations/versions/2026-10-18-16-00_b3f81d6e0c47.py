@@ -0,0 +1,50 @@
+"""Created searchable text table for chat messages and links.
+
+Revision ID: b3f81d6e0c47
+Revises: 7a4c9e1d2b86
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "b3f81d6e0c47"
+down_revision = "7a4c9e1d2b86"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.create_table(
+        "geb_text",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("message_id", sa.String(), nullable=False),
+        sa.Column("source_id", sa.String(), nullable=False),
+        sa.Column("line_user_id", sa.String(), nullable=True),
+        sa.Column("file_type", sa.String(), nullable=False),
+        sa.Column("collected_at", sa.DateTime(), nullable=False),
+        sa.Column("body", sa.String(), nullable=False),
+        sa.Column("lexemes", sa.String(), nullable=False),
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("lexemes::tsvector", persisted=True),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_geb_text_source_search",
+        "geb_text",
+        ["source_id", "search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_geb_text_source_search", table_name="geb_text")
+    op.drop_table("geb_text")
@@ -0,0 +1,38 @@
+"""Created link preview table.
+
+Revision ID: c8e2a5f17d93
+Revises: b3f81d6e0c47
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c8e2a5f17d93"
+down_revision = "b3f81d6e0c47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "link_preview",
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("image_url", sa.String(), nullable=True),
+        sa.Column("site_name", sa.String(), nullable=True),
+        sa.Column("content_type", sa.String(), nullable=True),
+        sa.Column("url", sa.String(), nullable=False),
+        sa.Column(
+            "fetched_at",
+            sa.DateTime(),
+            server_default=sa.text("current_timestamp"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("url"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("link_preview")
@@ -0,0 +1,70 @@
+"""Created task queue tables of the Postgres broker.
+
+Revision ID: f4a7d2c9b318
+Revises: c8e2a5f17d93
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f4a7d2c9b318"
+down_revision = "c8e2a5f17d93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "taskiq_queue",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("task_id", sa.String(), nullable=False),
+        sa.Column("task_name", sa.String(), nullable=False),
+        sa.Column("message", sa.LargeBinary(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column(
+            "available_at",
+            sa.DateTime(),
+            server_default=sa.text("localtimestamp"),
+            nullable=False,
+        ),
+        sa.Column("lock_token", sa.String(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column(
+            "created",
+            sa.DateTime(),
+            server_default=sa.text("localtimestamp"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_taskiq_queue_available_at",
+        "taskiq_queue",
+        ["available_at", "id"],
+        unique=False,
+    )
+    op.create_table(
+        "taskiq_dead_letter",
+        sa.Column("id", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("task_id", sa.String(), nullable=False),
+        sa.Column("task_name", sa.String(), nullable=False),
+        sa.Column("message", sa.LargeBinary(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column(
+            "died_at",
+            sa.DateTime(),
+            server_default=sa.text("localtimestamp"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("taskiq_dead_letter")
+    op.drop_index("ix_taskiq_queue_available_at", table_name="taskiq_queue")
+    op.drop_table("taskiq_queue")
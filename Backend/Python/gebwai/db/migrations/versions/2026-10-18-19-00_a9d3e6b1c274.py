@@ -0,0 +1,57 @@
+"""Added queues and fair keys to the task queue.
+
+Revision ID: a9d3e6b1c274
+Revises: f4a7d2c9b318
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a9d3e6b1c274"
+down_revision = "f4a7d2c9b318"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for table in ("taskiq_queue", "taskiq_dead_letter"):
+        op.add_column(
+            table,
+            sa.Column(
+                "queue",
+                sa.String(),
+                server_default="background",
+                nullable=False,
+            ),
+        )
+    op.add_column(
+        "taskiq_queue",
+        sa.Column("fair_key", sa.String(), server_default="", nullable=False),
+    )
+    op.add_column(
+        "taskiq_queue",
+        sa.Column("weight", sa.Float(), server_default=sa.text("1"), nullable=False),
+    )
+    op.drop_index("ix_taskiq_queue_available_at", table_name="taskiq_queue")
+    op.create_index(
+        "ix_taskiq_queue_queue_available_at",
+        "taskiq_queue",
+        ["queue", "available_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_taskiq_queue_queue_available_at", table_name="taskiq_queue")
+    op.create_index(
+        "ix_taskiq_queue_available_at",
+        "taskiq_queue",
+        ["available_at", "id"],
+        unique=False,
+    )
+    op.drop_column("taskiq_queue", "weight")
+    op.drop_column("taskiq_queue", "fair_key")
+    for table in ("taskiq_dead_letter", "taskiq_queue"):
+        op.drop_column(table, "queue")
@@ -0,0 +1,50 @@
+"""Added task dedup keys and the task result cache.
+
+Revision ID: d2b7f0a4e915
+Revises: a9d3e6b1c274
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "d2b7f0a4e915"
+down_revision = "a9d3e6b1c274"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("taskiq_queue", sa.Column("dedup_key", sa.String(), nullable=True))
+    op.create_index(
+        "ix_taskiq_queue_dedup_key",
+        "taskiq_queue",
+        ["dedup_key"],
+        unique=True,
+        postgresql_where=sa.text("dedup_key IS NOT NULL"),
+    )
+    op.create_table(
+        "taskiq_result_cache",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("value", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index(
+        op.f("ix_taskiq_result_cache_expires_at"),
+        "taskiq_result_cache",
+        ["expires_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_taskiq_result_cache_expires_at"),
+        table_name="taskiq_result_cache",
+    )
+    op.drop_table("taskiq_result_cache")
+    op.drop_index("ix_taskiq_queue_dedup_key", table_name="taskiq_queue")
+    op.drop_column("taskiq_queue", "dedup_key")
@@ -0,0 +1,29 @@
+"""Created LINE source lease table.
+
+Revision ID: 6b1e4d8f2a57
+Revises: d2b7f0a4e915
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6b1e4d8f2a57"
+down_revision = "d2b7f0a4e915"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "line_source_lease",
+        sa.Column("source_key", sa.String(), nullable=False),
+        sa.Column("token", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("source_key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("line_source_lease")
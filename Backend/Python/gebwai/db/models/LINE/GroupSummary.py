@@ -1,5 +1,7 @@
+from datetime import datetime
+
 from pydantic import HttpUrl
-from sqlmodel import SQLModel
+from sqlmodel import AutoString, Field, SQLModel, text
 
 
 class GroupSummary(SQLModel):
@@ -9,4 +11,16 @@ class GroupSummary(SQLModel):
 
     group_id: str
     group_name: str
-    picture_url: HttpUrl | None = None
+    picture_url: HttpUrl | None = Field(default=None, sa_type=AutoString)
+
+
+class LINEGroup(GroupSummary, table=True):
+    """Summary of a LINE group as last fetched from the Messaging API."""
+
+    __tablename__ = "line_group"
+
+    group_id: str = Field(primary_key=True)
+    fetched_at: datetime = Field(
+        nullable=False,
+        sa_column_kwargs={"server_default": text("current_timestamp")},
+    )
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from sqlmodel import Field, SQLModel
+
+
+class SourceLease(SQLModel, table=True):
+    """
+    Sources being handled by a worker.
+
+    A lease is renewed while events of its source are handled
+    and expires if its worker stops without releasing it.
+    """
+
+    __tablename__ = "line_source_lease"
+
+    source_key: str = Field(primary_key=True)
+    token: str = Field(nullable=False)
+    expires_at: datetime = Field(nullable=False)
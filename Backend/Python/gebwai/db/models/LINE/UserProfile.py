@@ -1,14 +1,24 @@
-from sqlmodel import Field, SQLModel
+from datetime import datetime
+
 from pydantic import HttpUrl
+from sqlmodel import AutoString, Field, SQLModel, text
 
 
 class BaseLINEUser(SQLModel):
-    user_id: str 
+    user_id: str
     display_name: str
-    picture_url: HttpUrl | None = None
+    picture_url: HttpUrl | None = Field(default=None, sa_type=AutoString)
     status_message: str | None = None
     language: str | None = None
 
 
 class LINEUser(BaseLINEUser, table=True):
-    user_id: str = Field(primary_key=True)
\ No newline at end of file
+    """Profile of a LINE user as last fetched from the Messaging API."""
+
+    __tablename__ = "line_user"
+
+    user_id: str = Field(primary_key=True)
+    fetched_at: datetime = Field(
+        nullable=False,
+        sa_column_kwargs={"server_default": text("current_timestamp")},
+    )
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from sqlmodel import Field, SQLModel, text
+
+
+class WebhookEvent(SQLModel, table=True):
+    """
+    Webhook event ids that were already received.
+
+    Shared between workers to drop redelivered events.
+    """
+
+    __tablename__ = "line_webhook_event"
+
+    webhook_event_id: str = Field(primary_key=True)
+    received_at: datetime = Field(
+        nullable=False,
+        index=True,
+        sa_column_kwargs={"server_default": text("current_timestamp")},
+    )
@@ -0,0 +1 @@
+"""Models of LINE Messaging API objects."""
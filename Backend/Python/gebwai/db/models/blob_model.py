@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Index, text
+from sqlmodel import BigInteger, Field, SQLModel
+
+# Length of a hex SHA-256 digest.
+SHA256_LENGTH = 64
+
+
+class Blob(SQLModel, table=True):
+    """
+    Content of collected messages, stored once per SHA-256.
+
+    ``ref_count`` is the number of ``geb_item`` rows with this ``sha256``.
+    Blobs nobody referenced since ``unreferenced_since``
+    are deleted by the garbage collection sweep.
+    """
+
+    __tablename__ = "blob"
+    __table_args__ = (
+        # Only blobs waiting for garbage collection are indexed.
+        Index(
+            "ix_blob_unreferenced_since",
+            "unreferenced_since",
+            postgresql_where=text("ref_count = 0"),
+        ),
+    )
+
+    sha256: str = Field(primary_key=True, max_length=SHA256_LENGTH)
+    size: int = Field(sa_type=BigInteger)
+    content_type: Optional[str] = None
+    ref_count: int = 0
+    created: datetime = Field(default_factory=datetime.now)
+    unreferenced_since: Optional[datetime] = Field(default_factory=datetime.now)
@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlmodel import BigInteger, Field, SQLModel
+
+# Columns returned by the item listing, kept in its indexes
+# so pages are read with index-only scans.
+LISTED_COLUMNS = ("message_id", "line_user_id", "file_type", "size", "sha256")
+
+
+class GebItem(SQLModel, table=True):
+    """
+    Message collected from a chat, one row per message.
+
+    ``file_type`` is one of the fields of ``NGebByFileType``.
+    Rows are written in batches by the item writer, ``sha256``
+    of the ``blob`` with downloaded content is set later.
+    """
+
+    __tablename__ = "geb_item"
+    __table_args__ = (
+        # Items of a source newest first, the listing's keyset order.
+        Index(
+            "ix_geb_item_source_listing",
+            "source_id",
+            "collected_at",
+            "id",
+            postgresql_include=list(LISTED_COLUMNS),
+        ),
+        # Same for listings filtered by file type.
+        Index(
+            "ix_geb_item_source_type_listing",
+            "source_id",
+            "file_type",
+            "collected_at",
+            "id",
+            postgresql_include=[
+                column for column in LISTED_COLUMNS if column != "file_type"
+            ],
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True, sa_type=BigInteger)
+    message_id: str = Field(index=True)
+    source_id: str
+    line_user_id: Optional[str] = None
+    file_type: str
+    size: Optional[int] = None
+    collected_at: datetime
+    sha256: Optional[str] = None
@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel, text
+
+
+class LinkMetadata(SQLModel):
+    """What a link points to, all empty if there was nothing to preview."""
+
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    site_name: Optional[str] = None
+    content_type: Optional[str] = None
+
+
+class LinkPreview(LinkMetadata, table=True):
+    """Preview of a link as last fetched, one row per normalized URL."""
+
+    __tablename__ = "link_preview"
+
+    url: str = Field(primary_key=True)
+    fetched_at: datetime = Field(
+        nullable=False,
+        sa_column_kwargs={"server_default": text("current_timestamp")},
+    )
@@ -0,0 +1,88 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import Index, LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import BigInteger, Field, SQLModel, text
+
+
+class QueuedTask(SQLModel, table=True):
+    """
+    Task waiting for a taskiq worker of the Postgres broker.
+
+    A task is ready once ``available_at`` passes. Claiming it pushes
+    ``available_at`` to the end of the visibility timeout and sets
+    a new ``lock_token``, so it's claimed again only if the worker
+    doesn't finish it in time. Finished tasks are deleted.
+
+    Tasks of a queue are taken in turns by ``fair_key``, ``weight``
+    tasks of a key per turn. Only one task with a ``dedup_key`` is queued
+    or running at a time.
+    """
+
+    __tablename__ = "taskiq_queue"
+    __table_args__ = (
+        Index("ix_taskiq_queue_queue_available_at", "queue", "available_at"),
+        Index(
+            "ix_taskiq_queue_dedup_key",
+            "dedup_key",
+            unique=True,
+            postgresql_where=text("dedup_key IS NOT NULL"),
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True, sa_type=BigInteger)
+    task_id: str
+    task_name: str
+    queue: str = Field(
+        default="background",
+        sa_column_kwargs={"server_default": "background"},
+    )
+    fair_key: str = Field(default="", sa_column_kwargs={"server_default": ""})
+    weight: float = Field(default=1, sa_column_kwargs={"server_default": text("1")})
+    dedup_key: Optional[str] = None
+    message: bytes = Field(sa_type=LargeBinary)
+    attempts: int = 0
+    available_at: datetime = Field(
+        sa_column_kwargs={"server_default": text("localtimestamp")},
+    )
+    lock_token: Optional[str] = None
+    last_error: Optional[str] = None
+    created: datetime = Field(
+        sa_column_kwargs={"server_default": text("localtimestamp")},
+    )
+
+
+class DeadTask(SQLModel, table=True):
+    """Task that failed all its attempts, kept for inspection and replay."""
+
+    __tablename__ = "taskiq_dead_letter"
+
+    id: int = Field(
+        primary_key=True,
+        sa_type=BigInteger,
+        sa_column_kwargs={"autoincrement": False},
+    )
+    task_id: str
+    task_name: str
+    queue: str = Field(
+        default="background",
+        sa_column_kwargs={"server_default": "background"},
+    )
+    message: bytes = Field(sa_type=LargeBinary)
+    attempts: int
+    last_error: Optional[str] = None
+    created: datetime
+    died_at: datetime = Field(
+        sa_column_kwargs={"server_default": text("localtimestamp")},
+    )
+
+
+class CachedTaskResult(SQLModel, table=True):
+    """Result of a cached task, shared by all workers until ``expires_at``."""
+
+    __tablename__ = "taskiq_result_cache"
+
+    key: str = Field(primary_key=True)
+    value: Any = Field(sa_type=JSONB)
+    expires_at: datetime = Field(index=True)
@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DDL, Column, Computed, Index, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlmodel import BigInteger, Field, SQLModel
+
+
+class GebText(SQLModel, table=True):
+    """
+    Text of a collected chat message or link, one row per message.
+
+    ``lexemes`` is the ``tsvector`` literal made at ingest
+    by ``gebwai.services.search.tokenizer.to_tsvector``,
+    Postgres keeps it parsed in ``search_vector`` for searching.
+    Rows are written in batches by the text writer.
+    """
+
+    __tablename__ = "geb_text"
+    __table_args__ = (
+        # Searches within some sources of a user or all of them,
+        # source_id is indexed by the btree_gin extension.
+        Index(
+            "ix_geb_text_source_search",
+            "source_id",
+            "search_vector",
+            postgresql_using="gin",
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True, sa_type=BigInteger)
+    message_id: str
+    source_id: str
+    line_user_id: Optional[str] = None
+    file_type: str
+    collected_at: datetime
+    body: str
+    lexemes: str
+    search_vector: Optional[str] = Field(
+        default=None,
+        sa_column=Column(
+            TSVECTOR,
+            Computed("lexemes::tsvector", persisted=True),
+            nullable=False,
+        ),
+    )
+
+
+event.listen(
+    SQLModel.metadata.tables[GebText.__tablename__],
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gin"),
+)
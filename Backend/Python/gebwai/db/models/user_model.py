@@ -1,21 +1,20 @@
 #  Copyright (c) 2020. Codustry Pte. Ltd., Codustry (Thailand) Co., Ltd.
 
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from enum import auto
 from json import JSONDecodeError
-from typing import Optional
-
-from sqlmodel import SQLModel
+from typing import Dict, Optional
 
 import arrow
-from gebwai.db.models.__base__ import TimestampModel
 import omise
 from autoname import AutoName
-from beanie import Document, Link
 from loguru import logger
-from pydantic import BaseModel, Field, conint
+from pydantic import BaseModel, conint
+from sqlalchemy import Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
 from tenacity import (
     retry,
     retry_if_exception_type,
@@ -23,7 +22,7 @@ from tenacity import (
     wait_exponential,
 )
 
-
+from gebwai.db.models.__base__ import TimestampModel
 
 
 class NGebByFileType(BaseModel):
@@ -37,19 +36,48 @@ class NGebByFileType(BaseModel):
     chat: int = 0
 
 
-class MonthlyStats(BaseModel):
+class MonthlyStats(SQLModel, table=True):
     """
-    easy and quick access of stats,
-    recal at 00.00+7, at the first day of each month
+    easy and quick access of stats, one row per user and month,
+    months start at 00.00+7 on the first day
+
+    Counters are columns incremented in place as items are collected,
+    see ``gebwai.services.stats.MonthlyStatsCounter``.
     """
 
+    __tablename__ = "monthly_stats"
+
+    line_user_id: str = Field(
+        primary_key=True,
+        foreign_key="gebwai_user.line_user_id",
+    )
+    month: date = Field(primary_key=True)
+
     n_geb_all: int = 0
     n_process_slip: int = 0
 
-    n_geb_by_file_type: NGebByFileType = Field(default_factory=NGebByFileType)
+    n_image: int = 0
+    n_audio: int = 0
+    n_file: int = 0
+    n_video: int = 0
+    n_slip: int = 0
+    n_link: int = 0
+    n_chat: int = 0
 
     updated: datetime = Field(default_factory=datetime.now)
 
+    @property
+    def n_geb_by_file_type(self) -> NGebByFileType:
+        return NGebByFileType(
+            image=self.n_image,
+            audio=self.n_audio,
+            file=self.n_file,
+            video=self.n_video,
+            slip=self.n_slip,
+            link=self.n_link,
+            chat=self.n_chat,
+        )
+
 
 class UserPayment(BaseModel):
     omise_customer_id: str | None = None
@@ -315,52 +343,91 @@ class TemplateSourceSettings(BaseModel):
     enabled: bool = True
 
 
-class SourceSettings(TemplateSourceSettings):
+class SourceSettings(SQLModel, table=True):
+    """
+    Settings of one chat a user collects files from, one row per source.
+
+    Rows of a user are found by the primary key,
+    users collecting a chat by the partial index on enabled rows.
+    """
+
+    __tablename__ = "source_settings"
+    __table_args__ = (
+        Index(
+            "ix_source_settings_enabled_source_id",
+            "source_id",
+            "line_user_id",
+            postgresql_where=text("enabled"),
+        ),
+    )
+
+    line_user_id: str = Field(
+        primary_key=True,
+        foreign_key="gebwai_user.line_user_id",
+    )
+    source_id: str = Field(primary_key=True)
     starting_source_name: str
-    source_id: str
-    created: datetime = Field(default_factory=datetime.now)
+    # Read and written as a whole and never filtered on,
+    # so new file types don't need a migration.
+    geb_settings: Dict[str, bool] = Field(
+        default_factory=lambda: GebSettings().model_dump(),
+        sa_type=JSONB,
+    )
+    verify_slip: bool | None = None
+    enabled: bool = True
     before_follow_gebwai: bool = False
+    created: datetime = Field(default_factory=datetime.now)
+
+    @property
+    def geb(self) -> GebSettings:
+        return GebSettings(**self.geb_settings)
 
     @classmethod
     def create_from_template(
-        cls, starting_source_name, source_id, template: TemplateSourceSettings
+        cls,
+        line_user_id,
+        starting_source_name,
+        source_id,
+        template: TemplateSourceSettings,
     ):
         return cls(
+            line_user_id=line_user_id,
             starting_source_name=starting_source_name,
             source_id=source_id,
-            geb_settings=template.geb_settings,
+            geb_settings=template.geb_settings.model_dump(),
             verify_slip=template.verify_slip,
-            integration=template.integration,
+            enabled=template.enabled,
         )
 
 
-class UserSettings(SQLModel):
+class UserSettings(SQLModel, table=True):
+    """Settings of a user, read only when a new source is added."""
+
+    __tablename__ = "user_settings"
+
+    line_user_id: str = Field(
+        primary_key=True,
+        foreign_key="gebwai_user.line_user_id",
+    )
+
     automatic_geb_for_newly_added_group: bool = True
     geb_my_own_files: bool = True
     report_geb_stats: bool = True
 
-    default_source_settings: TemplateSourceSettings = TemplateSourceSettings()
-    source_settings: dict[str, SourceSettings] = Field(default_factory=dict)
-
-    async def get_or_create_source_settings(
-        self, source_id: SourceIdStr, before_follow_gebwai: bool = False
-    ):
-        """please save after call this"""
-        did_create = False
-        source_setting = self.source_settings.get(source_id)
-        if source_setting is None:
-            source_setting = SourceSettings.create_from_template(
-                starting_source_name=await source_id.get_starting_name(),
-                source_id=source_id,
-                template=self.default_source_settings,
-            )
-            if not self.automatic_geb_for_newly_added_group:
-                source_setting.enabled = False
+    # Same as SourceSettings.geb_settings, copied to new sources.
+    default_geb_settings: Dict[str, bool] = Field(
+        default_factory=lambda: GebSettings().model_dump(),
+        sa_type=JSONB,
+    )
+    default_verify_slip: bool | None = None
 
-            source_setting.before_follow_gebwai = before_follow_gebwai
-            self.source_settings[source_id] = source_setting
-            did_create = True
-        return did_create, source_setting
+    @property
+    def default_source_settings(self) -> TemplateSourceSettings:
+        return TemplateSourceSettings(
+            geb_settings=GebSettings(**self.default_geb_settings),
+            verify_slip=self.default_verify_slip,
+            enabled=self.automatic_geb_for_newly_added_group,
+        )
 
 
 class Affiliate(BaseModel):
@@ -379,15 +446,14 @@ class TutorialExperience(BaseModel):
     collected_first_file_on: datetime | None = None
 
 
-class User(SQLModel, TimestampModel, table=True):
+class User(TimestampModel, table=True):
+    __tablename__ = "gebwai_user"
 
-    # settings: UserSettings = Field(default_factory=UserSettings)
+    # settings: UserSettings, stats: MonthlyStats and source settings
+    # are rows of their own tables keyed by line_user_id.
     # integrations: list[Link[Integration]] = Field(default_factory=list)
     # proposed_default_integration: Link[Integration] | None = None
 
-    # stats: MonthlyStats = Field(default_factory=MonthlyStats)
-
-    # is_blocked: bool = False
     # tier: UserTier = UserTier.iron
     # payment: UserPayment = Field(default_factory=UserPayment)
 
@@ -397,12 +463,13 @@ class User(SQLModel, TimestampModel, table=True):
     # refer_by_user: str | None = None
     # refer_time: datetime | None = None
 
-    line_user_id: str = Field(foreign_key="LINEUser.user_id")
+    is_blocked: bool = False
 
+    line_user_id: str = Field(primary_key=True)
 
     @property
     def user_id(self):
-        return self.profile.user_id
+        return self.line_user_id
 
     @property
     def n_club(self):
@@ -449,54 +516,45 @@ class User(SQLModel, TimestampModel, table=True):
         create_or_unblock_if_not_exists=False,
         with_working_token=False,
     ) -> Optional["User"]:
-        if with_working_token:
-            logger.warning("Removing `with_working_token`")
+        """
+        Get a user, creating or unblocking them if asked.
 
-        # majority of cases
+        Concurrent calls for one user share a single load,
+        see ``gebwai.services.users.UserDirectory``.
 
-        user = await cls.find_one(User.profile.user_id == line_id)
+        :param line_id: LINE user id.
+        :param create_or_unblock_if_not_exists: make sure the user
+            exists and isn't blocked.
+        :param with_working_token: ignored, kept for old callers.
+        :return: user or None if they don't exist and weren't created.
+        """
+        from gebwai.services.users import user_directory  # noqa: WPS433
 
-        if user:
-            if create_or_unblock_if_not_exists:
-                user.is_blocked = False
-                await user.save()
-            return user
-        else:
-            # minority of cases
-            if create_or_unblock_if_not_exists:
-                new = await cls.init_from_line_id(user_id=line_id)
-                await new.save()
-                return new
-            else:
-                return None
-
-    # # @staticmethod
-    # # def exists(db: Database, line_id: str) -> bool:
-    # #     n = (
-    # #         db[settings.MONGODB_USER_COLLECTION]
-    # #         .find({"profile.user_id": line_id})
-    # #         .count()
-    # #     )
-    # #     return n == 1
+        if with_working_token:
+            logger.warning("Removing `with_working_token`")
 
-    @classmethod
-    async def init_from_line_id(cls, user_id, group_id=None):
-        user_profile = await UserProfile.from_line_id(
-            user_id=user_id, group_id=group_id
+        return await user_directory.get_it_done(
+            line_id,
+            create_or_unblock_if_not_exists=create_or_unblock_if_not_exists,
         )
-        return cls(profile=user_profile)
 
     async def get_or_create_source_settings(
         self,
-        source_id: SourceIdStr,
+        source_id: str,
         before_follow_gebwai: bool = False,
-    ):
-        if not isinstance(source_id, SourceIdStr):
-            source_id = SourceIdStr(source_id)
+    ) -> SourceSettings:
+        """
+        Get settings of a source, creating them on first use.
+
+        :param source_id: id of a group, room or user.
+        :param before_follow_gebwai: whether the source was joined
+            before the user followed the bot.
+        :return: source settings.
+        """
+        from gebwai.services.users import user_directory  # noqa: WPS433
 
-        did_create, source_setting = await self.settings.get_or_create_source_settings(
-            source_id, before_follow_gebwai=before_follow_gebwai
+        return await user_directory.get_or_create_source_settings(
+            self.line_user_id,
+            source_id,
+            before_follow_gebwai=before_follow_gebwai,
         )
-        if did_create:
-            await self.save()
-        return source_setting
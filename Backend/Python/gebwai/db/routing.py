@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from gebwai.db.session import ReadOnlySession
+
+# Seconds the replica is behind the primary. A replica that has replayed
+# everything it received is not behind, even if nothing was written lately.
+# A primary answers 0, so one server can play both roles.
+REPLICATION_LAG_QUERY = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery()"
+    " OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE("
+    "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END",
+)
+
+LagCheck = asyncio.Task[Optional[float]]
+
+
+def readonly_sessionmaker(
+    engine: AsyncEngine,
+) -> "async_sessionmaker[AsyncSession]":
+    """
+    Create factory of read-only autocommit sessions.
+
+    :param engine: engine to read from.
+    :return: session factory.
+    """
+    return async_sessionmaker(
+        engine.execution_options(isolation_level="AUTOCOMMIT"),
+        expire_on_commit=False,
+        sync_session_class=ReadOnlySession,
+    )
+
+
+class ReplicaRouter:
+    """
+    Factory of read-only sessions routed to a replica.
+
+    Calling the router creates a session like ``async_sessionmaker`` does.
+    Sessions read from the replica while its last measured lag
+    is at most ``max_lag`` seconds, and from the primary otherwise,
+    including before the first measurement or when the replica is down.
+    Lag is measured in background at most every ``check_interval`` seconds.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        primary: AsyncEngine,
+        replica: Optional[AsyncEngine],
+        max_lag: float,
+        check_interval: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.clock = clock
+        # Last measured lag in seconds, None if unknown.
+        self.lag: Optional[float] = None
+        self._primary_sessions = readonly_sessionmaker(primary)
+        self._replica_sessions = readonly_sessionmaker(replica) if replica else None
+        self._checked_at = float("-inf")
+        self._check: Optional[LagCheck] = None
+
+    def __call__(self) -> AsyncSession:
+        """
+        Create a read-only session.
+
+        :return: session on the replica or on the primary.
+        """
+        self._schedule_check()
+        if self._replica_sessions is not None and self.use_replica:
+            return self._replica_sessions()
+        return self._primary_sessions()
+
+    @property
+    def use_replica(self) -> bool:
+        """
+        Whether reads go to the replica.
+
+        :return: True if the replica is known to be fresh enough.
+        """
+        return self.lag is not None and self.lag <= self.max_lag
+
+    async def check_lag(self) -> Optional[float]:
+        """
+        Measure replication lag of the replica.
+
+        :return: lag in seconds or None if the replica can't be reached.
+        """
+        if self.replica is None:
+            return None
+        self._checked_at = self.clock()
+        try:
+            async with self.replica.connect() as conn:
+                self.lag = float(
+                    (await conn.execute(REPLICATION_LAG_QUERY)).scalar_one(),
+                )
+        except Exception as error:
+            logger.warning("Reading from the primary, replica check failed: {0}", error)
+            self.lag = None
+        return self.lag
+
+    async def close(self) -> None:
+        """Stop the running lag check."""
+        if self._check is not None:
+            self._check.cancel()
+            await asyncio.gather(self._check, return_exceptions=True)
+
+    def _schedule_check(self) -> None:
+        if self.replica is None:
+            return
+        if self.clock() - self._checked_at < self.check_interval:
+            return
+        if self._check is not None and not self._check.done():
+            return
+        self._checked_at = self.clock()
+        self._check = asyncio.get_running_loop().create_task(self.check_lag())
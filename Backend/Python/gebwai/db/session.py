@@ -0,0 +1,85 @@
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session
+
+_WROTE = "gebwai_wrote"
+
+
+class WriteTrackingSession(Session):
+    """
+    Session that remembers whether it wrote anything.
+
+    ORM flushes and ``INSERT``, ``UPDATE`` or ``DELETE``
+    statements run with ``execute`` count as writes.
+    Raw SQL text doesn't, commit explicitly after it.
+    """
+
+    @property
+    def has_writes(self) -> bool:
+        """
+        Whether the session has anything to commit.
+
+        :return: True after a write or with pending ORM changes.
+        """
+        return bool(
+            self.info.get(_WROTE) or self.new or self.dirty or self.deleted,
+        )
+
+
+class ReadOnlySession(Session):
+    """Session that refuses to write."""
+
+
+def has_writes(session: AsyncSession) -> bool:
+    """
+    Whether an async session has anything to commit.
+
+    Sessions not created with ``WriteTrackingSession``
+    are assumed to have written.
+
+    :param session: async session.
+    :return: True if the session should be committed.
+    """
+    sync_session = session.sync_session
+    if isinstance(sync_session, WriteTrackingSession):
+        return sync_session.has_writes
+    return True
+
+
+def _is_write(orm_execute_state: ORMExecuteState) -> bool:
+    return (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    )
+
+
+@event.listens_for(WriteTrackingSession, "do_orm_execute")
+def _track_execute(orm_execute_state: ORMExecuteState) -> None:
+    if _is_write(orm_execute_state):
+        orm_execute_state.session.info[_WROTE] = True
+
+
+@event.listens_for(WriteTrackingSession, "after_flush")
+def _track_flush(session: Session, flush_context: Any) -> None:
+    session.info[_WROTE] = True
+
+
+@event.listens_for(WriteTrackingSession, "after_commit")
+@event.listens_for(WriteTrackingSession, "after_rollback")
+def _forget_writes(session: Session) -> None:
+    session.info.pop(_WROTE, None)
+
+
+@event.listens_for(ReadOnlySession, "do_orm_execute")
+def _refuse_execute(orm_execute_state: ORMExecuteState) -> None:
+    if _is_write(orm_execute_state):
+        raise RuntimeError("Writes aren't allowed in a read-only session.")
+
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def _refuse_flush(session: Session, flush_context: Any, instances: Any) -> None:
+    if session.new or session.dirty or session.deleted:
+        raise RuntimeError("Writes aren't allowed in a read-only session.")
@@ -1,12 +1,36 @@
 import logging
+import os
+import queue
+import random
 import sys
-from typing import Any, Union
+import threading
+import time
+import traceback
+import weakref
+from typing import Any, Dict, List, Optional, TextIO, Tuple, Union
 
+import ujson
 from loguru import logger
-from opentelemetry.trace import INVALID_SPAN, INVALID_SPAN_CONTEXT, get_current_span
+from opentelemetry.trace import get_current_span
 
 from gebwai.settings import settings
 
+# Loguru's own time formatting takes most of the time spent on a record,
+# so the timestamp is formatted with strftime by record_formatter.
+TEXT_FORMAT = (
+    "<green>{timestamp}</green> "
+    "| <level>{level: <8}</level> "
+    "| <magenta>trace_id={extra[trace_id]}</magenta> "
+    "| <blue>span_id={extra[span_id]}</blue> "
+    "| <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> "
+    "- <level>{message}</level>\n"
+)
+TEXT_EXCEPTION_FORMAT = f"{TEXT_FORMAT}{{exception}}"
+# JSON lines are made from records by the writer thread.
+JSON_FORMAT = "{message}"
+# Records written at once by the writer thread.
+WRITE_BATCH_SIZE = 1000
+
 
 class InterceptHandler(logging.Handler):
     """
@@ -19,22 +43,37 @@ class InterceptHandler(logging.Handler):
     https://loguru.readthedocs.io/en/stable/overview.html#entirely-compatible-with-standard-logging
     """
 
+    def __init__(self) -> None:
+        super().__init__()
+        # Loguru levels by stdlib level name, and the number of frames between
+        # emit and the code that logged by its file and line. It's the same
+        # for every record of a line, so frames are walked once per line.
+        self._levels: Dict[str, Union[str, int]] = {}
+        self._depths: Dict[Tuple[str, int], int] = {}
+
     def emit(self, record: logging.LogRecord) -> None:  # pragma: no cover
         """
         Propagates logs to loguru.
 
         :param record: record to log.
         """
-        try:
-            level: Union[str, int] = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
+        level = self._levels.get(record.levelname)
+        if level is None:
+            try:
+                level = logger.level(record.levelname).name
+            except ValueError:
+                level = record.levelno
+            self._levels[record.levelname] = level
 
-        # Find caller from where originated the logged message
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back  # type: ignore
-            depth += 1
+        call_site = (record.pathname, record.lineno)
+        depth = self._depths.get(call_site)
+        if depth is None:
+            # Find caller from where originated the logged message
+            frame, depth = sys._getframe(1), 1  # noqa: WPS437
+            while frame.f_code.co_filename == logging.__file__:
+                frame = frame.f_back  # type: ignore
+                depth += 1
+            self._depths[call_site] = depth
 
         logger.opt(depth=depth, exception=record.exc_info).log(
             level,
@@ -42,45 +81,234 @@ class InterceptHandler(logging.Handler):
         )
 
 
+class SamplingFilter(logging.Filter):
+    """
+    Drops records of a noisy logger.
+
+    Keeps ``sample_rate`` of records, and up to ``max_per_second`` of them
+    a second. Warnings and errors are always kept. Checks take no lock,
+    so the limits are approximate when several threads log at once.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 1,
+        max_per_second: Optional[float] = None,
+    ) -> None:
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        # Records dropped since start.
+        self.dropped = 0
+        self._tokens = max_per_second or 0
+        self._updated = time.monotonic()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Decide whether to keep a record.
+
+        :param record: record to log.
+        :return: whether the record is logged.
+        """
+        if record.levelno >= logging.WARNING:
+            return True
+        # Sampling needs no cryptographic randomness.
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:  # noqa: S311
+            self.dropped += 1
+            return False
+        if self.max_per_second is not None:
+            now = time.monotonic()
+            self._tokens = min(
+                self.max_per_second,
+                self._tokens + (now - self._updated) * self.max_per_second,
+            )
+            self._updated = now
+            if self._tokens < 1:
+                self.dropped += 1
+                return False
+            self._tokens -= 1
+        return True
+
+
+class QueuedStream:
+    """
+    Loguru sink writing to a stream in a background thread.
+
+    Logging only puts the message on a queue, so a slow or blocked
+    stdout doesn't stall the event loop. The thread writes all queued
+    messages at once and is restarted in forked processes.
+    """
+
+    def __init__(self, stream: TextIO, json: bool = False) -> None:
+        self.stream = stream
+        self.json = json
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._start()
+        _queued_streams.add(self)
+
+    def write(self, message: Any) -> None:
+        """
+        Queue a formatted message.
+
+        :param message: message from loguru, with its record.
+        """
+        self._queue.put(message)
+
+    def stop(self) -> None:
+        """Write queued messages and stop the thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def restart(self) -> None:
+        """Start a new thread in a forked process, the parent's isn't there."""
+        if self._thread is not None:
+            self._start()
+
+    def _start(self) -> None:
+        # Messages queued in the parent before a fork are its to write.
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._write_forever,
+            name="log-writer",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _write_forever(self) -> None:
+        while True:  # noqa: WPS457
+            batch = self._take_batch()
+            try:
+                self.stream.write(self._format_batch(batch))
+                self.stream.flush()
+            except (OSError, ValueError):
+                # The stream is closed, there's nowhere to report it.
+                pass  # noqa: WPS420
+            if None in batch:
+                return
+
+    def _take_batch(self) -> List[Any]:
+        batch = [self._queue.get()]
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _format_batch(self, batch: List[Any]) -> str:
+        lines: List[str] = []
+        for message in batch:
+            if message is None:
+                continue
+            # A broken record mustn't stop the thread and lose the others.
+            try:
+                lines.append(self._format(message))
+            except Exception as error:
+                lines.append(f"Cannot format log record: {error!r}\n")
+        return "".join(lines)
+
+    def _format(self, message: Any) -> str:
+        if not self.json:
+            return str(message)
+        return "{0}\n".format(json_line(message.record))
+
+
+def write_json(message: Any) -> None:
+    """
+    Loguru sink writing JSON lines to stdout.
+
+    :param message: message from loguru, with its record.
+    """
+    sys.stdout.write("{0}\n".format(json_line(message.record)))
+
+
+def json_line(record: Dict[str, Any]) -> str:
+    """
+    Serialize a record to a JSON object.
+
+    :param record: loguru record.
+    :return: JSON without new lines.
+    """
+    extra = record["extra"]
+    data: Dict[str, Any] = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    for key, extra_value in extra.items():
+        # Ids are 0 outside of spans.
+        if extra_value != 0 or key not in {"trace_id", "span_id"}:
+            data[key] = extra_value
+    exception = record["exception"]
+    if exception is not None:
+        data["exception"] = "".join(
+            traceback.format_exception(
+                exception.type,
+                exception.value,
+                exception.traceback,
+            ),
+        )
+    return ujson.dumps(data, default=str)
+
+
+def _restart_queued_streams() -> None:
+    for stream in _queued_streams:
+        stream.restart()
+
+
+_queued_streams: "weakref.WeakSet[QueuedStream]" = weakref.WeakSet()
+os.register_at_fork(after_in_child=_restart_queued_streams)
+# Span context of the last record and its formatted trace and span ids.
+_last_span: List[Tuple[Any, str, str]] = [(None, "", "")]
+
+
 def record_formatter(record: dict[str, Any]) -> str:  # pragma: no cover
     """
     Formats the record.
 
     This function formats message
     by adding extra trace information to the record.
+    Spans are only looked up with tracing enabled.
 
     :param record: record information.
     :return: format string.
     """
-    log_format = (
-        "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> "
-        "| <level>{level: <8}</level> "
-        "| <magenta>trace_id={extra[trace_id]}</magenta> "
-        "| <blue>span_id={extra[span_id]}</blue> "
-        "| <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> "
-        "- <level>{message}</level>\n"
-    )
-
-    span = get_current_span()
-    record["extra"]["span_id"] = 0
-    record["extra"]["trace_id"] = 0
-    if span != INVALID_SPAN:
-        span_context = span.get_span_context()
-        if span_context != INVALID_SPAN_CONTEXT:
-            record["extra"]["span_id"] = format(span_context.span_id, "016x")
-            record["extra"]["trace_id"] = format(span_context.trace_id, "032x")
+    if settings.opentelemetry_endpoint:
+        span_context = get_current_span().get_span_context()
+        if span_context.is_valid:
+            # Records of a span reuse its formatted ids.
+            last_span = _last_span[0]
+            if last_span[0] is not span_context:
+                last_span = (
+                    span_context,
+                    format(span_context.trace_id, "032x"),
+                    format(span_context.span_id, "016x"),
+                )
+                _last_span[0] = last_span
+            record["extra"]["trace_id"] = last_span[1]
+            record["extra"]["span_id"] = last_span[2]
 
+    if settings.log_json:
+        return JSON_FORMAT
+    record["timestamp"] = record["time"].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
     if record["exception"]:
-        log_format = f"{log_format}{{exception}}"
-
-    return log_format
+        return TEXT_EXCEPTION_FORMAT
+    return TEXT_FORMAT
 
 
 def configure_logging() -> None:  # pragma: no cover
     """Configures logging."""
     intercept_handler = InterceptHandler()
 
-    logging.basicConfig(handlers=[intercept_handler], level=logging.NOTSET)
+    # Records below the level are dropped before reaching loguru.
+    logging.basicConfig(handlers=[intercept_handler], level=settings.log_level.value)
 
     for logger_name in logging.root.manager.loggerDict:
         if logger_name.startswith("uvicorn."):
@@ -92,10 +320,37 @@ def configure_logging() -> None:  # pragma: no cover
     logging.getLogger("uvicorn").handlers = [intercept_handler]
     logging.getLogger("uvicorn.access").handlers = [intercept_handler]
 
+    # sample and rate limit noisy loggers
+    sampled_names = {*settings.log_sample_rates, *settings.log_rate_limits}
+    for sampled_name in sampled_names:
+        _set_sampling(logging.getLogger(sampled_name))
+
     # set logs output, level and format
     logger.remove()
+    logger.configure(extra={"trace_id": 0, "span_id": 0})
     logger.add(
-        sys.stdout,
+        _create_sink(),
         level=settings.log_level.value,
         format=record_formatter,  # type: ignore
+        colorize=not settings.log_json and sys.stdout.isatty(),
+    )
+
+
+def _set_sampling(std_logger: logging.Logger) -> None:  # pragma: no cover
+    for log_filter in list(std_logger.filters):
+        if isinstance(log_filter, SamplingFilter):
+            std_logger.removeFilter(log_filter)
+    std_logger.addFilter(
+        SamplingFilter(
+            settings.log_sample_rates.get(std_logger.name, 1),
+            settings.log_rate_limits.get(std_logger.name),
+        ),
     )
+
+
+def _create_sink() -> Any:  # pragma: no cover
+    if settings.log_queued:
+        return QueuedStream(sys.stdout, json=settings.log_json)
+    if settings.log_json:
+        return write_json
+    return sys.stdout
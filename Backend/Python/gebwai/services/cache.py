@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+class LRUTTLCache(Generic[KeyType, ValueType]):
+    """
+    In-process LRU cache with per-entry expiration.
+
+    Entries expire ``ttl`` seconds after they were set,
+    and the least recently used ones are evicted once
+    the cache holds more than ``max_size`` entries.
+    Not thread-safe, meant to be used from the event loop.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[KeyType, Tuple[float, ValueType]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: KeyType) -> Optional[ValueType]:
+        """
+        Get a live entry and mark it as recently used.
+
+        :param key: key of the entry.
+        :return: cached value or None if it's missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self._entries[key]  # noqa: WPS420
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: KeyType, value: ValueType, ttl: Optional[float] = None) -> None:
+        """
+        Store an entry, evicting expired and least recently used ones.
+
+        :param key: key of the entry.
+        :param value: value to cache.
+        :param ttl: lifetime of this entry, defaults to cache's ttl.
+        """
+        now = self.clock()
+        lifetime = self.ttl if ttl is None else ttl
+        self._entries[key] = (now + lifetime, value)
+        self._entries.move_to_end(key)
+        while self._entries:
+            oldest_key, (expires_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_size and expires_at > now:
+                break
+            del self._entries[oldest_key]  # noqa: WPS420
+
+    def pop(self, key: KeyType) -> Optional[ValueType]:
+        """
+        Remove an entry.
+
+        :param key: key of the entry.
+        :return: removed value if there was one.
+        """
+        entry = self._entries.pop(key, None)
+        return None if entry is None else entry[1]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
@@ -0,0 +1,169 @@
+import re
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from linebot.v3.webhooks import (
+    AudioMessageContent,
+    FileMessageContent,
+    ImageMessageContent,
+    MessageEvent,
+    TextMessageContent,
+    VideoMessageContent,
+)
+
+from gebwai.db.bulk import BulkWriter
+from gebwai.db.dao.item_dao import ItemDAO
+from gebwai.db.models.item_model import GebItem
+from gebwai.services.line.events import source_key
+from gebwai.services.links.tasks import unfurl_links
+from gebwai.services.media.blobs import blob_store
+from gebwai.services.media.tasks import download_content
+from gebwai.services.search.indexer import TEXT_FILE_TYPES, index_text
+from gebwai.services.stats import monthly_stats
+from gebwai.services.users import user_directory
+from gebwai.settings import settings
+
+ITEM_COLUMNS = (
+    "message_id",
+    "source_id",
+    "line_user_id",
+    "file_type",
+    "size",
+    "collected_at",
+)
+# Kinds of messages with content to download.
+MEDIA_FILE_TYPES = frozenset(("image", "video", "audio", "file"))
+_LINK = re.compile("https?://", re.IGNORECASE)
+# Field names of NGebByFileType by kind of message content.
+_CONTENT_FILE_TYPES = (
+    (ImageMessageContent, "image"),
+    (VideoMessageContent, "video"),
+    (AudioMessageContent, "audio"),
+    (FileMessageContent, "file"),
+)
+
+item_writer = BulkWriter(
+    GebItem.__table__,  # type: ignore
+    ITEM_COLUMNS,
+    batch_size=settings.item_write_batch_size,
+    flush_interval=settings.item_write_flush_interval,
+    max_pending=settings.item_write_max_pending,
+    method=settings.item_write_method,
+)
+
+
+def file_type_of(event: MessageEvent) -> Optional[str]:
+    """
+    Get kind of a collected message.
+
+    :param event: message event.
+    :return: field name of ``NGebByFileType`` or None if it's not collected.
+    """
+    message = event.message
+    for content_type, file_type in _CONTENT_FILE_TYPES:
+        if isinstance(message, content_type):
+            return file_type
+    if isinstance(message, TextMessageContent):
+        return "link" if _LINK.search(message.text) else "chat"
+    return None
+
+
+async def record_message(event: MessageEvent) -> None:
+    """
+    Queue a collected message to be stored and counted.
+
+    A message is kept only if a user collecting its source keeps
+    this kind of message from it, and is counted in monthly stats
+    of each of them. Content kept by LINE is then downloaded
+    by a taskiq worker and text is kept for searching,
+    with previews of its links.
+
+    :param event: message event.
+    """
+    file_type = file_type_of(event)
+    if file_type is None or user_directory.session_factory is None:
+        return
+    source_id = source_key(event)
+    keeping = await _keeping_users(source_id, file_type)
+    if not keeping:
+        return
+    collected_at = datetime.fromtimestamp(event.timestamp / 1000, timezone.utc)
+    await item_writer.submit(
+        (
+            event.message.id,
+            source_id,
+            getattr(event.source, "user_id", None),
+            file_type,
+            getattr(event.message, "file_size", None),
+            collected_at.replace(tzinfo=None),
+        ),
+    )
+    for line_user_id in keeping:
+        monthly_stats.add_item(line_user_id, file_type, collected_at)
+    if file_type in MEDIA_FILE_TYPES and _kept_by_line(event):
+        await download_content.kiq(
+            event.message.id,
+            source_id,
+            file_type,
+            getattr(event.message, "file_size", None),
+        )
+    if file_type in TEXT_FILE_TYPES:
+        await _index(event, source_id, file_type, collected_at, keeping)
+
+
+async def forget_message(message_id: str) -> None:
+    """
+    Delete items of a message its sender unsent.
+
+    LINE asks bots to respect unsent messages, so items and searchable text
+    are deleted and content nobody else collected is left to garbage
+    collection. Items still queued in ``item_writer`` aren't deleted.
+
+    :param message_id: LINE message id.
+    """
+    session_factory = blob_store.session_factory
+    if session_factory is None:
+        return
+    async with session_factory() as session:
+        await ItemDAO(session).delete_message(message_id)
+        await session.commit()
+
+
+async def _keeping_users(source_id: str, file_type: str) -> List[str]:
+    keeping: List[str] = []
+    for line_user_id in await user_directory.get_collecting_users(source_id):
+        source_settings = await user_directory.get_or_create_source_settings(
+            line_user_id,
+            source_id,
+        )
+        if source_settings.geb_settings.get(file_type):
+            keeping.append(line_user_id)
+    return keeping
+
+
+async def _index(
+    event: MessageEvent,
+    source_id: str,
+    file_type: str,
+    collected_at: datetime,
+    keeping: List[str],
+) -> None:
+    kept = await index_text(
+        event.message.id,
+        source_id,
+        getattr(event.source, "user_id", None),
+        file_type,
+        collected_at.replace(tzinfo=None),
+        event.message.text,
+        keeping,
+    )
+    if kept and file_type == "link":
+        await unfurl_links.kicker().with_labels(fair_key=source_id).kiq(
+            event.message.text,
+        )
+
+
+def _kept_by_line(event: MessageEvent) -> bool:
+    # Content of external providers isn't on LINE's content endpoint.
+    provider = getattr(event.message, "content_provider", None)
+    return provider is None or provider.type == "line"
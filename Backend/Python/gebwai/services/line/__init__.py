@@ -0,0 +1 @@
+"""Services for the LINE Messaging API."""
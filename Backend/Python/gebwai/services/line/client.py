@@ -0,0 +1,38 @@
+import aiohttp
+from linebot.v3.messaging import AsyncApiClient, AsyncMessagingApi, Configuration
+
+from gebwai.settings import settings
+
+# Seconds to keep resolved addresses of the Messaging API host.
+DNS_CACHE_TTL = 300
+
+configuration = Configuration(
+    host=settings.line_api_host,
+    access_token=settings.LINE_ACCESS_TOKEN,
+)
+
+
+async def create_messaging_api(
+    api_configuration: Configuration = configuration,
+) -> AsyncMessagingApi:
+    """
+    Create Messaging API client with a tuned connection pool.
+
+    Connections to LINE are kept alive and reused across requests
+    instead of the SDK defaults. Must be called in a running loop.
+
+    :param api_configuration: configuration of the client.
+    :return: new client, close its ``api_client`` when done.
+    """
+    api_client = AsyncApiClient(api_configuration)
+    await api_client.rest_client.pool_manager.close()
+    api_client.rest_client.pool_manager = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=settings.line_api_pool_size,
+            keepalive_timeout=settings.line_api_keepalive,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            enable_cleanup_closed=True,
+        ),
+        trust_env=True,
+    )
+    return AsyncMessagingApi(api_client)
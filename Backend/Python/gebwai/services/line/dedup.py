@@ -0,0 +1,163 @@
+import time
+from datetime import timedelta
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col
+
+from gebwai.db.models.LINE.WebhookEvent import WebhookEvent
+from gebwai.services.cache import LRUTTLCache
+from gebwai.services.line.events import RawEvent
+from gebwai.settings import settings
+
+
+class PostgresSeenEventStore:
+    """Seen webhook event ids shared by all workers through Postgres."""
+
+    def __init__(self, engine: AsyncEngine, ttl: float) -> None:
+        self.engine = engine
+        self.ttl = ttl
+        self._last_purge: float = 0
+
+    async def claim(self, event_ids: Iterable[str]) -> Set[str]:
+        """
+        Record event ids, returning those nobody has recorded before.
+
+        Expired ids are purged at most once per ``ttl / 10`` seconds
+        in the same transaction.
+
+        :param event_ids: webhook event ids.
+        :return: ids seen for the first time.
+        """
+        values = [{"webhook_event_id": event_id} for event_id in event_ids]
+        if not values:
+            return set()
+
+        query = (
+            insert(WebhookEvent)
+            .values(values)
+            .on_conflict_do_nothing()
+            .returning(col(WebhookEvent.webhook_event_id))
+        )
+        async with self.engine.begin() as conn:
+            claimed = set((await conn.execute(query)).scalars())
+            if time.monotonic() - self._last_purge > self.ttl / 10:
+                self._last_purge = time.monotonic()
+                await conn.execute(
+                    delete(WebhookEvent).where(
+                        WebhookEvent.received_at
+                        < func.now() - timedelta(seconds=self.ttl),
+                    ),
+                )
+        return claimed
+
+    async def release(self, event_ids: Iterable[str]) -> None:
+        """
+        Drop recorded event ids, so they can be claimed again.
+
+        :param event_ids: webhook event ids.
+        """
+        event_ids = list(event_ids)
+        if not event_ids:
+            return
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                delete(WebhookEvent).where(
+                    col(WebhookEvent.webhook_event_id).in_(event_ids),
+                ),
+            )
+
+
+class WebhookEventDeduplicator:
+    """
+    Drops webhook events that were already received.
+
+    Events are recognized by ``webhookEventId``. Ids are looked up
+    in an in-process LRU cache first and, if a shared store is set,
+    claimed in it, so redeliveries landing on another worker
+    are dropped too.
+
+    ``hits`` counts dropped duplicates, ``misses`` counts new events.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        store: Optional[PostgresSeenEventStore] = None,
+    ) -> None:
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._seen: LRUTTLCache[str, bool] = LRUTTLCache(max_size, ttl)
+
+    async def filter_new(self, raw_events: List[RawEvent]) -> List[RawEvent]:
+        """
+        Keep only events that weren't received before.
+
+        Events without ``webhookEventId`` are always kept.
+
+        :param raw_events: events as decoded from the webhook body.
+        :return: new events in the original order.
+        """
+        new_ids = await self._claim(raw_events)
+        new_events = [
+            raw_event for raw_event in raw_events if _is_new(raw_event, new_ids)
+        ]
+        self.misses += len(new_events)
+        self.hits += len(raw_events) - len(new_events)
+        return new_events
+
+    async def forget(self, raw_events: List[RawEvent]) -> None:
+        """
+        Stop treating events as received, so their redelivery is kept.
+
+        Used when new events couldn't be handed over for handling.
+
+        :param raw_events: events returned by ``filter_new``.
+        """
+        event_ids = set(_event_ids(raw_events))
+        for event_id in event_ids:
+            self._seen.pop(event_id)
+        if self.store is not None:
+            await self.store.release(event_ids)
+
+    async def _claim(self, raw_events: List[RawEvent]) -> Set[str]:
+        candidates = [
+            event_id
+            for event_id in _event_ids(raw_events)
+            if not self._seen.get(event_id)
+        ]
+        new_ids = set(candidates)
+        if self.store is not None and new_ids:
+            new_ids = await self.store.claim(new_ids)
+        for event_id in candidates:
+            self._seen.set(event_id, value=True)
+        return new_ids
+
+
+def _event_ids(raw_events: List[RawEvent]) -> List[str]:
+    return [
+        raw_event["webhookEventId"]
+        for raw_event in raw_events
+        if raw_event.get("webhookEventId")
+    ]
+
+
+def _is_new(raw_event: RawEvent, new_ids: Set[str]) -> bool:
+    event_id = raw_event.get("webhookEventId")
+    if not event_id:
+        return True
+    if event_id not in new_ids:
+        return False
+    # Same id twice in a body counts only once.
+    new_ids.discard(event_id)
+    return True
+
+
+event_deduplicator = WebhookEventDeduplicator(
+    max_size=settings.line_dedup_max_size,
+    ttl=settings.line_dedup_ttl,
+)
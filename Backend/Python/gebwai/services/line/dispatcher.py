@@ -0,0 +1,160 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from linebot.v3.webhooks import Event
+from loguru import logger
+
+from gebwai.services.line.events import source_key
+from gebwai.services.line.handlers import handle_event
+from gebwai.services.metrics import event_seconds
+from gebwai.settings import settings
+
+EventHandler = Callable[[Event], Awaitable[None]]
+# Event and the future resolved once it's handled.
+QueuedEvent = Tuple[Event, "asyncio.Future[None]"]
+
+
+class EventsNotHandledError(Exception):
+    """Handler of some dispatched events raised."""
+
+    def __init__(self, events: List[Event]) -> None:
+        super().__init__("{0} events weren't handled".format(len(events)))
+        self.events = events
+
+
+class _SourceLane:
+    """Queue of events of one source with a single consumer."""
+
+    def __init__(self, max_pending: int) -> None:
+        self.queue: "asyncio.Queue[QueuedEvent]" = asyncio.Queue(maxsize=max_pending)
+        # Events submitted to the lane and not handled yet.
+        self.pending = 0
+        self.task: "Optional[asyncio.Task[None]]" = None
+
+
+class SourceDispatcher:
+    """
+    Dispatcher of webhook events.
+
+    Events of different sources are handled concurrently,
+    events of the same source are handled one by one
+    in the order they were submitted, even across webhook calls.
+
+    Each source may have at most ``max_pending_per_source`` queued
+    events, submitting more waits for the source to catch up.
+    At most ``max_in_flight`` events are handled at the same time.
+    """
+
+    def __init__(
+        self,
+        handler: EventHandler,
+        max_in_flight: int,
+        max_pending_per_source: int,
+    ) -> None:
+        self.handler = handler
+        self.max_in_flight = max_in_flight
+        self.max_pending_per_source = max_pending_per_source
+        self._lanes: Dict[str, _SourceLane] = {}
+        # Created lazily to bind to the running event loop.
+        self._in_flight: Optional[asyncio.Semaphore] = None
+
+    async def submit(self, event: Event) -> "asyncio.Future[None]":
+        """
+        Put event in the queue of its source.
+
+        :param event: webhook event.
+        :return: future that resolves once the event is handled,
+            with the error of the handler if it raised.
+        """
+        key = source_key(event)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = _SourceLane(self.max_pending_per_source)
+            self._lanes[key] = lane
+            lane.task = asyncio.create_task(self._drain(key, lane))
+        lane.pending += 1
+
+        done: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        await lane.queue.put((event, done))
+        return done
+
+    async def dispatch(self, events: Iterable[Event]) -> None:
+        """
+        Handle events and wait until all of them are done.
+
+        A failed event doesn't stop the rest, its source goes on
+        with the next event.
+
+        :param events: webhook events in delivery order.
+        :raises EventsNotHandledError: if the handler of some events raised.
+        """
+        by_source: Dict[str, List[Event]] = {}
+        for event in events:
+            by_source.setdefault(source_key(event), []).append(event)
+        # A source whose queue is full must not hold up submitting the others.
+        failed = await asyncio.gather(
+            *(self._submit_all(source_events) for source_events in by_source.values()),
+        )
+        failed_events = [
+            failed_event for source_failed in failed for failed_event in source_failed
+        ]
+        if failed_events:
+            raise EventsNotHandledError(failed_events)
+
+    async def _submit_all(self, events: List[Event]) -> List[Event]:
+        futures: List["asyncio.Future[None]"] = []
+        for event in events:
+            futures.append(await self.submit(event))
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        return [
+            failed_event
+            for failed_event, result in zip(events, results)
+            if isinstance(result, BaseException)
+        ]
+
+    async def _drain(self, key: str, lane: _SourceLane) -> None:
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        while lane.pending:
+            event, done = await lane.queue.get()
+            try:  # noqa: WPS501
+                error = await self._handle(key, event, self._in_flight)
+            finally:
+                lane.pending -= 1
+            if not done.done():
+                _resolve(done, error)
+
+        del self._lanes[key]  # noqa: WPS420
+
+    async def _handle(
+        self,
+        key: str,
+        event: Event,
+        in_flight: asyncio.Semaphore,
+    ) -> Optional[Exception]:
+        started = time.perf_counter()
+        try:
+            async with in_flight:
+                await self.handler(event)
+        except Exception as error:
+            logger.exception("Cannot handle event of source {0}", key)
+            return error
+        finally:
+            event_seconds.observe(time.perf_counter() - started, event.type)
+        return None
+
+
+def _resolve(done: "asyncio.Future[None]", error: Optional[Exception]) -> None:
+    if error is None:
+        done.set_result(None)
+    else:
+        done.set_exception(error)
+
+
+dispatcher = SourceDispatcher(
+    handle_event,
+    max_in_flight=settings.line_dispatch_max_in_flight,
+    max_pending_per_source=settings.line_dispatch_max_pending_per_source,
+)
@@ -0,0 +1,50 @@
+from typing import Any, Dict, List
+
+from linebot.v3.webhooks import Event
+
+RawEvent = Dict[str, Any]
+
+
+def raw_source_key(raw_event: RawEvent) -> str:
+    """
+    Get the id of the chat a raw event came from.
+
+    Events from the same group, room or one-to-one chat share a key.
+
+    :param raw_event: event as decoded from the webhook body.
+    :return: group, room or user id, empty string if there is no source.
+    """
+    source = raw_event.get("source") or {}
+    chat_id = source.get("groupId") or source.get("roomId")
+    return chat_id or source.get("userId") or ""
+
+
+def group_by_source(raw_events: List[RawEvent]) -> Dict[str, List[RawEvent]]:
+    """
+    Split events by source, keeping delivery order inside each source.
+
+    :param raw_events: events as decoded from the webhook body.
+    :return: events of every source in the order they were delivered.
+    """
+    grouped: Dict[str, List[RawEvent]] = {}
+    for raw_event in raw_events:
+        grouped.setdefault(raw_source_key(raw_event), []).append(raw_event)
+    return grouped
+
+
+def source_key(event: Event) -> str:
+    """
+    Get the id of the chat a parsed event came from.
+
+    Same as ``raw_source_key`` but for event models.
+
+    :param event: parsed webhook event.
+    :return: group, room or user id, empty string if there is no source.
+    """
+    source = getattr(event, "source", None)
+    return (
+        getattr(source, "group_id", None)
+        or getattr(source, "room_id", None)
+        or getattr(source, "user_id", None)
+        or ""
+    )
@@ -0,0 +1,32 @@
+from linebot.v3.messaging import TextMessage
+from linebot.v3.webhooks import Event, MessageEvent, TextMessageContent, UnsendEvent
+
+from gebwai.services.items import forget_message, record_message
+from gebwai.services.line.events import source_key
+from gebwai.services.line.messaging import messenger
+
+# Types of webhook events worth parsing, others are dropped right away.
+HANDLED_EVENT_TYPES = frozenset(("message", "unsend"))
+
+
+async def handle_event(event: Event) -> None:
+    """
+    Handle single webhook event.
+
+    :param event: parsed webhook event.
+    """
+    if isinstance(event, UnsendEvent):
+        await forget_message(event.unsend.message_id)
+        return
+    if not isinstance(event, MessageEvent):
+        return
+    await record_message(event)
+    if not isinstance(event.message, TextMessageContent):
+        return
+
+    await messenger.reply(
+        event.reply_token,
+        [TextMessage(text=event.message.text)],
+        to=source_key(event),
+        received_at=event.timestamp / 1000,
+    )
@@ -0,0 +1,116 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col
+
+from gebwai.db.models.LINE.SourceLease import SourceLease
+from gebwai.settings import settings
+
+# Longest wait between two tries to take a lease held by another worker.
+MAX_POLL_INTERVAL = 1.0
+
+
+class SourceLock:
+    """
+    Serializes handling of a source across worker processes.
+
+    Holding the lock for a source keeps a lease row on its key, so
+    a delivery picked up by another worker waits until events of the
+    previous one are handled. Taking, renewing and releasing a lease
+    are short transactions, so no connection is kept while events are
+    handled and the pool isn't drained by busy sources. A lease is
+    renewed each third of ``ttl`` and is taken over once expired,
+    should its worker stop without releasing it.
+    Without an engine nothing is locked.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[AsyncEngine] = None,
+        ttl: float = 30,
+        poll_interval: float = 0.05,
+    ) -> None:
+        self.engine = engine
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+    @asynccontextmanager
+    async def hold(self, source_key: str) -> AsyncIterator[None]:
+        """
+        Lock a source for the duration of the block.
+
+        :param source_key: id of the group, room or user.
+        :yield: once the lock is taken.
+        """
+        if self.engine is None:
+            yield
+            return
+        token = uuid.uuid4().hex
+        await self._acquire(self.engine, source_key, token)
+        renewer = asyncio.create_task(
+            self._renew_forever(self.engine, source_key, token),
+        )
+        try:  # noqa: WPS501
+            yield
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+            async with self.engine.begin() as conn:
+                await conn.execute(
+                    delete(SourceLease).where(
+                        col(SourceLease.source_key) == source_key,
+                        col(SourceLease.token) == token,
+                    ),
+                )
+
+    async def _acquire(self, engine: AsyncEngine, source_key: str, token: str) -> None:
+        expires_at = func.now() + timedelta(seconds=self.ttl)
+        query = (
+            insert(SourceLease)
+            .values(source_key=source_key, token=token, expires_at=expires_at)
+            .on_conflict_do_update(
+                index_elements=[col(SourceLease.source_key)],
+                set_={"token": token, "expires_at": expires_at},
+                where=col(SourceLease.expires_at) < func.now(),
+            )
+            .returning(col(SourceLease.token))
+        )
+        delay = self.poll_interval
+        while True:  # noqa: WPS457
+            async with engine.begin() as conn:
+                if (await conn.execute(query)).scalar() is not None:
+                    return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_POLL_INTERVAL)
+
+    async def _renew_forever(
+        self,
+        engine: AsyncEngine,
+        source_key: str,
+        token: str,
+    ) -> None:
+        query = (
+            update(SourceLease)
+            .where(
+                col(SourceLease.source_key) == source_key,
+                col(SourceLease.token) == token,
+            )
+            .values(expires_at=func.now() + timedelta(seconds=self.ttl))
+        )
+        while True:  # noqa: WPS457
+            await asyncio.sleep(self.ttl / 3)
+            async with engine.begin() as conn:
+                renewed = (await conn.execute(query)).rowcount
+            if not renewed:
+                logger.warning("Lease of source {0} was taken over", source_key)
+                return
+
+
+source_lock = SourceLock(ttl=settings.line_source_lock_ttl)
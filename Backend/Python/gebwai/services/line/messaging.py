@@ -0,0 +1,430 @@
+import asyncio
+import itertools
+import time
+import uuid
+from http import HTTPStatus
+from operator import attrgetter
+from typing import (  # noqa: WPS235
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from linebot.v3.messaging import (
+    AsyncMessagingApi,
+    Message,
+    MulticastRequest,
+    PushMessageRequest,
+    ReplyMessageRequest,
+)
+from linebot.v3.messaging.exceptions import ApiException
+from loguru import logger
+
+from gebwai.services.line.client import create_messaging_api
+from gebwai.services.metrics import line_api_seconds
+from gebwai.services.ratelimit import TokenBucket
+from gebwai.settings import settings
+
+# Limits of the Messaging API.
+MAX_MESSAGES_PER_REQUEST = 5
+MAX_MULTICAST_RECIPIENTS = 500
+
+# Order outboxes are created in.
+_sequence = itertools.count()
+
+
+class _Outbox:
+    """Messages waiting to be sent with one reply token or to one chat."""
+
+    def __init__(self, to: Optional[str], received_at: Optional[float]) -> None:
+        self.to = to
+        self.received_at = received_at
+        self.sequence = next(_sequence)
+        self.messages: List[Message] = []
+        self.deliveries: "List[asyncio.Future[None]]" = []
+
+
+class _Send(NamedTuple):
+    """Messages sent to one chat, or to users who all get the same ones."""
+
+    messages: List[Message]
+    # Outboxes of each chat the messages come from, in order.
+    chats: List[List[_Outbox]]
+
+
+def _is_invalid_reply_token(error: ApiException) -> bool:
+    body = error.body or b""
+    if isinstance(body, bytes):
+        body = body.decode(errors="replace")
+    return error.status == HTTPStatus.BAD_REQUEST and "reply token" in body.lower()
+
+
+def _is_retryable(error: ApiException, retry_server_errors: bool) -> bool:
+    if error.status == HTTPStatus.TOO_MANY_REQUESTS:
+        return True
+    status = error.status or 0
+    return retry_server_errors and status >= HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def _group_chats(outboxes: List[_Outbox]) -> Dict[str, List[_Outbox]]:
+    chats: Dict[str, List[_Outbox]] = {}
+    for outbox in sorted(outboxes, key=attrgetter("sequence")):
+        chats.setdefault(str(outbox.to), []).append(outbox)
+    return chats
+
+
+def _send_key(to: str, messages: List[Message]) -> Tuple[str, ...]:
+    # Users getting the same messages share multicasts,
+    # groups and rooms only take pushes.
+    if to.startswith("U"):
+        return ("multicast", *(message.to_json() for message in messages))
+    return ("push", to)
+
+
+def _group_sends(outboxes: List[_Outbox]) -> List[_Send]:
+    sends: Dict[Tuple[str, ...], _Send] = {}
+    for to, chat in _group_chats(outboxes).items():
+        messages = [message for outbox in chat for message in outbox.messages]
+        send = sends.setdefault(_send_key(to, messages), _Send(messages, []))
+        send.chats.append(chat)
+    return [
+        _Send(send.messages, send.chats[offset : offset + MAX_MULTICAST_RECIPIENTS])
+        for send in sends.values()
+        for offset in range(0, len(send.chats), MAX_MULTICAST_RECIPIENTS)
+    ]
+
+
+def _owners(chat: List[_Outbox]) -> List[_Outbox]:
+    return [outbox for outbox in chat for _ in outbox.messages]
+
+
+def _resolve(
+    deliveries: "Sequence[asyncio.Future[None]]",
+    error: Optional[BaseException],
+) -> None:
+    for delivery in deliveries:
+        if delivery.done():
+            continue
+        if error is None:
+            delivery.set_result(None)
+        else:
+            delivery.set_exception(error)
+
+
+class LineMessenger:  # noqa: WPS230
+    """
+    Outbound messages to LINE.
+
+    Messages are collected for ``flush_delay`` seconds and sent
+    in as few requests as possible:
+
+    * messages for the same reply token are merged into one reply
+      of up to five messages, the rest is pushed to the chat;
+    * replies whose token is older than ``reply_token_ttl`` or
+      rejected by LINE are pushed to the chat instead;
+    * pushes to the same chat, including replies pushed instead,
+      are merged by five messages and sent one request after another
+      in the order they were queued;
+    * identical pushes to several users become one multicast.
+
+    Every endpoint has a token bucket with its LINE rate limit,
+    so bursts wait instead of getting 429 responses.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        api_factory: Callable[[], Awaitable[AsyncMessagingApi]],
+        rate_limits: Mapping[str, float],
+        reply_token_ttl: float,
+        flush_delay: float,
+        request_timeout: float,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.api_factory = api_factory
+        self.buckets = {
+            endpoint: TokenBucket(rate) for endpoint, rate in rate_limits.items()
+        }
+        self.reply_token_ttl = reply_token_ttl
+        self.flush_delay = flush_delay
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.clock = clock
+        self._api: Optional[AsyncMessagingApi] = None
+        self._api_lock: Optional[asyncio.Lock] = None
+        self._replies: Dict[str, _Outbox] = {}
+        self._pushes: Dict[str, _Outbox] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flushes: "Set[asyncio.Task[None]]" = set()
+
+    def reply(
+        self,
+        reply_token: str,
+        messages: Sequence[Message],
+        to: Optional[str] = None,
+        received_at: Optional[float] = None,
+    ) -> "asyncio.Future[None]":
+        """
+        Queue reply messages.
+
+        :param reply_token: reply token of the event.
+        :param messages: messages to send.
+        :param to: id of the chat to push to if the token can't be used.
+        :param received_at: unix time the event was sent by LINE.
+        :return: future that resolves once all messages are sent.
+        """
+        outbox = self._replies.get(reply_token)
+        if outbox is None:
+            outbox = _Outbox(to, received_at)
+            self._replies[reply_token] = outbox
+        return self._enqueue(outbox, messages)
+
+    def push(self, to: str, messages: Sequence[Message]) -> "asyncio.Future[None]":
+        """
+        Queue messages pushed to a user, group or room.
+
+        :param to: id of the chat.
+        :param messages: messages to send.
+        :return: future that resolves once all messages are sent.
+        """
+        outbox = self._pushes.get(to)
+        if outbox is None:
+            outbox = _Outbox(to, None)
+            self._pushes[to] = outbox
+        return self._enqueue(outbox, messages)
+
+    async def flush(self) -> None:
+        """Send everything queued so far and wait for it."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        await self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Send queued messages and close the connection pool."""
+        await self.flush()
+        if self._api is not None:
+            await self._api.api_client.close()
+            self._api = None
+
+    async def call(
+        self,
+        endpoint: str,
+        request: Callable[[AsyncMessagingApi], Awaitable[Any]],
+        retry_server_errors: bool = False,
+    ) -> Any:
+        """
+        Call an endpoint within its rate limit.
+
+        Requests rejected with 429 are retried with backoff. Server errors
+        are retried only for requests with a retry key, which LINE uses
+        to not send the same messages twice.
+
+        :param endpoint: name of the rate limited endpoint.
+        :param request: function sending the request with given client.
+        :param retry_server_errors: whether 5xx responses may be retried.
+        :raises ApiException: if LINE rejects the request.
+        :return: response of the endpoint.
+        """
+        api = await self._get_api()
+        for attempt in range(self.max_retries):
+            try:
+                return await self._call_once(endpoint, api, request)
+            except ApiException as error:
+                if not _is_retryable(error, retry_server_errors):
+                    raise
+            await asyncio.sleep(0.5 * 2**attempt)
+        return await self._call_once(endpoint, api, request)
+
+    def _enqueue(
+        self,
+        outbox: _Outbox,
+        messages: Sequence[Message],
+    ) -> "asyncio.Future[None]":
+        delivery: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        outbox.messages.extend(messages)
+        outbox.deliveries.append(delivery)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.flush_delay,
+                self._start_flush,
+            )
+        return delivery
+
+    def _start_flush(self) -> None:
+        self._flush_handle = None
+        task = asyncio.create_task(self._flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self) -> None:
+        leftovers = await self._send_replies()
+        pushes = self._pushes
+        self._pushes = {}
+        await self._send_pushes([*pushes.values(), *leftovers])
+
+    async def _send_replies(self) -> List[_Outbox]:
+        replies = self._replies
+        self._replies = {}
+        leftovers = await asyncio.gather(
+            *(self._send_reply(token, outbox) for token, outbox in replies.items()),
+        )
+        return [leftover for leftover in leftovers if leftover is not None]
+
+    async def _send_reply(
+        self,
+        reply_token: str,
+        outbox: _Outbox,
+    ) -> Optional[_Outbox]:
+        """
+        Send as much as possible with the reply token.
+
+        :param reply_token: reply token of the event.
+        :param outbox: messages for this token.
+        :return: outbox with messages that have to be pushed.
+        """
+        expired = (
+            outbox.received_at is not None
+            and self.clock() - outbox.received_at > self.reply_token_ttl
+        )
+        if not expired and not await self._reply_head(reply_token, outbox):
+            return None
+        if not outbox.messages:
+            _resolve(outbox.deliveries, None)
+            return None
+        if outbox.to is None:
+            _resolve(outbox.deliveries, RuntimeError("Reply token is expired"))
+            return None
+        return outbox
+
+    async def _reply_head(self, reply_token: str, outbox: _Outbox) -> bool:
+        """
+        Reply with the first messages of an outbox.
+
+        :param reply_token: reply token of the event.
+        :param outbox: messages for this token, sent ones are removed.
+        :return: False if sending failed and deliveries got the error.
+        """
+        head = outbox.messages[:MAX_MESSAGES_PER_REQUEST]
+        try:
+            await self.call(
+                "reply",
+                lambda api: api.reply_message(
+                    ReplyMessageRequest(reply_token=reply_token, messages=head),
+                    _request_timeout=self.request_timeout,
+                ),
+            )
+        except ApiException as error:
+            if outbox.to is None or not _is_invalid_reply_token(error):
+                _resolve(outbox.deliveries, error)
+                return False
+            logger.info("Reply token expired, pushing to {0}", outbox.to)
+            return True
+        except Exception as error:
+            _resolve(outbox.deliveries, error)
+            return False
+        outbox.messages = outbox.messages[MAX_MESSAGES_PER_REQUEST:]
+        return True
+
+    async def _send_pushes(self, outboxes: List[_Outbox]) -> None:
+        sent = await asyncio.gather(
+            *(self._send_chunks(send) for send in _group_sends(outboxes)),
+        )
+        errors: Dict[int, BaseException] = {}
+        for unsent in sent:
+            errors.update(unsent)
+        for outbox in outboxes:
+            _resolve(outbox.deliveries, errors.get(id(outbox)))
+
+    async def _send_chunks(self, send: _Send) -> Dict[int, BaseException]:
+        """
+        Send messages to chats one request after another.
+
+        :param send: messages and their chats.
+        :return: errors by id of the outboxes whose messages weren't sent.
+        """
+        recipients = [str(chat[0].to) for chat in send.chats]
+        for offset in range(0, len(send.messages), MAX_MESSAGES_PER_REQUEST):
+            chunk = send.messages[offset : offset + MAX_MESSAGES_PER_REQUEST]
+            try:
+                await self._send_chunk(recipients, chunk)
+            except Exception as error:
+                # Later messages aren't sent either, so chats keep their order.
+                return {
+                    id(owner): error
+                    for chat in send.chats
+                    for owner in _owners(chat)[offset:]
+                }
+        return {}
+
+    async def _send_chunk(self, recipients: List[str], messages: List[Message]) -> None:
+        if len(recipients) == 1:
+            await self._push(recipients[0], messages)
+        else:
+            await self._multicast(recipients, messages)
+
+    async def _push(self, to: str, messages: List[Message]) -> None:
+        retry_key = str(uuid.uuid4())
+        await self.call(
+            "push",
+            lambda api: api.push_message(
+                PushMessageRequest(to=to, messages=messages),
+                x_line_retry_key=retry_key,
+                _request_timeout=self.request_timeout,
+            ),
+            retry_server_errors=True,
+        )
+
+    async def _multicast(self, recipients: List[str], messages: List[Message]) -> None:
+        retry_key = str(uuid.uuid4())
+        await self.call(
+            "multicast",
+            lambda api: api.multicast(
+                MulticastRequest(to=recipients, messages=messages),
+                x_line_retry_key=retry_key,
+                _request_timeout=self.request_timeout,
+            ),
+            retry_server_errors=True,
+        )
+
+    async def _call_once(
+        self,
+        endpoint: str,
+        api: AsyncMessagingApi,
+        request: Callable[[AsyncMessagingApi], Awaitable[Any]],
+    ) -> Any:
+        bucket = self.buckets.get(endpoint)
+        if bucket is not None:
+            await bucket.acquire()
+        started = time.perf_counter()
+        try:  # noqa: WPS501
+            return await request(api)
+        finally:
+            line_api_seconds.observe(time.perf_counter() - started, endpoint)
+
+    async def _get_api(self) -> AsyncMessagingApi:
+        if self._api_lock is None:
+            self._api_lock = asyncio.Lock()
+        async with self._api_lock:
+            if self._api is None:
+                self._api = await self.api_factory()
+        return self._api
+
+
+messenger = LineMessenger(
+    create_messaging_api,
+    rate_limits=settings.line_api_rate_limits,
+    reply_token_ttl=settings.line_reply_token_ttl,
+    flush_delay=settings.line_messages_flush_delay,
+    request_timeout=settings.line_api_timeout,
+)
@@ -0,0 +1,146 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AbstractSet, Iterable, Iterator, List, Optional
+
+import ujson
+from linebot.v3.exceptions import InvalidSignatureError
+from linebot.v3.webhooks import Event
+from loguru import logger
+
+from gebwai.services.line.events import RawEvent
+from gebwai.services.line.handlers import HANDLED_EVENT_TYPES
+from gebwai.settings import ExecutorKind, settings
+
+
+def verify_and_decode(
+    channel_secret: bytes,
+    body: bytes,
+    signature: Optional[str],
+    event_types: AbstractSet[str],
+) -> List[RawEvent]:
+    """
+    Check webhook signature and decode events of the given types.
+
+    HMAC is computed over the raw body, so the body is never
+    decoded to ``str``. It's a module level function to be usable
+    in a process pool.
+
+    :param channel_secret: LINE channel secret.
+    :param body: raw webhook request body.
+    :param signature: value of the X-Line-Signature header.
+    :param event_types: webhook event types to keep.
+    :raises InvalidSignatureError: if the signature doesn't match the body.
+    :return: events as plain dicts.
+    """
+    digest = base64.b64encode(hmac.new(channel_secret, body, hashlib.sha256).digest())
+    if not signature or not hmac.compare_digest(signature.encode(), digest):
+        raise InvalidSignatureError(f"Invalid signature. signature={signature}")
+
+    return [
+        raw_event
+        for raw_event in ujson.loads(body)["events"]
+        if raw_event.get("type") in event_types
+    ]
+
+
+def build_events(raw_events: Iterable[RawEvent]) -> Iterator[Event]:
+    """
+    Build event models one by one.
+
+    :param raw_events: events as decoded from the webhook body.
+    :yields: parsed events, unknown ones are skipped.
+    """
+    for raw_event in raw_events:
+        try:
+            yield Event.from_dict(raw_event)
+        except ValueError:
+            logger.info("Unknown event type. type={0}", raw_event.get("type"))
+
+
+class WebhookBodyParser:
+    """
+    Parser of webhook bodies that keeps big ones off the event loop.
+
+    Bodies longer than ``offload_bytes`` are verified and decoded
+    in a thread or process pool, smaller ones inline, since
+    handing them over to a pool costs more than parsing.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        channel_secret: str,
+        event_types: AbstractSet[str],
+        offload_bytes: int,
+        executor_kind: ExecutorKind = ExecutorKind.THREAD,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        self.channel_secret = channel_secret.encode()
+        self.event_types = frozenset(event_types)
+        self.offload_bytes = offload_bytes
+        self.executor_kind = executor_kind
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+
+    def parse_sync(self, body: bytes, signature: Optional[str]) -> List[RawEvent]:
+        """
+        Verify and decode body in the current thread.
+
+        :param body: raw webhook request body.
+        :param signature: value of the X-Line-Signature header.
+        :return: events of handled types as plain dicts.
+        """
+        return verify_and_decode(
+            self.channel_secret,
+            body,
+            signature,
+            self.event_types,
+        )
+
+    async def parse(self, body: bytes, signature: Optional[str]) -> List[RawEvent]:
+        """
+        Verify and decode body, offloading big ones to a pool.
+
+        :param body: raw webhook request body.
+        :param signature: value of the X-Line-Signature header.
+        :return: events of handled types as plain dicts.
+        """
+        if len(body) <= self.offload_bytes:
+            return self.parse_sync(body, signature)
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(),
+            verify_and_decode,
+            self.channel_secret,
+            body,
+            signature,
+            self.event_types,
+        )
+
+    def shutdown(self) -> None:
+        """Stop the pool if it was started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == ExecutorKind.PROCESS:
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers,
+                    thread_name_prefix="line-parser",
+                )
+        return self._executor
+
+
+webhook_parser = WebhookBodyParser(
+    settings.LINE_CHANNEL_SECRET,
+    event_types=HANDLED_EVENT_TYPES,
+    offload_bytes=settings.line_parse_offload_bytes,
+    executor_kind=settings.line_parse_executor,
+    max_workers=settings.line_parse_workers,
+)
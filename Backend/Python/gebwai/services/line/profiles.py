@@ -0,0 +1,262 @@
+import time
+from functools import partial
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from linebot.v3.messaging import AsyncMessagingApi
+from linebot.v3.messaging.exceptions import ApiException
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from gebwai.brokers.queues import TaskQueue
+from gebwai.db.dao.line_profile_dao import LINEProfileDAO
+from gebwai.db.models.LINE.GroupSummary import GroupSummary
+from gebwai.db.models.LINE.UserProfile import BaseLINEUser
+from gebwai.services.cache import LRUTTLCache
+from gebwai.services.line.messaging import LineMessenger, messenger
+from gebwai.services.singleflight import SingleFlight
+from gebwai.settings import settings
+from gebwai.tkq import broker, task_cache
+
+# Kind of the entry, ``user`` or ``group``, and LINE id.
+CacheKey = Tuple[str, str]
+# Cached value and unix time it was fetched from LINE.
+Cached = Tuple[Optional[Any], float]
+# Stored value and seconds since it was fetched.
+Stored = Optional[Tuple[Any, float]]
+StoredLoader = Callable[[LINEProfileDAO], Awaitable[Stored]]
+Fetcher = Callable[[], Awaitable[Optional[Any]]]
+
+
+class LineProfileCache:
+    """
+    Read-through cache of LINE user profiles and group summaries.
+
+    Lookups go to an in-process LRU cache, then to the database,
+    then to the Messaging API. Concurrent lookups of the same id
+    share one load. Entries older than ``fresh_for`` seconds are
+    still served, while a taskiq task refreshes them in background.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        line_messenger: LineMessenger,
+        max_size: int,
+        local_ttl: float,
+        fresh_for: float,
+        session_factory: "Optional[async_sessionmaker[AsyncSession]]" = None,
+    ) -> None:
+        self.messenger = line_messenger
+        self.fresh_for = fresh_for
+        self.session_factory = session_factory
+        # Stored profiles are read with it if set, e.g. from a replica.
+        self.readonly_session_factory: Optional[Callable[[], AsyncSession]] = None
+        self._local: LRUTTLCache[CacheKey, Cached] = LRUTTLCache(max_size, local_ttl)
+        # Ids with refresh already enqueued, to not enqueue it per lookup.
+        self._refreshing: LRUTTLCache[CacheKey, bool] = LRUTTLCache(max_size, ttl=60)
+        self._loads: SingleFlight[CacheKey, Cached] = SingleFlight()
+
+    async def get_user(
+        self,
+        user_id: str,
+        group_id: Optional[str] = None,
+    ) -> Optional[BaseLINEUser]:
+        """
+        Get profile of a user.
+
+        :param user_id: LINE user id.
+        :param group_id: group the user is in, used if they aren't a friend.
+        :return: profile or None if LINE doesn't share it.
+        """
+        key = ("user", user_id)
+        return await self._get(
+            key,
+            partial(LINEProfileDAO.get_user, user_id=user_id),
+            partial(self.refresh_user, user_id, group_id),
+            partial(refresh_line_user.kiq, user_id, group_id),
+        )
+
+    async def get_group(self, group_id: str) -> Optional[GroupSummary]:
+        """
+        Get summary of a group.
+
+        :param group_id: LINE group id.
+        :return: summary or None if the bot isn't in the group.
+        """
+        key = ("group", group_id)
+        return await self._get(
+            key,
+            partial(LINEProfileDAO.get_group, group_id=group_id),
+            partial(self.refresh_group, group_id),
+            partial(refresh_line_group.kiq, group_id),
+        )
+
+    async def get_source_name(self, source_id: str) -> str:
+        """
+        Get human readable name of a chat.
+
+        :param source_id: id of a group, room or user.
+        :return: group name, user display name or the id itself.
+        """
+        if source_id.startswith("C"):
+            group = await self.get_group(source_id)
+            return group.group_name if group else source_id
+        if source_id.startswith("U"):
+            user = await self.get_user(source_id)
+            return user.display_name if user else source_id
+        return source_id
+
+    async def refresh_user(
+        self,
+        user_id: str,
+        group_id: Optional[str] = None,
+    ) -> Optional[BaseLINEUser]:
+        """
+        Fetch profile of a user from LINE and store it.
+
+        :param user_id: LINE user id.
+        :param group_id: group the user is in, used if they aren't a friend.
+        :return: fetched profile or None if LINE doesn't share it.
+        """
+        response = await self._fetch(
+            "profile",
+            lambda api: api.get_profile(user_id),
+        )
+        if response is None and group_id:
+            response = await self._fetch(
+                "profile",
+                lambda api: api.get_group_member_profile(group_id, user_id),
+            )
+        if response is None:
+            return None
+
+        profile = BaseLINEUser.model_validate(response, from_attributes=True)
+        await self._store(lambda dao: dao.upsert_user(profile))
+        self._local.set(("user", user_id), (profile, time.time()))
+        return profile
+
+    async def refresh_group(self, group_id: str) -> Optional[GroupSummary]:
+        """
+        Fetch summary of a group from LINE and store it.
+
+        :param group_id: LINE group id.
+        :return: fetched summary or None if the bot isn't in the group.
+        """
+        response = await self._fetch(
+            "group_summary",
+            lambda api: api.get_group_summary(group_id),
+        )
+        if response is None:
+            return None
+
+        summary = GroupSummary.model_validate(response, from_attributes=True)
+        await self._store(lambda dao: dao.upsert_group(summary))
+        self._local.set(("group", group_id), (summary, time.time()))
+        return summary
+
+    async def _get(
+        self,
+        key: CacheKey,
+        load_stored: StoredLoader,
+        fetch: Fetcher,
+        enqueue_refresh: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        cached = self._local.get(key)
+        if cached is None:
+            cached = await self._loads.do(
+                key,
+                partial(self._load, key, load_stored, fetch),
+            )
+
+        value, fetched_at = cached
+        stale = time.time() - fetched_at > self.fresh_for
+        if stale and not self._refreshing.get(key):
+            self._refreshing.set(key, value=True)
+            await enqueue_refresh()
+        return value
+
+    async def _load(
+        self,
+        key: CacheKey,
+        load_stored: StoredLoader,
+        fetch: Fetcher,
+    ) -> Cached:
+        session_factory = self.readonly_session_factory or self.session_factory
+        if session_factory is not None:
+            async with session_factory() as session:
+                stored = await load_stored(LINEProfileDAO(session))
+            if stored is not None:
+                cached = (stored[0], time.time() - stored[1])
+                self._local.set(key, cached)
+                return cached
+
+        value = await fetch()
+        cached = (value, time.time())
+        # Missing profiles are cached too, so they aren't fetched per event.
+        self._local.set(key, cached)
+        return cached
+
+    async def _fetch(
+        self,
+        endpoint: str,
+        request: Callable[[AsyncMessagingApi], Awaitable[Any]],
+    ) -> Optional[Any]:
+        try:
+            return await self.messenger.call(endpoint, request)
+        except ApiException as error:
+            if error.status in {403, 404}:
+                return None
+            raise
+
+    async def _store(
+        self,
+        upsert: Callable[[LINEProfileDAO], Awaitable[None]],
+    ) -> None:
+        if self.session_factory is None:
+            return
+        async with self.session_factory() as session:
+            await upsert(LINEProfileDAO(session))
+            await session.commit()
+
+
+profile_cache = LineProfileCache(
+    messenger,
+    max_size=settings.line_profile_cache_size,
+    local_ttl=settings.line_profile_cache_ttl,
+    fresh_for=settings.line_profile_fresh_for,
+)
+
+
+@task_cache.cached(
+    key=lambda user_id, group_id=None: user_id,
+    ttl=settings.line_profile_cache_ttl,
+)
+@broker.task(
+    task_name="line:refresh_user",
+    queue=TaskQueue.BACKGROUND.value,
+    fair_by="user_id",
+)
+async def refresh_line_user(user_id: str, group_id: Optional[str] = None) -> None:
+    """
+    Refresh stored profile of a user.
+
+    :param user_id: LINE user id.
+    :param group_id: group the user is in, used if they aren't a friend.
+    """
+    await profile_cache.refresh_user(user_id, group_id)
+
+
+@task_cache.cached(
+    key=lambda group_id: group_id,
+    ttl=settings.line_profile_cache_ttl,
+)
+@broker.task(
+    task_name="line:refresh_group",
+    queue=TaskQueue.BACKGROUND.value,
+    fair_by="group_id",
+)
+async def refresh_line_group(group_id: str) -> None:
+    """
+    Refresh stored summary of a group.
+
+    :param group_id: LINE group id.
+    """
+    await profile_cache.refresh_group(group_id)
@@ -0,0 +1,35 @@
+from typing import List
+
+from gebwai.brokers.queues import TaskQueue
+from gebwai.services.line.dispatcher import EventsNotHandledError, dispatcher
+from gebwai.services.line.events import RawEvent
+from gebwai.services.line.locks import source_lock
+from gebwai.services.line.parser import build_events
+from gebwai.tkq import broker
+
+
+@broker.task(
+    task_name="line:process_source_events",
+    queue=TaskQueue.REPLIES.value,
+    fair_by="source_key",
+)
+async def process_source_events(source_key: str, raw_events: List[RawEvent]) -> None:
+    """
+    Handle events of one chat in the order LINE delivered them.
+
+    Webhook body is split into one task per source and the dispatcher
+    handles events of the same source one by one inside a worker process,
+    so a group never sees its events handled out of order.
+    Deliveries of a source picked up by different worker processes
+    are handled one at a time under the source's lock.
+
+    :param source_key: id of the group, room or user the events came from.
+    :param raw_events: events as decoded from the webhook body.
+    """
+    async with source_lock.hold(source_key):
+        try:
+            await dispatcher.dispatch(build_events(raw_events))
+        except EventsNotHandledError:
+            # Retrying the task would handle the other events again,
+            # the failures are logged by the dispatcher.
+            return
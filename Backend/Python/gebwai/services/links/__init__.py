@@ -0,0 +1 @@
+"""Previews of collected links."""
@@ -0,0 +1,106 @@
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from gebwai.db.models.link_model import LinkMetadata
+
+# Meta tags read from a page, Open Graph first.
+_META_NAMES = frozenset(
+    (
+        "og:title",
+        "og:description",
+        "og:image",
+        "og:site_name",
+        "twitter:title",
+        "twitter:description",
+        "twitter:image",
+        "description",
+    ),
+)
+_MAX_TITLE = 300
+_MAX_DESCRIPTION = 1000
+
+Attributes = List[Tuple[str, Optional[str]]]
+
+
+class HeadParser(HTMLParser):
+    """
+    Incremental parser of the title and meta tags of an HTML page.
+
+    Feed it the page as it's read, ``done`` is set once
+    the head is over, so the rest doesn't need to be read.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.done = False
+        self.meta: Dict[str, str] = {}
+        self._title: List[str] = []
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs: Attributes) -> None:
+        """
+        Read meta tags and notice where the title and body start.
+
+        :param tag: tag name.
+        :param attrs: tag attributes.
+        """
+        if tag == "body":
+            self.done = True
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "meta":
+            self._read_meta(dict(attrs))
+
+    def handle_endtag(self, tag: str) -> None:
+        """
+        Notice where the title and head end.
+
+        :param tag: tag name.
+        """
+        if tag == "head":
+            self.done = True
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data: str) -> None:
+        """
+        Collect text of the title.
+
+        :param data: text between tags.
+        """
+        if self._in_title:
+            self._title.append(data)
+
+    def metadata(self, url: str, content_type: Optional[str]) -> LinkMetadata:
+        """
+        Get what was found so far.
+
+        :param url: URL the page was read from, for relative image links.
+        :param content_type: media type of the page.
+        :return: link metadata.
+        """
+        title = (
+            self.meta.get("og:title")
+            or self.meta.get("twitter:title")
+            or " ".join("".join(self._title).split())
+        )
+        description = (
+            self.meta.get("og:description")
+            or self.meta.get("twitter:description")
+            or self.meta.get("description")
+        )
+        image = self.meta.get("og:image") or self.meta.get("twitter:image")
+        return LinkMetadata(
+            title=title[:_MAX_TITLE] or None,
+            description=description[:_MAX_DESCRIPTION] if description else None,
+            image_url=urljoin(url, image) if image else None,
+            site_name=self.meta.get("og:site_name"),
+            content_type=content_type,
+        )
+
+    def _read_meta(self, attributes: Dict[str, Optional[str]]) -> None:
+        name = attributes.get("property") or attributes.get("name") or ""
+        content = (attributes.get("content") or "").strip()
+        if name.lower() in _META_NAMES and content:
+            self.meta.setdefault(name.lower(), content)
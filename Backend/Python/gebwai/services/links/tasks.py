@@ -0,0 +1,26 @@
+import asyncio
+
+from gebwai.brokers.queues import TaskQueue
+from gebwai.services.links.unfurler import link_unfurler
+from gebwai.services.links.urls import find_links
+from gebwai.settings import settings
+from gebwai.tkq import broker, task_cache
+
+
+@task_cache.cached(
+    key=lambda text: " ".join(find_links(text, settings.link_unfurl_max_links)),
+    ttl=settings.link_unfurl_ttl,
+)
+@broker.task(task_name="links:unfurl", queue=TaskQueue.BACKGROUND.value)
+async def unfurl_links(text: str) -> None:
+    """
+    Fetch previews of links in a collected message.
+
+    :param text: message text.
+    """
+    await asyncio.gather(
+        *(
+            link_unfurler.unfurl(url)
+            for url in find_links(text, settings.link_unfurl_max_links)
+        ),
+    )
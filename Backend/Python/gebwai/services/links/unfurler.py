@@ -0,0 +1,310 @@
+import asyncio
+import codecs
+import ipaddress
+import socket
+from collections import Counter
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from gebwai.db.dao.link_dao import LinkPreviewDAO
+from gebwai.db.models.link_model import LinkMetadata
+from gebwai.services.cache import LRUTTLCache
+from gebwai.services.links.metadata import HeadParser
+from gebwai.services.links.urls import normalize_url
+from gebwai.services.singleflight import SingleFlight
+from gebwai.settings import settings
+
+_REDIRECTS = frozenset((301, 302, 303, 307, 308))
+_HTML_TYPES = frozenset(("text/html", "application/xhtml+xml"))
+_CHUNK_SIZE = 4096
+# Seconds to keep resolved addresses of linked hosts.
+DNS_CACHE_TTL = 300
+
+
+class LinkUnavailableError(Exception):
+    """A link couldn't be fetched."""
+
+
+class PublicResolver(AbstractResolver):
+    """
+    DNS resolver that only returns addresses on the public internet.
+
+    Keeps links in messages from reaching the worker's own network,
+    including through redirects and DNS records changed after a check.
+    """
+
+    def __init__(self) -> None:
+        self._resolver = aiohttp.DefaultResolver()
+
+    async def resolve(
+        self,
+        host: str,
+        port: int = 0,
+        family: int = socket.AF_INET,
+    ) -> List[Dict[str, Any]]:
+        """
+        Resolve a host name to its public addresses.
+
+        :param host: host name.
+        :param port: port to connect to.
+        :param family: address family.
+        :return: addresses as aiohttp expects them.
+        :raises OSError: if the host has no public address.
+        """
+        public = [
+            address
+            for address in await self._resolver.resolve(host, port, family)
+            if ipaddress.ip_address(address["host"]).is_global
+        ]
+        if not public:
+            raise OSError(f"{host} has no public address.")
+        return public
+
+    async def close(self) -> None:
+        """Close the wrapped resolver."""
+        await self._resolver.close()
+
+
+class LinkUnfurler:  # noqa: WPS230
+    """
+    Read-through cache of link titles, descriptions and preview images.
+
+    Lookups go to an in-process LRU cache, then to the database,
+    then to the link itself. Concurrent lookups of the same normalized
+    URL share one load, and previews are fetched again once they're
+    ``ttl`` seconds old. Links that can't be fetched are retried after
+    ``failure_ttl`` seconds.
+
+    Links are fetched by one pooled HTTP client, at most
+    ``domain_concurrency`` at once per host. A ``HEAD`` request tells
+    what the link is, only HTML pages are read with a ``GET``,
+    and reading stops after the head or ``max_bytes`` bytes.
+    Addresses outside the public internet are refused unless
+    ``allow_private`` is set.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        max_bytes: int,
+        timeout: float,
+        max_concurrency: int,
+        domain_concurrency: int,
+        ttl: float,
+        cache_size: int,
+        user_agent: str,
+        failure_ttl: float = 5 * 60,
+        max_redirects: int = 5,
+        allow_private: bool = False,
+        session_factory: "Optional[async_sessionmaker[AsyncSession]]" = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.domain_concurrency = domain_concurrency
+        self.ttl = ttl
+        self.user_agent = user_agent
+        self.failure_ttl = failure_ttl
+        self.max_redirects = max_redirects
+        self.allow_private = allow_private
+        self.session_factory = session_factory
+        self._local: LRUTTLCache[str, LinkMetadata] = LRUTTLCache(cache_size, ttl)
+        self._loads: SingleFlight[str, LinkMetadata] = SingleFlight()
+        self._domains: Dict[str, asyncio.Semaphore] = {}
+        self._domain_users: "Counter[str]" = Counter()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def unfurl(self, url: str) -> LinkMetadata:
+        """
+        Get preview of a link.
+
+        :param url: http or https URL.
+        :return: metadata, empty if there's nothing to preview.
+        :raises ValueError: if it's not an http or https URL.
+        """  # noqa: DAR402
+        key = normalize_url(url)
+        cached = self._local.get(key)
+        if cached is not None:
+            return cached
+        return await self._loads.do(key, lambda: self._load(key))
+
+    async def fetch(self, url: str) -> LinkMetadata:
+        """
+        Fetch preview of a link, bypassing caches.
+
+        :param url: normalized URL.
+        :return: metadata, empty if there's nothing to preview.
+        :raises LinkUnavailableError: if the link can't be fetched.
+        """
+        host = urlsplit(url).hostname or ""
+        try:
+            async with self._domain_slot(host):
+                return await self._fetch(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as error:
+            raise LinkUnavailableError(f"Can't fetch {url}: {error!r}") from error
+
+    async def close(self) -> None:
+        """Close pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _load(self, key: str) -> LinkMetadata:
+        stored = await self._load_stored(key)
+        if stored is not None:
+            return stored
+        try:
+            metadata = await self.fetch(key)
+        except LinkUnavailableError as error:
+            logger.debug("No preview of a link: {0}", error)
+            metadata = LinkMetadata()
+            self._local.set(key, metadata, ttl=self.failure_ttl)
+            return metadata
+        await self._store(key, metadata)
+        self._local.set(key, metadata)
+        return metadata
+
+    async def _load_stored(self, key: str) -> Optional[LinkMetadata]:
+        # Stored previews are cached for the rest of their ttl.
+        if self.session_factory is None:
+            return None
+        async with self.session_factory() as session:
+            stored = await LinkPreviewDAO(session).get_preview(key)
+        if stored is None:
+            return None
+        preview, age = stored
+        if age >= self.ttl:
+            return None
+        self._local.set(key, preview, ttl=self.ttl - age)
+        return preview
+
+    async def _store(self, key: str, metadata: LinkMetadata) -> None:
+        if self.session_factory is None:
+            return
+        async with self.session_factory() as session:
+            await LinkPreviewDAO(session).upsert_preview(key, metadata)
+            await session.commit()
+
+    async def _fetch(self, url: str) -> LinkMetadata:
+        async with await self._request("HEAD", url) as head:
+            if head.status < HTTPStatus.BAD_REQUEST:
+                url = str(head.url)
+                if head.content_type not in _HTML_TYPES:
+                    return _not_a_page(url, head.content_type)
+        async with await self._request(
+            "GET",
+            url,
+            headers={"Range": "bytes=0-{0}".format(self.max_bytes - 1)},
+        ) as response:
+            if response.status >= HTTPStatus.BAD_REQUEST:
+                raise LinkUnavailableError(f"{url} answered {response.status}.")
+            if response.content_type not in _HTML_TYPES:
+                return _not_a_page(str(response.url), response.content_type)
+            return await self._read_head(response)
+
+    async def _read_head(self, response: aiohttp.ClientResponse) -> LinkMetadata:
+        try:
+            decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(
+                errors="replace",
+            )
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        parser = HeadParser()
+        read = 0
+        async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+            chunk = chunk[: self.max_bytes - read]
+            read += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or read >= self.max_bytes:
+                break
+        return parser.metadata(str(response.url), response.content_type)
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> aiohttp.ClientResponse:
+        # Redirects are followed here, so every hop is checked.
+        session = self._get_session()
+        for _ in range(self.max_redirects + 1):
+            self._check_address(url)
+            response = await session.request(
+                method,
+                url,
+                headers=headers,
+                allow_redirects=False,
+            )
+            location = response.headers.get("Location")
+            if response.status not in _REDIRECTS or not location:
+                return response
+            response.release()
+            url = urljoin(str(response.url), location)
+        raise LinkUnavailableError(f"Too many redirects to {url}.")
+
+    def _check_address(self, url: str) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in {"http", "https"} or not parts.hostname:
+            raise LinkUnavailableError(f"Not a web link: {url}.")
+        if self.allow_private:
+            return
+        try:
+            address = ipaddress.ip_address(parts.hostname)
+        except ValueError:
+            return  # Host names are checked by the resolver.
+        if not address.is_global:
+            raise LinkUnavailableError(f"{url} isn't on the public internet.")
+
+    @asynccontextmanager
+    async def _domain_slot(self, host: str) -> AsyncIterator[None]:
+        semaphore = self._domains.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.domain_concurrency)
+            self._domains[host] = semaphore
+        self._domain_users[host] += 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._domain_users[host] -= 1
+            if not self._domain_users[host]:
+                del self._domain_users[host]  # noqa: WPS420
+                del self._domains[host]  # noqa: WPS420
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency,
+                    ttl_dns_cache=DNS_CACHE_TTL,
+                    enable_cleanup_closed=True,
+                    resolver=None if self.allow_private else PublicResolver(),
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": self.user_agent, "Accept": "text/html,*/*"},
+            )
+        return self._session
+
+
+def _not_a_page(url: str, content_type: str) -> LinkMetadata:
+    return LinkMetadata(
+        image_url=url if content_type.startswith("image/") else None,
+        content_type=content_type,
+    )
+
+
+link_unfurler = LinkUnfurler(
+    max_bytes=settings.link_unfurl_max_bytes,
+    timeout=settings.link_unfurl_timeout,
+    max_concurrency=settings.link_unfurl_concurrency,
+    domain_concurrency=settings.link_unfurl_domain_concurrency,
+    ttl=settings.link_unfurl_ttl,
+    cache_size=settings.link_unfurl_cache_size,
+    user_agent=settings.link_unfurl_user_agent,
+)
@@ -0,0 +1,80 @@
+import ipaddress
+import re
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+_URL = re.compile(r"https?://[^\s<>\"']+", re.IGNORECASE)
+# Closing punctuation of the sentence around a link.
+_TRAILING = ".,;:!?)]}"
+# Query parameters that only track where a link was shared.
+_TRACKING = re.compile(r"^(utm_\w+|fbclid|gclid|igshid|mc_cid|mc_eid)$")
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_IPV6 = 6
+
+
+def normalize_url(url: str) -> str:
+    """
+    Make the canonical form of a web link, used as its cache key.
+
+    Scheme and host are lowercased, hosts are IDNA encoded, default ports,
+    credentials, fragments and tracking parameters are dropped
+    and the rest of the query is sorted.
+
+    :param url: link as written in a message.
+    :return: normalized URL.
+    :raises ValueError: if it's not an http or https URL.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        raise ValueError("Not a web link: {0!r}.".format(url))
+    netloc = _normalize_host(parts.hostname)
+    if parts.port not in {None, _DEFAULT_PORTS[scheme]}:
+        netloc = "{0}:{1}".format(netloc, parts.port)
+    path = parts.path or "/"
+    return urlunsplit((scheme, netloc, path, _clean_query(parts.query), ""))
+
+
+def find_links(text: str, limit: int) -> List[str]:
+    """
+    Find web links in a message.
+
+    :param text: message text.
+    :param limit: maximum number of links.
+    :return: distinct normalized URLs in order of appearance.
+    """
+    found: List[str] = []
+    for match in _URL.finditer(text):
+        url = _normalize_or_none(match.group().rstrip(_TRAILING))
+        if url is not None and url not in found:
+            found.append(url)
+            if len(found) == limit:
+                break
+    return found
+
+
+def _normalize_host(host: str) -> str:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return host.encode("idna").decode()
+    if address.version == _IPV6:
+        return "[{0}]".format(address)
+    return str(address)
+
+
+def _clean_query(query: str) -> str:
+    # Drops tracking parameters and sorts the rest.
+    kept = [
+        (name, value)
+        for name, value in parse_qsl(query, keep_blank_values=True)
+        if not _TRACKING.match(name)
+    ]
+    return urlencode(sorted(kept))
+
+
+def _normalize_or_none(url: str) -> Optional[str]:
+    try:
+        return normalize_url(url)
+    except ValueError:
+        return None
@@ -0,0 +1 @@
+"""Content of collected LINE messages."""
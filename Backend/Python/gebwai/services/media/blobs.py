@@ -0,0 +1,236 @@
+import asyncio
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Awaitable, Callable, Iterable, List, Optional, TypeVar
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from gebwai.db.dao.blob_dao import BlobDAO
+from gebwai.db.models.blob_model import Blob
+from gebwai.services.media.downloader import (
+    MediaDownloader,
+    StoredContent,
+    media_downloader,
+)
+from gebwai.settings import settings
+
+ResultType = TypeVar("ResultType")
+
+
+def blob_key(sha256: str) -> str:
+    """
+    Get storage key of content.
+
+    :param sha256: hash of the content.
+    :return: storage key.
+    """
+    return "blobs/{0}/{1}/{2}".format(sha256[:2], sha256[2:4], sha256)
+
+
+def poster_key(sha256: str) -> str:
+    """
+    Get storage key of LINE's preview image of a video.
+
+    :param sha256: hash of the video.
+    :return: storage key next to the video.
+    """
+    return "{0}.poster.jpg".format(blob_key(sha256))
+
+
+def derivative_key(sha256: str, max_side: int) -> str:
+    """
+    Get storage key of a thumbnail or preview.
+
+    :param sha256: hash of the image or video.
+    :param max_side: longer side of the derivative in pixels.
+    :return: storage key next to the content.
+    """
+    return "{0}.{1}.jpg".format(blob_key(sha256), max_side)
+
+
+def staging_key(message_id: str) -> str:
+    """
+    Get storage key of content being downloaded.
+
+    :param message_id: LINE message id.
+    :return: storage key.
+    """
+    return f"incoming/{message_id}"
+
+
+class BlobStore:  # noqa: WPS230
+    """
+    Content-addressed storage of collected message content.
+
+    Content is kept once per SHA-256 and ``geb_item`` rows point to it.
+    A message whose content was downloaded before, e.g. a retried task,
+    isn't downloaded again. Forwarded copies have message ids of their
+    own, so they're downloaded and only deduplicated by their hash.
+    New content is streamed into a staging key and moved under its hash
+    once its blob row is committed, unless the same bytes are stored
+    already, then the references are written.
+    Blobs without references for ``gc_grace`` seconds are deleted
+    by ``collect_garbage``, with their video poster and derivatives
+    of ``derivative_sides``.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        downloader: MediaDownloader,
+        gc_grace: float,
+        gc_batch_size: int,
+        derivative_sides: Iterable[int] = (),
+        session_factory: "Optional[async_sessionmaker[AsyncSession]]" = None,
+    ) -> None:
+        self.downloader = downloader
+        self.gc_grace = gc_grace
+        self.gc_batch_size = gc_batch_size
+        self.derivative_sides = list(derivative_sides)
+        self.session_factory = session_factory
+        # Messages found downloaded, content found stored and content stored.
+        self.skipped = 0
+        self.deduplicated = 0
+        self.stored = 0
+
+    async def collect(self, message_id: str, size: Optional[int] = None) -> str:
+        """
+        Store content of a message and point its items to it.
+
+        :param message_id: id of an image, video, audio or file message.
+        :param size: size of the content if LINE sent it.
+        :return: hash of the content.
+        """
+        blob = await self._session_call(
+            lambda dao: dao.find_message_blob(message_id, size),
+        )
+        if blob is not None:
+            self.skipped += 1
+            await self._reference(blob.sha256, message_id, blob.size)
+            return blob.sha256
+
+        content = await self._download(message_id)
+        await self._reference(content.sha256, message_id, content.size)
+        return content.sha256
+
+    async def collect_poster(self, message_id: str, sha256: str) -> None:
+        """
+        Store LINE's preview image of a video next to it.
+
+        :param message_id: id of the video message.
+        :param sha256: hash of the video.
+        """
+        key = poster_key(sha256)
+        if not await self.downloader.storage.exists(key):
+            await self.downloader.download(message_id, key, preview=True)
+
+    async def read(self, key: str) -> bytes:
+        """
+        Read whole stored content, for small files like images.
+
+        :param key: storage key, e.g. from ``blob_key``.
+        :return: content.
+        """
+        chunks = self.downloader.storage.open(key, self.downloader.chunk_size)
+        return b"".join([chunk async for chunk in chunks])
+
+    async def collect_garbage(self) -> int:
+        """
+        Delete blobs nobody referenced for ``gc_grace`` seconds.
+
+        :return: number of deleted blobs.
+        """
+        before = datetime.now() - timedelta(seconds=self.gc_grace)
+        delete_garbage = partial(self._delete_garbage, before=before)
+        deleted = 0
+        while True:  # noqa: WPS457
+            garbage = await self._session_call(delete_garbage, commit=True)
+            deleted += garbage
+            if garbage < self.gc_batch_size:
+                return deleted
+
+    async def _download(self, message_id: str) -> StoredContent:
+        staged = staging_key(message_id)
+        content = await self.downloader.download(message_id, staged)
+        try:  # noqa: WPS501
+            await self._store(staged, content)
+        finally:
+            # Left over only if the same content was stored before.
+            await self.downloader.storage.delete(staged)
+        return content
+
+    async def _store(self, staged: str, content: StoredContent) -> None:
+        # The row is committed first, so content whose references never
+        # get written is unreferenced and swept by collect_garbage.
+        await self._session_call(
+            lambda dao: dao.claim_blob(
+                Blob(
+                    sha256=content.sha256,
+                    size=content.size,
+                    content_type=content.content_type,
+                ),
+            ),
+            commit=True,
+        )
+        key = blob_key(content.sha256)
+        if await self.downloader.storage.exists(key):
+            self.deduplicated += 1
+        else:
+            await self.downloader.storage.move(staged, key)
+            self.stored += 1
+
+    async def _reference(self, sha256: str, message_id: str, size: int) -> None:
+        # Items are written in batches, so they may not be in the table yet.
+        link = partial(
+            BlobDAO.reference,
+            sha256=sha256,
+            message_id=message_id,
+            size=size,
+        )
+        for attempt in range(5):
+            linked = await self._session_call(link, commit=True)
+            if linked:
+                return
+            await asyncio.sleep(0.1 * 2**attempt)
+        logger.warning("No items of message {0} to point to {1}", message_id, sha256)
+
+    async def _delete_garbage(self, dao: BlobDAO, before: datetime) -> int:
+        garbage = await dao.lock_garbage(before, self.gc_batch_size)
+        # Content goes first, so a failure leaves rows to retry, not files.
+        await asyncio.gather(
+            *(
+                self.downloader.storage.delete(key)
+                for blob in garbage
+                for key in self._stored_keys(blob.sha256)
+            ),
+        )
+        await dao.delete_blobs([blob.sha256 for blob in garbage])
+        return len(garbage)
+
+    def _stored_keys(self, sha256: str) -> List[str]:
+        return [
+            blob_key(sha256),
+            poster_key(sha256),
+            *(derivative_key(sha256, side) for side in self.derivative_sides),
+        ]
+
+    async def _session_call(
+        self,
+        call: Callable[[BlobDAO], Awaitable[ResultType]],
+        commit: bool = False,
+    ) -> ResultType:
+        if self.session_factory is None:
+            raise RuntimeError("Database isn't set up for the blob store.")
+        async with self.session_factory() as session:
+            result = await call(BlobDAO(session))
+            if commit:
+                await session.commit()
+        return result
+
+
+blob_store = BlobStore(
+    media_downloader,
+    gc_grace=settings.media_gc_grace,
+    gc_batch_size=settings.media_gc_batch_size,
+    derivative_sides=settings.media_derivative_sizes.values(),
+)
@@ -0,0 +1,194 @@
+import asyncio
+import io
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from importlib.util import find_spec
+from pathlib import Path
+from typing import AsyncIterator, Mapping, Optional
+
+from loguru import logger
+
+from gebwai.services.media.blobs import (
+    BlobStore,
+    blob_key,
+    blob_store,
+    derivative_key,
+    poster_key,
+)
+from gebwai.services.media.diskcache import DiskLRUCache
+from gebwai.services.singleflight import SingleFlight
+from gebwai.settings import ExecutorKind, settings
+
+# Derivatives are rendered with pillow of the media extra.
+PILLOW_INSTALLED = find_spec("PIL") is not None
+# Quality of rendered JPEGs, small thumbnails don't show the difference.
+JPEG_QUALITY = 80
+
+
+class DerivativeUnavailable(LookupError):
+    """Content to make a derivative of isn't stored or can't be rendered."""
+
+
+def render_derivative(image: bytes, max_side: int) -> bytes:
+    """
+    Scale an image down to a JPEG.
+
+    Needs ``pillow``, it's CPU bound and meant to run in a process pool.
+
+    :param image: encoded image.
+    :param max_side: longer side of the result in pixels.
+    :return: encoded JPEG.
+    """
+    from PIL import Image, ImageOps  # noqa: WPS433
+
+    with Image.open(io.BytesIO(image)) as opened:
+        # Lets JPEG decode at 1/2, 1/4 or 1/8 of the size.
+        opened.draft("RGB", (max_side, max_side))
+        scaled = ImageOps.exif_transpose(opened).convert("RGB")
+    scaled.thumbnail((max_side, max_side))
+    output = io.BytesIO()
+    scaled.save(
+        output,
+        format="JPEG",
+        quality=JPEG_QUALITY,
+        optimize=True,
+        progressive=True,
+    )
+    return output.getvalue()
+
+
+class DerivativeStore:  # noqa: WPS230
+    """
+    Thumbnails and previews of stored images and videos.
+
+    Derivatives are keyed by the content hash and their size,
+    so each one is rendered once however many users collected
+    the content. They're rendered from images and from LINE's
+    preview image of videos in a process pool, kept in media storage
+    next to the content and served from a local ``DiskLRUCache``.
+
+    Without pillow derivatives aren't made eagerly and those
+    not stored yet are unavailable.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        blobs: BlobStore,
+        sizes: Mapping[str, int],
+        cache: DiskLRUCache,
+        max_workers: Optional[int] = None,
+        executor_kind: ExecutorKind = ExecutorKind.PROCESS,
+        eager: bool = False,
+    ) -> None:
+        self.blobs = blobs
+        self.sizes = dict(sizes)
+        self.cache = cache
+        self.max_workers = max_workers
+        self.executor_kind = executor_kind
+        self.eager = eager and PILLOW_INSTALLED
+        if eager and not PILLOW_INSTALLED:
+            logger.warning(
+                "Derivatives won't be made eagerly, "
+                "install gebwai with the media extra to render them.",
+            )
+        # Derivatives rendered by this process.
+        self.rendered = 0
+        self._loads: SingleFlight[str, Path] = SingleFlight()
+        self._executor: Optional[Executor] = None
+
+    async def get(self, sha256: str, size: str, is_video: bool = False) -> Path:
+        """
+        Get a derivative, rendering it on first use.
+
+        :param sha256: hash of the image or video.
+        :param size: name of the size in ``sizes``.
+        :param is_video: whether the content is a video.
+        :return: path to the derivative in the disk cache.
+        """
+        key = derivative_key(sha256, self.sizes[size])
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        return await self._loads.do(
+            key,
+            lambda: self._load(sha256, self.sizes[size], is_video),
+        )
+
+    async def ensure(self, sha256: str, is_video: bool = False) -> None:
+        """
+        Render derivatives of all sizes that aren't stored yet.
+
+        :param sha256: hash of the image or video.
+        :param is_video: whether the content is a video.
+        """
+        storage = self.blobs.downloader.storage
+        source: Optional[bytes] = None
+        for side in self.sizes.values():
+            if await storage.exists(derivative_key(sha256, side)):
+                continue
+            if source is None:
+                source = await self._read_source(sha256, is_video)
+            await self._render(sha256, side, source)
+
+    def shutdown(self) -> None:
+        """Stop the pool if it was started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _load(self, sha256: str, side: int, is_video: bool) -> Path:
+        key = derivative_key(sha256, side)
+        if await self.blobs.downloader.storage.exists(key):
+            content = await self.blobs.read(key)
+        else:
+            source = await self._read_source(sha256, is_video)
+            content = await self._render(sha256, side, source)
+        return await self.cache.put(key, content)
+
+    async def _read_source(self, sha256: str, is_video: bool) -> bytes:
+        key = poster_key(sha256) if is_video else blob_key(sha256)
+        if not await self.blobs.downloader.storage.exists(key):
+            raise DerivativeUnavailable(key)
+        return await self.blobs.read(key)
+
+    async def _render(self, sha256: str, side: int, source: bytes) -> bytes:
+        if not PILLOW_INSTALLED:
+            raise DerivativeUnavailable(derivative_key(sha256, side))
+        content = await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(),
+            render_derivative,
+            source,
+            side,
+        )
+        self.rendered += 1
+        await self.blobs.downloader.storage.put(
+            derivative_key(sha256, side),
+            _single_chunk(content),
+        )
+        return content
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == ExecutorKind.PROCESS:
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers,
+                    thread_name_prefix="media-derivatives",
+                )
+        return self._executor
+
+
+async def _single_chunk(content: bytes) -> AsyncIterator[bytes]:
+    yield content
+
+
+derivative_store = DerivativeStore(
+    blob_store,
+    sizes=settings.media_derivative_sizes,
+    cache=DiskLRUCache(
+        settings.media_derivative_cache_dir,
+        settings.media_derivative_cache_bytes,
+    ),
+    max_workers=settings.media_derivative_workers,
+    eager=settings.media_derivatives_eager,
+)
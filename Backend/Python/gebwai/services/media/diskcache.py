@@ -0,0 +1,106 @@
+import asyncio
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+
+class DiskLRUCache:
+    """
+    Files on local disk, least recently used evicted past ``max_bytes``.
+
+    The index lives in memory and is rebuilt from modification times
+    on first use. Hits touch the file, so the order survives restarts.
+    Processes sharing the directory evict independently,
+    a file evicted by another process is a miss.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        # Bytes of cached files and lookups answered from disk or not.
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._index: "Optional[OrderedDict[str, int]]" = None
+        self._index_lock: Optional[asyncio.Lock] = None
+
+    async def get(self, key: str) -> Optional[Path]:
+        """
+        Find a cached file.
+
+        :param key: relative path of the file.
+        :return: path to the file or None if it isn't cached.
+        """
+        index = await self._get_index()
+        if key not in index:
+            self.misses += 1
+            return None
+        path = self.root / key
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.size -= index.pop(key)
+            self.misses += 1
+            return None
+        index.move_to_end(key)
+        self.hits += 1
+        return path
+
+    async def put(self, key: str, content: bytes) -> Path:
+        """
+        Cache a file, evicting old ones to stay in ``max_bytes``.
+
+        :param key: relative path of the file.
+        :param content: content of the file.
+        :return: path to the file.
+        """
+        index = await self._get_index()
+        path = self.root / key
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            _write_file,
+            path,
+            content,
+        )
+        self.size += len(content) - index.pop(key, 0)
+        index[key] = len(content)
+        while self.size > self.max_bytes and len(index) > 1:
+            evicted, size = index.popitem(last=False)
+            (self.root / evicted).unlink(missing_ok=True)
+            self.size -= size
+        return path
+
+    async def _get_index(self) -> "OrderedDict[str, int]":
+        if self._index is not None:
+            return self._index
+        if self._index_lock is None:
+            self._index_lock = asyncio.Lock()
+        async with self._index_lock:
+            if self._index is None:
+                self._index = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    _scan,
+                    self.root,
+                )
+                self.size = sum(self._index.values())
+        return self._index
+
+
+def _scan(root: Path) -> "OrderedDict[str, int]":
+    # Oldest first, partial files of interrupted writes are left out.
+    found = []
+    for path in root.rglob("*"):
+        if path.is_file() and not path.name.startswith("."):
+            stat = path.stat()
+            key = str(path.relative_to(root))
+            found.append((stat.st_mtime, key, stat.st_size))
+    return OrderedDict((key, size) for _, key, size in sorted(found))
+
+
+def _write_file(path: Path, content: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(".{0}.{1}.part".format(path.name, uuid4().hex))
+    partial.write_bytes(content)
+    os.replace(partial, path)
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import time
+from http import HTTPStatus
+from typing import AsyncIterator, Optional
+
+import aiohttp
+from pydantic import BaseModel
+
+from gebwai.services.media.storage import MediaStorage, create_storage
+from gebwai.services.metrics import line_api_seconds
+from gebwai.settings import settings
+
+# Seconds to keep resolved addresses of LINE's data host.
+DNS_CACHE_TTL = 300
+
+
+class StoredContent(BaseModel):
+    """Content of a message kept in media storage."""
+
+    key: str
+    sha256: str
+    size: int
+    content_type: Optional[str] = None
+
+
+class ContentNotReadyError(Exception):
+    """LINE is still preparing content of a video or audio message."""
+
+
+class _HashedChunks:
+    """Chunks of a response, hashed and counted as they pass."""
+
+    def __init__(self, stream: aiohttp.StreamReader, chunk_size: int) -> None:
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._stream = stream
+        self._chunk_size = chunk_size
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self._hashed()
+
+    async def _hashed(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream.iter_chunked(self._chunk_size):
+            self.digest.update(chunk)
+            self.size += len(chunk)
+            yield chunk
+
+
+class MediaDownloader:  # noqa: WPS230
+    """
+    Streaming download of message content from LINE into media storage.
+
+    Content is read in chunks of ``chunk_size`` bytes, hashed
+    with SHA-256 and handed to the storage chunk by chunk,
+    so memory used by a download doesn't grow with the content.
+    At most ``max_concurrency`` downloads run at once.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        data_host: str,
+        access_token: str,
+        chunk_size: int,
+        max_concurrency: int,
+        timeout: float,
+        storage: MediaStorage,
+        max_retries: int = 5,
+    ) -> None:
+        self.data_host = data_host.rstrip("/")
+        self.access_token = access_token
+        self.chunk_size = chunk_size
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.storage = storage
+        self.max_retries = max_retries
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def download(
+        self,
+        message_id: str,
+        key: str,
+        preview: bool = False,
+    ) -> StoredContent:
+        """
+        Download content of a message into storage.
+
+        Content that LINE is still preparing is retried
+        with exponential backoff.
+
+        :param message_id: id of an image, video, audio or file message.
+        :param key: storage key to keep the content under.
+        :param preview: download LINE's preview image of an image or video.
+        :return: stored content.
+        :raises ContentNotReadyError: if the content wasn't ready after all retries.
+        """
+        path = "content/preview" if preview else "content"
+        attempt = 0
+        while True:  # noqa: WPS457
+            try:
+                return await self._download(message_id, key, path)
+            except ContentNotReadyError:
+                if attempt == self.max_retries:
+                    raise
+            await asyncio.sleep(2**attempt)
+            attempt += 1
+
+    async def close(self) -> None:
+        """Close connections to LINE and to the storage."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        await self.storage.close()
+
+    async def _download(self, message_id: str, key: str, path: str) -> StoredContent:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            started = time.perf_counter()
+            async with self._get_session().get(
+                f"{self.data_host}/v2/bot/message/{message_id}/{path}",
+                headers={"Authorization": f"Bearer {self.access_token}"},
+            ) as response:
+                line_api_seconds.observe(time.perf_counter() - started, path)
+                if response.status == HTTPStatus.ACCEPTED:
+                    raise ContentNotReadyError(message_id)
+                response.raise_for_status()
+                chunks = _HashedChunks(response.content, self.chunk_size)
+                await self.storage.put(key, chunks)
+                return StoredContent(
+                    key=key,
+                    sha256=chunks.digest.hexdigest(),
+                    size=chunks.size,
+                    content_type=response.content_type,
+                )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency,
+                    ttl_dns_cache=DNS_CACHE_TTL,
+                    enable_cleanup_closed=True,
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trust_env=True,
+            )
+        return self._session
+
+
+media_downloader = MediaDownloader(
+    settings.line_api_data_host,
+    settings.LINE_ACCESS_TOKEN,
+    chunk_size=settings.media_chunk_size,
+    max_concurrency=settings.media_download_concurrency,
+    timeout=settings.media_download_timeout,
+    storage=create_storage(settings),
+)
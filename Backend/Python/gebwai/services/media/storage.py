@@ -0,0 +1,389 @@
+import abc
+import asyncio
+import os
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional
+from uuid import uuid4
+
+from gebwai.settings import MediaStorageKind, Settings
+
+
+class MediaStorage(abc.ABC):
+    """
+    Place to keep content of collected messages.
+
+    Content is written and read as a stream of chunks,
+    so no backend holds a whole file in memory.
+    """
+
+    @abc.abstractmethod
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> None:
+        """
+        Store content, replacing content with the same key.
+
+        Content appears under the key only once it's complete.
+
+        :param key: relative path like ``source/message``.
+        :param chunks: content.
+        """
+
+    @abc.abstractmethod
+    def open(self, key: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """
+        Read stored content.
+
+        :param key: key the content was stored with.
+        :param chunk_size: bytes read at once.
+        :return: iterator of chunks.
+        """  # noqa: DAR202
+
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool:
+        """
+        Check whether content is stored.
+
+        :param key: key the content was stored with.
+        :return: True if it's stored.
+        """  # noqa: DAR202
+
+    @abc.abstractmethod
+    async def move(self, source: str, destination: str) -> None:
+        """
+        Move stored content to another key, replacing content there.
+
+        :param source: key the content was stored with.
+        :param destination: new key.
+        """
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None:
+        """
+        Delete stored content if it exists.
+
+        :param key: key the content was stored with.
+        """
+
+    async def close(self) -> None:  # noqa: B027
+        """Release connections."""
+
+
+class LocalStorage(MediaStorage):
+    """Content kept in files under a directory."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def path(self, key: str) -> Path:
+        """
+        Get file of a key.
+
+        :param key: relative path.
+        :return: path under the root directory.
+        :raises ValueError: if the key points outside of the root.
+        """
+        root = self.root.resolve()
+        path = (root / key).resolve()
+        if root not in path.parents:
+            raise ValueError(f"Media key {key!r} is outside of the storage.")
+        return path
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> None:
+        """
+        Store content, replacing content with the same key.
+
+        Chunks are written to a partial file in a thread
+        and the file is renamed when they are all written.
+
+        :param key: relative path like ``source/message``.
+        :param chunks: content.
+        """
+        loop = asyncio.get_running_loop()
+        path = self.path(key)
+        partial = _partial_path(path)
+        await loop.run_in_executor(None, _make_parent, path)
+        file = await loop.run_in_executor(None, partial.open, "wb")
+        try:  # noqa: WPS501
+            async for chunk in chunks:
+                await loop.run_in_executor(None, file.write, chunk)
+            await loop.run_in_executor(None, file.close)
+            await loop.run_in_executor(None, os.replace, partial, path)
+        finally:
+            # Nothing is left to clean up once the file is renamed.
+            file.close()
+            partial.unlink(missing_ok=True)
+
+    async def open(  # noqa: WPS217
+        self,
+        key: str,
+        chunk_size: int,
+    ) -> AsyncIterator[bytes]:
+        """
+        Read stored content.
+
+        :param key: key the content was stored with.
+        :param chunk_size: bytes read at once.
+        :yield: chunks of the content.
+        """
+        loop = asyncio.get_running_loop()
+        file = await loop.run_in_executor(None, self.path(key).open, "rb")
+        with file:
+            while True:  # noqa: WPS457
+                chunk = await loop.run_in_executor(None, file.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def exists(self, key: str) -> bool:
+        """
+        Check whether content is stored.
+
+        :param key: key the content was stored with.
+        :return: True if it's stored.
+        """
+        return self.path(key).is_file()
+
+    async def move(self, source: str, destination: str) -> None:
+        """
+        Move stored content to another key, replacing content there.
+
+        :param source: key the content was stored with.
+        :param destination: new key.
+        """
+        loop = asyncio.get_running_loop()
+        path = self.path(destination)
+        await loop.run_in_executor(None, _make_parent, path)
+        await loop.run_in_executor(None, os.replace, self.path(source), path)
+
+    async def delete(self, key: str) -> None:
+        """
+        Delete stored content if it exists.
+
+        :param key: key the content was stored with.
+        """
+        self.path(key).unlink(missing_ok=True)
+
+
+class S3Storage(MediaStorage):
+    """
+    Content kept in an S3 compatible bucket, such as MinIO.
+
+    Content bigger than ``part_size`` is sent as a multipart upload,
+    so at most one part is held in memory. Needs ``aiobotocore``.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        bucket: str,
+        part_size: int,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+    ) -> None:
+        self.bucket = bucket
+        self.part_size = part_size
+        self.client_options = {
+            "endpoint_url": endpoint_url,
+            "region_name": region,
+            "aws_access_key_id": access_key,
+            "aws_secret_access_key": secret_key,
+        }
+        self._client: Optional[Any] = None
+        self._client_lock: Optional[asyncio.Lock] = None
+        self._exit_stack = AsyncExitStack()
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> None:
+        """
+        Store content, replacing content with the same key.
+
+        :param key: relative path like ``source/message``.
+        :param chunks: content.
+        """
+        upload_id: Optional[str] = None
+        parts: List[Dict[str, Any]] = []
+        completed = False
+        try:  # noqa: WPS501
+            async for part in _join_chunks(chunks, self.part_size):
+                upload_id = upload_id or await self._start_upload(key, part)
+                if upload_id is None:
+                    return
+                parts.append(await self._upload_part(key, upload_id, parts, part))
+            if upload_id is not None:
+                await self._complete_upload(key, upload_id, parts)
+                completed = True
+        finally:
+            if upload_id is not None and not completed:
+                await self._abort_upload(key, upload_id)
+
+    async def open(self, key: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """
+        Read stored content.
+
+        :param key: key the content was stored with.
+        :param chunk_size: bytes read at once.
+        :yield: chunks of the content.
+        """
+        client = await self._get_client()
+        response = await client.get_object(Bucket=self.bucket, Key=key)
+        async with response["Body"] as body:
+            async for chunk in body.iter_chunks(chunk_size):
+                yield chunk
+
+    async def exists(self, key: str) -> bool:
+        """
+        Check whether content is stored.
+
+        :param key: key the content was stored with.
+        :return: True if it's stored.
+        :raises ClientError: if S3 fails for another reason.
+        """  # noqa: DAR401, DAR402
+        client = await self._get_client()
+        try:
+            await client.head_object(Bucket=self.bucket, Key=key)
+        except client.exceptions.ClientError as error:
+            if error.response.get("Error", {}).get("Code") in {"404", "NoSuchKey"}:
+                return False
+            raise
+        return True
+
+    async def move(self, source: str, destination: str) -> None:
+        """
+        Move stored content to another key, replacing content there.
+
+        The content is copied inside the bucket, not downloaded.
+
+        :param source: key the content was stored with.
+        :param destination: new key.
+        """
+        client = await self._get_client()
+        await client.copy_object(
+            Bucket=self.bucket,
+            Key=destination,
+            CopySource={"Bucket": self.bucket, "Key": source},
+        )
+        await client.delete_object(Bucket=self.bucket, Key=source)
+
+    async def delete(self, key: str) -> None:
+        """
+        Delete stored content if it exists.
+
+        :param key: key the content was stored with.
+        """
+        client = await self._get_client()
+        await client.delete_object(Bucket=self.bucket, Key=key)
+
+    async def close(self) -> None:
+        """Close the S3 client."""
+        await self._exit_stack.aclose()
+        self._client = None
+
+    async def _start_upload(self, key: str, first_part: bytes) -> Optional[str]:
+        client = await self._get_client()
+        if len(first_part) < self.part_size:
+            # Content smaller than a part is sent at once.
+            await client.put_object(Bucket=self.bucket, Key=key, Body=first_part)
+            return None
+        upload = await client.create_multipart_upload(Bucket=self.bucket, Key=key)
+        return upload["UploadId"]
+
+    async def _complete_upload(
+        self,
+        key: str,
+        upload_id: str,
+        parts: List[Dict[str, Any]],
+    ) -> None:
+        client = await self._get_client()
+        await client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+
+    async def _abort_upload(self, key: str, upload_id: str) -> None:
+        client = await self._get_client()
+        await client.abort_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+        )
+
+    async def _upload_part(
+        self,
+        key: str,
+        upload_id: str,
+        parts: List[Dict[str, Any]],
+        part: bytes,
+    ) -> Dict[str, Any]:
+        number = len(parts) + 1
+        response = await (await self._get_client()).upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=part,
+        )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    async def _get_client(self) -> Any:
+        if self._client is not None:
+            return self._client
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+        async with self._client_lock:
+            if self._client is None:
+                try:
+                    from aiobotocore.session import get_session  # noqa: WPS433
+                except ImportError as error:
+                    raise RuntimeError(
+                        "S3 media storage needs aiobotocore, "
+                        "install gebwai with the s3 extra.",
+                    ) from error
+                self._client = await self._exit_stack.enter_async_context(
+                    get_session().create_client("s3", **self.client_options),
+                )
+        return self._client
+
+
+def create_storage(app_settings: Settings) -> MediaStorage:
+    """
+    Create storage chosen in settings.
+
+    :param app_settings: application settings.
+    :return: media storage.
+    """
+    if app_settings.media_storage == MediaStorageKind.S3:
+        return S3Storage(
+            app_settings.media_s3_bucket,
+            part_size=app_settings.media_s3_part_size,
+            endpoint_url=app_settings.media_s3_endpoint,
+            region=app_settings.media_s3_region,
+            access_key=app_settings.media_s3_access_key,
+            secret_key=app_settings.media_s3_secret_key,
+        )
+    return LocalStorage(app_settings.media_local_root)
+
+
+def _make_parent(path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+
+def _partial_path(path: Path) -> Path:
+    # Hidden and unique, so concurrent writers don't share it.
+    return path.with_name(".{0}.{1}.part".format(path.name, uuid4().hex))
+
+
+async def _join_chunks(chunks: AsyncIterable[bytes], size: int) -> AsyncIterator[bytes]:
+    # Parts are at least size bytes long except the last one,
+    # which is there, maybe empty, when nothing else is.
+    part = bytearray()
+    joined = False
+    async for chunk in chunks:
+        part += chunk
+        if len(part) >= size:
+            yield bytes(part)
+            part.clear()
+            joined = True
+    if part or not joined:
+        yield bytes(part)
@@ -0,0 +1,106 @@
+from typing import Optional
+
+from loguru import logger
+
+from gebwai.brokers.queues import TaskQueue
+from gebwai.services.media.blobs import blob_key, blob_store
+from gebwai.services.media.derivatives import derivative_store
+from gebwai.services.slips.verifier import slip_verifier
+from gebwai.services.stats import monthly_stats
+from gebwai.services.users import user_directory
+from gebwai.settings import settings
+from gebwai.tkq import broker, task_cache
+
+
+@broker.task(
+    task_name="media:download_content",
+    queue=TaskQueue.MEDIA.value,
+    fair_by="source_id",
+)
+async def download_content(
+    message_id: str,
+    source_id: str,
+    file_type: str,
+    size: Optional[int] = None,
+) -> None:
+    """
+    Download content of a collected message into media storage.
+
+    Videos get LINE's preview image stored next to them,
+    thumbnails of both are queued if they're made eagerly.
+    Images are queued for slip verification.
+
+    :param message_id: id of an image, video, audio or file message.
+    :param source_id: id of the group, room or user the message came from.
+    :param file_type: field name of ``NGebByFileType``.
+    :param size: size of the content if LINE sent it.
+    """
+    sha256 = await blob_store.collect(message_id, size)
+    logger.debug("Content of message {0} is blob {1}", message_id, sha256)
+    if file_type == "video":
+        await blob_store.collect_poster(message_id, sha256)
+    if file_type in {"image", "video"} and derivative_store.eager:
+        await make_derivatives.kicker().with_labels(fair_key=source_id).kiq(
+            sha256,
+            is_video=file_type == "video",
+        )
+    if file_type == "image":
+        await verify_slip.kiq(source_id, sha256)
+
+
+@broker.task(task_name="media:make_derivatives", queue=TaskQueue.MEDIA.value)
+async def make_derivatives(sha256: str, is_video: bool = False) -> None:
+    """
+    Render thumbnails and previews of new content.
+
+    :param sha256: hash of the image or video.
+    :param is_video: whether the content is a video.
+    """
+    await derivative_store.ensure(sha256, is_video)
+
+
+@task_cache.cached(
+    key=lambda source_id, sha256: f"{source_id}:{sha256}",
+    ttl=settings.slip_cache_ttl,
+)
+@broker.task(
+    task_name="media:verify_slip",
+    queue=TaskQueue.SLIPS.value,
+    fair_by="source_id",
+)
+async def verify_slip(source_id: str, sha256: str) -> None:
+    """
+    Verify a stored image as a transfer slip if a collecting user wants it.
+
+    :param source_id: id of the group, room or user the image came from.
+    :param sha256: hash of the stored image.
+    """
+    verifying = []
+    for line_user_id in await user_directory.get_collecting_users(source_id):
+        source_settings = await user_directory.get_or_create_source_settings(
+            line_user_id,
+            source_id,
+        )
+        if source_settings.verify_slip:
+            verifying.append(line_user_id)
+    if not verifying:
+        return
+
+    image = await blob_store.read(blob_key(sha256))
+    result = await slip_verifier.verify(image, sha256)
+    if not result.is_slip:
+        return
+    logger.info("Image {0} is slip {1}", sha256, result.payload)
+    for line_user_id in verifying:  # noqa: WPS440
+        monthly_stats.add_processed_slip(line_user_id)
+
+
+@broker.task(
+    task_name="media:collect_garbage",
+    queue=TaskQueue.BACKGROUND.value,
+    schedule=[{"cron": settings.media_gc_cron}],
+)
+async def collect_garbage() -> None:
+    """Delete stored content nobody references anymore."""
+    deleted = await blob_store.collect_garbage()
+    logger.info("Deleted {0} unreferenced blobs", deleted)
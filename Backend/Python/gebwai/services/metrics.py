@@ -0,0 +1,486 @@
+import asyncio
+import os
+import socket
+from bisect import bisect_left
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import ujson
+from loguru import logger
+
+from gebwai.settings import settings
+
+# Bounds of histogram buckets in seconds.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+# Metrics as written by a process: histograms by name with their bucket
+# counts by labels, and sampled counters and gauges by name.
+Snapshot = Dict[str, Any]
+# Prometheus escapes of backslashes, new lines and quotes in label values.
+LABEL_ESCAPES = str.maketrans({"\\": r"\\", "\n": r"\n", '"': r"\""})  # noqa: WPS342
+
+
+class Sample(NamedTuple):
+    """Value of a counter or gauge read when metrics are collected."""
+
+    name: str
+    kind: str
+    documentation: str
+    labels: Dict[str, str]
+    value: float
+
+
+Collector = Callable[[], Iterable[Sample]]
+
+
+class Histogram:
+    """
+    Distribution of observed values by bucket.
+
+    Observing only bumps two numbers of a list, so it takes no lock.
+    A histogram belongs to one process and is updated from its event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Counts by bucket and above the last one, then the sum, by label values.
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, amount: float, *labels: str) -> None:
+        """
+        Record a value.
+
+        :param amount: observed value.
+        :param labels: values of ``labelnames`` in order.
+        """
+        counts = self.series.get(labels)
+        if counts is None:
+            counts = [0 for _ in range(len(self.buckets) + 2)]
+            self.series[labels] = counts
+        counts[bisect_left(self.buckets, amount)] += 1
+        counts[-1] += amount
+
+
+class MetricsRegistry:
+    """Histograms and collectors of counters and gauges of a process."""
+
+    def __init__(self) -> None:
+        self.histograms: List[Histogram] = []
+        self.collectors: List[Collector] = []
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """
+        Create a histogram.
+
+        :param name: metric name.
+        :param documentation: help text.
+        :param labelnames: names of labels values are observed with.
+        :param buckets: upper bounds of buckets.
+        :return: new histogram.
+        """
+        histogram = Histogram(name, documentation, labelnames, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, collector: Collector) -> None:
+        """
+        Read counters and gauges with a function whenever metrics are collected.
+
+        :param collector: function returning samples.
+        """
+        self.collectors.append(collector)
+
+    def snapshot(self) -> Snapshot:
+        """
+        Get all metrics of this process.
+
+        :return: JSON serializable metrics.
+        """
+        histograms = {
+            histogram.name: {
+                "help": histogram.documentation,
+                "labelnames": histogram.labelnames,
+                "buckets": histogram.buckets,
+                "series": [
+                    [labels, counts] for labels, counts in histogram.series.items()
+                ],
+            }
+            for histogram in self.histograms
+        }
+        samples: List[Sample] = []
+        for collector in self.collectors:
+            try:
+                samples.extend(collector())
+            except Exception as error:
+                logger.warning("Can't collect metrics: {0}", error)
+        return {"histograms": histograms, "samples": group_samples(samples)}
+
+
+def group_samples(samples: Iterable[Sample]) -> Snapshot:
+    """
+    Put samples in the form of snapshots.
+
+    :param samples: counter and gauge values.
+    :return: samples by metric name.
+    """
+    grouped: Dict[str, Any] = {}
+    for sample in samples:
+        metric = grouped.setdefault(
+            sample.name,
+            {"type": sample.kind, "help": sample.documentation, "series": []},
+        )
+        metric["series"].append([sample.labels, sample.value])
+    return grouped
+
+
+def merge(snapshots: Iterable[Snapshot]) -> Snapshot:
+    """
+    Add up metrics of several processes.
+
+    :param snapshots: metrics of each process.
+    :return: metrics with values of equal labels summed.
+    """
+    histograms: Dict[str, Any] = {}
+    samples: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        _merge_metrics(histograms, snapshot["histograms"], _add_counts)
+        _merge_metrics(samples, snapshot["samples"], _add_values)
+    return {
+        "histograms": _list_series(histograms, _histogram_series),
+        "samples": _list_series(samples, _sample_series),
+    }
+
+
+def render(snapshot: Snapshot) -> str:
+    """
+    Format metrics in the Prometheus text format.
+
+    :param snapshot: metrics.
+    :return: exposition text.
+    """
+    lines: List[str] = []
+    for histogram_name, histogram in snapshot["histograms"].items():
+        lines.extend(_render_histogram(histogram_name, histogram))
+    for sample_name, metric in snapshot["samples"].items():
+        lines.extend(_render_samples(sample_name, metric))
+    lines.append("")
+    return "\n".join(lines)
+
+
+class MetricsExporter:
+    """
+    Shares metrics of the processes of a host through files.
+
+    Every process writes its snapshot to ``<directory>/<host>-<pid>.json``
+    each ``interval`` seconds, so whichever uvicorn worker answers
+    a scrape adds up metrics of all of them.
+
+    A process flushing its metrics takes over files of stopped processes
+    of its host: their counters and histograms are added to its own,
+    so they don't go missing from the totals, and their gauges are dropped.
+    Files of other hosts can't be told stopped and are always read.
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        directory: Path,
+        interval: float,
+    ) -> None:
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._task: "Optional[asyncio.Task[None]]" = None
+        # Counters and histograms taken over from stopped processes.
+        self._retired: Snapshot = {"histograms": {}, "samples": {}}
+
+    @property
+    def path(self) -> Path:
+        """
+        Get the file of this process.
+
+        :return: snapshot path.
+        """
+        hostname = socket.gethostname()
+        return self.directory / f"{hostname}-{os.getpid()}.json"
+
+    def start(self) -> None:
+        """Start writing metrics of this process in background."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._task = asyncio.create_task(self._flush_forever())
+
+    async def close(self) -> None:
+        """Stop writing metrics, writing them one last time."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write metrics of this process and those taken over from stopped ones."""
+        loop = asyncio.get_running_loop()
+        claimed = await loop.run_in_executor(None, self._claim_stopped)
+        self._retired = merge([self._retired, *claimed.values()])
+        snapshot = merge([self.registry.snapshot(), self._retired])
+        await loop.run_in_executor(None, self._write, snapshot)
+        # Files are removed once their counts are safe in the file of this one.
+        await loop.run_in_executor(None, _remove, list(claimed))
+
+    async def collect(self, samples: Iterable[Sample] = ()) -> Snapshot:
+        """
+        Get metrics of all processes.
+
+        :param samples: values shared by all processes, like queue depths.
+        :return: metrics of this process added to the others' last ones.
+        """
+        others = await asyncio.get_running_loop().run_in_executor(None, self._read)
+        shared = {"histograms": {}, "samples": group_samples(samples)}
+        return merge([self.registry.snapshot(), self._retired, *others, shared])
+
+    def _write(self, snapshot: Snapshot) -> None:
+        written = self.path.with_suffix(".tmp")
+        written.write_text(ujson.dumps(snapshot))
+        os.replace(written, self.path)
+
+    def _read(self) -> List[Snapshot]:
+        snapshots: List[Snapshot] = []
+        if not self.directory.is_dir():
+            return snapshots
+        for path in self.directory.glob("*.json"):
+            if path == self.path:
+                continue
+            snapshot = _load(path)
+            if snapshot is None:
+                continue
+            if self._is_stopped(path):
+                snapshot = _without_gauges(snapshot)
+            snapshots.append(snapshot)
+        return snapshots
+
+    def _claim_stopped(self) -> Dict[Path, Snapshot]:
+        claimed: Dict[Path, Snapshot] = {}
+        for path in self.directory.glob("*.json"):
+            if not self._is_stopped(path):
+                continue
+            # Renaming makes sure only one process takes over a file.
+            retiring = path.with_suffix(".retiring")
+            try:
+                path.rename(retiring)
+            except OSError:
+                continue
+            snapshot = _load(retiring)
+            if snapshot is not None:
+                claimed[retiring] = _without_gauges(snapshot)
+        return claimed
+
+    def _is_stopped(self, path: Path) -> bool:
+        hostname, _, pid = path.stem.rpartition("-")
+        if hostname != socket.gethostname() or not pid.isdigit():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            # The process exists but belongs to another user.
+            return False
+        return False
+
+    async def _flush_forever(self) -> None:
+        while True:  # noqa: WPS457
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except OSError as error:
+                logger.warning("Can't write metrics: {0}", error)
+
+
+def _load(path: Path) -> Optional[Snapshot]:
+    try:
+        return ujson.loads(path.read_text())
+    except (OSError, ValueError) as error:
+        logger.warning("Can't read metrics of {0}: {1}", path.name, error)
+    return None
+
+
+def _without_gauges(snapshot: Snapshot) -> Snapshot:
+    samples = {
+        name: metric
+        for name, metric in snapshot["samples"].items()
+        if metric["type"] != "gauge"
+    }
+    return {"histograms": snapshot["histograms"], "samples": samples}
+
+
+def _remove(paths: List[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def _merge_metrics(
+    merged: Dict[str, Any],
+    named_metrics: Dict[str, Any],
+    add: Callable[[Dict[Any, Any], List[Any]], None],
+) -> None:
+    for name, metric in named_metrics.items():
+        totals = merged.setdefault(name, {**metric, "series": {}})
+        add(totals["series"], metric["series"])
+
+
+def _add_counts(totals: Dict[Any, List[float]], series: List[Any]) -> None:
+    for labels, counts in series:
+        key = tuple(labels)
+        total = totals.get(key)
+        if total is None:
+            totals[key] = list(counts)
+        else:
+            totals[key] = [sum(pair) for pair in zip(total, counts)]
+
+
+def _add_values(totals: Dict[Any, float], series: List[Any]) -> None:
+    for labels, sample_value in series:
+        key = tuple(sorted(labels.items()))
+        totals[key] = totals.get(key, 0) + sample_value
+
+
+def _list_series(
+    merged: Dict[str, Any],
+    to_list: Callable[[Dict[Any, Any]], List[Any]],
+) -> Dict[str, Any]:
+    return {
+        name: {**metric, "series": to_list(metric["series"])}
+        for name, metric in merged.items()
+    }
+
+
+def _histogram_series(totals: Dict[Any, List[float]]) -> List[Any]:
+    return list(totals.items())
+
+
+def _sample_series(totals: Dict[Any, float]) -> List[Any]:
+    return [[dict(key), total] for key, total in totals.items()]
+
+
+def _render_histogram(name: str, histogram: Dict[str, Any]) -> List[str]:
+    lines = [
+        f"# HELP {name} {histogram['help']}",
+        f"# TYPE {name} histogram",
+    ]
+    bounds = [*map(_format_value, histogram["buckets"]), "+Inf"]
+    for labels, counts in histogram["series"]:
+        named = dict(zip(histogram["labelnames"], labels))
+        lines.extend(_render_buckets(name, named, bounds, counts))
+    return lines
+
+
+def _render_buckets(
+    name: str,
+    labels: Dict[str, str],
+    bounds: List[str],
+    counts: List[float],
+) -> List[str]:
+    # Buckets are exposed as counts of values up to their bound.
+    cumulative = list(accumulate(counts[:-1]))
+    lines = [
+        _render_line(name, {**labels, "le": bound}, count, "_bucket")
+        for bound, count in zip(bounds, cumulative)
+    ]
+    lines.append(_render_line(name, labels, counts[-1], "_sum"))
+    lines.append(_render_line(name, labels, cumulative[-1], "_count"))
+    return lines
+
+
+def _render_samples(name: str, metric: Dict[str, Any]) -> List[str]:
+    lines = [
+        f"# HELP {name} {metric['help']}",
+        f"# TYPE {name} {metric['type']}",
+    ]
+    lines.extend(
+        _render_line(name, labels, sample_value)
+        for labels, sample_value in metric["series"]
+    )
+    return lines
+
+
+def _render_line(
+    name: str,
+    labels: Dict[str, Any],
+    number: float,
+    suffix: str = "",
+) -> str:
+    return "{0}{1}{2} {3}".format(
+        name,
+        suffix,
+        _format_labels(labels),
+        _format_value(number),
+    )
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{0}="{1}"'.format(name, str(label_value).translate(LABEL_ESCAPES))
+        for name, label_value in labels.items()
+    )
+    return f"{{{pairs}}}"
+
+
+def _format_value(number: float) -> str:
+    if float(number).is_integer():
+        return str(int(number))
+    return repr(float(number))
+
+
+metrics = MetricsRegistry()
+metrics_exporter = MetricsExporter(
+    metrics,
+    settings.metrics_dir,
+    settings.metrics_flush_interval,
+)
+
+webhook_seconds = metrics.histogram(
+    "gebwai_webhook_seconds",
+    "Time to answer a LINE webhook call.",
+)
+event_seconds = metrics.histogram(
+    "gebwai_event_seconds",
+    "Time to handle a webhook event by event type.",
+    labelnames=("type",),
+)
+line_api_seconds = metrics.histogram(
+    "gebwai_line_api_seconds",
+    "Latency of LINE API calls by endpoint.",
+    labelnames=("endpoint",),
+)
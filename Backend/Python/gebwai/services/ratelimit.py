@@ -0,0 +1,46 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter.
+
+    Callers wait for a token instead of failing, so bursts
+    above the rate turn into backpressure.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated_at = clock()
+
+    def try_acquire(self) -> bool:
+        """
+        Take a token if one is available right now.
+
+        :return: whether the token was taken.
+        """
+        now = self.clock()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * self.rate,
+        )
+        self._updated_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        while not self.try_acquire():
+            await asyncio.sleep((1 - self._tokens) / self.rate)
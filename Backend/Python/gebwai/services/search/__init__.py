@@ -0,0 +1 @@
+"""Full-text search of collected chat messages and links."""
@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import List, Optional
+
+from gebwai.db.bulk import BulkWriter
+from gebwai.db.models.text_model import GebText
+from gebwai.services.search import tokenizer
+from gebwai.services.users import user_directory
+from gebwai.settings import settings
+
+TEXT_COLUMNS = (
+    "message_id",
+    "source_id",
+    "line_user_id",
+    "file_type",
+    "collected_at",
+    "body",
+    "lexemes",
+)
+# Kinds of messages with searchable text.
+TEXT_FILE_TYPES = frozenset(("chat", "link"))
+
+text_writer = BulkWriter(
+    GebText.__table__,  # type: ignore
+    TEXT_COLUMNS,
+    batch_size=settings.item_write_batch_size,
+    flush_interval=settings.item_write_flush_interval,
+    max_pending=settings.item_write_max_pending,
+    method=settings.item_write_method,
+)
+
+
+async def index_text(  # noqa: WPS211
+    message_id: str,
+    source_id: str,
+    line_user_id: Optional[str],
+    file_type: str,
+    collected_at: datetime,
+    body: str,
+    collecting: List[str],
+) -> bool:
+    """
+    Queue text of a message to be stored for searching.
+
+    Text is kept only if a collecting user keeps this kind
+    of message from the source. Its lexemes are made here,
+    so Postgres adds it to the search index as it's written.
+
+    :param message_id: LINE message id.
+    :param source_id: id of the group, room or user the message came from.
+    :param line_user_id: LINE user id of the sender.
+    :param file_type: ``chat`` or ``link``.
+    :param collected_at: when the message was sent.
+    :param body: message text.
+    :param collecting: LINE user ids of users collecting the source.
+    :return: whether the text is kept.
+    """
+    for collecting_user_id in collecting:
+        source_settings = await user_directory.get_or_create_source_settings(
+            collecting_user_id,
+            source_id,
+        )
+        if source_settings.geb_settings.get(file_type):
+            break
+    else:
+        return False
+    await text_writer.submit(
+        (
+            message_id,
+            source_id,
+            line_user_id,
+            file_type,
+            collected_at,
+            body,
+            tokenizer.to_tsvector(body),
+        ),
+    )
+    return True
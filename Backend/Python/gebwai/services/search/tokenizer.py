@@ -0,0 +1,99 @@
+import re
+import unicodedata
+from typing import Iterator, List, Optional
+
+# Thai letters, vowels, tone marks and digits.
+_TOKEN = re.compile(r"[฀-๿]+|[^\W_฀-๿]+")
+_THAI = re.compile("[฀-๿]")
+# Postgres rejects lexemes over 2 KiB and positions over 16383.
+_MAX_WORD_LENGTH = 100
+_MAX_POSITION = 16383
+
+
+def clusters(run: str) -> List[str]:
+    """
+    Split Thai text into characters with their vowel and tone marks.
+
+    :param run: Thai text without spaces.
+    :return: letters, each followed by the marks written over or under it.
+    """
+    split: List[str] = []
+    for char in run:
+        if split and unicodedata.category(char) == "Mn":
+            split[-1] += char
+        else:
+            split.append(char)
+    return split
+
+
+def terms(text: str) -> Iterator[List[str]]:
+    """
+    Split text into terms for searching.
+
+    Thai is written without spaces between words, so instead
+    of guessing word boundaries a Thai run is split into overlapping
+    pairs of letters, which find any part of the run
+    when searched next to each other. Other words are lowercased.
+
+    :param text: message text.
+    :yield: lexemes of a term, next to each other in the text.
+    """
+    for match in _TOKEN.finditer(unicodedata.normalize("NFC", text)):
+        word = match.group()
+        if not _THAI.match(word):
+            yield [word.lower()[:_MAX_WORD_LENGTH]]
+            continue
+        letters = clusters(word)
+        if len(letters) == 1:
+            yield letters
+        else:
+            yield _pairs(letters)
+
+
+def to_tsvector(text: str) -> str:
+    """
+    Make a ``tsvector`` literal of a message.
+
+    Lexemes are quoted, so Postgres keeps them as they are
+    instead of parsing them with a text search configuration.
+
+    :param text: message text.
+    :return: lexemes with their positions, empty for text without words.
+    """
+    lexemes: List[str] = []
+    position = 0
+    for term in terms(text):
+        for lexeme in term:
+            position = min(position + 1, _MAX_POSITION)
+            lexemes.append("{0}:{1}".format(_quoted(lexeme), position))
+    return " ".join(lexemes)
+
+
+def to_tsquery(text: str) -> Optional[str]:
+    """
+    Make a ``tsquery`` literal matching messages with all terms of a query.
+
+    Pairs of a Thai term must be next to each other,
+    a single Thai letter matches as a prefix.
+
+    :param text: search query.
+    :return: query or None if the text has no words.
+    """
+    parts: List[str] = []
+    for term in terms(text):
+        if len(term) > 1:
+            phrase = " <-> ".join(_quoted(pair) for pair in term)
+            parts.append("({0})".format(phrase))
+        elif _THAI.match(term[0]):
+            parts.append("{0}:*".format(_quoted(term[0])))
+        else:
+            parts.append(_quoted(term[0]))
+    return " & ".join(parts) or None
+
+
+def _pairs(letters: List[str]) -> List[str]:
+    return ["".join(pair) for pair in zip(letters, letters[1:])]
+
+
+def _quoted(lexeme: str) -> str:
+    return "'{0}'".format(lexeme)
@@ -0,0 +1,51 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ResultType = TypeVar("ResultType")
+
+
+class SingleFlight(Generic[KeyType, ResultType]):
+    """
+    Coalesces concurrent calls with the same key.
+
+    While a call for a key is running, other callers with
+    the same key wait for its result instead of starting their own.
+    Cancelling a waiter doesn't cancel the shared call.
+    """
+
+    def __init__(self) -> None:
+        # Number of callers that got a result of someone else's call.
+        self.shared = 0
+        self._calls: "Dict[KeyType, asyncio.Future[ResultType]]" = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(
+        self,
+        key: KeyType,
+        func: Callable[[], Awaitable[ResultType]],
+    ) -> ResultType:
+        """
+        Run ``func`` unless a call with the same key is running.
+
+        :param key: key of the call.
+        :param func: function to call.
+        :return: result of the running or the new call.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(func())
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(call)
+
+    def _forget(self, key: KeyType, call: "asyncio.Future[ResultType]") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]  # noqa: WPS420
+        # All waiters may be gone, mark the error as retrieved.
+        if not call.cancelled():
+            call.exception()
@@ -0,0 +1 @@
+"""Verification of bank transfer slips."""
@@ -0,0 +1,88 @@
+import io
+from enum import Enum
+from typing import List, Optional, Sequence
+
+from pydantic import BaseModel
+
+from gebwai.services.slips.payload import (
+    InvalidSlipPayload,
+    SlipPayload,
+    parse_slip_payload,
+)
+
+# Longer side images are decoded at. Slip QR codes stay readable,
+# and JPEG decoding is much cheaper at a reduced scale.
+MAX_SIDE = 1600
+
+
+class SlipFailure(str, Enum):  # noqa: WPS600
+    """Reasons an image isn't a verifiable slip."""
+
+    UNREADABLE_IMAGE = "unreadable_image"
+    NO_QR_CODE = "no_qr_code"
+    NOT_A_SLIP = "not_a_slip"
+
+
+class SlipResult(BaseModel):
+    """Outcome of decoding one image."""
+
+    payload: Optional[SlipPayload] = None
+    failure: Optional[SlipFailure] = None
+
+    @property
+    def is_slip(self) -> bool:
+        """
+        Whether the image is a slip with a valid QR code.
+
+        :return: True if the payload was read.
+        """
+        return self.payload is not None
+
+
+def decode_slip(image: bytes) -> SlipResult:
+    """
+    Find and parse the slip QR code in an image.
+
+    Needs ``pillow`` and ``zxing-cpp``, it's CPU bound
+    and meant to run in a process pool.
+
+    :param image: encoded image, e.g. JPEG from LINE.
+    :return: slip payload or the reason there is none.
+    """
+    from PIL import Image, UnidentifiedImageError  # noqa: WPS433
+    from zxingcpp import BarcodeFormat, BarcodeFormats, read_barcodes  # noqa: WPS433
+
+    try:
+        with Image.open(io.BytesIO(image)) as opened:
+            # Lets JPEG decode at 1/2, 1/4 or 1/8 of the size.
+            opened.draft("L", (MAX_SIDE, MAX_SIDE))
+            gray = opened.convert("L")
+    except (UnidentifiedImageError, OSError):
+        return SlipResult(failure=SlipFailure.UNREADABLE_IMAGE)
+    gray.thumbnail((MAX_SIDE, MAX_SIDE))
+
+    codes = read_barcodes(gray, formats=BarcodeFormats(BarcodeFormat.QRCode))
+    if not codes:
+        return SlipResult(failure=SlipFailure.NO_QR_CODE)
+    for code in codes:
+        payload = _slip_payload_or_none(code.text)
+        if payload is not None:
+            return SlipResult(payload=payload)
+    return SlipResult(failure=SlipFailure.NOT_A_SLIP)
+
+
+def decode_slips(images: Sequence[bytes]) -> List[SlipResult]:
+    """
+    Decode a batch of images, one pool round trip for all of them.
+
+    :param images: encoded images.
+    :return: results in the same order.
+    """
+    return [decode_slip(image) for image in images]
+
+
+def _slip_payload_or_none(text: str) -> Optional[SlipPayload]:
+    try:
+        return parse_slip_payload(text)
+    except InvalidSlipPayload:
+        return None
@@ -0,0 +1,115 @@
+from typing import Dict
+
+from pydantic import BaseModel
+
+# Payload of the mini QR code on Thai bank transfer slips is EMVCo style
+# tag, two digit length and value, with tag 00 holding the slip fields.
+SLIP_API_ID = "000001"
+_SLIP_TAG = "00"
+_COUNTRY_TAG = "51"
+_CRC_TAG = "91"
+# CRC-16/CCITT-FALSE polynomial, its top bit and 16 bit mask.
+_CRC_POLYNOMIAL = 0x1021
+_CRC_TOP_BIT = 0x8000
+_CRC_MASK = 0xFFFF
+
+
+class InvalidSlipPayload(ValueError):
+    """QR code text isn't a payload of a bank transfer slip."""
+
+
+class SlipPayload(BaseModel):
+    """Transfer a slip QR code refers to."""
+
+    sending_bank: str
+    trans_ref: str
+    country: str
+
+
+def parse_tlv(text: str) -> Dict[str, str]:
+    """
+    Split tag-length-value fields.
+
+    :param text: fields one after another.
+    :return: values by tag.
+    :raises InvalidSlipPayload: if a field is cut short.
+    """
+    fields: Dict[str, str] = {}
+    position = 0
+    while position < len(text):
+        header = text[position : position + 4]
+        if len(header) < 4 or not header[2:].isdigit():
+            raise InvalidSlipPayload("Bad field header at {0}.".format(position))
+        end = position + 4 + int(header[2:])
+        if end > len(text):
+            raise InvalidSlipPayload("Field {0} is cut short.".format(header[:2]))
+        fields[header[:2]] = text[position + 4 : end]
+        position = end
+    return fields
+
+
+def crc16(data: bytes) -> int:
+    """
+    Compute CRC-16/CCITT-FALSE used by EMVCo QR codes.
+
+    :param data: checked bytes.
+    :return: checksum.
+    """
+    crc = _CRC_MASK
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = (crc << 1) ^ _CRC_POLYNOMIAL if crc & _CRC_TOP_BIT else crc << 1
+        crc &= _CRC_MASK
+    return crc
+
+
+def parse_slip_payload(text: str) -> SlipPayload:
+    """
+    Parse text of a slip QR code.
+
+    :param text: decoded QR code.
+    :return: slip fields.
+    :raises InvalidSlipPayload: if the text isn't a valid slip payload.
+    """
+    fields = parse_tlv(text)
+    checksum = fields.get(_CRC_TAG)
+    if checksum is None or not text.endswith(checksum):
+        raise InvalidSlipPayload("Payload has no checksum.")
+    if checksum.upper() != _checksum(text[:-4]):
+        raise InvalidSlipPayload("Payload checksum doesn't match.")
+    slip = parse_tlv(fields.get(_SLIP_TAG, ""))
+    if slip.get("00") != SLIP_API_ID or "01" not in slip or "02" not in slip:
+        raise InvalidSlipPayload("Payload isn't a transfer slip.")
+    return SlipPayload(
+        sending_bank=slip["01"],
+        trans_ref=slip["02"],
+        country=fields.get(_COUNTRY_TAG, ""),
+    )
+
+
+def build_slip_payload(sending_bank: str, trans_ref: str, country: str = "TH") -> str:
+    """
+    Build text of a slip QR code, e.g. for tests.
+
+    :param sending_bank: three digit bank code.
+    :param trans_ref: transaction reference.
+    :param country: country code.
+    :return: payload with checksum.
+    """
+    slip = "".join(
+        _field(tag, value)
+        for tag, value in (("00", SLIP_API_ID), ("01", sending_bank), ("02", trans_ref))
+    )
+    text = "".join(
+        (_field(_SLIP_TAG, slip), _field(_COUNTRY_TAG, country), _CRC_TAG, "04"),
+    )
+    return text + _checksum(text)
+
+
+def _field(tag: str, value: str) -> str:
+    return "{0}{1:02d}{2}".format(tag, len(value), value)
+
+
+def _checksum(text: str) -> str:
+    return "{0:04X}".format(crc16(text.encode()))
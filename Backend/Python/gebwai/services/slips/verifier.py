@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Set, Tuple, Union
+
+from gebwai.services.cache import LRUTTLCache
+from gebwai.services.singleflight import SingleFlight
+from gebwai.services.slips.decoder import SlipResult, decode_slips
+from gebwai.settings import ExecutorKind, settings
+
+_Pending = Tuple[bytes, "asyncio.Future[SlipResult]"]
+
+
+class SlipVerifier:
+    """
+    Slip decoding in a process pool, awaited like a plain coroutine.
+
+    Images are decoded and their QR codes parsed in worker processes.
+    Images waiting at the same time are sent together in batches
+    of up to ``batch_size``, collected for at most ``batch_delay`` seconds,
+    so one pool round trip serves several events.
+    Results are cached by SHA-256 of the image, and concurrent
+    verification of the same image decodes it once.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        batch_size: int,
+        batch_delay: float,
+        cache_size: int,
+        cache_ttl: float,
+        max_workers: Optional[int] = None,
+        executor_kind: ExecutorKind = ExecutorKind.PROCESS,
+    ) -> None:
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_workers = max_workers
+        self.executor_kind = executor_kind
+        # Verifications answered from the cache and decoded in the pool.
+        self.cache_hits = 0
+        self.decoded = 0
+        self._results: LRUTTLCache[str, SlipResult] = LRUTTLCache(
+            cache_size,
+            cache_ttl,
+        )
+        self._decodes: SingleFlight[str, SlipResult] = SingleFlight()
+        self._pending: List[_Pending] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batches: "Set[asyncio.Task[None]]" = set()
+        self._executor: Optional[Executor] = None
+
+    async def verify(self, image: bytes, sha256: Optional[str] = None) -> SlipResult:
+        """
+        Read the slip in an image.
+
+        :param image: encoded image.
+        :param sha256: hash of the image if already known.
+        :return: slip payload or the reason there is none.
+        """
+        key = sha256 or hashlib.sha256(image).hexdigest()
+        cached = self._results.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        return await self._decodes.do(key, lambda: self._decode(key, image))
+
+    def shutdown(self) -> None:
+        """Stop the pool if it was started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _decode(self, key: str, image: bytes) -> SlipResult:
+        loop = asyncio.get_running_loop()
+        result: "asyncio.Future[SlipResult]" = loop.create_future()
+        self._pending.append((image, result))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+        slip = await result
+        self._results.set(key, slip)
+        return slip
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch = self._pending
+        self._pending = []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._decode_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _decode_batch(self, batch: List[_Pending]) -> None:
+        try:
+            slips = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(),
+                decode_slips,
+                [image for image, _ in batch],
+            )
+        except Exception as error:
+            for _, failed in batch:
+                _set_result(failed, error)
+            return
+        self.decoded += len(batch)
+        for (_, result), slip in zip(batch, slips):
+            _set_result(result, slip)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == ExecutorKind.PROCESS:
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers,
+                    thread_name_prefix="slip-verifier",
+                )
+        return self._executor
+
+
+def _set_result(
+    result: "asyncio.Future[SlipResult]",
+    outcome: Union[SlipResult, Exception],
+) -> None:
+    # Callers who gave up waiting have cancelled their futures.
+    if result.done():
+        return
+    if isinstance(outcome, Exception):
+        result.set_exception(outcome)
+    else:
+        result.set_result(outcome)
+
+
+slip_verifier = SlipVerifier(
+    batch_size=settings.slip_batch_size,
+    batch_delay=settings.slip_batch_delay,
+    cache_size=settings.slip_cache_size,
+    cache_ttl=settings.slip_cache_ttl,
+    max_workers=settings.slip_workers,
+)
@@ -0,0 +1,179 @@
+import asyncio
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.dialects.postgresql import Insert, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col
+
+from gebwai.db.models.user_model import MonthlyStats
+from gebwai.settings import settings
+
+# Months start at 00:00 in Thailand.
+STATS_TIMEZONE = timezone(timedelta(hours=7))
+COUNTER_COLUMNS = (
+    "n_geb_all",
+    "n_process_slip",
+    "n_image",
+    "n_audio",
+    "n_file",
+    "n_video",
+    "n_slip",
+    "n_link",
+    "n_chat",
+)
+# Rows per statement, well below the bind parameter limit.
+_ROWS_PER_STATEMENT = 1000
+
+StatsKey = Tuple[str, date]
+
+
+def stats_month(at: Optional[datetime] = None) -> date:
+    """
+    Get month a moment is counted in.
+
+    :param at: moment, now by default.
+    :return: first day of the month in Thailand.
+    """
+    moment = at.astimezone(STATS_TIMEZONE) if at else datetime.now(STATS_TIMEZONE)
+    return moment.date().replace(day=1)
+
+
+class MonthlyStatsCounter:
+    """
+    Incremental per-user monthly stats.
+
+    Counts are added up in memory and flushed every ``flush_interval``
+    seconds with one ``INSERT ... ON CONFLICT DO UPDATE SET n = n + k``
+    per batch of rows, so reading stats is a primary key lookup
+    and a new month only starts a new row.
+    Counts are dropped while the counter has no engine.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float,
+        engine: Optional[AsyncEngine] = None,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.engine = engine
+        self._pending: Dict[StatsKey, "Counter[str]"] = {}
+        self._closing: Optional[asyncio.Event] = None
+        self._flusher: "Optional[asyncio.Task[None]]" = None
+
+    def add_item(
+        self,
+        line_user_id: str,
+        file_type: str,
+        at: Optional[datetime] = None,
+    ) -> None:
+        """
+        Count a collected item.
+
+        :param line_user_id: LINE user id of the collecting user.
+        :param file_type: field name of ``NGebByFileType``.
+        :param at: when the item was collected, now by default.
+        """
+        counts = {"n_geb_all": 1, f"n_{file_type}": 1}
+        self._add(line_user_id, at, **counts)
+
+    def add_processed_slip(
+        self,
+        line_user_id: str,
+        at: Optional[datetime] = None,
+    ) -> None:
+        """
+        Count a processed payment slip.
+
+        :param line_user_id: LINE user id of the collecting user.
+        :param at: when the slip was processed, now by default.
+        """
+        self._add(line_user_id, at, n_process_slip=1)
+
+    async def flush(self) -> None:
+        """Write counts added so far."""
+        pending = self._pending
+        self._pending = {}
+        if not pending:
+            return
+        try:
+            await self.write(pending)
+        except Exception as error:
+            logger.warning("Keeping stats of {0} users: {1}", len(pending), error)
+            for key, counts in pending.items():
+                self._pending.setdefault(key, Counter()).update(counts)
+
+    async def write(self, pending: Dict[StatsKey, "Counter[str]"]) -> None:
+        """
+        Add counts to stored stats.
+
+        :param pending: counts by user and month.
+        """
+        if self.engine is None:
+            return
+        rows = _rows(pending)
+        async with self.engine.begin() as conn:
+            for start in range(0, len(rows), _ROWS_PER_STATEMENT):
+                await conn.execute(_upsert(rows[start : start + _ROWS_PER_STATEMENT]))
+
+    async def close(self) -> None:
+        """Stop periodic flushing once a write in progress ends, and write the rest."""
+        if self._closing is not None:
+            self._closing.set()
+        if self._flusher is not None:
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        self._closing = None
+        self._flusher = None
+        await self.flush()
+
+    def _add(self, line_user_id: str, at: Optional[datetime], **counts: int) -> None:
+        if self.engine is None:
+            return
+        key = (line_user_id, stats_month(at))
+        self._pending.setdefault(key, Counter()).update(counts)
+        if self._closing is None:
+            self._closing = asyncio.Event()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_forever(self._closing))
+
+    async def _flush_forever(self, closing: asyncio.Event) -> None:
+        # Not cancelled on close, so counts being written aren't dropped.
+        while not closing.is_set():
+            try:
+                await asyncio.wait_for(closing.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+
+def _rows(pending: Dict[StatsKey, "Counter[str]"]) -> List[Dict[str, Any]]:
+    updated = datetime.now()
+    return [
+        {
+            "line_user_id": line_user_id,
+            "month": month,
+            "updated": updated,
+            **{column: counts[column] for column in COUNTER_COLUMNS},
+        }
+        # Same order in every worker, so concurrent flushes don't deadlock.
+        for (line_user_id, month), counts in sorted(pending.items())
+    ]
+
+
+def _upsert(rows: List[Dict[str, Any]]) -> Insert:
+    statement = insert(MonthlyStats).values(rows)
+    table = statement.table
+    return statement.on_conflict_do_update(
+        index_elements=[col(MonthlyStats.line_user_id), col(MonthlyStats.month)],
+        set_={
+            "updated": statement.excluded.updated,
+            **{
+                column: table.c[column] + statement.excluded[column]
+                for column in COUNTER_COLUMNS
+            },
+        },
+    )
+
+
+monthly_stats = MonthlyStatsCounter(flush_interval=settings.stats_flush_interval)
@@ -0,0 +1,211 @@
+from functools import partial
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from gebwai.db.dao.user_dao import UserDAO
+from gebwai.db.models.user_model import SourceSettings, TemplateSourceSettings, User
+from gebwai.services.cache import LRUTTLCache
+from gebwai.services.line.profiles import LineProfileCache, profile_cache
+from gebwai.services.singleflight import SingleFlight
+from gebwai.settings import settings
+
+ResultType = TypeVar("ResultType")
+
+
+class UserDirectory:
+    """
+    Loads and creates users and their source settings.
+
+    Concurrent calls for the same user or source share one
+    database round trip, and results are kept in a short-lived
+    identity cache, so a burst of events from one user
+    reads the user once and writes nothing when nothing changed.
+    Writes are single ``INSERT ... ON CONFLICT`` statements.
+    """
+
+    def __init__(
+        self,
+        line_profiles: LineProfileCache,
+        max_size: int,
+        ttl: float,
+        session_factory: "Optional[async_sessionmaker[AsyncSession]]" = None,
+    ) -> None:
+        self.profiles = line_profiles
+        self.session_factory = session_factory
+        self._users: LRUTTLCache[str, User] = LRUTTLCache(max_size, ttl)
+        self._source_settings: LRUTTLCache[
+            Tuple[str, str],
+            SourceSettings,
+        ] = LRUTTLCache(max_size, ttl)
+        self._user_loads: SingleFlight[
+            Tuple[str, bool],
+            Optional[User],
+        ] = SingleFlight()
+        self._source_loads: SingleFlight[
+            Tuple[str, str],
+            SourceSettings,
+        ] = SingleFlight()
+        self._collecting: LRUTTLCache[str, List[str]] = LRUTTLCache(max_size, ttl)
+        self._collecting_loads: SingleFlight[str, List[str]] = SingleFlight()
+
+    async def get_it_done(
+        self,
+        line_user_id: str,
+        *,
+        create_or_unblock_if_not_exists: bool = False,
+    ) -> Optional[User]:
+        """
+        Get a user, creating or unblocking them if asked.
+
+        :param line_user_id: LINE user id.
+        :param create_or_unblock_if_not_exists: make sure the user
+            exists and isn't blocked.
+        :return: user or None if they don't exist and weren't created.
+        """
+        user = self._users.get(line_user_id)
+        if user is not None:
+            needs_unblock = create_or_unblock_if_not_exists and user.is_blocked
+            if not needs_unblock:
+                return user
+
+        key = (line_user_id, create_or_unblock_if_not_exists)
+        return await self._user_loads.do(
+            key,
+            partial(self._load_user, *key),
+        )
+
+    async def get_or_create_source_settings(
+        self,
+        line_user_id: str,
+        source_id: str,
+        *,
+        before_follow_gebwai: bool = False,
+    ) -> SourceSettings:
+        """
+        Get settings of a source of a user, creating them on first use.
+
+        :param line_user_id: LINE user id.
+        :param source_id: id of a group, room or user.
+        :param before_follow_gebwai: whether the source was joined
+            before the user followed the bot.
+        :return: source settings.
+        """
+        key = (line_user_id, source_id)
+        source_settings = self._source_settings.get(key)
+        if source_settings is not None:
+            return source_settings
+
+        return await self._source_loads.do(
+            key,
+            lambda: self._load_source_settings(
+                line_user_id,
+                source_id,
+                before_follow_gebwai,
+            ),
+        )
+
+    async def get_collecting_users(self, source_id: str) -> List[str]:
+        """
+        Get users who collect files from a source.
+
+        :param source_id: id of a group, room or user.
+        :return: LINE user ids.
+        """
+        collecting = self._collecting.get(source_id)
+        if collecting is not None:
+            return collecting
+
+        return await self._collecting_loads.do(
+            source_id,
+            lambda: self._load_collecting_users(source_id),
+        )
+
+    def forget(self, line_user_id: str) -> None:
+        """
+        Drop a cached user, e.g. after they were blocked.
+
+        :param line_user_id: LINE user id.
+        """
+        self._users.pop(line_user_id)
+
+    async def _load_user(
+        self,
+        line_user_id: str,
+        create_or_unblock: bool,
+    ) -> Optional[User]:
+        user = await self._session_call(lambda dao: dao.get_user(line_user_id))
+        if create_or_unblock and (user is None or user.is_blocked):
+            # Stores the profile for new users.
+            await self.profiles.get_user(line_user_id)
+            user = await self._session_call(
+                lambda dao: self._create_or_unblock(dao, line_user_id),
+                commit=True,
+            )
+        if user is not None:
+            self._users.set(line_user_id, user)
+        return user
+
+    async def _load_source_settings(
+        self,
+        line_user_id: str,
+        source_id: str,
+        before_follow_gebwai: bool,
+    ) -> SourceSettings:
+        source_settings = await self._session_call(
+            lambda dao: dao.get_source_settings(line_user_id, source_id),
+        )
+        if source_settings is None:
+            user_settings = await self._session_call(
+                lambda dao: dao.get_user_settings(line_user_id),
+            )
+            new = SourceSettings.create_from_template(
+                line_user_id=line_user_id,
+                starting_source_name=await self.profiles.get_source_name(source_id),
+                source_id=source_id,
+                template=(
+                    user_settings.default_source_settings
+                    if user_settings
+                    else TemplateSourceSettings()
+                ),
+            )
+            new.before_follow_gebwai = before_follow_gebwai
+            source_settings = await self._session_call(
+                lambda dao: dao.ensure_source_settings(new),
+                commit=True,
+            )
+            self._collecting.pop(source_id)
+        self._source_settings.set((line_user_id, source_id), source_settings)
+        return source_settings
+
+    async def _load_collecting_users(self, source_id: str) -> List[str]:
+        collecting = await self._session_call(
+            lambda dao: dao.get_collecting_users(source_id),
+        )
+        self._collecting.set(source_id, collecting)
+        return collecting
+
+    async def _create_or_unblock(self, dao: UserDAO, line_user_id: str) -> User:
+        user = await dao.upsert_user(line_user_id)
+        await dao.insert_user_settings(line_user_id)
+        return user
+
+    async def _session_call(
+        self,
+        call: Callable[[UserDAO], Awaitable[ResultType]],
+        commit: bool = False,
+    ) -> ResultType:
+        if self.session_factory is None:
+            raise RuntimeError("Database isn't set up for the user directory.")
+        async with self.session_factory() as session:
+            result = await call(UserDAO(session))
+            if commit:
+                await session.commit()
+        return result
+
+
+user_directory = UserDirectory(
+    profile_cache,
+    max_size=settings.user_cache_size,
+    ttl=settings.user_cache_ttl,
+)
@@ -1,7 +1,7 @@
 import enum
 from pathlib import Path
 from tempfile import gettempdir
-from typing import Optional
+from typing import Dict, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from yarl import URL
@@ -20,6 +20,35 @@ class LogLevel(str, enum.Enum):  # noqa: WPS600
     FATAL = "FATAL"
 
 
+class ExecutorKind(str, enum.Enum):  # noqa: WPS600
+    """Kinds of pools for blocking work."""
+
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class BulkWriteMethod(str, enum.Enum):  # noqa: WPS600
+    """Ways to write batches of rows."""
+
+    COPY = "copy"
+    INSERT = "insert"
+
+
+class MediaStorageKind(str, enum.Enum):  # noqa: WPS600
+    """Places to keep content of collected messages."""
+
+    LOCAL = "local"
+    S3 = "s3"
+
+
+class BrokerKind(str, enum.Enum):  # noqa: WPS600
+    """Ways to pass tasks to taskiq workers."""
+
+    ZEROMQ = "zeromq"
+    POSTGRES = "postgres"
+    INMEMORY = "inmemory"
+
+
 class Settings(BaseSettings):
     """
     Application settings.
@@ -39,6 +68,14 @@ class Settings(BaseSettings):
     environment: str = "dev"
 
     log_level: LogLevel = LogLevel.INFO
+    # Logs are written to stdout by a background thread if log_queued,
+    # as JSON lines if log_json. Records of loggers in log_sample_rates
+    # are kept at that rate, and of loggers in log_rate_limits up to that
+    # many per second and process. Warnings and errors are always kept.
+    log_queued: bool = True
+    log_json: bool = False
+    log_sample_rates: Dict[str, float] = {}
+    log_rate_limits: Dict[str, float] = {"uvicorn.access": 100}
     # Variables for the database
     db_host: str = "localhost"
     db_port: int = 5432
@@ -46,6 +83,30 @@ class Settings(BaseSettings):
     db_pass: str = "gebwai"
     db_base: str = "gebwai"
     db_echo: bool = False
+    # Connection pool of each worker process. Connections used at once
+    # across the deployment are up to
+    # workers_count * (db_pool_size + db_max_overflow).
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    # Seconds to wait for a free connection before failing.
+    db_pool_timeout: float = 10
+    # Connections older than this are reopened, in seconds.
+    db_pool_recycle: int = 1800
+    # Check connections with a round trip when they're taken from the pool.
+    db_pool_pre_ping: bool = True
+    # Prepared statements cached by asyncpg per connection.
+    db_statement_cache_size: int = 500
+    # Statements running longer than this are cancelled, in seconds.
+    db_statement_timeout: Optional[float] = None
+    # Connect through PgBouncer in transaction pooling mode.
+    db_pgbouncer: bool = False
+    # Optional read replica for read-only sessions, same user and database.
+    # Reads go to the primary while the replica lags more than
+    # db_replica_max_lag seconds, checked every db_replica_lag_check_interval.
+    db_replica_host: Optional[str] = None
+    db_replica_port: int = 5432
+    db_replica_max_lag: float = 5
+    db_replica_lag_check_interval: float = 1
 
     # Sentry's configuration.
     sentry_dsn: Optional[str] = None
@@ -55,9 +116,167 @@ class Settings(BaseSettings):
     # E.G. http://localhost:4317
     opentelemetry_endpoint: Optional[str] = None
 
+    # Every process writes its metrics to metrics_dir each
+    # metrics_flush_interval seconds, GET /api/metrics adds up all of them.
+    metrics_dir: Path = TEMP_DIR / "gebwai-metrics"
+    metrics_flush_interval: float = 5
+
+    # Broker passing tasks to taskiq workers. ZeroMQ needs workers on the
+    # same host and loses tasks in flight, Postgres keeps them in the database
+    # until a worker finishes them. Tests always use the in-memory broker.
+    broker: BrokerKind = BrokerKind.ZEROMQ
+    broker_zmq_pub_host: str = "tcp://0.0.0.0:5555"
+    broker_zmq_sub_host: str = "tcp://localhost:5555"
+    # A claimed task is given to another worker if it isn't finished
+    # within broker_visibility_timeout seconds, which a live worker extends.
+    broker_visibility_timeout: float = 60
+    # Failed tasks are retried after broker_retry_delay seconds, doubled
+    # per attempt up to broker_retry_max_delay, and moved to the dead letter
+    # table after broker_max_attempts attempts.
+    broker_max_attempts: int = 5
+    broker_retry_delay: float = 10
+    broker_retry_max_delay: float = 60 * 60
+    # Tasks claimed per query, and how often idle workers look for tasks
+    # if they miss a notification.
+    broker_claim_batch_size: int = 10
+    broker_poll_interval: float = 1
+    # Tasks of a queue a worker process runs at once. Workers take replies first,
+    # then slips, media and background tasks. Queues missing here are limited
+    # by the worker's --max-async-tasks only.
+    broker_queue_concurrency: Dict[str, int] = {
+        "slips": 4,
+        "media": 8,
+        "background": 8,
+    }
+
+    # Results of tasks declared with task_cache.cached are kept in an LRU cache
+    # of task_cache_max_size entries per process, and in Postgres
+    # for all workers if task_cache_shared.
+    task_cache_max_size: int = 10000
+    task_cache_shared: bool = False
+
     # LINE
     LINE_ACCESS_TOKEN: str
     LINE_CHANNEL_SECRET: str
+    line_api_host: str = "https://api.line.me"
+    # Connections kept to the Messaging API and their idle keepalive.
+    line_api_pool_size: int = 100
+    line_api_keepalive: float = 30
+    line_api_timeout: float = 10
+    # Requests per second allowed by LINE for each endpoint.
+    line_api_rate_limits: Dict[str, float] = {
+        "reply": 2000,
+        "push": 2000,
+        "multicast": 200,
+        "profile": 2000,
+        "group_summary": 2000,
+    }
+    # Reply tokens older than this are not tried, messages are pushed instead.
+    line_reply_token_ttl: float = 50
+    # Time to collect outbound messages before sending them together.
+    line_messages_flush_delay: float = 0.01
+    # Reply 200 right after the signature check
+    # and handle webhook events on the taskiq broker.
+    line_webhook_ack_first: bool = False
+    # Handle events of a source in one worker at a time in ack-first mode,
+    # under a lease row in Postgres renewed while its events are handled.
+    # Leases of stopped workers are taken over after line_source_lock_ttl.
+    line_source_lock: bool = True
+    line_source_lock_ttl: float = 30
+    # Events handled at the same time across all sources.
+    line_dispatch_max_in_flight: int = 32
+    # Events of one source waiting to be handled before submitting blocks.
+    line_dispatch_max_pending_per_source: int = 100
+    # Webhook bodies bigger than this are parsed outside the event loop
+    # in a "thread" or "process" pool of line_parse_workers workers.
+    line_parse_offload_bytes: int = 65536
+    line_parse_executor: ExecutorKind = ExecutorKind.THREAD
+    line_parse_workers: Optional[int] = None
+    # Webhook event ids remembered to drop redeliveries, in seconds.
+    line_dedup_ttl: float = 24 * 60 * 60
+    line_dedup_max_size: int = 100000
+    # Share seen event ids between workers through the database.
+    line_dedup_shared: bool = False
+    # Profiles and group summaries kept in memory and for how long,
+    # stored ones older than line_profile_fresh_for are refreshed.
+    line_profile_cache_size: int = 10000
+    line_profile_cache_ttl: float = 10 * 60
+    line_profile_fresh_for: float = 24 * 60 * 60
+
+    # Collected items are written in batches of up to item_write_batch_size
+    # rows at least every item_write_flush_interval seconds, handlers wait
+    # while item_write_max_pending rows are queued.
+    item_write_batch_size: int = 1000
+    item_write_flush_interval: float = 0.05
+    item_write_max_pending: int = 10000
+    item_write_method: BulkWriteMethod = BulkWriteMethod.COPY
+    # Largest page of the item listing API.
+    item_list_max_limit: int = 1000
+    # Most results of one text search.
+    search_max_limit: int = 100
+
+    # Content of collected images, videos, audio and files is downloaded
+    # by taskiq workers in chunks of media_chunk_size bytes,
+    # media_download_concurrency downloads at once per worker process.
+    line_api_data_host: str = "https://api-data.line.me"
+    media_chunk_size: int = 65536
+    media_download_concurrency: int = 8
+    media_download_timeout: float = 5 * 60
+    # Content is kept in a local directory or an S3 compatible bucket.
+    # For MinIO set media_s3_endpoint, e.g. http://localhost:9000.
+    media_storage: MediaStorageKind = MediaStorageKind.LOCAL
+    media_local_root: Path = Path("media")
+    media_s3_bucket: str = "gebwai-media"
+    media_s3_endpoint: Optional[str] = None
+    media_s3_region: str = "us-east-1"
+    media_s3_access_key: Optional[str] = None
+    media_s3_secret_key: Optional[str] = None
+    # Uploaded to S3 in parts of this size, the minimum is 5 MiB.
+    media_s3_part_size: int = 8 * 1024 * 1024
+    # Thumbnails and previews of images and videos, longer side in pixels
+    # by name. They're made right after download if media_derivatives_eager,
+    # else on first request, kept next to the content, and served from
+    # a disk cache of up to media_derivative_cache_bytes per host.
+    # Rendering needs the media extra, without it they're never made eagerly.
+    media_derivative_sizes: Dict[str, int] = {"thumbnail": 256, "preview": 1024}
+    media_derivatives_eager: bool = True
+    media_derivative_workers: Optional[int] = None
+    media_derivative_cache_dir: Path = TEMP_DIR / "gebwai-derivatives"
+    media_derivative_cache_bytes: int = 1024 * 1024 * 1024
+    # Stored content nobody referenced for media_gc_grace seconds is deleted
+    # media_gc_batch_size blobs at a time on the media_gc_cron schedule.
+    media_gc_grace: float = 24 * 60 * 60
+    media_gc_batch_size: int = 1000
+    media_gc_cron: str = "17 * * * *"
+
+    # Slips are decoded in a pool of slip_workers processes, CPU count
+    # by default, in batches of up to slip_batch_size images collected
+    # for at most slip_batch_delay seconds. Results are cached by image hash.
+    slip_workers: Optional[int] = None
+    slip_batch_size: int = 4
+    slip_batch_delay: float = 0.005
+    slip_cache_size: int = 10000
+    slip_cache_ttl: float = 24 * 60 * 60
+
+    # Previews of collected links are fetched by taskiq workers,
+    # link_unfurl_concurrency requests at once per worker process and
+    # link_unfurl_domain_concurrency per host, reading at most
+    # link_unfurl_max_bytes of each page. They're kept link_unfurl_ttl seconds.
+    link_unfurl_concurrency: int = 20
+    link_unfurl_domain_concurrency: int = 2
+    link_unfurl_max_bytes: int = 65536
+    link_unfurl_timeout: float = 10
+    link_unfurl_ttl: float = 24 * 60 * 60
+    link_unfurl_cache_size: int = 10000
+    link_unfurl_max_links: int = 5
+    link_unfurl_user_agent: str = "gebwai-link-preview/1.0 (+https://gebwai.com)"
+
+    # Monthly stats counted in memory are added to stored ones this often.
+    stats_flush_interval: float = 5
+
+    # Users and source settings kept in memory between events, in seconds.
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 30
 
     @property
     def db_url(self) -> URL:
@@ -75,6 +294,19 @@ class Settings(BaseSettings):
             path=f"/{self.db_base}",
         )
 
+    @property
+    def db_replica_url(self) -> Optional[URL]:
+        """
+        Assemble read replica URL from settings.
+
+        :return: replica URL or None if there's no replica.
+        """
+        if self.db_replica_host is None:
+            return None
+        return self.db_url.with_host(self.db_replica_host).with_port(
+            self.db_replica_port,
+        )
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_prefix="BACKEND_",
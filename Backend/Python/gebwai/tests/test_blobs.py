@@ -0,0 +1,226 @@
+import hashlib
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Sequence
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlmodel import col
+
+from gebwai.db.dao.blob_dao import BlobDAO
+from gebwai.db.dao.item_dao import ItemDAO
+from gebwai.db.models.blob_model import Blob
+from gebwai.db.models.item_model import GebItem
+from gebwai.services.media.blobs import BlobStore, blob_key, derivative_key, poster_key
+from gebwai.services.media.downloader import StoredContent
+from gebwai.services.media.storage import LocalStorage
+
+
+class FakeDownloader:
+    """Downloader storing content from a dict instead of LINE."""
+
+    def __init__(self, root: Path, contents: Dict[str, bytes]) -> None:
+        self.storage = LocalStorage(root)
+        self.contents = contents
+        self.downloads: List[str] = []
+
+    async def download(self, message_id: str, key: str) -> StoredContent:
+        """
+        Store content of a message.
+
+        :param message_id: id of the message.
+        :param key: key to store the content with.
+        :return: stored content.
+        """
+        self.downloads.append(message_id)
+        content = self.contents[message_id]
+        await self.storage.put(key, _chunks(content))
+        return StoredContent(
+            key=key,
+            sha256=hashlib.sha256(content).hexdigest(),
+            size=len(content),
+        )
+
+
+async def _chunks(content: bytes) -> AsyncIterator[bytes]:
+    yield content
+
+
+async def _add_items(engine: AsyncEngine, *message_ids: str) -> None:
+    async with async_sessionmaker(engine)() as session:
+        session.add_all(
+            GebItem(
+                message_id=message_id,
+                source_id=f"C{index}",
+                file_type="image",
+                collected_at=datetime.now(),
+            )
+            for index, message_id in enumerate(message_ids)
+        )
+        await session.commit()
+
+
+async def _release(engine: AsyncEngine, message_id: str) -> None:
+    async with async_sessionmaker(engine)() as session:
+        items = await session.scalars(
+            select(GebItem).where(col(GebItem.message_id) == message_id),
+        )
+        await BlobDAO(session).release([item.id for item in items if item.id])
+        await session.commit()
+
+
+def _store(
+    engine: AsyncEngine,
+    downloader: FakeDownloader,
+    derivative_sides: Sequence[int] = (),
+) -> BlobStore:
+    return BlobStore(
+        downloader,  # type: ignore
+        gc_grace=0,
+        gc_batch_size=10,
+        derivative_sides=derivative_sides,
+        session_factory=async_sessionmaker(engine, expire_on_commit=False),
+    )
+
+
+@pytest.mark.anyio
+async def test_forwarded_content_is_stored_once(
+    _engine: AsyncEngine,
+    tmp_path: Path,
+) -> None:
+    """Tests that identical content of two messages is one blob."""
+    content = uuid.uuid4().bytes * 1000
+    first, second = uuid.uuid4().hex, uuid.uuid4().hex
+    downloader = FakeDownloader(tmp_path, {first: content, second: content})
+    store = _store(_engine, downloader)
+    await _add_items(_engine, first, second)
+
+    assert await store.collect(first) == await store.collect(second)
+
+    sha256 = hashlib.sha256(content).hexdigest()
+    async with async_sessionmaker(_engine)() as session:
+        blob = await session.get(Blob, sha256)
+    assert blob is not None and blob.ref_count == 2
+    assert (store.stored, store.deduplicated) == (1, 1)
+    assert (tmp_path / blob_key(sha256)).read_bytes() == content
+    assert not list((tmp_path / "incoming").iterdir())
+
+
+@pytest.mark.anyio
+async def test_downloaded_message_is_skipped(
+    _engine: AsyncEngine,
+    tmp_path: Path,
+) -> None:
+    """Tests that a message downloaded before isn't downloaded again."""
+    message_id = uuid.uuid4().hex
+    downloader = FakeDownloader(tmp_path, {message_id: b"slip"})
+    store = _store(_engine, downloader)
+    await _add_items(_engine, message_id)
+
+    await store.collect(message_id, size=4)
+    await store.collect(message_id, size=4)
+
+    assert downloader.downloads == [message_id]
+    assert store.skipped == 1
+
+
+@pytest.mark.anyio
+async def test_unreferenced_blobs_are_collected(
+    _engine: AsyncEngine,
+    tmp_path: Path,
+) -> None:
+    """Tests that blobs are deleted once their items let them go."""
+    message_id = uuid.uuid4().hex
+    content = uuid.uuid4().bytes
+    store = _store(_engine, FakeDownloader(tmp_path, {message_id: content}))
+    await _add_items(_engine, message_id)
+    sha256 = await store.collect(message_id)
+
+    await _release(_engine, message_id)
+    await store.collect_garbage()
+
+    async with async_sessionmaker(_engine)() as session:
+        assert await session.get(Blob, sha256) is None
+    assert not (tmp_path / blob_key(sha256)).exists()
+
+
+@pytest.mark.anyio
+async def test_posters_and_derivatives_are_collected(
+    _engine: AsyncEngine,
+    tmp_path: Path,
+) -> None:
+    """Tests that a poster and derivatives are deleted with their blob."""
+    message_id = uuid.uuid4().hex
+    downloader = FakeDownloader(tmp_path, {message_id: uuid.uuid4().bytes})
+    store = _store(_engine, downloader, derivative_sides=[320, 1024])
+    await _add_items(_engine, message_id)
+    sha256 = await store.collect(message_id)
+    keys = [
+        poster_key(sha256),
+        derivative_key(sha256, 320),
+        derivative_key(sha256, 1024),
+    ]
+    for derived_key in keys:
+        await downloader.storage.put(derived_key, _chunks(b"derived"))
+
+    await _release(_engine, message_id)
+    await store.collect_garbage()
+
+    paths = [tmp_path / key for key in (blob_key(sha256), *keys)]
+    assert not any(path.exists() for path in paths)
+
+
+class FailingReferences:
+    """Reference writer of a database going away after the content is stored."""
+
+    async def __call__(self, *args: object) -> None:
+        """
+        Fail to write references.
+
+        :param args: hash, message id and size.
+        :raises ConnectionError: always.
+        """
+        raise ConnectionError("database is down")
+
+
+@pytest.mark.anyio
+async def test_content_without_references_is_collected(
+    _engine: AsyncEngine,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that content isn't orphaned when its references can't be written."""
+    message_id = uuid.uuid4().hex
+    content = uuid.uuid4().bytes
+    store = _store(_engine, FakeDownloader(tmp_path, {message_id: content}))
+    await _add_items(_engine, message_id)
+    monkeypatch.setattr(store, "_reference", FailingReferences())
+    with pytest.raises(ConnectionError):
+        await store.collect(message_id)
+
+    await store.collect_garbage()
+
+    sha256 = hashlib.sha256(content).hexdigest()
+    assert not (tmp_path / blob_key(sha256)).exists()
+
+
+@pytest.mark.anyio
+async def test_deleted_message_releases_its_blob(
+    _engine: AsyncEngine,
+    tmp_path: Path,
+) -> None:
+    """Tests that deleting items of an unsent message lets their blob go."""
+    message_id = uuid.uuid4().hex
+    store = _store(_engine, FakeDownloader(tmp_path, {message_id: b"unsent"}))
+    await _add_items(_engine, message_id)
+    sha256 = await store.collect(message_id)
+
+    async with async_sessionmaker(_engine)() as session:
+        deleted = await ItemDAO(session).delete_message(message_id)
+        await session.commit()
+    await store.collect_garbage()
+
+    assert deleted == 1
+    assert not (tmp_path / blob_key(sha256)).exists()
@@ -0,0 +1,304 @@
+import asyncio
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pytest
+from sqlalchemy import Row, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from taskiq import BrokerMessage, InMemoryBroker, TaskiqMessage, ZeroMQBroker
+from taskiq.utils import maybe_awaitable
+
+from gebwai.brokers.postgres import PostgresBroker, backoff_delay
+from gebwai.brokers.queues import TaskQueue
+from gebwai.db.dao.task_queue_dao import TaskQueueDAO
+from gebwai.db.models.queue_model import DeadTask, QueuedTask
+from gebwai.settings import BrokerKind, settings
+from gebwai.tkq import create_broker
+
+# Rows of the task queue or of the dead letter table.
+Rows = List[Row[Any]]
+
+
+def test_retry_delay_backs_off() -> None:
+    """Tests that retries wait twice as long each time, up to a limit."""
+    delays = [backoff_delay(attempts, 10, 60) for attempts in range(1, 6)]
+
+    assert delays == [10, 20, 40, 60, 60]
+
+
+def test_broker_is_chosen_in_settings() -> None:
+    """Tests the broker kinds, tests always getting the in-memory one."""
+    assert _broker_kind(BrokerKind.POSTGRES) is PostgresBroker
+    assert _broker_kind(BrokerKind.ZEROMQ) is ZeroMQBroker
+    assert _broker_kind(BrokerKind.INMEMORY) is InMemoryBroker
+    assert _broker_kind(BrokerKind.POSTGRES, environment="pytest") is InMemoryBroker
+
+
+def _broker_kind(broker: BrokerKind, environment: str = "prod") -> type:
+    config = settings.model_copy(
+        update={"broker": broker, "environment": environment},
+    )
+    return type(create_broker(config))
+
+
+@pytest.fixture
+async def _empty_queue(_engine: AsyncEngine) -> AsyncEngine:
+    """
+    Empty the task queue and the dead letter table.
+
+    :param _engine: current engine.
+    :return: the engine.
+    """
+    async with _engine.begin() as conn:
+        await conn.execute(delete(QueuedTask))
+        await conn.execute(delete(DeadTask))
+    return _engine
+
+
+def _broker(
+    engine: AsyncEngine,
+    visibility_timeout: float = 60,
+    queue_concurrency: Optional[Dict[str, int]] = None,
+) -> PostgresBroker:
+    return PostgresBroker(
+        engine,
+        visibility_timeout=visibility_timeout,
+        max_attempts=2,
+        retry_delay=30,
+        retry_max_delay=60,
+        claim_batch_size=10,
+        poll_interval=0.01,
+        queue_concurrency=queue_concurrency,
+    )
+
+
+async def _kick(
+    broker: PostgresBroker,
+    queue: TaskQueue = TaskQueue.BACKGROUND,
+    fair_key: str = "",
+) -> str:
+    task_id = uuid.uuid4().hex
+    await broker.kick(
+        BrokerMessage(
+            task_id=task_id,
+            task_name="test:task",
+            message=task_id.encode(),
+            labels={"queue": queue.value, "fair_key": fair_key},
+        ),
+    )
+    return task_id
+
+
+async def _kick_all(
+    broker: PostgresBroker,
+    queues: Iterable[TaskQueue],
+    fair_key: str,
+) -> List[str]:
+    return [await _kick(broker, queue, fair_key) for queue in queues]
+
+
+async def _claimed_ids(broker: PostgresBroker) -> List[str]:
+    return [task.task_id for task in await broker.claim(10)]
+
+
+async def _run_failing(broker: PostgresBroker, task_id: str) -> None:
+    # What a worker does with a task that raises.
+    await broker.claim(10)
+    await broker.fail(task_id, "RuntimeError()", broker.max_attempts)
+    await broker.ack(task_id)
+
+
+async def _queue_rows(engine: AsyncEngine) -> Tuple[Rows, Rows]:
+    async with engine.connect() as conn:
+        queued = await conn.execute(select(QueuedTask))
+        dead = await conn.execute(select(DeadTask))
+    return list(queued), list(dead)
+
+
+async def _fair_task(message_id: str, source_id: str) -> None:
+    """
+    Task of a source.
+
+    :param message_id: LINE message id.
+    :param source_id: LINE source id.
+    """
+
+
+async def _sent_labels(
+    broker: PostgresBroker,
+    args: List[str],
+    labels: Dict[str, str],
+) -> Dict[str, Any]:
+    message = TaskiqMessage(
+        task_id="1",
+        task_name="test:fair",
+        labels={"fair_by": "source_id", **labels},
+        args=args,
+        kwargs={},
+    )
+    for middleware in broker.middlewares:
+        message = await maybe_awaitable(middleware.pre_send(message))
+    return message.labels
+
+
+@pytest.mark.anyio
+async def test_fair_key_is_taken_from_argument() -> None:
+    """Tests that a task's fair_by label names the argument used as its key."""
+    broker = _broker(None)  # type: ignore
+    broker.register_task(_fair_task, task_name="test:fair", fair_by="source_id")
+
+    labels = await _sent_labels(broker, ["M1", "C1"], {})
+    assert labels["fair_key"] == "C1"
+    labels = await _sent_labels(broker, ["M1", "C1"], {"fair_key": "U1"})
+    assert labels["fair_key"] == "U1"
+
+
+@pytest.mark.anyio
+async def test_claimed_task_is_deleted_when_done(_empty_queue: AsyncEngine) -> None:
+    """Tests that a task is claimed once and gone after its ack."""
+    broker = _broker(_empty_queue)
+    task_id = await _kick(broker)
+
+    assert await _claimed_ids(broker) == [task_id]
+    assert not await broker.claim(10)
+
+    await broker.ack(task_id)
+    assert not broker.in_flight
+    assert await _queue_rows(_empty_queue) == ([], [])
+
+
+@pytest.mark.anyio
+async def test_unfinished_task_is_claimed_again(_empty_queue: AsyncEngine) -> None:
+    """Tests that a task reappears after its visibility timeout."""
+    broker = _broker(_empty_queue, visibility_timeout=0)
+    task_id = await _kick(broker)
+
+    first = await broker.claim(10)
+    second = await broker.claim(10)
+
+    assert [task.task_id for task in second] == [task_id]
+    # The worker that lost the task can't delete it.
+    broker.in_flight[task_id] = first[0]
+    await broker.ack(task_id)
+    queued, _ = await _queue_rows(_empty_queue)
+    assert [task.task_id for task in queued] == [task_id]
+
+
+@pytest.mark.anyio
+async def test_failed_task_is_retried_later(_empty_queue: AsyncEngine) -> None:
+    """Tests that a failed task waits for its backoff before it's claimed."""
+    broker = _broker(_empty_queue)
+    task_id = await _kick(broker)
+
+    await _run_failing(broker, task_id)
+
+    assert not await broker.claim(10)
+    queued, dead = await _queue_rows(_empty_queue)
+    assert [(task.attempts, task.last_error) for task in queued] == [
+        (1, "RuntimeError()"),
+    ]
+    assert not dead
+
+
+@pytest.mark.anyio
+async def test_failed_task_is_buried_after_last_attempt(
+    _empty_queue: AsyncEngine,
+) -> None:
+    """Tests dead lettering of a task that failed all its attempts."""
+    broker = _broker(_empty_queue)
+    task_id = await _kick(broker)
+    await _run_failing(broker, task_id)
+    async with _empty_queue.begin() as conn:
+        # Skips the backoff.
+        await conn.execute(
+            update(QueuedTask).values(available_at=func.localtimestamp()),
+        )
+
+    await _run_failing(broker, task_id)
+
+    queued, dead = await _queue_rows(_empty_queue)
+    assert not queued
+    assert [(task.task_id, task.attempts, task.queue) for task in dead] == [
+        (task_id, 2, "background"),
+    ]
+
+
+@pytest.mark.anyio
+async def test_urgent_queues_and_quiet_sources_go_first(
+    _empty_queue: AsyncEngine,
+) -> None:
+    """Tests queue priorities and turns of sources within a queue."""
+    broker = _broker(_empty_queue)
+    busy = await _kick_all(broker, (TaskQueue.MEDIA for _ in range(5)), "C1")
+    quiet = await _kick(broker, TaskQueue.MEDIA, "C2")
+    reply = await _kick(broker, TaskQueue.REPLIES, "C2")
+
+    claimed = await broker.claim(3)
+
+    assert [task.task_id for task in claimed] == [reply, busy[0], quiet]
+    assert [task.queue for task in claimed] == [
+        TaskQueue.REPLIES,
+        TaskQueue.MEDIA,
+        TaskQueue.MEDIA,
+    ]
+
+
+@pytest.mark.anyio
+async def test_queue_concurrency_is_limited(_empty_queue: AsyncEngine) -> None:
+    """Tests that a worker holds at most the limit of a queue's tasks."""
+    broker = _broker(_empty_queue, queue_concurrency={"media": 2})
+    *media, reply = await _kick_all(
+        broker,
+        [TaskQueue.MEDIA, TaskQueue.MEDIA, TaskQueue.MEDIA, TaskQueue.REPLIES],
+        "C1",
+    )
+
+    assert await _claimed_ids(broker) == [reply, *media[:2]]
+    assert not await broker.claim(10)
+
+    await broker.ack(media[0])
+    assert await _claimed_ids(broker) == [media[2]]
+
+
+@pytest.mark.anyio
+async def test_queue_stats(_empty_queue: AsyncEngine) -> None:
+    """Tests task counts per queue."""
+    broker = _broker(_empty_queue, queue_concurrency={"media": 1})
+    await _kick(broker, TaskQueue.MEDIA)
+    await _kick(broker, TaskQueue.MEDIA)
+    await broker.claim(10)
+
+    async with AsyncSession(_empty_queue) as session:
+        stats = {row.queue: row for row in await TaskQueueDAO(session).get_stats()}
+
+    assert list(stats) == list(TaskQueue)
+    media = stats[TaskQueue.MEDIA]
+    assert (media.ready, media.running) == (1, 1)
+    assert stats[TaskQueue.REPLIES].ready == 0
+
+
+@pytest.mark.anyio
+async def test_concurrent_workers_claim_different_tasks(
+    _empty_queue: AsyncEngine,
+) -> None:
+    """Tests that workers claiming at once all get their own tasks."""
+    async with _empty_queue.begin() as conn:
+        await conn.execute(
+            insert(QueuedTask),
+            [
+                {
+                    "task_id": str(number),
+                    "task_name": "test:task",
+                    "fair_key": "C{0}".format(number % 7),
+                    "message": b"",
+                }
+                for number in range(400)
+            ],
+        )
+    workers = [_broker(_empty_queue) for _ in range(8)]
+
+    claims = await asyncio.gather(*(worker.claim(10) for worker in workers))
+
+    assert [len(claimed) for claimed in claims] == [10 for _ in workers]
+    task_ids = {task.task_id for claimed in claims for task in claimed}
+    assert len(task_ids) == 80
@@ -0,0 +1,95 @@
+import asyncio
+from typing import List
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from gebwai.db.bulk import BulkWriter, Record
+from gebwai.db.models.item_model import GebItem
+from gebwai.services.items import ITEM_COLUMNS
+
+
+class RecordingWriter(BulkWriter):
+    """Bulk writer keeping batches in memory."""
+
+    def __init__(self, **kwargs: float) -> None:
+        super().__init__(
+            GebItem.__table__,  # type: ignore
+            ITEM_COLUMNS,
+            engine=create_async_engine("postgresql+asyncpg://localhost/gebwai"),
+            **kwargs,  # type: ignore
+        )
+        self.batches: List[List[Record]] = []
+        self.blocked = asyncio.Event()
+        self.blocked.set()
+        self.failures = 0
+
+    async def write(self, records: List[Record]) -> None:
+        """
+        Record a batch unless the database is down.
+
+        :param records: values in the order of ``columns``.
+        :raises ConnectionError: while failures are left.
+        """
+        await self.blocked.wait()
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database is down")
+        self.batches.append(list(records))
+
+
+@pytest.mark.anyio
+async def test_records_are_batched() -> None:
+    """Tests that records are written in batches of batch_size."""
+    writer = RecordingWriter(batch_size=3, flush_interval=10, max_pending=100)
+
+    for index in range(7):
+        await writer.submit((index,))
+    await writer.close()
+
+    assert [len(batch) for batch in writer.batches] == [3, 3, 1]
+    assert writer.written == 7
+
+
+@pytest.mark.anyio
+async def test_partial_batch_is_flushed_after_interval() -> None:
+    """Tests that a partial batch isn't held longer than flush_interval."""
+    writer = RecordingWriter(batch_size=100, flush_interval=0.01, max_pending=100)
+
+    await writer.submit((1,))
+    await asyncio.sleep(0.05)
+
+    assert writer.batches == [[(1,)]]
+    await writer.close()
+
+
+@pytest.mark.anyio
+async def test_full_queue_blocks_submit() -> None:
+    """Tests that submitting waits while max_pending records are queued."""
+    writer = RecordingWriter(batch_size=1, flush_interval=0, max_pending=2)
+    writer.blocked.clear()
+
+    for index in range(3):
+        await writer.submit((index,))
+    late = asyncio.create_task(writer.submit((3,)))
+    await asyncio.sleep(0.01)
+    assert not late.done()
+
+    writer.blocked.set()
+    await late
+    await writer.close()
+    assert writer.written == 4
+
+
+@pytest.mark.anyio
+async def test_failed_writes_are_retried() -> None:
+    """Tests that a batch is retried before it's dropped."""
+    writer = RecordingWriter(batch_size=10, flush_interval=0, max_pending=10)
+    writer.max_retries = 1
+    writer.failures = 1
+
+    await writer.submit((1,))
+    await writer.close()
+
+    assert writer.batches == [[(1,)]]
+    assert writer.failed == 0
@@ -0,0 +1,31 @@
+from typing import List
+
+from gebwai.services.cache import LRUTTLCache
+
+
+def test_lru_ttl_cache_expires() -> None:
+    """Tests that entries are gone after their ttl."""
+    now: List[float] = [0]
+    cache: LRUTTLCache[str, int] = LRUTTLCache(10, ttl=5, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=20)
+
+    now[0] = 6
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_ttl_cache_evicts_least_recent() -> None:
+    """Tests that the least recently used entry is evicted first."""
+    cache: LRUTTLCache[str, int] = LRUTTLCache(2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert len(cache) == 2
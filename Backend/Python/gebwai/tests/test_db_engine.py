@@ -0,0 +1,45 @@
+import pytest
+
+from gebwai.db import engine as db_engine
+from gebwai.db.engine import TimedQueuePool, create_engine, pool_status
+from gebwai.settings import settings
+
+
+def test_engine_uses_pool_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that the engine pool is sized from settings."""
+    monkeypatch.setattr(settings, "db_pool_size", 3)
+    monkeypatch.setattr(settings, "db_max_overflow", 2)
+
+    engine = create_engine()
+    status = pool_status(engine)
+
+    assert isinstance(engine.pool, TimedQueuePool)
+    assert status.size == 3
+    assert status.in_use == 0
+    assert status.checkouts == 0
+
+
+def test_pgbouncer_mode_skips_prepared_statements(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that PgBouncer mode doesn't reuse prepared statements."""
+    monkeypatch.setattr(settings, "db_pgbouncer", value=True)
+    monkeypatch.setattr(settings, "db_statement_timeout", 5)
+
+    connect_args = db_engine._connect_args()  # noqa: WPS437
+
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    assert connect_args["command_timeout"] == 5
+    assert "server_settings" not in connect_args
+    names = {connect_args["prepared_statement_name_func"]() for _ in range(2)}
+    assert len(names) == 2
+
+
+def test_statement_timeout_is_sent_to_server(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that the statement timeout is set in milliseconds."""
+    monkeypatch.setattr(settings, "db_statement_timeout", 2.5)
+
+    connect_args = db_engine._connect_args()  # noqa: WPS437
+
+    assert connect_args["server_settings"] == {"statement_timeout": "2500"}
@@ -0,0 +1,52 @@
+from typing import Optional
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from gebwai.db.routing import ReplicaRouter
+
+
+def _engine(host: str) -> AsyncEngine:
+    # Port 1 refuses connections right away.
+    return create_async_engine(f"postgresql+asyncpg://gebwai:gebwai@{host}:1/gebwai")
+
+
+def _host(router: ReplicaRouter) -> Optional[str]:
+    bind = router().bind
+    assert isinstance(bind, AsyncEngine)
+    return bind.url.host
+
+
+@pytest.mark.anyio
+async def test_reads_follow_replica_lag() -> None:
+    """Tests that sessions go to the replica only while it's fresh."""
+    primary, replica = _engine("127.0.0.1"), _engine("localhost")
+    router = ReplicaRouter(primary, replica, max_lag=5, check_interval=60)
+
+    assert _host(router) == "127.0.0.1"
+    router.lag = 1
+    assert _host(router) == "localhost"
+    router.lag = 10
+    assert _host(router) == "127.0.0.1"
+    await router.close()
+
+
+@pytest.mark.anyio
+async def test_unreachable_replica_reads_primary() -> None:
+    """Tests that a failed lag check sends reads to the primary."""
+    primary, replica = _engine("127.0.0.1"), _engine("localhost")
+    router = ReplicaRouter(primary, replica, max_lag=5, check_interval=60)
+    router.lag = 0
+
+    assert await router.check_lag() is None
+    assert _host(router) == "127.0.0.1"
+    await replica.dispose()
+
+
+@pytest.mark.anyio
+async def test_without_replica_reads_go_to_primary() -> None:
+    """Tests that the router works without a replica."""
+    router = ReplicaRouter(_engine("127.0.0.1"), None, max_lag=5, check_interval=0)
+
+    assert _host(router) == "127.0.0.1"
+    assert await router.check_lag() is None
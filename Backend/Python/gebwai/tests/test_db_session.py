@@ -0,0 +1,51 @@
+from typing import Generator
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from gebwai.db.session import ReadOnlySession, WriteTrackingSession, has_writes
+
+metadata = MetaData()
+numbers = Table("numbers", metadata, Column("value", Integer, primary_key=True))
+
+
+@pytest.fixture
+def sqlite_engine() -> Generator[Engine, None, None]:
+    """
+    Create an in-memory database with the numbers table.
+
+    :yield: new engine.
+    """
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_session_tracks_writes(sqlite_engine: Engine) -> None:
+    """Tests that only writing statements make a session need a commit."""
+    with WriteTrackingSession(sqlite_engine) as session:
+        session.execute(select(numbers))
+        assert not session.has_writes
+
+        session.execute(insert(numbers).values(value=1))
+        assert session.has_writes
+
+        session.commit()
+        assert not session.has_writes
+
+
+def test_readonly_session_refuses_writes(sqlite_engine: Engine) -> None:
+    """Tests that a read-only session can't write."""
+    with ReadOnlySession(sqlite_engine) as session:
+        session.execute(select(numbers))
+        with pytest.raises(RuntimeError):
+            session.execute(insert(numbers).values(value=1))
+
+
+def test_unused_async_session_has_no_writes() -> None:
+    """Tests that an async session with nothing done isn't committed."""
+    assert not has_writes(AsyncSession(sync_session_class=WriteTrackingSession))
+    assert has_writes(AsyncSession())
@@ -0,0 +1,241 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional
+
+import pytest
+import ujson
+from linebot.v3.webhooks import Event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from gebwai.db.dao.item_dao import ItemDAO, ItemKey
+from gebwai.db.models.item_model import GebItem
+from gebwai.db.models.user_model import SourceSettings, User
+from gebwai.services import items
+from gebwai.web.api.items.schema import decode_cursor, encode_cursor
+from gebwai.web.api.items.views import _stream_page  # noqa: WPS450
+
+START = datetime(2026, 10, 1)
+
+
+def test_cursor_round_trip() -> None:
+    """Tests that cursors keep the item key and reject garbage."""
+    key = (datetime(2026, 10, 18, 9, 30, 15, 123456), 42)
+
+    assert decode_cursor(encode_cursor(key)) == key
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+@pytest.mark.anyio
+async def test_full_page_has_next_cursor() -> None:
+    """Tests that the streamed page is JSON with a cursor after a full page."""
+    rows = [
+        {"id": index, "collected_at": START + timedelta(minutes=index)}
+        for index in range(250)
+    ]
+
+    chunks = _stream_page(_stream(rows), limit=250)
+    page = ujson.loads(b"".join([chunk async for chunk in chunks]))
+
+    ids = [item["id"] for item in page["items"]]
+    assert ids == list(range(250))
+    last_key = (rows[-1]["collected_at"], 249)
+    assert decode_cursor(page["next_cursor"]) == last_key
+
+
+async def _stream(
+    rows: List[Dict[str, Any]],
+) -> AsyncIterator[Mapping[str, Any]]:
+    for row in rows:
+        yield row
+
+
+async def _seed(engine: AsyncEngine) -> str:
+    line_user_id = "U{0}".format(uuid.uuid4().hex)
+    sources = ["C{0}".format(uuid.uuid4().hex) for _ in range(3)]
+    async with async_sessionmaker(engine)() as session:
+        session.add(User(line_user_id=line_user_id))
+        await session.flush()
+        session.add_all(
+            SourceSettings(
+                line_user_id=line_user_id,
+                source_id=source_id,
+                starting_source_name=source_id,
+                enabled=index < 2,
+            )
+            for index, source_id in enumerate(sources)
+        )
+        session.add_all(
+            GebItem(
+                message_id=f"{source_id}-{index}",
+                source_id=source_id,
+                file_type="image" if index % 2 else "chat",
+                # Items of different sources share timestamps.
+                collected_at=START + timedelta(minutes=index // 2),
+            )
+            for source_id in sources
+            for index in range(25)
+        )
+        await session.commit()
+    return line_user_id
+
+
+async def _walk(
+    engine: AsyncEngine,
+    line_user_id: str,
+    **filters: Any,
+) -> List[Dict[str, Any]]:
+    found: List[Dict[str, Any]] = []
+    after: Optional[ItemKey] = None
+    async with async_sessionmaker(engine)() as session:
+        dao = ItemDAO(session)
+        while True:  # noqa: WPS457
+            page = [
+                dict(row)
+                async for row in dao.stream_items(
+                    line_user_id,
+                    limit=7,
+                    after=after,
+                    **filters,
+                )
+            ]
+            found.extend(page)
+            if len(page) < 7:
+                return found
+            last = page[-1]
+            after = (last["collected_at"], last["id"])
+
+
+@pytest.mark.anyio
+async def test_keyset_pages_cover_enabled_sources(_engine: AsyncEngine) -> None:
+    """Tests that walking pages returns every item once, newest first."""
+    line_user_id = await _seed(_engine)
+
+    items = await _walk(_engine, line_user_id)
+
+    keys = [(item["collected_at"], item["id"]) for item in items]
+    assert keys == sorted(keys, reverse=True)
+    assert len(set(keys)) == len(keys) == 50
+
+
+@pytest.mark.anyio
+async def test_listing_filters(_engine: AsyncEngine) -> None:
+    """Tests filters by file type and collection time."""
+    line_user_id = await _seed(_engine)
+
+    images = await _walk(
+        _engine,
+        line_user_id,
+        file_type="image",
+        since=START + timedelta(minutes=5),
+    )
+
+    assert {item["file_type"] for item in images} == {"image"}
+    earliest = min(item["collected_at"] for item in images)
+    assert earliest >= START + timedelta(minutes=5)
+    assert len(images) == 14
+
+
+class FakeDirectory:
+    """Users collecting a source with the kinds of messages they keep."""
+
+    session_factory = object()
+
+    def __init__(self, keeps: Dict[str, Dict[str, bool]]) -> None:
+        self.keeps = keeps
+
+    async def get_collecting_users(self, source_id: str) -> List[str]:
+        """
+        Get users collecting any source.
+
+        :param source_id: id of the source.
+        :return: LINE user ids.
+        """
+        return list(self.keeps)
+
+    async def get_or_create_source_settings(
+        self,
+        line_user_id: str,
+        source_id: str,
+    ) -> Any:
+        """
+        Get settings of a source of a user.
+
+        :param line_user_id: LINE user id.
+        :param source_id: id of the source.
+        :return: settings with the kinds of messages kept.
+        """
+        return SimpleNamespace(geb_settings=self.keeps[line_user_id])
+
+
+class Recorder:
+    """Stand-in for the item writer, stats counter and search indexer."""
+
+    def __init__(self) -> None:
+        self.items: List[Any] = []
+        self.counted: List[str] = []
+        self.indexed: List[List[str]] = []
+
+    async def submit(self, record: Any) -> None:
+        """
+        Keep a queued item.
+
+        :param record: item values.
+        """
+        self.items.append(record)
+
+    def add_item(self, line_user_id: str, *args: Any) -> None:
+        """
+        Keep a counted user.
+
+        :param line_user_id: LINE user id.
+        :param args: file type and time.
+        """
+        self.counted.append(line_user_id)
+
+    async def index_text(self, *args: Any) -> bool:
+        """
+        Keep users text is indexed for.
+
+        :param args: message values, then collecting users.
+        :return: whether the text is kept.
+        """
+        self.indexed.append(args[-1])
+        return True
+
+
+def _chat_event(text: str) -> Any:
+    return Event.from_dict(
+        {
+            "type": "message",
+            "mode": "active",
+            "timestamp": 1700000000000,
+            "webhookEventId": text,
+            "deliveryContext": {"isRedelivery": False},
+            "replyToken": "token",
+            "source": {"type": "group", "groupId": "G1", "userId": "U9"},
+            "message": {"type": "text", "id": text, "quoteToken": "q", "text": text},
+        },
+    )
+
+
+@pytest.mark.anyio
+async def test_messages_are_kept_by_file_type_settings(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that items and stats only count users keeping the kind of message."""
+    recorder = Recorder()
+    directory = FakeDirectory({"U1": {"chat": False}, "U2": {"chat": True}})
+    monkeypatch.setattr(items, "user_directory", directory)
+    monkeypatch.setattr(items, "item_writer", recorder)
+    monkeypatch.setattr(items, "monthly_stats", recorder)
+    monkeypatch.setattr(items, "index_text", recorder.index_text)
+
+    await items.record_message(_chat_event("kept"))
+    directory.keeps = {"U1": {"chat": False}}
+    await items.record_message(_chat_event("dropped"))
+
+    assert [record[0] for record in recorder.items] == ["kept"]
+    assert recorder.counted == ["U2"]
+    assert recorder.indexed == [["U2"]]
@@ -0,0 +1,497 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import pytest
+import ujson
+from fastapi import FastAPI
+from httpx import AsyncClient
+from linebot.v3.exceptions import InvalidSignatureError
+from linebot.v3.webhooks import Event
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col
+from starlette import status
+
+from gebwai.db.models.LINE.SourceLease import SourceLease
+from gebwai.services.line import handlers, tasks
+from gebwai.services.line.dedup import WebhookEventDeduplicator
+from gebwai.services.line.dispatcher import EventsNotHandledError, SourceDispatcher
+from gebwai.services.line.events import group_by_source
+from gebwai.services.line.locks import SourceLock
+from gebwai.services.line.parser import WebhookBodyParser
+from gebwai.settings import settings
+from gebwai.web.api.LINE import views
+
+# Source key and texts of the events of a kicked task.
+Kick = Tuple[str, List[str]]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_deduplicator(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Forget webhook events received by other tests."""
+    monkeypatch.setattr(
+        views,
+        "event_deduplicator",
+        WebhookEventDeduplicator(max_size=10, ttl=60),
+    )
+
+
+class FakeSeenEventStore:
+    """Shared store of seen event ids kept in memory."""
+
+    def __init__(self, claimed: Set[str]) -> None:
+        self.claimed = claimed
+
+    async def claim(self, event_ids: Iterable[str]) -> Set[str]:
+        """
+        Record event ids.
+
+        :param event_ids: webhook event ids.
+        :return: ids seen for the first time.
+        """
+        new_ids = set(event_ids) - self.claimed
+        self.claimed |= new_ids
+        return new_ids
+
+    async def release(self, event_ids: Iterable[str]) -> None:
+        """
+        Drop recorded event ids.
+
+        :param event_ids: webhook event ids.
+        """
+        self.claimed -= set(event_ids)
+
+
+def _text_event(source_id: str, text: str) -> Dict[str, Any]:
+    return {
+        "type": "message",
+        "mode": "active",
+        "timestamp": 1700000000000,
+        "webhookEventId": f"{source_id}-{text}",
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": f"token-{text}",
+        "source": {"type": "group", "groupId": source_id, "userId": "U1"},
+        "message": {"type": "text", "id": text, "quoteToken": "q", "text": text},
+    }
+
+
+def _parse(raw_event: Dict[str, Any]) -> Event:
+    return Event.from_dict(raw_event)
+
+
+def _texts(raw_events: Iterable[Dict[str, Any]]) -> List[str]:
+    return [raw_event["message"]["text"] for raw_event in raw_events]
+
+
+class _Handler:
+    """
+    Event handler recording texts of the events it handled.
+
+    Events with a text in ``delays`` take that many seconds,
+    the ones with a text in ``failing`` fail the first time.
+    """
+
+    def __init__(
+        self,
+        delays: Optional[Dict[str, float]] = None,
+        failing: Iterable[str] = (),
+    ) -> None:
+        self.delays = delays or {}
+        self.failing = set(failing)
+        self.handled: List[str] = []
+        # Events being handled now and the most handled at once.
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, event: Any) -> None:
+        text = event.message.text
+        if text in self.failing:
+            self.failing.remove(text)
+            raise RuntimeError(text)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        delay = self.delays.get(text)
+        if delay:
+            await asyncio.sleep(delay)
+        self.running -= 1
+        self.handled.append(text)
+
+
+class _Kicks:
+    """Fake ``kiq`` of the source task, failing the kicks numbered in ``failing``."""
+
+    def __init__(self, failing: Iterable[int] = ()) -> None:
+        self.failing = set(failing)
+        self.attempts = 0
+        self.kicked: List[Kick] = []
+
+    async def __call__(self, source_key: str, raw_events: List[Dict[str, Any]]) -> None:
+        self.attempts += 1
+        if self.attempts in self.failing:
+            raise ConnectionError("Broker is down")
+        self.kicked.append((source_key, _texts(raw_events)))
+
+
+def _sign(body: str) -> str:
+    digest = hmac.new(
+        settings.LINE_CHANNEL_SECRET.encode(),
+        body.encode(),
+        hashlib.sha256,
+    ).digest()
+    return base64.b64encode(digest).decode()
+
+
+def test_group_by_source_keeps_order() -> None:
+    """Tests that events are split by source in delivery order."""
+    events = [
+        _text_event("G1", "a"),
+        _text_event("G2", "b"),
+        _text_event("G1", "c"),
+    ]
+
+    grouped = group_by_source(events)
+
+    assert list(grouped) == ["G1", "G2"]
+    assert _texts(grouped["G1"]) == ["a", "c"]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("offload_bytes", [0, 1024 * 1024])
+async def test_parser_keeps_handled_types(offload_bytes: int) -> None:
+    """Tests that the parser verifies raw bytes and drops unhandled events."""
+    body_parser = WebhookBodyParser(
+        settings.LINE_CHANNEL_SECRET,
+        event_types={"message"},
+        offload_bytes=offload_bytes,
+    )
+    body = ujson.dumps(
+        {
+            "destination": "U0",
+            "events": [_text_event("G1", "a"), {"type": "unfollow"}],
+        },
+    )
+
+    raw_events = await body_parser.parse(body.encode(), _sign(body))
+    body_parser.shutdown()
+
+    assert _texts(raw_events) == ["a"]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("signature", [None, "", "wrong"])
+async def test_parser_rejects_signature(signature: Any) -> None:
+    """Tests that missing or wrong signatures are rejected."""
+    body_parser = WebhookBodyParser(
+        settings.LINE_CHANNEL_SECRET,
+        event_types={"message"},
+        offload_bytes=0,
+    )
+
+    with pytest.raises(InvalidSignatureError):
+        await body_parser.parse(b'{"events": []}', signature)
+    body_parser.shutdown()
+
+
+@pytest.mark.anyio
+async def test_dedup_drops_redeliveries() -> None:
+    """Tests that events with seen webhookEventId are dropped."""
+    deduplicator = WebhookEventDeduplicator(max_size=10, ttl=60)
+    first = [_text_event("G1", "a"), _text_event("G1", "b")]
+
+    assert await deduplicator.filter_new(first) == first
+    redelivered = await deduplicator.filter_new(
+        [_text_event("G1", "b"), _text_event("G1", "c")],
+    )
+
+    assert _texts(redelivered) == ["c"]
+    assert (deduplicator.hits, deduplicator.misses) == (1, 3)
+
+
+@pytest.mark.anyio
+async def test_dedup_uses_shared_store() -> None:
+    """Tests that ids claimed by another worker are dropped."""
+    deduplicator = WebhookEventDeduplicator(
+        max_size=10,
+        ttl=60,
+        store=FakeSeenEventStore({"G1-a"}),  # type: ignore
+    )
+
+    new_events = await deduplicator.filter_new(
+        [_text_event("G1", "a"), _text_event("G1", "b")],
+    )
+
+    assert _texts(new_events) == ["b"]
+    assert deduplicator.hits == 1
+
+
+@pytest.mark.anyio
+async def test_source_task_handles_in_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that the per-source task handles events in delivery order."""
+    handler = _Handler()
+    monkeypatch.setattr(tasks, "dispatcher", SourceDispatcher(handler, 4, 4))
+
+    await tasks.process_source_events(
+        "G1",
+        [_text_event("G1", "a"), {"type": "unknown"}, _text_event("G1", "b")],
+    )
+
+    assert handler.handled == ["a", "b"]
+
+
+@pytest.mark.anyio
+async def test_source_deliveries_take_turns(
+    _engine: AsyncEngine,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that two workers don't handle events of a source at once."""
+    running: Dict[str, int] = {}
+    peaks: Dict[str, int] = {}
+
+    class WorkerDispatcher:
+        async def dispatch(self, events: Iterable[Event]) -> None:
+            key = next(iter(events)).source.group_id  # type: ignore
+            running[key] = running.get(key, 0) + 1
+            peaks[key] = max(peaks.get(key, 0), running[key])
+            await asyncio.sleep(0.05)
+            running[key] -= 1
+
+    # Unlike SourceDispatcher it doesn't queue events of a source,
+    # like dispatchers of separate worker processes.
+    monkeypatch.setattr(tasks, "dispatcher", WorkerDispatcher())
+    monkeypatch.setattr(tasks, "source_lock", SourceLock(_engine))
+
+    await asyncio.gather(
+        tasks.process_source_events("G1", [_text_event("G1", "a")]),
+        tasks.process_source_events("G1", [_text_event("G1", "b")]),
+        tasks.process_source_events("G2", [_text_event("G2", "c")]),
+    )
+
+    assert peaks == {"G1": 1, "G2": 1}
+
+
+async def _lease_tokens(engine: AsyncEngine) -> List[str]:
+    async with engine.connect() as conn:
+        tokens = await conn.execute(select(col(SourceLease.token)))
+    return list(tokens.scalars())
+
+
+@pytest.mark.anyio
+async def test_source_lock_keeps_no_connection(_engine: AsyncEngine) -> None:
+    """Tests that a held source doesn't keep a pooled connection."""
+    lock = SourceLock(_engine)
+
+    async with lock.hold("G1"):
+        checked_out = _engine.pool.checkedout()  # type: ignore[attr-defined]
+
+    assert checked_out == 0
+
+
+@pytest.mark.anyio
+async def test_source_lock_takes_over_expired_lease(_engine: AsyncEngine) -> None:
+    """Tests that a lease left by a stopped worker doesn't block its source."""
+    async with _engine.begin() as conn:
+        await conn.execute(
+            insert(SourceLease).values(
+                source_key="G1",
+                token="stopped",  # noqa: S106
+                expires_at=func.now() - timedelta(seconds=1),
+            ),
+        )
+
+    async with SourceLock(_engine).hold("G1"):
+        held = await _lease_tokens(_engine)
+    released = await _lease_tokens(_engine)
+
+    assert len(held) == 1
+    assert held != ["stopped"]
+    assert not released
+
+
+@pytest.mark.anyio
+async def test_dispatcher_orders_per_source() -> None:
+    """Tests that a slow source doesn't hold up others and keeps its order."""
+    handler = _Handler(delays={"slow": 0.05})
+    dispatcher = SourceDispatcher(handler, max_in_flight=4, max_pending_per_source=4)
+    events = [
+        _parse(_text_event("G1", "slow")),
+        _parse(_text_event("G1", "after-slow")),
+        _parse(_text_event("G2", "fast")),
+    ]
+
+    await dispatcher.dispatch(events)
+
+    assert handler.handled == ["fast", "slow", "after-slow"]
+
+
+@pytest.mark.anyio
+async def test_dispatcher_full_source_blocks_no_others() -> None:
+    """Tests that a source with a full queue doesn't delay other sources."""
+    texts = ["a", "b", "c", "d"]
+    handler = _Handler(delays=dict.fromkeys(texts, 0.02))
+    dispatcher = SourceDispatcher(handler, max_in_flight=4, max_pending_per_source=1)
+    events = [_parse(_text_event("G1", text)) for text in texts]
+    events.append(_parse(_text_event("G2", "fast")))
+
+    await dispatcher.dispatch(events)
+
+    assert handler.handled == ["fast", *texts]
+
+
+@pytest.mark.anyio
+async def test_dispatcher_bounds_in_flight() -> None:
+    """Tests that no more than max_in_flight events are handled at once."""
+    handler = _Handler(delays={"a": 0.01})
+    dispatcher = SourceDispatcher(handler, max_in_flight=2, max_pending_per_source=1)
+    sources = ["G{0}".format(index) for index in range(6)]
+
+    await dispatcher.dispatch([_parse(_text_event(source, "a")) for source in sources])
+
+    assert handler.peak == 2
+
+
+@pytest.mark.anyio
+async def test_callback_invalid_signature(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+) -> None:
+    """Tests that webhook with wrong signature is rejected."""
+    url = fastapi_app.url_path_for("handle_callback")
+    response = await client.post(
+        url,
+        content=ujson.dumps({"destination": "U0", "events": []}),
+        headers={"X-Line-Signature": "wrong"},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.anyio
+async def test_callback_ack_first(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that ack-first mode enqueues one task per source."""
+    kicks = _Kicks()
+    handler = _Handler()
+    monkeypatch.setattr(settings, "line_webhook_ack_first", value=True)
+    monkeypatch.setattr(views.process_source_events, "kiq", kicks)
+    monkeypatch.setattr(views, "dispatcher", SourceDispatcher(handler, 4, 4))
+    body = ujson.dumps(
+        {
+            "destination": "U0",
+            "events": [
+                _text_event("G1", "a"),
+                _text_event("G2", "b"),
+                _text_event("G1", "c"),
+            ],
+        },
+    )
+
+    url = fastapi_app.url_path_for("handle_callback")
+    response = await client.post(
+        url,
+        content=body,
+        headers={"X-Line-Signature": _sign(body)},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert kicks.kicked == [("G1", ["a", "c"]), ("G2", ["b"])]
+    assert not handler.handled
+
+
+@pytest.mark.anyio
+async def test_callback_failed_enqueue_is_redelivered(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that events not enqueued because of an error aren't seen."""
+    kicks = _Kicks(failing={2})
+    store = FakeSeenEventStore(set())
+    monkeypatch.setattr(
+        views,
+        "event_deduplicator",
+        WebhookEventDeduplicator(max_size=10, ttl=60, store=store),  # type: ignore
+    )
+    monkeypatch.setattr(settings, "line_webhook_ack_first", value=True)
+    monkeypatch.setattr(views.process_source_events, "kiq", kicks)
+    body = ujson.dumps(
+        {
+            "destination": "U0",
+            "events": [_text_event("G1", "a"), _text_event("G2", "b")],
+        },
+    )
+    url = fastapi_app.url_path_for("handle_callback")
+    headers = {"X-Line-Signature": _sign(body)}
+
+    with pytest.raises(ConnectionError):
+        await client.post(url, content=body, headers=headers)
+    assert store.claimed == {"G1-a"}
+    response = await client.post(url, content=body, headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert kicks.kicked == [("G1", ["a"]), ("G2", ["b"])]
+
+
+@pytest.mark.anyio
+async def test_callback_failed_event_is_redelivered(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that only events whose handler raised are handled again."""
+    handler = _Handler(failing={"b"})
+    store = FakeSeenEventStore(set())
+    monkeypatch.setattr(
+        views,
+        "event_deduplicator",
+        WebhookEventDeduplicator(max_size=10, ttl=60, store=store),  # type: ignore
+    )
+    monkeypatch.setattr(views, "dispatcher", SourceDispatcher(handler, 4, 4))
+    body = ujson.dumps(
+        {
+            "destination": "U0",
+            "events": [_text_event("G1", "a"), _text_event("G2", "b")],
+        },
+    )
+    url = fastapi_app.url_path_for("handle_callback")
+    headers = {"X-Line-Signature": _sign(body)}
+
+    with pytest.raises(EventsNotHandledError):
+        await client.post(url, content=body, headers=headers)
+    assert store.claimed == {"G1-a"}
+    response = await client.post(url, content=body, headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert handler.handled == ["a", "b"]
+
+
+@pytest.mark.anyio
+async def test_callback_inline(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that events are replied to before the response by default."""
+    replied: List[str] = []
+
+    class FakeMessenger:
+        async def reply(self, reply_token: str, messages: Any, **kwargs: Any) -> None:
+            replied.append(messages[0].text)
+
+    monkeypatch.setattr(handlers, "messenger", FakeMessenger())
+    body = ujson.dumps({"destination": "U0", "events": [_text_event("G1", "a")]})
+
+    url = fastapi_app.url_path_for("handle_callback")
+    response = await client.post(
+        url,
+        content=body,
+        headers={"X-Line-Signature": _sign(body)},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert replied == ["a"]
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Dict, List, Tuple
+
+import pytest
+from aiohttp import web
+from linebot.v3.messaging import Configuration, TextMessage
+
+from gebwai.services.line.client import create_messaging_api
+from gebwai.services.line.messaging import LineMessenger
+from gebwai.services.ratelimit import TokenBucket
+
+Calls = List[Tuple[str, Dict[str, Any]]]
+
+
+class _Recorder:
+    """Handler of the stub server keeping the requests it got."""
+
+    def __init__(self) -> None:
+        self.calls: Calls = []
+
+    async def sent(self, request: web.Request) -> web.Response:
+        """
+        Answer like the Messaging API.
+
+        :param request: request to an endpoint.
+        :return: response of the endpoint.
+        """
+        body = await request.json()
+        endpoint = request.path.rsplit("/", 1)[-1]
+        self.calls.append((endpoint, body))
+        if body.get("replyToken", "").startswith("expired"):
+            return web.json_response({"message": "Invalid reply token"}, status=400)
+        messages = [{"id": "1"} for _ in body["messages"]]
+        return web.json_response({"sentMessages": messages})
+
+
+def _texts_of(body: Dict[str, Any]) -> List[str]:
+    return [message["text"] for message in body["messages"]]
+
+
+@pytest.fixture
+async def line_stub() -> AsyncGenerator[Tuple[str, Calls], None]:
+    """
+    Local stand-in for the Messaging API.
+
+    Reply tokens starting with "expired" are rejected.
+
+    :yields: base url of the server and requests it received.
+    """
+    recorder = _Recorder()
+    app = web.Application()
+    app.router.add_post("/v2/bot/message/{endpoint}", recorder.sent)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore  # noqa: WPS437
+
+    yield f"http://127.0.0.1:{port}", recorder.calls
+
+    await runner.cleanup()
+
+
+@pytest.fixture
+async def messenger(
+    line_stub: Tuple[str, Calls],
+) -> AsyncGenerator[LineMessenger, None]:
+    """
+    Messenger that talks to the stub server.
+
+    :param line_stub: stub server.
+    :yields: messenger.
+    """
+    configuration = Configuration(
+        host=line_stub[0],
+        access_token="pytest",  # noqa: S106
+    )
+    line_messenger = LineMessenger(
+        lambda: create_messaging_api(configuration),
+        rate_limits={"reply": 100, "push": 100, "multicast": 100},
+        reply_token_ttl=50,
+        flush_delay=0.01,
+        request_timeout=5,
+    )
+
+    yield line_messenger
+
+    await line_messenger.close()
+
+
+def _texts(*texts: str) -> List[TextMessage]:
+    return [TextMessage(text=text) for text in texts]
+
+
+@pytest.mark.anyio
+async def test_replies_are_merged(
+    messenger: LineMessenger,
+    line_stub: Tuple[str, Calls],
+) -> None:
+    """Tests that replies with one token are merged, overflow is pushed."""
+    deliveries = [
+        messenger.reply("token", _texts("a", "b"), to="G1"),
+        messenger.reply("token", _texts("c", "d"), to="G1"),
+        messenger.reply("token", _texts("e", "f"), to="G1"),
+    ]
+    await asyncio.gather(*deliveries)
+
+    calls = line_stub[1]
+    assert [endpoint for endpoint, _ in calls] == ["reply", "push"]
+    assert _texts_of(calls[0][1]) == list("abcde")
+    assert calls[1][1]["to"] == "G1"
+    assert _texts_of(calls[1][1]) == ["f"]
+
+
+@pytest.mark.anyio
+async def test_rejected_reply_token_is_pushed(
+    messenger: LineMessenger,
+    line_stub: Tuple[str, Calls],
+) -> None:
+    """Tests that messages are pushed when LINE rejects the reply token."""
+    await messenger.reply("expired-token", _texts("a"), to="G1")
+
+    assert [endpoint for endpoint, _ in line_stub[1]] == ["reply", "push"]
+
+
+@pytest.mark.anyio
+async def test_old_replies_become_multicast(
+    messenger: LineMessenger,
+    line_stub: Tuple[str, Calls],
+) -> None:
+    """Tests that identical late replies to users are sent as one multicast."""
+    long_ago = time.time() - 120
+    await asyncio.gather(
+        messenger.reply("t1", _texts("done"), to="U1", received_at=long_ago),
+        messenger.reply("t2", _texts("done"), to="U2", received_at=long_ago),
+    )
+
+    calls = line_stub[1]
+    assert [endpoint for endpoint, _ in calls] == ["multicast"]
+    assert sorted(calls[0][1]["to"]) == ["U1", "U2"]
+
+
+@pytest.mark.anyio
+async def test_pushes_to_a_chat_keep_their_order(
+    messenger: LineMessenger,
+    line_stub: Tuple[str, Calls],
+) -> None:
+    """Tests that late replies and pushes to a chat are merged in order."""
+    long_ago = time.time() - 120
+    replies = [
+        messenger.reply(
+            f"t{number}",
+            _texts(str(number)),
+            to="G1",
+            received_at=long_ago,
+        )
+        for number in range(7)
+    ]
+    await asyncio.gather(*replies, messenger.push("G1", _texts("7")))
+
+    calls = line_stub[1]
+    assert [endpoint for endpoint, _ in calls] == ["push", "push"]
+    first, second = (_texts_of(body) for _, body in calls)
+    assert first + second == [str(number) for number in range(8)]
+
+
+def test_token_bucket_limits_burst() -> None:
+    """Tests that bucket gives out no more than its capacity at once."""
+    now = [0.0]  # noqa: WPS358
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+    now[0] = 0.5
+    assert bucket.try_acquire()
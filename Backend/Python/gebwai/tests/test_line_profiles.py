@@ -0,0 +1,140 @@
+import asyncio
+import time
+from typing import Any, List
+
+import pytest
+from linebot.v3.messaging import GroupSummaryResponse, UserProfileResponse
+from linebot.v3.messaging.exceptions import ApiException
+
+from gebwai.services.line import profiles
+from gebwai.services.singleflight import SingleFlight
+
+
+class FakeMessenger:
+    """Messenger answering profile requests with a delay."""
+
+    def __init__(self) -> None:
+        self.calls: List[str] = []
+
+    async def call(self, endpoint: str, request: Any) -> Any:
+        """
+        Record the endpoint and run the request.
+
+        :param endpoint: name of the endpoint.
+        :param request: request taking this messenger as the API.
+        :return: response.
+        """
+        self.calls.append(endpoint)
+        await asyncio.sleep(0.01)
+        return await request(self)
+
+    async def get_profile(self, user_id: str) -> UserProfileResponse:
+        """
+        Get profile of a user, ``Ublocked`` blocked the bot.
+
+        :param user_id: LINE user id.
+        :raises ApiException: for the blocked user.
+        :return: profile.
+        """
+        if user_id == "Ublocked":
+            raise ApiException(status=404)
+        return UserProfileResponse(userId=user_id, displayName=f"name of {user_id}")
+
+    async def get_group_summary(self, group_id: str) -> GroupSummaryResponse:
+        """
+        Get summary of a group.
+
+        :param group_id: LINE group id.
+        :return: summary.
+        """
+        return GroupSummaryResponse(groupId=group_id, groupName="family")
+
+
+class _Kicks:
+    """Fake ``kiq`` of a refresh task recording its arguments."""
+
+    def __init__(self) -> None:
+        self.kicked: List[str] = []
+
+    async def __call__(self, group_id: str) -> None:
+        self.kicked.append(group_id)
+
+
+class _Load:
+    """Slow load returning how many times it ran."""
+
+    def __init__(self) -> None:
+        self.runs = 0
+
+    async def __call__(self) -> int:
+        self.runs += 1
+        await asyncio.sleep(0.01)
+        return self.runs
+
+
+def _cache(
+    fake_messenger: FakeMessenger,
+    fresh_for: float = 60,
+) -> profiles.LineProfileCache:
+    return profiles.LineProfileCache(
+        fake_messenger,  # type: ignore
+        max_size=10,
+        local_ttl=60,
+        fresh_for=fresh_for,
+    )
+
+
+@pytest.mark.anyio
+async def test_concurrent_lookups_are_coalesced() -> None:
+    """Tests that a burst of lookups for one user makes one API call."""
+    fake_messenger = FakeMessenger()
+    cache = _cache(fake_messenger)
+
+    lookups = [cache.get_user("U1") for _ in range(10)]
+    found = await asyncio.gather(*lookups)
+    await cache.get_user("U1")
+
+    assert {profile.display_name for profile in found if profile} == {"name of U1"}
+    assert fake_messenger.calls == ["profile"]
+
+
+@pytest.mark.anyio
+async def test_missing_profile_is_cached() -> None:
+    """Tests that profiles LINE doesn't share aren't fetched again."""
+    fake_messenger = FakeMessenger()
+    cache = _cache(fake_messenger)
+
+    assert await cache.get_user("Ublocked") is None
+    assert await cache.get_user("Ublocked") is None
+    assert fake_messenger.calls == ["profile"]
+
+
+@pytest.mark.anyio
+async def test_stale_profile_is_refreshed_in_background(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that a stale entry is served and refresh is enqueued once."""
+    kicks = _Kicks()
+    monkeypatch.setattr(profiles.refresh_line_group, "kiq", kicks)
+    cache = _cache(FakeMessenger(), fresh_for=0)
+
+    assert await cache.get_source_name("C1") == "family"
+    time.sleep(0.001)
+    assert await cache.get_source_name("C1") == "family"
+    assert await cache.get_source_name("C1") == "family"
+
+    assert kicks.kicked == ["C1"]
+
+
+@pytest.mark.anyio
+async def test_single_flight_shares_result() -> None:
+    """Tests that concurrent calls with one key run the function once."""
+    flight: SingleFlight[str, int] = SingleFlight()
+    load = _Load()
+    calls = [flight.do("key", load) for _ in range(5)]
+
+    results = await asyncio.gather(*calls)
+
+    assert results == [1, 1, 1, 1, 1]
+    assert flight.shared == 4
+    assert not flight
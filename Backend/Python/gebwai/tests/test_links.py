@@ -0,0 +1,258 @@
+import asyncio
+from typing import AsyncGenerator, Dict
+
+import pytest
+from aiohttp import web
+
+from gebwai.services.links.unfurler import LinkUnavailableError, LinkUnfurler
+from gebwai.services.links.urls import find_links, normalize_url
+
+PAGE = """<!doctype html>
+<html><head>
+<meta charset="utf-8">
+<title> Fallback &amp; title </title>
+<meta property="og:title" content="โอนเงินง่ายๆ">
+<meta name="description" content="How to transfer">
+<meta property="og:image" content="/cover.jpg">
+</head><body>{padding}</body></html>
+"""
+
+
+class FixtureSite:
+    """Local site with pages, an image, a redirect and a slow page."""
+
+    def __init__(self) -> None:
+        self.url = ""
+        self.requests: Dict[str, int] = {}
+        self.body_bytes_sent = 0
+        self.running = 0
+        self.most_running = 0
+
+    def app(self) -> web.Application:
+        """
+        Build the site.
+
+        :return: application with the routes.
+        """
+        app = web.Application()
+        app.router.add_route("*", "/page", self.page)
+        app.router.add_route("*", "/big", self.big)
+        app.router.add_route("*", "/image.png", self.image)
+        app.router.add_route("*", "/moved", self.moved)
+        app.router.add_route("*", "/slow/{index}", self.slow)
+        app.router.add_route("*", "/no-head", self.no_head)
+        return app
+
+    async def page(self, request: web.Request) -> web.Response:
+        """
+        Serve a page with a title and meta tags.
+
+        :param request: page request.
+        :return: the page.
+        """
+        self._count(request)
+        return web.Response(text=PAGE.format(padding=""), content_type="text/html")
+
+    async def big(self, request: web.Request) -> web.StreamResponse:
+        """
+        Stream a page whose head never ends.
+
+        :param request: page request.
+        :return: streamed response.
+        """
+        self._count(request)
+        response = web.StreamResponse(headers={"Content-Type": "text/html"})
+        await response.prepare(request)
+        if request.method == "GET":
+            # Ignores the range and sends 10 MiB without ending the head.
+            for _ in range(10 * 256):
+                await response.write(b"<!-- padding -->" * 256)
+                self.body_bytes_sent += 4096
+                await asyncio.sleep(0.005)
+        return response
+
+    async def image(self, request: web.Request) -> web.Response:
+        """
+        Serve an image.
+
+        :param request: image request.
+        :return: PNG bytes.
+        """
+        self._count(request)
+        return web.Response(body=b"\x89PNG", content_type="image/png")
+
+    async def moved(self, request: web.Request) -> web.Response:
+        """
+        Redirect to the page.
+
+        :param request: redirected request.
+        :raises HTTPFound: always.
+        """
+        self._count(request)
+        raise web.HTTPFound("/page")
+
+    async def no_head(self, request: web.Request) -> web.Response:
+        """
+        Serve the page to GET requests only.
+
+        :param request: page request.
+        :raises HTTPMethodNotAllowed: for HEAD requests.
+        :return: the page.
+        """
+        self._count(request)
+        if request.method == "HEAD":
+            raise web.HTTPMethodNotAllowed("HEAD", ["GET"])
+        return web.Response(text=PAGE.format(padding=""), content_type="text/html")
+
+    async def slow(self, request: web.Request) -> web.Response:
+        """
+        Answer slowly, counting requests running at once.
+
+        :param request: slow request.
+        :return: empty PDF.
+        """
+        self._count(request)
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.05)
+        self.running -= 1
+        return web.Response(body=b"", content_type="application/pdf")
+
+    def _count(self, request: web.Request) -> None:
+        key = f"{request.method} {request.path}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+
+@pytest.fixture
+async def site() -> AsyncGenerator[FixtureSite, None]:
+    """
+    Start the fixture site on a local port.
+
+    :yield: the site, its URL is in ``url``.
+    """
+    fixture = FixtureSite()
+    runner = web.AppRunner(fixture.app())
+    await runner.setup()
+    tcp_site = web.TCPSite(runner, "127.0.0.1", 0)
+    await tcp_site.start()
+    port = tcp_site._server.sockets[0].getsockname()[1]  # type: ignore # noqa: WPS437
+    fixture.url = f"http://127.0.0.1:{port}"
+    try:
+        yield fixture
+    finally:
+        await runner.cleanup()
+
+
+def _unfurler(allow_private: bool = True) -> LinkUnfurler:
+    return LinkUnfurler(
+        max_bytes=16 * 1024,
+        timeout=10,
+        max_concurrency=10,
+        domain_concurrency=2,
+        ttl=60,
+        cache_size=100,
+        user_agent="test",
+        allow_private=allow_private,
+    )
+
+
+def test_normalize_url() -> None:
+    """Tests that equivalent links share a cache key."""
+    assert normalize_url("HTTPS://Example.COM:443?b=2&utm_source=x&a=1#top") == (
+        "https://example.com/?a=1&b=2"
+    )
+    assert normalize_url("http://ไทย.example/a") == "http://xn--o3cw4h.example/a"
+    with pytest.raises(ValueError):
+        normalize_url("ftp://example.com/file")
+
+
+def test_find_links() -> None:
+    """Tests links in a sentence are found once without punctuation."""
+    text = "ดูนี่ https://example.com/a, และ (https://EXAMPLE.com/a) http://x.io."
+
+    assert find_links(text, limit=5) == [
+        "https://example.com/a",
+        "http://x.io/",
+    ]
+    assert find_links(text, limit=1) == ["https://example.com/a"]
+
+
+@pytest.mark.anyio
+async def test_page_preview_is_cached(site: FixtureSite) -> None:
+    """Tests reading Open Graph tags and caching by normalized URL."""
+    unfurler = _unfurler()
+
+    first = await unfurler.unfurl(f"{site.url}/page?utm_source=line")
+    again = await unfurler.unfurl(f"{site.url}/page#comments")
+    await unfurler.close()
+
+    assert first.title == "โอนเงินง่ายๆ"
+    assert first.description == "How to transfer"
+    assert first.image_url == f"{site.url}/cover.jpg"
+    assert again == first
+    assert site.requests == {"HEAD /page": 1, "GET /page": 1}
+
+
+@pytest.mark.anyio
+async def test_head_skips_reading_non_pages(site: FixtureSite) -> None:
+    """Tests that images are previewed from the HEAD response alone."""
+    unfurler = _unfurler()
+
+    preview = await unfurler.unfurl(f"{site.url}/image.png")
+    await unfurler.close()
+
+    assert preview.image_url == f"{site.url}/image.png"
+    assert preview.content_type == "image/png"
+    assert site.requests == {"HEAD /image.png": 1}
+
+
+@pytest.mark.anyio
+async def test_redirects_and_refused_head(site: FixtureSite) -> None:
+    """Tests following redirects and pages refusing HEAD."""
+    unfurler = _unfurler()
+
+    moved = await unfurler.unfurl(f"{site.url}/moved")
+    no_head = await unfurler.unfurl(f"{site.url}/no-head")
+    await unfurler.close()
+
+    assert moved.title == no_head.title == "โอนเงินง่ายๆ"
+    assert site.requests["GET /page"] == 1
+
+
+@pytest.mark.anyio
+async def test_reading_is_capped(site: FixtureSite) -> None:
+    """Tests that a page without an end of head isn't read to the end."""
+    unfurler = _unfurler()
+
+    preview = await unfurler.unfurl(f"{site.url}/big")
+    await unfurler.close()
+
+    assert preview.title is None
+    assert site.body_bytes_sent < 256 * 1024
+
+
+@pytest.mark.anyio
+async def test_concurrency_per_domain(site: FixtureSite) -> None:
+    """Tests that at most domain_concurrency requests run per host."""
+    unfurler = _unfurler()
+
+    urls = ["{0}/slow/{1}".format(site.url, index) for index in range(6)]
+    await asyncio.gather(*(unfurler.unfurl(url) for url in urls))
+    await unfurler.close()
+
+    assert site.most_running == 2
+    assert not unfurler._domains  # noqa: WPS437
+
+
+@pytest.mark.anyio
+async def test_private_addresses_are_refused(site: FixtureSite) -> None:
+    """Tests that links to the worker's own network aren't fetched."""
+    unfurler = _unfurler(allow_private=False)
+
+    with pytest.raises(LinkUnavailableError):
+        await unfurler.fetch(f"{site.url}/page")
+    preview = await unfurler.unfurl("http://localhost:1/page")
+    await unfurler.close()
+
+    assert preview.title is None
+    assert not site.requests
@@ -0,0 +1,88 @@
+import io
+import logging
+
+import ujson
+from loguru import logger
+
+from gebwai.logging import QueuedStream, SamplingFilter, record_formatter
+
+
+def _record(level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord("uvicorn.access", level, __file__, 1, "GET /", (), None)
+
+
+def _break() -> None:
+    raise ValueError("broken")
+
+
+def test_rate_limited_records_are_dropped() -> None:
+    """Tests that records over the rate are dropped but warnings aren't."""
+    log_filter = SamplingFilter(max_per_second=3)
+
+    kept = [log_filter.filter(_record()) for _ in range(10)]
+
+    assert kept.count(True) == 3
+    assert log_filter.dropped == 7
+    assert log_filter.filter(_record(logging.WARNING))
+
+
+def test_records_are_sampled() -> None:
+    """Tests that about the sample rate of records is kept."""
+    log_filter = SamplingFilter(sample_rate=0.1)
+
+    kept = sum(log_filter.filter(_record()) for _ in range(10000))
+
+    assert 800 < kept < 1200
+
+
+def test_queued_stream_writes_all_records() -> None:
+    """Tests that messages logged before stopping are written in order."""
+    stream = io.StringIO()
+    sink = QueuedStream(stream)
+    handler_id = logger.add(sink, format="{message}")
+
+    messages = ["message {0}".format(index) for index in range(100)]
+    for message in messages:
+        logger.info(message)
+    logger.remove(handler_id)
+
+    assert stream.getvalue().splitlines() == messages
+
+
+def test_json_lines() -> None:
+    """Tests records written as JSON with extra fields and exceptions."""
+    stream = io.StringIO()
+    handler_id = logger.add(
+        QueuedStream(stream, json=True),
+        format=record_formatter,  # type: ignore
+    )
+
+    logger.bind(trace_id=0, span_id=0, source_id="C1").info("hello")
+    try:
+        _break()
+    except ValueError:
+        logger.bind(trace_id=0, span_id=0).exception("failed")
+    logger.remove(handler_id)
+
+    lines = stream.getvalue().splitlines()
+    first, second = (ujson.loads(line) for line in lines)
+    assert first["message"] == "hello"
+    assert first["level"] == "INFO"
+    assert first["source_id"] == "C1"
+    assert "trace_id" not in first
+    assert second["exception"].endswith("ValueError: broken\n")
+
+
+def test_queued_stream_survives_broken_records() -> None:
+    """Tests that a record failing to format doesn't stop the writer."""
+    stream = io.StringIO()
+    sink = QueuedStream(stream, json=True)
+    handler_id = logger.add(sink, format="{message}")
+
+    sink.write("a message without a record")
+    logger.info("after")
+    logger.remove(handler_id)
+
+    broken, written = stream.getvalue().splitlines()
+    assert broken.startswith("Cannot format log record: AttributeError")
+    assert ujson.loads(written)["message"] == "after"
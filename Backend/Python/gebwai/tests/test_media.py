@@ -0,0 +1,196 @@
+import hashlib
+import io
+import os
+from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator
+
+import pytest
+from aiohttp import web
+
+from gebwai.services.media import derivatives as derivatives_module
+from gebwai.services.media.blobs import BlobStore, blob_key, derivative_key
+from gebwai.services.media.derivatives import DerivativeStore, DerivativeUnavailable
+from gebwai.services.media.diskcache import DiskLRUCache
+from gebwai.services.media.downloader import ContentNotReadyError, MediaDownloader
+from gebwai.services.media.storage import LocalStorage
+from gebwai.settings import ExecutorKind
+
+CONTENT = os.urandom(300 * 1024)
+
+
+async def serve_content(request: web.Request) -> web.StreamResponse:
+    """
+    Serve content like LINE does.
+
+    :param request: content request.
+    :return: content or 202 while it's being prepared.
+    """
+    if request.match_info["message_id"] == "preparing":
+        return web.Response(status=202)
+    assert request.headers["Authorization"] == "Bearer token"
+    return web.Response(body=CONTENT, content_type="image/jpeg")
+
+
+@pytest.fixture
+async def content_host() -> AsyncGenerator[str, None]:
+    """
+    Start a server shaped like LINE's content endpoint.
+
+    :yield: its URL.
+    """
+    app = web.Application()
+    app.router.add_get("/v2/bot/message/{message_id}/content", serve_content)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore # noqa: WPS437
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        await runner.cleanup()
+
+
+async def _chunks(content: bytes) -> AsyncIterator[bytes]:
+    yield content
+
+
+async def _interrupted_chunks() -> AsyncIterator[bytes]:
+    yield b"first chunk"
+    raise ConnectionResetError
+
+
+def _downloader(content_host: str, root: Path) -> MediaDownloader:
+    return MediaDownloader(
+        content_host,
+        "token",
+        chunk_size=16 * 1024,
+        max_concurrency=2,
+        timeout=10,
+        storage=LocalStorage(root),
+        max_retries=0,
+    )
+
+
+@pytest.mark.anyio
+async def test_content_is_streamed_into_storage(
+    content_host: str,
+    tmp_path: Path,
+) -> None:
+    """Tests that downloaded content is stored and hashed."""
+    downloader = _downloader(content_host, tmp_path)
+
+    stored = await downloader.download("1", "C1/1")
+    await downloader.close()
+
+    assert stored.sha256 == hashlib.sha256(CONTENT).hexdigest()
+    assert stored.size == len(CONTENT)
+    assert stored.content_type == "image/jpeg"
+    stored_path = tmp_path / "C1" / "1"
+    assert stored_path.read_bytes() == CONTENT
+    assert list(stored_path.parent.iterdir()) == [stored_path]
+
+
+@pytest.mark.anyio
+async def test_content_being_prepared(content_host: str, tmp_path: Path) -> None:
+    """Tests that content LINE hasn't prepared yet isn't stored."""
+    downloader = _downloader(content_host, tmp_path)
+
+    with pytest.raises(ContentNotReadyError):
+        await downloader.download("preparing", "C1/preparing")
+    await downloader.close()
+
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.anyio
+async def test_interrupted_upload_leaves_nothing(tmp_path: Path) -> None:
+    """Tests that a failed stream doesn't leave partial files."""
+    storage = LocalStorage(tmp_path)
+
+    with pytest.raises(ConnectionResetError):
+        await storage.put("C1/1", _interrupted_chunks())
+
+    assert not list((tmp_path / "C1").iterdir())
+
+
+def test_keys_stay_in_storage(tmp_path: Path) -> None:
+    """Tests that keys can't point outside of the storage directory."""
+    with pytest.raises(ValueError):
+        LocalStorage(tmp_path).path("../outside")
+
+
+async def _fill_disk_cache(root: Path) -> DiskLRUCache:
+    cache = DiskLRUCache(root, max_bytes=10)
+    await cache.put("a.jpg", b"aaaa")
+    await cache.put("b.jpg", b"bbbb")
+    assert await cache.get("a.jpg") == root / "a.jpg"
+    await cache.put("c.jpg", b"cccc")
+    return cache
+
+
+@pytest.mark.anyio
+async def test_disk_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    """Tests that files not used lately are evicted past the size limit."""
+    cache = await _fill_disk_cache(tmp_path)
+
+    assert await cache.get("b.jpg") is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.jpg", "c.jpg"]
+
+
+@pytest.mark.anyio
+async def test_disk_cache_is_kept_on_disk(tmp_path: Path) -> None:
+    """Tests that a new cache finds files put by an earlier one."""
+    await _fill_disk_cache(tmp_path)
+
+    assert await DiskLRUCache(tmp_path, max_bytes=10).get("c.jpg") is not None
+
+
+@pytest.mark.anyio
+async def test_derivative_is_rendered_once(tmp_path: Path) -> None:
+    """Tests that a thumbnail is rendered once and kept next to the image."""
+    image_module = pytest.importorskip("PIL.Image")
+    storage = LocalStorage(tmp_path / "media")
+    sha256 = "ab" * 32
+    original = io.BytesIO()
+    image_module.new("RGB", (1200, 800), "red").save(original, format="JPEG")
+    await storage.put(blob_key(sha256), _chunks(original.getvalue()))
+    downloader = _downloader("http://unused", tmp_path / "media")
+    derivatives = DerivativeStore(
+        BlobStore(downloader, gc_grace=0, gc_batch_size=1),
+        sizes={"thumbnail": 256},
+        cache=DiskLRUCache(tmp_path / "cache", max_bytes=1024 * 1024),
+        executor_kind=ExecutorKind.THREAD,
+    )
+
+    paths = [await derivatives.get(sha256, "thumbnail") for _ in range(3)]
+    derivatives.shutdown()
+
+    assert derivatives.rendered == 1
+    assert len(set(paths)) == 1
+    with image_module.open(paths[0]) as thumbnail:
+        assert thumbnail.size == (256, 171)
+    assert await storage.exists(derivative_key(sha256, 256))
+
+
+@pytest.mark.anyio
+async def test_derivatives_without_pillow(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that missing pillow turns eager derivatives off."""
+    monkeypatch.setattr(derivatives_module, "PILLOW_INSTALLED", value=False)
+    storage = LocalStorage(tmp_path / "media")
+    sha256 = "cd" * 32
+    await storage.put(blob_key(sha256), _chunks(b"image"))
+    downloader = _downloader("http://unused", tmp_path / "media")
+    derivatives = DerivativeStore(
+        BlobStore(downloader, gc_grace=0, gc_batch_size=1),
+        sizes={"thumbnail": 256},
+        cache=DiskLRUCache(tmp_path / "cache", max_bytes=1024),
+        eager=True,
+    )
+
+    assert not derivatives.eager
+    with pytest.raises(DerivativeUnavailable):
+        await derivatives.get(sha256, "thumbnail")
@@ -0,0 +1,147 @@
+import socket
+import subprocess  # noqa: S404
+import sys
+from pathlib import Path
+
+import pytest
+import ujson
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from gebwai.db.dependencies import get_db_readonly_session
+from gebwai.services.metrics import (
+    MetricsExporter,
+    MetricsRegistry,
+    Sample,
+    merge,
+    render,
+    webhook_seconds,
+)
+
+
+def _registry() -> MetricsRegistry:
+    registry = MetricsRegistry()
+    latency = registry.histogram(
+        "test_seconds",
+        "Test latency.",
+        labelnames=("endpoint",),
+        buckets=(0.1, 1),
+    )
+    latency.observe(0.05, "reply")
+    latency.observe(0.1, "reply")
+    latency.observe(0.5, "reply")
+    latency.observe(2, "push")
+    registry.add_collector(
+        lambda: [Sample("test_total", "counter", "Test count.", {"queue": "a"}, 3)],
+    )
+    return registry
+
+
+def test_histograms_are_rendered_cumulatively() -> None:
+    """Tests the Prometheus text format of histograms and samples."""
+    text = render(_registry().snapshot())
+
+    assert text.splitlines() == [
+        "# HELP test_seconds Test latency.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{endpoint="reply",le="0.1"} 2',
+        'test_seconds_bucket{endpoint="reply",le="1"} 3',
+        'test_seconds_bucket{endpoint="reply",le="+Inf"} 3',
+        'test_seconds_sum{endpoint="reply"} 0.65',
+        'test_seconds_count{endpoint="reply"} 3',
+        'test_seconds_bucket{endpoint="push",le="0.1"} 0',
+        'test_seconds_bucket{endpoint="push",le="1"} 0',
+        'test_seconds_bucket{endpoint="push",le="+Inf"} 1',
+        'test_seconds_sum{endpoint="push"} 2',
+        'test_seconds_count{endpoint="push"} 1',
+        "# HELP test_total Test count.",
+        "# TYPE test_total counter",
+        'test_total{queue="a"} 3',
+    ]
+
+
+def test_label_values_are_escaped() -> None:
+    """Tests quotes and new lines in label values."""
+    text = render(
+        {
+            "histograms": {},
+            "samples": {
+                "test_total": {
+                    "type": "counter",
+                    "help": "Test count.",
+                    "series": [[{"task": 'a"b\nc'}, 1]],
+                },
+            },
+        },
+    )
+
+    assert r'test_total{task="a\"b\nc"} 1' in text
+
+
+def test_snapshots_of_processes_are_added_up() -> None:
+    """Tests merging metrics of two workers."""
+    snapshot = _registry().snapshot()
+
+    merged = merge([snapshot, snapshot])
+
+    histogram = dict(merged["histograms"]["test_seconds"]["series"])
+    samples = merged["samples"]["test_total"]["series"]
+    assert histogram[("reply",)] == [4, 2, 0, 1.3]
+    assert samples == [[{"queue": "a"}, 6]]
+
+
+@pytest.mark.anyio
+async def test_exporter_reads_other_processes(tmp_path: Path) -> None:
+    """Tests that metrics written by other processes are collected."""
+    exporter = MetricsExporter(_registry(), tmp_path, interval=60)
+    other = tmp_path / "1.json"
+    await exporter.flush()
+    exporter.path.rename(other)
+
+    text = render(await exporter.collect())
+
+    assert 'test_seconds_count{endpoint="reply"} 6' in text
+    assert 'test_total{queue="a"} 6' in text
+
+
+@pytest.mark.anyio
+async def test_exporter_takes_over_stopped_processes(tmp_path: Path) -> None:
+    """Tests that counts of stopped processes are kept and their gauges dropped."""
+    stopped = subprocess.Popen([sys.executable, "-c", ""])  # noqa: S603
+    stopped.wait()
+    exporter = MetricsExporter(_registry(), tmp_path, interval=60)
+    await exporter.flush()
+    snapshot = ujson.loads(exporter.path.read_text())
+    snapshot["samples"]["test_workers"] = {
+        "type": "gauge",
+        "help": "Test gauge.",
+        "series": [[{}, 1]],
+    }
+    other = tmp_path / f"{socket.gethostname()}-{stopped.pid}.json"
+    other.write_text(ujson.dumps(snapshot))
+
+    await exporter.flush()
+    text = render(await exporter.collect())
+
+    assert not other.exists()
+    assert 'test_seconds_count{endpoint="reply"} 6' in text
+    assert 'test_total{queue="a"} 6' in text
+    assert "test_workers" not in text
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    dbsession: AsyncSession,
+) -> None:
+    """Tests that recorded metrics are exposed."""
+    fastapi_app.dependency_overrides[get_db_readonly_session] = lambda: dbsession
+    webhook_seconds.observe(0.01)
+
+    response = await client.get(fastapi_app.url_path_for("prometheus_metrics"))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE gebwai_webhook_seconds histogram" in response.text
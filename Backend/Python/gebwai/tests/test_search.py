@@ -0,0 +1,108 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from gebwai.db.dao.text_dao import TextDAO
+from gebwai.db.models.text_model import GebText
+from gebwai.db.models.user_model import GebSettings, SourceSettings, User
+from gebwai.services.search import tokenizer
+
+START = datetime(2026, 10, 1)
+
+
+def test_thai_is_split_into_letter_pairs() -> None:
+    """Tests that Thai runs become pairs of letters with their marks."""
+    pairs = [["โอ", "อน", "นเ", "เงิ", "งิน"], ["ok"]]
+    assert tokenizer.clusters("เงิน") == ["เ", "งิ", "น"]
+    assert list(tokenizer.terms("โอนเงิน OK")) == pairs
+
+
+def test_tsvector_literal_has_positions() -> None:
+    """Tests lexemes and positions of a mixed Thai and English message."""
+    assert tokenizer.to_tsvector("จ่ายแล้ว Paid") == (
+        "'จ่า':1 'าย':2 'ยแ':3 'แล้':4 'ล้ว':5 'paid':6"
+    )
+    assert tokenizer.to_tsvector("!!! ...") == ""
+
+
+def test_tsquery_literal() -> None:
+    """Tests that Thai terms are phrases and single letters are prefixes."""
+    assert tokenizer.to_tsquery("เงิน ok ก") == "('เงิ' <-> 'งิน') & 'ok' & 'ก':*"
+    assert tokenizer.to_tsquery("?!") is None
+
+
+def _new_id(prefix: str) -> str:
+    return "{0}{1}".format(prefix, uuid.uuid4().hex)
+
+
+async def _seed(engine: AsyncEngine) -> str:
+    line_user_id = _new_id("U")
+    sources = [_new_id("C") for _ in range(3)]
+    texts = [
+        "โอนเงินแล้วนะ",
+        "โอนเงินแล้ว โอนเงินให้อีกรอบ",
+        "ยังไม่ได้โอน",
+        "https://bank.example.com/โอนเงิน",
+    ]
+    async with async_sessionmaker(engine)() as session:
+        session.add(User(line_user_id=line_user_id))
+        await session.flush()
+        session.add_all(
+            SourceSettings(
+                line_user_id=line_user_id,
+                source_id=source_id,
+                starting_source_name=source_id,
+                # The first source keeps chat, the last one is disabled.
+                geb_settings=GebSettings(chat=index == 0).model_dump(),
+                enabled=index < 2,
+            )
+            for index, source_id in enumerate(sources)
+        )
+        session.add_all(
+            GebText(
+                message_id=f"{source_id}-{index}",
+                source_id=source_id,
+                file_type="link" if "://" in body else "chat",
+                collected_at=START + timedelta(minutes=index),
+                body=body,
+                lexemes=tokenizer.to_tsvector(body),
+            )
+            for source_id in sources
+            for index, body in enumerate(texts)
+        )
+        await session.commit()
+    return line_user_id
+
+
+async def _search(engine: AsyncEngine, line_user_id: str, query: str) -> List[str]:
+    tsquery = tokenizer.to_tsquery(query)
+    assert tsquery is not None
+    async with async_sessionmaker(engine)() as session:
+        rows = await TextDAO(session).search(line_user_id, tsquery, limit=10)
+    return [row["message_id"] for row in rows]
+
+
+@pytest.mark.anyio
+async def test_search_ranks_and_scopes(_engine: AsyncEngine) -> None:
+    """Tests ranking and that only kept kinds of enabled sources are found."""
+    line_user_id = await _seed(_engine)
+
+    found = await _search(_engine, line_user_id, "เงิน")
+
+    # Chat of the first source, links of both enabled sources.
+    assert len(found) == 4
+    assert found[0].endswith("-1")
+    indexes = {message_id.rsplit("-", 1)[1] for message_id in found}
+    assert indexes == {"0", "1", "3"}
+
+
+@pytest.mark.anyio
+async def test_thai_search_needs_adjacent_letters(_engine: AsyncEngine) -> None:
+    """Tests that letters of a Thai word far apart don't match."""
+    line_user_id = await _seed(_engine)
+
+    assert not await _search(_engine, line_user_id, "โอนไม่")
+    assert len(await _search(_engine, line_user_id, "ไม่ได้")) == 1
@@ -0,0 +1,94 @@
+import asyncio
+import io
+from typing import List, Sequence
+
+import pytest
+
+from gebwai.services.slips import verifier
+from gebwai.services.slips.decoder import SlipFailure, SlipResult, decode_slip
+from gebwai.services.slips.payload import (
+    InvalidSlipPayload,
+    build_slip_payload,
+    parse_slip_payload,
+)
+from gebwai.settings import ExecutorKind
+
+
+def test_slip_payload_round_trip() -> None:
+    """Tests that a built payload parses back with a valid checksum."""
+    text = build_slip_payload("014", "2026101812345678ABC")
+
+    payload = parse_slip_payload(text)
+
+    assert payload.sending_bank == "014"
+    assert payload.trans_ref == "2026101812345678ABC"
+    assert payload.country == "TH"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "{0}0".format(build_slip_payload("014", "1234")[:-1]),
+        "00020151",
+        "https://example.com/not-a-slip",
+    ],
+)
+def test_invalid_slip_payload(text: str) -> None:
+    """Tests that corrupted and foreign payloads are rejected."""
+    with pytest.raises(InvalidSlipPayload):
+        parse_slip_payload(text)
+
+
+def test_slip_is_decoded_from_image() -> None:
+    """Tests that the QR code of a slip image is found and parsed."""
+    qrcode = pytest.importorskip("qrcode")
+    pytest.importorskip("zxingcpp")
+    image = io.BytesIO()
+    qrcode.make(build_slip_payload("004", "REF1")).save(image, format="PNG")
+
+    result = decode_slip(image.getvalue())
+
+    assert result.payload is not None
+    assert result.payload.trans_ref == "REF1"
+    assert decode_slip(b"not an image").failure == SlipFailure.UNREADABLE_IMAGE
+
+
+class _Decoder:
+    """Decoder that finds no QR codes and records its batches."""
+
+    def __init__(self) -> None:
+        self.batches: List[List[bytes]] = []
+
+    def __call__(self, images: Sequence[bytes]) -> List[SlipResult]:
+        """
+        Decode a batch.
+
+        :param images: encoded images.
+        :return: results in the same order.
+        """
+        self.batches.append(list(images))
+        return [SlipResult(failure=SlipFailure.NO_QR_CODE) for _ in images]
+
+
+@pytest.mark.anyio
+async def test_slips_are_batched_and_cached(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that waiting images share a batch and repeats are cached."""
+    decoder = _Decoder()
+    monkeypatch.setattr(verifier, "decode_slips", decoder)
+    slip_verifier = verifier.SlipVerifier(
+        batch_size=3,
+        batch_delay=0.01,
+        cache_size=10,
+        cache_ttl=60,
+        executor_kind=ExecutorKind.THREAD,
+    )
+
+    images = [b"first", b"second", b"first", b"third", b"fourth"]
+    results = await asyncio.gather(*(slip_verifier.verify(image) for image in images))
+    await slip_verifier.verify(b"second")
+    slip_verifier.shutdown()
+
+    assert all(result.failure == SlipFailure.NO_QR_CODE for result in results)
+    assert decoder.batches == [[b"first", b"second", b"third"], [b"fourth"]]
+    assert slip_verifier.decoded == 4
+    assert slip_verifier.cache_hits == 1
@@ -0,0 +1,140 @@
+import asyncio
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Dict, List
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from gebwai.services.stats import MonthlyStatsCounter, StatsKey, stats_month
+
+Pending = Dict[StatsKey, "Counter[str]"]
+
+
+class RecordingCounter(MonthlyStatsCounter):
+    """Stats counter keeping flushed counts in memory."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            flush_interval=60,
+            engine=create_async_engine("postgresql+asyncpg://localhost/gebwai"),
+        )
+        self.flushed: List[Pending] = []
+        self.fail = False
+        self.delay: float = 0
+
+    async def write(self, pending: Pending) -> None:
+        """
+        Keep counts instead of writing them.
+
+        :param pending: counts by user and month.
+        :raises ConnectionError: if ``fail`` is set.
+        """
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.flushed.append(pending)
+
+
+def test_month_starts_in_thailand() -> None:
+    """Tests that 17:00 UTC on the last day already counts in the next month."""
+    before = datetime(2026, 1, 31, 16, 59, tzinfo=timezone.utc)
+    after = datetime(2026, 1, 31, 17, 0, tzinfo=timezone.utc)
+
+    assert stats_month(before) == date(2026, 1, 1)
+    assert stats_month(after) == date(2026, 2, 1)
+
+
+@pytest.mark.anyio
+async def test_counts_are_aggregated_per_user_and_month() -> None:
+    """Tests that counts are added up in memory before one write."""
+    counter = RecordingCounter()
+    at = datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+    counter.add_item("U1", "image", at)
+    counter.add_item("U1", "image", at)
+    counter.add_item("U1", "link", at)
+    counter.add_processed_slip("U1", at)
+    counter.add_item("U2", "chat", at)
+    await counter.close()
+
+    assert counter.flushed == [
+        {
+            ("U1", date(2026, 10, 1)): Counter(
+                n_geb_all=3,
+                n_image=2,
+                n_link=1,
+                n_process_slip=1,
+            ),
+            ("U2", date(2026, 10, 1)): Counter(n_geb_all=1, n_chat=1),
+        },
+    ]
+
+
+@pytest.mark.anyio
+async def test_failed_flush_keeps_counts() -> None:
+    """Tests that counts aren't lost when the database is down."""
+    counter = RecordingCounter()
+    at = datetime(2026, 10, 18, tzinfo=timezone.utc)
+    counter.add_item("U1", "file", at)
+    counter.fail = True
+    await counter.flush()
+
+    counter.fail = False
+    counter.add_item("U1", "file", at)
+    await counter.close()
+
+    assert counter.flushed == [
+        {("U1", date(2026, 10, 1)): Counter(n_geb_all=2, n_file=2)},
+    ]
+
+
+@pytest.mark.anyio
+async def test_close_waits_for_write_in_progress() -> None:
+    """Tests that closing during a slow periodic write doesn't drop its counts."""
+    counter = RecordingCounter()
+    counter.flush_interval = 0.01
+    counter.delay = 0.05
+    at = datetime(2026, 10, 18, tzinfo=timezone.utc)
+    counter.add_item("U1", "image", at)
+    await asyncio.sleep(0.03)
+
+    counter.add_item("U2", "image", at)
+    await counter.close()
+
+    assert counter.flushed == [
+        {("U1", date(2026, 10, 1)): Counter(n_geb_all=1, n_image=1)},
+        {("U2", date(2026, 10, 1)): Counter(n_geb_all=1, n_image=1)},
+    ]
+
+
+@pytest.mark.anyio
+async def test_write_increments_in_place() -> None:
+    """Tests that stored counters are incremented, not overwritten."""
+    statements = []
+
+    class Connection:
+        async def execute(self, statement: object) -> None:
+            statements.append(
+                str(statement.compile(dialect=postgresql.dialect())),  # type: ignore
+            )
+
+    class Engine:
+        def begin(self) -> "Engine":
+            return self
+
+        async def __aenter__(self) -> Connection:
+            return Connection()
+
+        async def __aexit__(self, *args: object) -> None:
+            """Nothing to clean up."""
+
+    counter = MonthlyStatsCounter(flush_interval=60, engine=Engine())  # type: ignore
+    month = date(2026, 10, 1)
+    await counter.write({("U1", month): Counter(n_geb_all=1)})
+
+    assert len(statements) == 1
+    assert "ON CONFLICT (line_user_id, month) DO UPDATE" in statements[0]
+    increment = "n_geb_all = (monthly_stats.n_geb_all + excluded.n_geb_all)"
+    assert increment in statements[0]
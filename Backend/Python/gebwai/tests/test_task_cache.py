@@ -0,0 +1,217 @@
+import asyncio
+import uuid
+from typing import Any, List, Tuple
+
+import pytest
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col
+from taskiq import AsyncTaskiqDecoratedTask, BrokerMessage, InMemoryBroker
+
+from gebwai.brokers.cache import PostgresTaskResultStore, TaskCache
+from gebwai.brokers.postgres import PostgresBroker
+from gebwai.db.models.queue_model import CachedTaskResult, QueuedTask
+
+
+class _Calls:
+    """Records calls of a fake task or broker."""
+
+    def __init__(self) -> None:
+        self.args: List[Any] = []
+
+    async def upper(self, text: str, referrer: str = "") -> str:
+        """
+        Task returning text in upper case.
+
+        :param text: any text.
+        :param referrer: ignored by the cache key.
+        :return: the text in upper case.
+        """
+        self.args.append(text)
+        return text.upper()
+
+    async def kick(self, message: BrokerMessage) -> None:
+        """
+        Broker's send, keeping labels of the message.
+
+        :param message: sent message.
+        """
+        self.args.append(message.labels)
+
+
+def _first_argument(text: str, referrer: str = "") -> str:
+    return text
+
+
+def _cached_task(
+    ttl: float,
+) -> Tuple[AsyncTaskiqDecoratedTask[Any, Any], TaskCache, _Calls]:
+    broker = InMemoryBroker()
+    task_cache = TaskCache(max_size=100)
+    broker.add_middlewares(task_cache)
+    calls = _Calls()
+    task = broker.register_task(calls.upper, task_name="test:upper")
+    return task_cache.cached(key=_first_argument, ttl=ttl)(task), task_cache, calls
+
+
+async def _verify(source_id: str, sha256: str) -> None:
+    """
+    Task verifying nothing.
+
+    :param source_id: LINE source id.
+    :param sha256: hash of content.
+    """
+
+
+def _verify_key(source_id: str, sha256: str) -> str:
+    return "{0}:{1}".format(source_id, sha256)
+
+
+@pytest.fixture
+async def _broker(_engine: AsyncEngine) -> PostgresBroker:
+    """
+    Postgres broker with an empty queue.
+
+    :param _engine: current engine.
+    :return: broker.
+    """
+    async with _engine.begin() as conn:
+        await conn.execute(delete(QueuedTask))
+    return PostgresBroker(
+        _engine,
+        visibility_timeout=60,
+        max_attempts=2,
+        retry_delay=30,
+        retry_max_delay=60,
+        claim_batch_size=10,
+        poll_interval=0.01,
+    )
+
+
+async def _kick_verify(broker: PostgresBroker) -> None:
+    await broker.kick(
+        BrokerMessage(
+            task_id=uuid.uuid4().hex,
+            task_name="test:verify",
+            message=b"{}",
+            labels={"dedup_key": "test:verify:C1:ab"},
+        ),
+    )
+
+
+async def _expire_results(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(
+            update(CachedTaskResult).values(expires_at=func.localtimestamp()),
+        )
+
+
+@pytest.mark.anyio
+async def test_cached_task_runs_once_per_key() -> None:
+    """Tests that calls with a cached key return the first result."""
+    upper, task_cache, calls = _cached_task(ttl=60)
+
+    results = []
+    for text in ("a", "a", "b", "a"):
+        task = await upper.kiq(text, referrer=uuid.uuid4().hex)
+        results.append((await task.wait_result(check_interval=0.01)).return_value)
+
+    assert results == ["A", "A", "B", "A"]
+    assert calls.args == ["a", "b"]
+    stats = task_cache.get_stats()["test:upper"]
+    assert (stats.hits, stats.misses, stats.hit_rate) == (2, 2, 0.5)
+
+
+@pytest.mark.anyio
+async def test_none_results_are_cached() -> None:
+    """Tests that tasks returning nothing aren't run again either."""
+    broker = InMemoryBroker()
+    task_cache = TaskCache(max_size=100)
+    broker.add_middlewares(task_cache)
+    verify = task_cache.cached(key=_verify_key, ttl=60)(
+        broker.register_task(_verify, task_name="test:verify"),
+    )
+
+    await verify("C1", "ab")
+    await verify("C1", "ab")
+
+    stats = task_cache.get_stats()["test:verify"]
+    assert (stats.hits, stats.misses) == (1, 1)
+
+
+@pytest.mark.anyio
+async def test_expired_results_run_again() -> None:
+    """Tests that results are served for their ttl only."""
+    upper, _, calls = _cached_task(ttl=0.01)
+
+    await upper("a")
+    await asyncio.sleep(0.02)
+    await upper("a")
+
+    assert calls.args == ["a", "a"]
+
+
+@pytest.mark.anyio
+async def test_sends_are_labelled_with_their_key() -> None:
+    """Tests the label the Postgres broker drops duplicates by."""
+    broker = InMemoryBroker()
+    task_cache = TaskCache(max_size=100)
+    broker.add_middlewares(task_cache)
+    verify = task_cache.cached(key=_verify_key, ttl=60)(
+        broker.register_task(_verify, task_name="test:verify"),
+    )
+    kicks = _Calls()
+    broker.kick = kicks.kick  # type: ignore
+
+    await verify.kiq("C1", sha256="ab")
+
+    assert kicks.args[0]["dedup_key"] == "test:verify:C1:ab"
+
+
+@pytest.mark.anyio
+async def test_duplicate_sends_are_dropped(_broker: PostgresBroker) -> None:
+    """Tests that a call isn't queued again while it's queued or running."""
+    await _kick_verify(_broker)
+    await _kick_verify(_broker)
+    claimed = await _broker.claim(10)
+    await _kick_verify(_broker)
+
+    assert len(claimed) == 1
+    assert _broker.deduplicated["test:verify"] == 2
+
+
+@pytest.mark.anyio
+async def test_done_call_is_queued_again(_broker: PostgresBroker) -> None:
+    """Tests that a call is queued again once the first one is done."""
+    await _kick_verify(_broker)
+    claimed = await _broker.claim(10)
+    await _broker.ack(claimed[0].task_id)
+
+    await _kick_verify(_broker)
+
+    assert len(await _broker.claim(10)) == 1
+
+
+@pytest.mark.anyio
+async def test_results_are_shared_through_postgres(_engine: AsyncEngine) -> None:
+    """Tests results of the shared store."""
+    store = PostgresTaskResultStore(_engine)
+    await store.set("test:fetch:a", {"result": None}, ttl=60)
+    await store.set("test:fetch:a", {"result": "A"}, ttl=60)
+
+    assert await store.get("test:fetch:a") == {"result": "A"}
+    assert await store.get("test:fetch:b") is None
+
+
+@pytest.mark.anyio
+async def test_expired_results_are_purged(_engine: AsyncEngine) -> None:
+    """Tests that expired results aren't served and are deleted later."""
+    store = PostgresTaskResultStore(_engine, purge_interval=0)
+    await store.set("test:fetch:a", {"result": "A"}, ttl=60)
+    await _expire_results(_engine)
+
+    assert await store.get("test:fetch:a") is None
+    await store.set("test:fetch:b", {"result": "B"}, ttl=60)
+    async with _engine.connect() as conn:
+        keys = await conn.scalars(select(col(CachedTaskResult.key)))
+        assert keys.all() == ["test:fetch:b"]
@@ -0,0 +1,114 @@
+import asyncio
+import uuid
+from typing import Optional
+
+import pytest
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlmodel import col
+
+from gebwai.db.dao.user_dao import UserDAO
+from gebwai.db.models.user_model import SourceSettings, UserSettings
+from gebwai.services.users import UserDirectory
+
+
+class FakeProfiles:
+    """Profile cache that doesn't call LINE."""
+
+    async def get_user(self, user_id: str, group_id: Optional[str] = None) -> None:
+        """
+        Skip storing the profile.
+
+        :param user_id: LINE user id.
+        :param group_id: group the user is in.
+        """
+
+    async def get_source_name(self, source_id: str) -> str:
+        """
+        Name a source after its id.
+
+        :param source_id: id of a group, room or user.
+        :return: source name.
+        """
+        return "name of {0}".format(source_id)
+
+
+def _new_line_user_id() -> str:
+    return "U{0}".format(uuid.uuid4().hex)
+
+
+def _directory(engine: AsyncEngine) -> UserDirectory:
+    return UserDirectory(
+        FakeProfiles(),  # type: ignore
+        max_size=100,
+        ttl=60,
+        session_factory=async_sessionmaker(engine, expire_on_commit=False),
+    )
+
+
+@pytest.mark.anyio
+async def test_concurrent_get_it_done_creates_once(_engine: AsyncEngine) -> None:
+    """Tests that a burst of events from a new user shares one upsert."""
+    directory = _directory(_engine)
+    line_user_id = _new_line_user_id()
+
+    assert await directory.get_it_done(line_user_id) is None
+    users = await asyncio.gather(
+        *(
+            directory.get_it_done(line_user_id, create_or_unblock_if_not_exists=True)
+            for _ in range(10)
+        ),
+    )
+
+    assert all(user is users[0] for user in users)
+    assert users[0] is not None
+    assert not users[0].is_blocked
+    assert await directory.get_it_done(line_user_id) is users[0]
+
+
+@pytest.mark.anyio
+async def test_source_settings_are_upserted_once(_engine: AsyncEngine) -> None:
+    """Tests that new source settings are inserted once across directories."""
+    line_user_id = _new_line_user_id()
+    first, second = _directory(_engine), _directory(_engine)
+    await first.get_it_done(line_user_id, create_or_unblock_if_not_exists=True)
+
+    found = await asyncio.gather(
+        *(
+            directory.get_or_create_source_settings(line_user_id, "C1")
+            for directory in (first, second)
+            for _ in range(5)
+        ),
+    )
+
+    assert {source.starting_source_name for source in found} == {"name of C1"}
+    async with _engine.connect() as conn:
+        rows = await conn.scalar(
+            select(func.count())
+            .select_from(SourceSettings)
+            .where(col(SourceSettings.line_user_id) == line_user_id),
+        )
+    assert rows == 1
+
+
+@pytest.mark.anyio
+async def test_new_source_follows_user_settings(_engine: AsyncEngine) -> None:
+    """Tests that new sources are disabled if the user turned it off."""
+    directory = _directory(_engine)
+    line_user_id = _new_line_user_id()
+    await directory.get_it_done(line_user_id, create_or_unblock_if_not_exists=True)
+    async with _engine.begin() as conn:
+        await conn.execute(
+            update(UserSettings)
+            .where(col(UserSettings.line_user_id) == line_user_id)
+            .values(automatic_geb_for_newly_added_group=False),
+        )
+
+    source_settings = await directory.get_or_create_source_settings(
+        line_user_id,
+        "C2",
+    )
+
+    assert not source_settings.enabled
+    async with async_sessionmaker(_engine)() as session:
+        assert not await UserDAO(session).get_collecting_users("C2")
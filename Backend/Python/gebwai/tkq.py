@@ -1,14 +1,52 @@
 import taskiq_fastapi
-from taskiq import InMemoryBroker, ZeroMQBroker
+from taskiq import AsyncBroker, InMemoryBroker, TaskiqScheduler, ZeroMQBroker
+from taskiq.schedule_sources import LabelScheduleSource
 
-from gebwai.settings import settings
+from gebwai.brokers.cache import TaskCache
+from gebwai.brokers.postgres import PostgresBroker
+from gebwai.db.engine import create_engine
+from gebwai.settings import BrokerKind, Settings, settings
 
-broker = ZeroMQBroker()
 
-if settings.environment.lower() == "pytest":
-    broker = InMemoryBroker()
+def create_broker(config: Settings) -> AsyncBroker:
+    """
+    Create the broker chosen in settings.
+
+    :param config: application settings.
+    :return: taskiq broker.
+    """
+    if config.environment.lower() == "pytest" or config.broker == BrokerKind.INMEMORY:
+        return InMemoryBroker()
+    if config.broker == BrokerKind.POSTGRES:
+        return PostgresBroker(
+            create_engine(config.db_url),
+            visibility_timeout=config.broker_visibility_timeout,
+            max_attempts=config.broker_max_attempts,
+            retry_delay=config.broker_retry_delay,
+            retry_max_delay=config.broker_retry_max_delay,
+            claim_batch_size=config.broker_claim_batch_size,
+            poll_interval=config.broker_poll_interval,
+            queue_concurrency=config.broker_queue_concurrency,
+            # PgBouncer in transaction mode doesn't pass notifications.
+            use_notify=not config.db_pgbouncer,
+        )
+    return ZeroMQBroker(
+        zmq_pub_host=config.broker_zmq_pub_host,
+        zmq_sub_host=config.broker_zmq_sub_host,
+    )
+
+
+broker = create_broker(settings)
+
+# Declares tasks whose results are cached, see TaskCache.
+task_cache = TaskCache(max_size=settings.task_cache_max_size)
+broker.add_middlewares(task_cache)
 
 taskiq_fastapi.init(
     broker,
     "gebwai.web.application:get_app",
 )
+
+# Sends tasks declared with a ``schedule`` label, run it with
+# ``taskiq scheduler gebwai.tkq:scheduler`` and the task modules.
+scheduler = TaskiqScheduler(broker, sources=[LabelScheduleSource(broker)])
@@ -1,60 +1,94 @@
-from fastapi import APIRouter, HTTPException, Header, Request
-from linebot.v3 import (
-    WebhookHandler,
-    WebhookParser
-)
-from linebot.v3.exceptions import (
-    InvalidSignatureError
-)
-from linebot.v3.messaging import (
-    Configuration,
-    AsyncApiClient,
-    AsyncMessagingApi,
-    ReplyMessageRequest,
-    TextMessage
-)
-from linebot.v3.webhooks import (
-    MessageEvent,
-    TextMessageContent
-)
-from loguru import logger
+import time
+from http import HTTPStatus
+from typing import Dict, List, Optional
 
+from fastapi import APIRouter, Header, HTTPException, Request
+from linebot.v3.exceptions import InvalidSignatureError
+from linebot.v3.webhooks import Event
+
+from gebwai.services.line.dedup import event_deduplicator
+from gebwai.services.line.dispatcher import EventsNotHandledError, dispatcher
+from gebwai.services.line.events import RawEvent, group_by_source
+from gebwai.services.line.parser import build_events, webhook_parser
+from gebwai.services.line.tasks import process_source_events
+from gebwai.services.metrics import webhook_seconds
 from gebwai.settings import settings
 
 router = APIRouter()
 
-configuration = Configuration(access_token=settings.LINE_ACCESS_TOKEN)
-async_api_client = AsyncApiClient(configuration)
-line_bot_api = AsyncMessagingApi(async_api_client)
-handler = WebhookHandler(settings.LINE_CHANNEL_SECRET)
-parser = WebhookParser(settings.LINE_CHANNEL_SECRET)
 
 @router.post("/callback")
 async def handle_callback(
     request: Request,
-    signature: str = Header(None, alias="X-Line-Signature"),
-):
-    # get request body as text
-    body = await request.body()
-    body = body.decode()
+    signature: Optional[str] = Header(None, alias="X-Line-Signature"),
+) -> Dict[str, str]:
+    """
+    Receives webhook events from LINE.
+
+    In ack-first mode events are only verified and put on
+    the task broker, so LINE gets its 200 as soon as possible.
 
+    :param request: current request.
+    :param signature: value of the X-Line-Signature header.
+    :raises HTTPException: if the signature is invalid.
+    :returns: status of the webhook.
+    """  # noqa: DAR402
+    started = time.perf_counter()
     try:
-        events = parser.parse(body, signature)
+        return await _handle_webhook(await request.body(), signature)
+    finally:
+        webhook_seconds.observe(time.perf_counter() - started)
+
+
+async def _handle_webhook(body: bytes, signature: Optional[str]) -> Dict[str, str]:
+    try:
+        raw_events = await webhook_parser.parse(body, signature)
     except InvalidSignatureError:
-        raise HTTPException(status_code=400, detail="Invalid signature")
-
-    for event in events:
-        if not isinstance(event, MessageEvent):
-            continue
-        if not isinstance(event.message, TextMessageContent):
-            continue
-
-        await line_bot_api.reply_message(
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=event.message.text)]
-            )
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail="Invalid signature",
         )
 
+    # LINE redelivers events when we are slow, they were handled already.
+    raw_events = await event_deduplicator.filter_new(raw_events)
+
+    if settings.line_webhook_ack_first:
+        await _enqueue(raw_events)
+    else:
+        await _dispatch(raw_events)
     return {"status": "ok"}
 
+
+async def _dispatch(raw_events: List[RawEvent]) -> None:
+    try:
+        await dispatcher.dispatch(build_events(raw_events))
+    except EventsNotHandledError as error:
+        # LINE redelivers the whole body, handled events stay filtered out.
+        await event_deduplicator.forget(_raw_events_of(raw_events, error.events))
+        raise
+    except Exception:
+        # LINE redelivers events after an error, they must not look handled.
+        await event_deduplicator.forget(raw_events)
+        raise
+
+
+async def _enqueue(raw_events: List[RawEvent]) -> None:
+    grouped = list(group_by_source(raw_events).items())
+    for index, (source_key, source_events) in enumerate(grouped):
+        try:
+            await process_source_events.kiq(source_key, source_events)
+        except Exception:
+            # Enqueued sources get handled, the rest has to be redelivered.
+            await event_deduplicator.forget(
+                [event for _, events in grouped[index:] for event in events],
+            )
+            raise
+
+
+def _raw_events_of(raw_events: List[RawEvent], events: List[Event]) -> List[RawEvent]:
+    event_ids = {event.webhook_event_id for event in events}
+    return [
+        raw_event
+        for raw_event in raw_events
+        if raw_event.get("webhookEventId") in event_ids
+    ]
@@ -0,0 +1,4 @@
+"""Collected items API."""
+from gebwai.web.api.items.views import router
+
+__all__ = ["router"]
@@ -0,0 +1,58 @@
+import base64
+from datetime import datetime
+from typing import List, Optional
+
+import ujson
+from pydantic import BaseModel
+
+from gebwai.db.dao.item_dao import ItemKey
+
+
+class ListedItem(BaseModel):
+    """Collected item in a listing."""
+
+    id: int
+    source_id: str
+    collected_at: datetime
+    message_id: str
+    line_user_id: Optional[str]
+    file_type: str
+    size: Optional[int]
+    sha256: Optional[str]
+
+
+class ItemPage(BaseModel):
+    """Page of collected items, newest first."""
+
+    items: List[ListedItem]
+    # Pass as ``cursor`` to get the next page, null on the last page.
+    next_cursor: Optional[str]
+
+
+def encode_cursor(key: ItemKey) -> str:
+    """
+    Make an opaque cursor from the key of an item.
+
+    :param key: ``collected_at`` and ``id`` of the item.
+    :return: URL safe cursor.
+    """
+    collected_at, item_id = key
+    raw = ujson.dumps([collected_at.isoformat(), item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ItemKey:
+    """
+    Read the item key of a cursor.
+
+    :param cursor: cursor made by ``encode_cursor``.
+    :return: ``collected_at`` and ``id`` of the item.
+    :raises ValueError: if the cursor is malformed.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding)
+        collected_at, item_id = ujson.loads(raw)
+        return datetime.fromisoformat(collected_at), int(item_id)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Malformed cursor {cursor!r}.") from error
@@ -0,0 +1,103 @@
+from datetime import datetime
+from http import HTTPStatus
+from typing import Any, AsyncIterator, List, Mapping, Optional
+
+import ujson
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from gebwai.db.dao.item_dao import ItemDAO
+from gebwai.settings import settings
+from gebwai.web.api.items.schema import ItemPage, decode_cursor, encode_cursor
+
+router = APIRouter()
+
+# Items serialized per chunk of the streamed response.
+_ITEMS_PER_CHUNK = 100
+# Items of a page unless the limit is given.
+_DEFAULT_LIMIT = 50
+
+
+@router.get("/users/{line_user_id}/items", response_model=ItemPage)
+async def list_items(  # noqa: WPS211
+    line_user_id: str,
+    limit: int = Query(_DEFAULT_LIMIT, ge=1, le=settings.item_list_max_limit),
+    cursor: Optional[str] = None,
+    source_id: Optional[str] = None,
+    file_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    item_dao: ItemDAO = Depends(),
+) -> StreamingResponse:
+    """
+    Lists items a user collected, newest first.
+
+    Pages are found by the cursor of the previous page instead
+    of an offset, so deep pages are as fast as the first one.
+    The page is streamed as rows are read.
+
+    :param line_user_id: LINE user id.
+    :param limit: maximum number of items.
+    :param cursor: ``next_cursor`` of the previous page.
+    :param source_id: only items of this source.
+    :param file_type: only items of this kind, e.g. ``image``.
+    :param since: only items collected at or after this time.
+    :param until: only items collected before this time.
+    :param item_dao: DAO for collected items.
+    :raises HTTPException: if the cursor is malformed.
+    :returns: page of items and cursor of the next one.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail="Malformed cursor.",
+        )
+    rows = item_dao.stream_items(
+        line_user_id,
+        limit,
+        after=after,
+        source_id=source_id,
+        file_type=file_type,
+        since=since,
+        until=until,
+    )
+    return StreamingResponse(
+        _stream_page(rows, limit),
+        media_type="application/json",
+    )
+
+
+async def _stream_page(
+    rows: AsyncIterator[Mapping[str, Any]],
+    limit: int,
+) -> AsyncIterator[bytes]:
+    yield b'{"items":['
+    chunk: List[str] = []
+    last: Optional[Mapping[str, Any]] = None
+    count = 0
+    async for row in rows:
+        chunk.append(_dump_item(row))
+        last = row
+        count += 1
+        if len(chunk) == _ITEMS_PER_CHUNK:
+            yield _join_items(chunk, first=count == len(chunk))
+            chunk = []
+    if chunk:
+        yield _join_items(chunk, first=count == len(chunk))
+    next_cursor = None
+    if last is not None and count == limit:
+        next_cursor = encode_cursor((last["collected_at"], last["id"]))
+    yield '],"next_cursor":{0}}}'.format(ujson.dumps(next_cursor)).encode()
+
+
+def _dump_item(row: Mapping[str, Any]) -> str:
+    item = dict(row)
+    item["collected_at"] = row["collected_at"].isoformat()
+    return ujson.dumps(item)
+
+
+def _join_items(items: List[str], first: bool) -> bytes:
+    joined = ",".join(items)
+    return (joined if first else f",{joined}").encode()
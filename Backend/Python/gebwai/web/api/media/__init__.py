@@ -0,0 +1,4 @@
+"""Collected media API."""
+from gebwai.web.api.media.views import router
+
+__all__ = ["router"]
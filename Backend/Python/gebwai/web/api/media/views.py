@@ -0,0 +1,49 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi import Path as PathParam
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from gebwai.db.dependencies import get_db_readonly_session
+from gebwai.db.models.blob_model import Blob
+from gebwai.services.media.derivatives import DerivativeUnavailable, derivative_store
+
+router = APIRouter()
+
+
+@router.get("/{sha256}/{size}", response_class=FileResponse)
+async def get_derivative(
+    sha256: str = PathParam(pattern="^[0-9a-f]{64}$"),
+    size: str = PathParam(),
+    session: AsyncSession = Depends(get_db_readonly_session),
+) -> FileResponse:
+    """
+    Sends a thumbnail or preview of a collected image or video.
+
+    Derivatives never change for a hash, so clients may cache them forever.
+
+    :param sha256: hash of the content.
+    :param size: name of the size, e.g. ``thumbnail`` or ``preview``.
+    :param session: read-only database session.
+    :raises HTTPException: if there's no such content or size.
+    :returns: JPEG image.
+    """
+    blob = await session.get(Blob, sha256)
+    media_type = (blob.content_type or "") if blob else ""
+    is_visual = media_type.startswith(("image/", "video/"))
+    if size not in derivative_store.sizes or not is_visual:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
+    try:
+        path = await derivative_store.get(
+            sha256,
+            size,
+            is_video=media_type.startswith("video/"),
+        )
+    except DerivativeUnavailable:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
+    return FileResponse(
+        path,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
@@ -1,4 +1,17 @@
-from fastapi import APIRouter
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from gebwai.brokers.cache import TaskCacheStats
+from gebwai.db.dao.blob_dao import BlobDAO, StorageSavings
+from gebwai.db.dao.task_queue_dao import TaskQueueDAO, TaskQueueStats
+from gebwai.db.dependencies import get_db_readonly_session
+from gebwai.db.engine import PoolStatus, pool_status
+from gebwai.services.metrics import Sample, metrics_exporter, render
+from gebwai.settings import BrokerKind, settings
+from gebwai.tkq import task_cache
 
 router = APIRouter()
 
@@ -10,3 +23,105 @@ def health_check() -> None:
 
     It returns 200 if the project is healthy.
     """
+
+
+@router.get("/health/db-pool", response_model=PoolStatus)
+def db_pool_status(request: Request) -> PoolStatus:
+    """
+    Reports the database connection pool of this worker.
+
+    Growing ``wait_seconds_total`` or any ``timeouts``
+    mean requests are starved of connections.
+
+    :param request: current request.
+    :returns: pool size, usage and checkout waits.
+    """
+    return pool_status(request.app.state.db_engine)
+
+
+@router.get("/health/media-storage", response_model=StorageSavings)
+async def media_storage_savings(
+    session: AsyncSession = Depends(get_db_readonly_session),
+) -> StorageSavings:
+    """
+    Reports space saved by storing identical media once.
+
+    :param session: read-only database session.
+    :returns: stored and referenced bytes.
+    """
+    return await BlobDAO(session).get_savings()
+
+
+@router.get("/health/task-queues", response_model=List[TaskQueueStats])
+async def task_queues(dao: TaskQueueDAO = Depends()) -> List[TaskQueueStats]:
+    """
+    Reports tasks waiting in each queue of the Postgres broker.
+
+    Growing ``oldest_wait_seconds`` of a queue means its workers
+    can't keep up, or its concurrency limit is too low.
+
+    :param dao: task queue DAO.
+    :returns: task counts and waits per queue.
+    """
+    return await dao.get_stats()
+
+
+@router.get("/health/task-cache", response_model=Dict[str, TaskCacheStats])
+def task_cache_stats() -> Dict[str, TaskCacheStats]:
+    """
+    Reports calls of cached tasks in this worker.
+
+    Hits are counted where tasks run, duplicate sends where they're sent.
+
+    :returns: hits, misses and dropped duplicates by task name.
+    """
+    return task_cache.get_stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics(
+    dao: TaskQueueDAO = Depends(),
+) -> PlainTextResponse:
+    """
+    Exposes metrics of all processes of this host to Prometheus.
+
+    Histograms and counters are added up from the files every process
+    writes to ``metrics_dir``, so they lag by up to
+    ``metrics_flush_interval`` seconds for other processes.
+    Depths of the Postgres broker's queues are read from the database.
+
+    :param dao: task queue DAO.
+    :returns: metrics in the Prometheus text format.
+    """
+    samples: List[Sample] = []
+    if settings.broker == BrokerKind.POSTGRES:
+        samples.extend(_queue_samples(await dao.get_stats()))
+    return PlainTextResponse(
+        render(await metrics_exporter.collect(samples)),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+def _queue_samples(queues: List[TaskQueueStats]) -> List[Sample]:
+    samples: List[Sample] = []
+    for stats in queues:
+        samples.extend(
+            Sample(
+                "gebwai_task_queue_tasks",
+                "gauge",
+                "Tasks of Postgres broker queues by state.",
+                {"queue": stats.queue.value, "state": state},
+                getattr(stats, state),
+            )
+            for state in ("ready", "running", "delayed")
+        )
+        samples.append(
+            Sample(
+                "gebwai_task_queue_oldest_wait_seconds",
+                "gauge",
+                "How long the oldest ready task of a queue has waited.",
+                {"queue": stats.queue.value},
+                stats.oldest_wait_seconds,
+            ),
+        )
+    return samples
@@ -1,8 +1,11 @@
 from fastapi.routing import APIRouter
 
-from gebwai.web.api import echo, monitoring, LINE
+from gebwai.web.api import LINE, echo, items, media, monitoring, search
 
 api_router = APIRouter()
 api_router.include_router(monitoring.router)
 api_router.include_router(echo.router, prefix="/echo", tags=["echo"])
 api_router.include_router(LINE.router, prefix="/line", tags=["line"])
+api_router.include_router(media.router, prefix="/media", tags=["media"])
+api_router.include_router(items.router, tags=["items"])
+api_router.include_router(search.router, tags=["search"])
@@ -0,0 +1,4 @@
+"""Collected text search API."""
+from gebwai.web.api.search.views import router
+
+__all__ = ["router"]
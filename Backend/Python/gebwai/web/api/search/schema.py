@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class SearchHit(BaseModel):
+    """Collected text matching a search."""
+
+    message_id: str
+    source_id: str
+    line_user_id: Optional[str]
+    file_type: str
+    collected_at: datetime
+    body: str
+    # Higher is better, comparable only within one search.
+    rank: float
+
+
+class SearchResults(BaseModel):
+    """Best matching texts, best first."""
+
+    hits: List[SearchHit]
@@ -0,0 +1,52 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from gebwai.db.dao.text_dao import TextDAO
+from gebwai.services.search import tokenizer
+from gebwai.settings import settings
+from gebwai.web.api.search.schema import SearchHit, SearchResults
+
+router = APIRouter()
+
+# Longest accepted search query.
+_MAX_QUERY_LENGTH = 200
+# Texts found unless the limit is given.
+_DEFAULT_LIMIT = 20
+
+
+@router.get("/users/{line_user_id}/search", response_model=SearchResults)
+async def search_texts(  # noqa: WPS211
+    line_user_id: str,
+    query: str = Query(alias="q", min_length=1, max_length=_MAX_QUERY_LENGTH),
+    limit: int = Query(_DEFAULT_LIMIT, ge=1, le=settings.search_max_limit),
+    source_id: Optional[str] = None,
+    file_type: Optional[str] = Query(None, pattern="^(chat|link)$"),
+    text_dao: TextDAO = Depends(),
+) -> SearchResults:
+    """
+    Searches chat messages and links a user collected.
+
+    Texts with every word of the query are ranked by how close
+    and how often the words appear. Thai words match anywhere
+    in a message, even inside longer words.
+
+    :param line_user_id: LINE user id.
+    :param query: words to search for, ``q`` in the URL.
+    :param limit: maximum number of texts.
+    :param source_id: only texts of this source.
+    :param file_type: only ``chat`` messages or ``link`` messages.
+    :param text_dao: DAO for collected texts.
+    :returns: best matching texts.
+    """
+    tsquery = tokenizer.to_tsquery(query)
+    if tsquery is None:
+        return SearchResults(hits=[])
+    rows = await text_dao.search(
+        line_user_id,
+        tsquery,
+        limit,
+        source_id=source_id,
+        file_type=file_type,
+    )
+    return SearchResults(hits=[SearchHit(**row) for row in rows])
@@ -1,4 +1,5 @@
-from typing import Awaitable, Callable
+from functools import partial
+from typing import Awaitable, Callable, List
 
 from fastapi import FastAPI
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
@@ -13,29 +14,151 @@ from opentelemetry.sdk.resources import (
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.trace import set_tracer_provider
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 
+from gebwai.brokers.cache import PostgresTaskResultStore
+from gebwai.db.engine import create_engine, pool_status
+from gebwai.db.routing import ReplicaRouter
+from gebwai.db.session import WriteTrackingSession
+from gebwai.services.items import item_writer
+from gebwai.services.line.dedup import PostgresSeenEventStore, event_deduplicator
+from gebwai.services.line.locks import source_lock
+from gebwai.services.line.messaging import messenger
+from gebwai.services.line.parser import webhook_parser
+from gebwai.services.line.profiles import profile_cache
+from gebwai.services.links.unfurler import link_unfurler
+from gebwai.services.media.blobs import blob_store
+from gebwai.services.media.derivatives import derivative_store
+from gebwai.services.media.downloader import media_downloader
+from gebwai.services.metrics import Sample, metrics, metrics_exporter
+from gebwai.services.search.indexer import text_writer
+from gebwai.services.slips.verifier import slip_verifier
+from gebwai.services.stats import monthly_stats
+from gebwai.services.users import user_directory
 from gebwai.settings import settings
-from gebwai.tkq import broker
+from gebwai.tkq import broker, task_cache
 
 
 def _setup_db(app: FastAPI) -> None:  # pragma: no cover
     """
     Creates connection to the database.
 
-    This function creates SQLAlchemy engine instance,
-    session_factory for creating sessions
+    This function creates SQLAlchemy engine instances,
+    session factories for read-write and read-only sessions
     and stores them in the application's state property.
+    Read-only sessions go to the replica if it's configured.
 
     :param app: fastAPI application.
     """
-    engine = create_async_engine(str(settings.db_url), echo=settings.db_echo)
+    engine = create_engine()
+    replica_url = settings.db_replica_url
+    replica_engine = create_engine(replica_url) if replica_url else None
     session_factory = async_sessionmaker(
         engine,
         expire_on_commit=False,
+        sync_session_class=WriteTrackingSession,
     )
     app.state.db_engine = engine
+    app.state.db_replica_engine = replica_engine
     app.state.db_session_factory = session_factory
+    app.state.db_readonly_session_factory = ReplicaRouter(
+        engine,
+        replica_engine,
+        max_lag=settings.db_replica_max_lag,
+        check_interval=settings.db_replica_lag_check_interval,
+    )
+
+
+def _setup_line(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Connects services to the database.
+
+    LINE, user, item, search, link, media and task cache services
+    keep their own references to the engine or session factories.
+
+    :param app: fastAPI application.
+    """
+    profile_cache.session_factory = app.state.db_session_factory
+    profile_cache.readonly_session_factory = app.state.db_readonly_session_factory
+    user_directory.session_factory = app.state.db_session_factory
+    blob_store.session_factory = app.state.db_session_factory
+    link_unfurler.session_factory = app.state.db_session_factory
+    item_writer.engine = app.state.db_engine
+    text_writer.engine = app.state.db_engine
+    monthly_stats.engine = app.state.db_engine
+    if settings.line_source_lock:
+        source_lock.engine = app.state.db_engine
+    if settings.line_dedup_shared:
+        event_deduplicator.store = PostgresSeenEventStore(
+            app.state.db_engine,
+            ttl=settings.line_dedup_ttl,
+        )
+    if settings.task_cache_shared:
+        task_cache.store = PostgresTaskResultStore(app.state.db_engine)
+
+
+def _db_pool_samples(engine: AsyncEngine) -> List[Sample]:
+    status = pool_status(engine)
+    by_state = [
+        Sample(
+            "gebwai_db_pool_connections",
+            "gauge",
+            "Connections of database pools by state.",
+            {"state": state},
+            getattr(status, state),
+        )
+        for state in ("in_use", "idle", "overflow")
+    ]
+    return by_state + [
+        Sample(
+            "gebwai_db_pool_checkouts_total",
+            "counter",
+            "Connections taken from database pools.",
+            {},
+            status.checkouts,
+        ),
+        Sample(
+            "gebwai_db_pool_timeouts_total",
+            "counter",
+            "Checkouts that timed out waiting for a connection.",
+            {},
+            status.timeouts,
+        ),
+        Sample(
+            "gebwai_db_pool_wait_seconds_total",
+            "counter",
+            "Time spent waiting for a free connection.",
+            {},
+            status.wait_seconds_total,
+        ),
+    ]
+
+
+def _task_cache_samples() -> List[Sample]:
+    return [
+        Sample(
+            "gebwai_task_cache_calls_total",
+            "counter",
+            "Calls of cached tasks by outcome.",
+            {"task": task_name, "outcome": outcome},
+            getattr(stats, outcome),
+        )
+        for task_name, stats in task_cache.get_stats().items()
+        for outcome in ("hits", "misses", "deduplicated")
+    ]
+
+
+def _setup_metrics(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Adds connection pool and task cache counters to metrics.
+
+    Metrics are shared with other processes from then on.
+
+    :param app: fastAPI application.
+    """
+    metrics.add_collector(partial(_db_pool_samples, app.state.db_engine))
+    metrics.add_collector(_task_cache_samples)
+    metrics_exporter.start()
 
 
 def setup_opentelemetry(app: FastAPI) -> None:  # pragma: no cover
@@ -119,6 +242,8 @@ def register_startup_event(
         if not broker.is_worker_process:
             await broker.startup()
         _setup_db(app)
+        _setup_line(app)
+        _setup_metrics(app)
         setup_opentelemetry(app)
         app.middleware_stack = app.build_middleware_stack()
         pass  # noqa: WPS420
@@ -140,9 +265,34 @@ def register_shutdown_event(
     async def _shutdown() -> None:  # noqa: WPS430
         if not broker.is_worker_process:
             await broker.shutdown()
-        await app.state.db_engine.dispose()
+        await _flush_writers()
+        await _close_db(app)
+        await _close_clients()
 
         stop_opentelemetry(app)
         pass  # noqa: WPS420
 
     return _shutdown
+
+
+async def _flush_writers() -> None:  # pragma: no cover
+    await item_writer.close()
+    await text_writer.close()
+    await monthly_stats.close()
+
+
+async def _close_db(app: FastAPI) -> None:  # pragma: no cover
+    await app.state.db_readonly_session_factory.close()
+    await app.state.db_engine.dispose()
+    if app.state.db_replica_engine is not None:
+        await app.state.db_replica_engine.dispose()
+
+
+async def _close_clients() -> None:  # pragma: no cover
+    webhook_parser.shutdown()
+    slip_verifier.shutdown()
+    derivative_store.shutdown()
+    await messenger.close()
+    await media_downloader.close()
+    await link_unfurler.close()
+    await metrics_exporter.close()